@@ -188,8 +188,10 @@ CREATE TABLE tab_section (
 	id_section int4 NOT NULL,
   section_type section_type NOT NULL,
 	description text NULL,
+  geom_line geometry(LineStringZ) NULL,  -- maintained from geopts bindings by triggers (rebuild_section_lines)
 	CONSTRAINT tab_section_pk PRIMARY KEY (id_section)
 );
+CREATE INDEX IF NOT EXISTS tab_section_geom_line_gix ON tab_section USING GIST (geom_line);
 
 ---
 -- tab_geopts definition
@@ -287,6 +289,8 @@ CREATE TABLE tab_polygon_geopts_binding_top (
   UNIQUE (ref_polygon, pts_from, pts_to)
 );
 CREATE INDEX tab_polygon_geopts_binding_top_idx ON tab_polygon_geopts_binding_top(ref_polygon, pts_from, pts_to);
+-- range index for point -> polygon lookups (int4range(pts_from, pts_to, '[]') @> id_pts)
+CREATE INDEX tab_polygon_geopts_binding_top_range_gix ON tab_polygon_geopts_binding_top USING GIST (int4range(pts_from, pts_to, '[]'));
 
 -- here bottom/lower polygon points
 CREATE TABLE tab_polygon_geopts_binding_bottom (
@@ -301,6 +305,7 @@ CREATE TABLE tab_polygon_geopts_binding_bottom (
   UNIQUE (ref_polygon, pts_from, pts_to)
 );
 CREATE INDEX tab_polygon_geopts_binding_bottom_idx ON tab_polygon_geopts_binding_bottom(ref_polygon, pts_from, pts_to);
+CREATE INDEX tab_polygon_geopts_binding_bottom_range_gix ON tab_polygon_geopts_binding_bottom USING GIST (int4range(pts_from, pts_to, '[]'));
 
 
 ---
@@ -734,6 +739,7 @@ CREATE TABLE IF NOT EXISTS tab_section_geopts_binding (
   CONSTRAINT tab_section_geopts_binding_ref_section_fkey FOREIGN KEY (ref_section) REFERENCES tab_section(id_section) ON DELETE CASCADE ON UPDATE CASCADE
 );
 CREATE INDEX IF NOT EXISTS tab_section_geopts_binding_idx ON tab_section_geopts_binding(ref_section, pts_from, pts_to);
+CREATE INDEX IF NOT EXISTS tab_section_geopts_binding_range_gix ON tab_section_geopts_binding USING GIST (int4range(pts_from, pts_to, '[]'));
 
 
 -- 6) M:N SECTIONS and DOCU entities
@@ -785,6 +791,7 @@ CREATE TABLE tabaid_photogram_geopts (
 	CONSTRAINT tabaid_photogram_geopts_pk PRIMARY KEY (ref_photogram, ref_geopt_from, ref_geopt_to),
 	CONSTRAINT tabaid_photogram_geopts_fk FOREIGN KEY (ref_photogram) REFERENCES tab_photograms(id_photogram) ON DELETE CASCADE ON UPDATE CASCADE
 );
+CREATE INDEX IF NOT EXISTS tabaid_photogram_geopts_range_gix ON tabaid_photogram_geopts USING GIST (int4range(ref_geopt_from, ref_geopt_to, '[]'));
 
 
 -- #################################
@@ -888,6 +895,14 @@ BEGIN
   IF array_length(failed, 1) IS NOT NULL THEN
     RAISE EXCEPTION 'set_project_srid failed for % column(s): %', array_length(failed, 1), array_to_string(failed, ' | ');
   END IF;
+
+  -- photo_centroid is derived from the WGS84 GPS columns: recompute it in the new SRID
+  IF to_regclass(format('%I.tab_photos', in_schema)) IS NOT NULL THEN
+    EXECUTE format(
+      'UPDATE %I.tab_photos SET gps_lat = gps_lat WHERE gps_lat IS NOT NULL AND gps_lon IS NOT NULL',
+      in_schema
+    );
+  END IF;
 END
 $$;
 
@@ -1040,9 +1055,11 @@ BEGIN
     RETURN NEW;
   END IF;
 
+  -- EXIF GPS is WGS84 lon/lat; store the centroid in the project SRID so the
+  -- GiST index serves the same bbox filters as tab_geopts.
   NEW.photo_centroid :=
-    ST_SetSRID(
-      ST_MakePoint(NEW.gps_lon, NEW.gps_lat, COALESCE(NEW.gps_alt, 0)),
+    ST_Transform(
+      ST_SetSRID(ST_MakePoint(NEW.gps_lon, NEW.gps_lat, COALESCE(NEW.gps_alt, 0)), 4326),
       v_epsg
     );
 
@@ -1581,6 +1598,426 @@ $function$
 ;
 
 
+---
+-- tab_data_version: change stamp for map response caches
+---
+-- Bumped in the same transaction as every change of the map layer tables,
+-- so the web app can key cached GeoJSON on it.
+CREATE TABLE IF NOT EXISTS tab_data_version (
+  id          boolean PRIMARY KEY DEFAULT true CHECK (id),
+  version     int8        NOT NULL DEFAULT 0,
+  changed_at  timestamptz NOT NULL DEFAULT now()
+);
+INSERT INTO tab_data_version (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+-- Every writing transaction adds one row of its own; inserts of different
+-- transactions never wait on each other, so writers are not serialized on
+-- the version row and cannot deadlock on it. The current version is
+-- tab_data_version.version plus the rows of committed transactions.
+CREATE TABLE IF NOT EXISTS tab_data_version_log (
+  xid         int8        PRIMARY KEY,
+  changed_at  timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+  INSERT INTO tab_data_version_log (xid) VALUES (txid_current())
+  ON CONFLICT (xid) DO NOTHING;
+
+  -- Fold the rows of committed transactions into the version row, keeping
+  -- the sum the same. One folder at a time; the others skip it instead of
+  -- waiting for the version row.
+  IF pg_try_advisory_xact_lock(hashtext('tab_data_version')) THEN
+    WITH folded AS (
+      DELETE FROM tab_data_version_log
+      WHERE xid <> txid_current()
+      RETURNING 1
+    )
+    UPDATE tab_data_version
+    SET version = version + (SELECT COUNT(*) FROM folded), changed_at = now()
+    WHERE id AND EXISTS (SELECT 1 FROM folded);
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+-- statement level: a bulk import bumps the version once, not per row
+DROP TRIGGER IF EXISTS trg_tab_geopts_data_version ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tab_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+DROP TRIGGER IF EXISTS trg_tab_polygons_data_version ON tab_polygons;
+CREATE TRIGGER trg_tab_polygons_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tab_polygons
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+DROP TRIGGER IF EXISTS trg_tab_section_geopts_binding_data_version ON tab_section_geopts_binding;
+CREATE TRIGGER trg_tab_section_geopts_binding_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tab_section_geopts_binding
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+
+---
+-- tab_polygon_geom_dirty: polygons whose geometry is stale after geopts changes
+---
+-- Triggers on tab_geopts mark every polygon with a TOP/BOTTOM binding range
+-- covering a changed id_pts; rebuild_dirty_polygon_geoms() rebuilds just
+-- those (the apps call it before committing a geopts change, a batched pass
+-- can call it with a limit).
+CREATE TABLE IF NOT EXISTS tab_polygon_geom_dirty (
+  polygon_name  text PRIMARY KEY
+                  REFERENCES tab_polygons(polygon_name)
+                  ON UPDATE CASCADE ON DELETE CASCADE,
+  marked_at     timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION mark_polygons_dirty_for_geopts(p_ids int[])
+RETURNS void
+LANGUAGE sql AS
+$$
+  -- driven by the changed ids through the *_range_gix indexes
+  INSERT INTO tab_polygon_geom_dirty (polygon_name)
+  SELECT b.ref_polygon
+  FROM unnest(p_ids) AS c(id_pts)
+  JOIN tab_polygon_geopts_binding_top b
+    ON int4range(b.pts_from, b.pts_to, '[]') @> c.id_pts
+  UNION
+  SELECT b.ref_polygon
+  FROM unnest(p_ids) AS c(id_pts)
+  JOIN tab_polygon_geopts_binding_bottom b
+    ON int4range(b.pts_from, b.pts_to, '[]') @> c.id_pts
+  ON CONFLICT (polygon_name) DO NOTHING;
+$$;
+
+-- statement level with transition tables: one marking query per statement,
+-- UPDATEs that leave pts_geom unchanged (code, notes) mark nothing
+CREATE OR REPLACE FUNCTION tab_geopts_mark_polygons_dirty()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM mark_polygons_dirty_for_geopts(ARRAY(SELECT id_pts FROM new_geopts));
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM mark_polygons_dirty_for_geopts(ARRAY(SELECT id_pts FROM old_geopts));
+  ELSE
+    PERFORM mark_polygons_dirty_for_geopts(ARRAY(
+      SELECT COALESCE(n.id_pts, o.id_pts)
+      FROM new_geopts n
+      FULL JOIN old_geopts o ON o.id_pts = n.id_pts
+      WHERE n.id_pts IS NULL OR o.id_pts IS NULL
+         OR n.pts_geom IS DISTINCT FROM o.pts_geom
+    ));
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_dirty_insert ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_dirty_insert
+AFTER INSERT ON tab_geopts
+REFERENCING NEW TABLE AS new_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_mark_polygons_dirty();
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_dirty_update ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_dirty_update
+AFTER UPDATE ON tab_geopts
+REFERENCING OLD TABLE AS old_geopts NEW TABLE AS new_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_mark_polygons_dirty();
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_dirty_delete ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_dirty_delete
+AFTER DELETE ON tab_geopts
+REFERENCING OLD TABLE AS old_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_mark_polygons_dirty();
+
+-- Rebuild up to p_limit dirty polygons (all when NULL), oldest marks first.
+-- Claimed rows are locked with SKIP LOCKED, so concurrent passes do not wait
+-- for each other. Returns the number of rebuilt polygons.
+CREATE OR REPLACE FUNCTION rebuild_dirty_polygon_geoms(p_limit int DEFAULT NULL)
+RETURNS int
+LANGUAGE plpgsql AS
+$$
+DECLARE
+  v_name  text;
+  v_count int := 0;
+BEGIN
+  FOR v_name IN
+    DELETE FROM tab_polygon_geom_dirty d
+    WHERE d.polygon_name IN (
+      SELECT polygon_name
+      FROM tab_polygon_geom_dirty
+      ORDER BY marked_at, polygon_name
+      LIMIT p_limit
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING d.polygon_name
+  LOOP
+    PERFORM rebuild_polygon_geoms_from_geopts(v_name);
+    v_count := v_count + 1;
+  END LOOP;
+  RETURN v_count;
+END
+$$;
+
+
+---
+-- tab_section.geom_line: section line maintained from the geopts bindings
+---
+-- A section line is just the bound points in id_pts order, cheap enough to
+-- rebuild right in the triggers (no dirty queue as for polygons). Binding
+-- changes rebuild the touched sections, geopts changes the sections whose
+-- ranges cover a changed id_pts (through tab_section_geopts_binding_range_gix).
+
+-- Rebuild the lines of the given sections (all when NULL): distinct points
+-- ascending by id_pts, NULL below 2 points. Returns the number of changed rows.
+CREATE OR REPLACE FUNCTION rebuild_section_lines(p_ids int[] DEFAULT NULL)
+RETURNS int
+LANGUAGE plpgsql AS
+$$
+DECLARE
+  v_count int;
+BEGIN
+  UPDATE tab_section s
+  SET geom_line = l.geom
+  FROM (
+    SELECT
+      t.id_section,
+      (
+        SELECT CASE WHEN COUNT(*) >= 2 THEN ST_MakeLine(p.pts_geom ORDER BY p.id_pts) END
+        FROM (
+          SELECT DISTINCT ON (g.id_pts) g.id_pts, g.pts_geom
+          FROM tab_section_geopts_binding b
+          JOIN tab_geopts g
+            ON g.id_pts BETWEEN b.pts_from AND b.pts_to
+          WHERE b.ref_section = t.id_section
+            AND g.pts_geom IS NOT NULL
+          ORDER BY g.id_pts
+        ) p
+      ) AS geom
+    FROM tab_section t
+    WHERE p_ids IS NULL OR t.id_section = ANY (p_ids)
+  ) l
+  WHERE s.id_section = l.id_section
+    AND s.geom_line IS DISTINCT FROM l.geom;
+
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+  RETURN v_count;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION rebuild_section_lines_for_geopts(p_ids int[])
+RETURNS void
+LANGUAGE sql AS
+$$
+  SELECT rebuild_section_lines(ARRAY(
+    SELECT DISTINCT b.ref_section
+    FROM unnest(p_ids) AS c(id_pts)
+    JOIN tab_section_geopts_binding b
+      ON int4range(b.pts_from, b.pts_to, '[]') @> c.id_pts
+  ));
+$$;
+
+CREATE OR REPLACE FUNCTION tab_section_geopts_binding_rebuild_lines()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM rebuild_section_lines(ARRAY(SELECT DISTINCT ref_section FROM new_bindings));
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM rebuild_section_lines(ARRAY(SELECT DISTINCT ref_section FROM old_bindings));
+  ELSE
+    PERFORM rebuild_section_lines(ARRAY(
+      SELECT ref_section FROM new_bindings
+      UNION
+      SELECT ref_section FROM old_bindings
+    ));
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_tab_section_geopts_binding_lines_insert ON tab_section_geopts_binding;
+CREATE TRIGGER trg_tab_section_geopts_binding_lines_insert
+AFTER INSERT ON tab_section_geopts_binding
+REFERENCING NEW TABLE AS new_bindings
+FOR EACH STATEMENT EXECUTE FUNCTION tab_section_geopts_binding_rebuild_lines();
+
+DROP TRIGGER IF EXISTS trg_tab_section_geopts_binding_lines_update ON tab_section_geopts_binding;
+CREATE TRIGGER trg_tab_section_geopts_binding_lines_update
+AFTER UPDATE ON tab_section_geopts_binding
+REFERENCING OLD TABLE AS old_bindings NEW TABLE AS new_bindings
+FOR EACH STATEMENT EXECUTE FUNCTION tab_section_geopts_binding_rebuild_lines();
+
+DROP TRIGGER IF EXISTS trg_tab_section_geopts_binding_lines_delete ON tab_section_geopts_binding;
+CREATE TRIGGER trg_tab_section_geopts_binding_lines_delete
+AFTER DELETE ON tab_section_geopts_binding
+REFERENCING OLD TABLE AS old_bindings
+FOR EACH STATEMENT EXECUTE FUNCTION tab_section_geopts_binding_rebuild_lines();
+
+-- same change detection as tab_geopts_mark_polygons_dirty()
+CREATE OR REPLACE FUNCTION tab_geopts_rebuild_section_lines()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM rebuild_section_lines_for_geopts(ARRAY(SELECT id_pts FROM new_geopts));
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM rebuild_section_lines_for_geopts(ARRAY(SELECT id_pts FROM old_geopts));
+  ELSE
+    PERFORM rebuild_section_lines_for_geopts(ARRAY(
+      SELECT COALESCE(n.id_pts, o.id_pts)
+      FROM new_geopts n
+      FULL JOIN old_geopts o ON o.id_pts = n.id_pts
+      WHERE n.id_pts IS NULL OR o.id_pts IS NULL
+         OR n.pts_geom IS DISTINCT FROM o.pts_geom
+    ));
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_section_lines_insert ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_section_lines_insert
+AFTER INSERT ON tab_geopts
+REFERENCING NEW TABLE AS new_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_rebuild_section_lines();
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_section_lines_update ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_section_lines_update
+AFTER UPDATE ON tab_geopts
+REFERENCING OLD TABLE AS old_geopts NEW TABLE AS new_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_rebuild_section_lines();
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_section_lines_delete ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_section_lines_delete
+AFTER DELETE ON tab_geopts
+REFERENCING OLD TABLE AS old_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_rebuild_section_lines();
+
+
+---
+-- tab_polygon_closure: ancestor/descendant pairs of the parent_name tree
+---
+-- One row per (ancestor, descendant) with the distance between them,
+-- including (p, p, 0), so "all descendants of X", "depth of X" and subtree
+-- aggregates are plain indexed joins instead of recursive walks. Row
+-- triggers on tab_polygons keep it in sync; renames and deletes follow
+-- through the foreign keys.
+CREATE TABLE IF NOT EXISTS tab_polygon_closure (
+  ancestor    text NOT NULL
+                REFERENCES tab_polygons(polygon_name)
+                ON UPDATE CASCADE ON DELETE CASCADE,
+  descendant  text NOT NULL
+                REFERENCES tab_polygons(polygon_name)
+                ON UPDATE CASCADE ON DELETE CASCADE,
+  depth       int4 NOT NULL CHECK (depth >= 0),
+  PRIMARY KEY (ancestor, descendant)
+);
+CREATE INDEX IF NOT EXISTS tab_polygon_closure_descendant_idx ON tab_polygon_closure (descendant, depth);
+
+-- Hang the subtree of p_name below p_parent and all of p_parent's ancestors.
+CREATE OR REPLACE FUNCTION polygon_closure_attach(p_name text, p_parent text)
+RETURNS void
+LANGUAGE sql AS
+$$
+  INSERT INTO tab_polygon_closure (ancestor, descendant, depth)
+  SELECT a.ancestor, d.descendant, a.depth + d.depth + 1
+  FROM tab_polygon_closure a
+  JOIN tab_polygon_closure d ON d.ancestor = p_name
+  WHERE a.descendant = p_parent
+  ON CONFLICT (ancestor, descendant) DO NOTHING;
+$$;
+
+CREATE OR REPLACE FUNCTION tab_polygons_maintain_closure()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+DECLARE
+  v_child text;
+BEGIN
+  IF TG_OP = 'UPDATE' THEN
+    -- detach the subtree from its former ancestors
+    DELETE FROM tab_polygon_closure c
+    USING tab_polygon_closure d
+    WHERE d.ancestor = NEW.polygon_name
+      AND c.descendant = d.descendant
+      AND c.ancestor NOT IN (
+        SELECT descendant FROM tab_polygon_closure WHERE ancestor = NEW.polygon_name
+      );
+  ELSE
+    INSERT INTO tab_polygon_closure (ancestor, descendant, depth)
+    VALUES (NEW.polygon_name, NEW.polygon_name, 0)
+    ON CONFLICT (ancestor, descendant) DO NOTHING;
+
+    -- children inserted before their parent in the same statement
+    FOR v_child IN SELECT polygon_name FROM tab_polygons WHERE parent_name = NEW.polygon_name LOOP
+      PERFORM polygon_closure_attach(v_child, NEW.polygon_name);
+    END LOOP;
+  END IF;
+
+  IF NEW.parent_name IS NOT NULL THEN
+    PERFORM polygon_closure_attach(NEW.polygon_name, NEW.parent_name);
+    -- a parent inside the own subtree shows up as a pair (polygon, parent)
+    IF EXISTS (
+      SELECT 1 FROM tab_polygon_closure
+      WHERE ancestor = NEW.polygon_name AND descendant = NEW.parent_name
+    ) THEN
+      RAISE EXCEPTION 'Polygon % cannot be nested in its own descendant %', NEW.polygon_name, NEW.parent_name;
+    END IF;
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_tab_polygons_closure_insert ON tab_polygons;
+CREATE TRIGGER trg_tab_polygons_closure_insert
+AFTER INSERT ON tab_polygons
+FOR EACH ROW EXECUTE FUNCTION tab_polygons_maintain_closure();
+
+DROP TRIGGER IF EXISTS trg_tab_polygons_closure_update ON tab_polygons;
+CREATE TRIGGER trg_tab_polygons_closure_update
+AFTER UPDATE OF parent_name ON tab_polygons
+FOR EACH ROW
+WHEN (OLD.parent_name IS DISTINCT FROM NEW.parent_name)
+EXECUTE FUNCTION tab_polygons_maintain_closure();
+
+-- Recompute the whole closure from parent_name (migrations, repairs).
+-- Returns the number of stored pairs.
+CREATE OR REPLACE FUNCTION rebuild_polygon_closure()
+RETURNS int
+LANGUAGE plpgsql AS
+$$
+DECLARE
+  v_count int;
+BEGIN
+  DELETE FROM tab_polygon_closure;
+
+  INSERT INTO tab_polygon_closure (ancestor, descendant, depth)
+  WITH RECURSIVE walk AS (
+    SELECT polygon_name AS ancestor, polygon_name AS descendant, 0 AS depth
+    FROM tab_polygons
+    UNION ALL
+    SELECT w.ancestor, p.polygon_name, w.depth + 1
+    FROM walk w
+    JOIN tab_polygons p ON p.parent_name = w.descendant
+    WHERE w.depth < (SELECT COUNT(*) FROM tab_polygons)  -- stops on legacy cycles
+  )
+  SELECT DISTINCT ON (ancestor, descendant) ancestor, descendant, depth
+  FROM walk
+  ORDER BY ancestor, descendant, depth;
+
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+  RETURN v_count;
+END
+$$;
+
 ----
 -- END OF CREATEING OBJECTS
 ----
@@ -0,0 +1,68 @@
+-- Adds the tab_data_version change stamp used by the web app's map response
+-- cache. Run once in every existing terrain DB (and terrain_db_template) as
+-- the DB owner; running it again upgrades DBs that have the one-row version
+-- without tab_data_version_log:
+--   psql -d <terrain_db> -f db/migrations/20261017_add_data_version.sql
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS tab_data_version (
+  id          boolean PRIMARY KEY DEFAULT true CHECK (id),
+  version     int8        NOT NULL DEFAULT 0,
+  changed_at  timestamptz NOT NULL DEFAULT now()
+);
+INSERT INTO tab_data_version (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+-- Every writing transaction adds one row of its own; inserts of different
+-- transactions never wait on each other, so writers are not serialized on
+-- the version row and cannot deadlock on it. The current version is
+-- tab_data_version.version plus the rows of committed transactions.
+CREATE TABLE IF NOT EXISTS tab_data_version_log (
+  xid         int8        PRIMARY KEY,
+  changed_at  timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+  INSERT INTO tab_data_version_log (xid) VALUES (txid_current())
+  ON CONFLICT (xid) DO NOTHING;
+
+  -- Fold the rows of committed transactions into the version row, keeping
+  -- the sum the same. One folder at a time; the others skip it instead of
+  -- waiting for the version row.
+  IF pg_try_advisory_xact_lock(hashtext('tab_data_version')) THEN
+    WITH folded AS (
+      DELETE FROM tab_data_version_log
+      WHERE xid <> txid_current()
+      RETURNING 1
+    )
+    UPDATE tab_data_version
+    SET version = version + (SELECT COUNT(*) FROM folded), changed_at = now()
+    WHERE id AND EXISTS (SELECT 1 FROM folded);
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_data_version ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tab_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+DROP TRIGGER IF EXISTS trg_tab_polygons_data_version ON tab_polygons;
+CREATE TRIGGER trg_tab_polygons_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tab_polygons
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+DROP TRIGGER IF EXISTS trg_tab_section_geopts_binding_data_version ON tab_section_geopts_binding;
+CREATE TRIGGER trg_tab_section_geopts_binding_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tab_section_geopts_binding
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+GRANT SELECT ON tab_data_version, tab_data_version_log TO grp_app_terrain_ro;
+GRANT SELECT, INSERT, UPDATE, DELETE ON tab_data_version, tab_data_version_log TO grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION bump_data_version() TO grp_app_terrain_ro, grp_app_terrain_rw;
+
+COMMIT;
@@ -0,0 +1,34 @@
+-- GiST indexes on the binding ranges as int4range(from, to, '[]'), so
+-- "which polygons / sections / photograms use point N" is an index lookup
+-- instead of a scan of every binding row. Expression indexes keep the
+-- tables (and the BETWEEN joins driven from a binding) unchanged. Run once in
+-- every existing terrain DB (and terrain_db_template) as the DB owner, after
+-- 20261017_polygon_geom_dirty.sql:
+--   psql -d <terrain_db> -f db/migrations/20261017_binding_range_indexes.sql
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS tab_polygon_geopts_binding_top_range_gix ON tab_polygon_geopts_binding_top USING GIST (int4range(pts_from, pts_to, '[]'));
+CREATE INDEX IF NOT EXISTS tab_polygon_geopts_binding_bottom_range_gix ON tab_polygon_geopts_binding_bottom USING GIST (int4range(pts_from, pts_to, '[]'));
+CREATE INDEX IF NOT EXISTS tab_section_geopts_binding_range_gix ON tab_section_geopts_binding USING GIST (int4range(pts_from, pts_to, '[]'));
+CREATE INDEX IF NOT EXISTS tabaid_photogram_geopts_range_gix ON tabaid_photogram_geopts USING GIST (int4range(ref_geopt_from, ref_geopt_to, '[]'));
+
+-- mark dirty polygons through the new indexes
+CREATE OR REPLACE FUNCTION mark_polygons_dirty_for_geopts(p_ids int[])
+RETURNS void
+LANGUAGE sql AS
+$$
+  -- driven by the changed ids through the *_range_gix indexes
+  INSERT INTO tab_polygon_geom_dirty (polygon_name)
+  SELECT b.ref_polygon
+  FROM unnest(p_ids) AS c(id_pts)
+  JOIN tab_polygon_geopts_binding_top b
+    ON int4range(b.pts_from, b.pts_to, '[]') @> c.id_pts
+  UNION
+  SELECT b.ref_polygon
+  FROM unnest(p_ids) AS c(id_pts)
+  JOIN tab_polygon_geopts_binding_bottom b
+    ON int4range(b.pts_from, b.pts_to, '[]') @> c.id_pts
+  ON CONFLICT (polygon_name) DO NOTHING;
+$$;
+
+COMMIT;
@@ -0,0 +1,51 @@
+-- photo_centroid used to get the raw GPS lon/lat with the project SRID
+-- assigned, which only matched the real position in EPSG:4326 projects. The
+-- trigger now transforms from WGS84; this migration replaces the trigger
+-- function and recomputes existing centroids. Run once in every existing
+-- terrain DB (and terrain_db_template) as the DB owner:
+--   psql -d <terrain_db> -f db/migrations/20261017_photo_centroid_from_wgs84.sql
+-- New DBs get set_project_srid() from the template, which recomputes the
+-- centroids itself; in older DBs re-run the UPDATE below after an SRID change.
+BEGIN;
+
+CREATE OR REPLACE FUNCTION tab_photos_set_centroid()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+DECLARE
+  v_epsg int;
+BEGIN
+  IF NEW.gps_lat IS NULL OR NEW.gps_lon IS NULL THEN
+    NEW.photo_centroid := NULL;
+    RETURN NEW;
+  END IF;
+
+  v_epsg := Find_SRID(TG_TABLE_SCHEMA::text, TG_TABLE_NAME::text, 'photo_centroid'::text);
+  IF v_epsg IS NULL OR v_epsg <= 0 THEN
+    NEW.photo_centroid := NULL;
+    RETURN NEW;
+  END IF;
+
+  -- EXIF GPS is WGS84 lon/lat; store the centroid in the project SRID so the
+  -- GiST index serves the same bbox filters as tab_geopts.
+  NEW.photo_centroid :=
+    ST_Transform(
+      ST_SetSRID(ST_MakePoint(NEW.gps_lon, NEW.gps_lat, COALESCE(NEW.gps_alt, 0)), 4326),
+      v_epsg
+    );
+
+  RETURN NEW;
+
+EXCEPTION
+  WHEN OTHERS THEN
+    NEW.photo_centroid := NULL;
+    RETURN NEW;
+END
+$$;
+
+-- fires trg_tab_photos_set_centroid (BEFORE UPDATE OF gps_lat, ...)
+UPDATE tab_photos
+SET gps_lat = gps_lat
+WHERE gps_lat IS NOT NULL AND gps_lon IS NOT NULL;
+
+COMMIT;
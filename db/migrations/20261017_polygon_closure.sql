@@ -0,0 +1,132 @@
+-- Closure table for the polygon parent_name tree (tab_polygon_closure) and
+-- the triggers that maintain it, so subtree lookups, polygon depth and
+-- subtree aggregates no longer need recursive walks. Run once in every
+-- existing terrain DB (and terrain_db_template) as the DB owner:
+--   psql -d <terrain_db> -f db/migrations/20261017_polygon_closure.sql
+BEGIN;
+
+---
+-- tab_polygon_closure: ancestor/descendant pairs of the parent_name tree
+---
+-- One row per (ancestor, descendant) with the distance between them,
+-- including (p, p, 0), so "all descendants of X", "depth of X" and subtree
+-- aggregates are plain indexed joins instead of recursive walks. Row
+-- triggers on tab_polygons keep it in sync; renames and deletes follow
+-- through the foreign keys.
+CREATE TABLE IF NOT EXISTS tab_polygon_closure (
+  ancestor    text NOT NULL
+                REFERENCES tab_polygons(polygon_name)
+                ON UPDATE CASCADE ON DELETE CASCADE,
+  descendant  text NOT NULL
+                REFERENCES tab_polygons(polygon_name)
+                ON UPDATE CASCADE ON DELETE CASCADE,
+  depth       int4 NOT NULL CHECK (depth >= 0),
+  PRIMARY KEY (ancestor, descendant)
+);
+CREATE INDEX IF NOT EXISTS tab_polygon_closure_descendant_idx ON tab_polygon_closure (descendant, depth);
+
+-- Hang the subtree of p_name below p_parent and all of p_parent's ancestors.
+CREATE OR REPLACE FUNCTION polygon_closure_attach(p_name text, p_parent text)
+RETURNS void
+LANGUAGE sql AS
+$$
+  INSERT INTO tab_polygon_closure (ancestor, descendant, depth)
+  SELECT a.ancestor, d.descendant, a.depth + d.depth + 1
+  FROM tab_polygon_closure a
+  JOIN tab_polygon_closure d ON d.ancestor = p_name
+  WHERE a.descendant = p_parent
+  ON CONFLICT (ancestor, descendant) DO NOTHING;
+$$;
+
+CREATE OR REPLACE FUNCTION tab_polygons_maintain_closure()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+DECLARE
+  v_child text;
+BEGIN
+  IF TG_OP = 'UPDATE' THEN
+    -- detach the subtree from its former ancestors
+    DELETE FROM tab_polygon_closure c
+    USING tab_polygon_closure d
+    WHERE d.ancestor = NEW.polygon_name
+      AND c.descendant = d.descendant
+      AND c.ancestor NOT IN (
+        SELECT descendant FROM tab_polygon_closure WHERE ancestor = NEW.polygon_name
+      );
+  ELSE
+    INSERT INTO tab_polygon_closure (ancestor, descendant, depth)
+    VALUES (NEW.polygon_name, NEW.polygon_name, 0)
+    ON CONFLICT (ancestor, descendant) DO NOTHING;
+
+    -- children inserted before their parent in the same statement
+    FOR v_child IN SELECT polygon_name FROM tab_polygons WHERE parent_name = NEW.polygon_name LOOP
+      PERFORM polygon_closure_attach(v_child, NEW.polygon_name);
+    END LOOP;
+  END IF;
+
+  IF NEW.parent_name IS NOT NULL THEN
+    PERFORM polygon_closure_attach(NEW.polygon_name, NEW.parent_name);
+    -- a parent inside the own subtree shows up as a pair (polygon, parent)
+    IF EXISTS (
+      SELECT 1 FROM tab_polygon_closure
+      WHERE ancestor = NEW.polygon_name AND descendant = NEW.parent_name
+    ) THEN
+      RAISE EXCEPTION 'Polygon % cannot be nested in its own descendant %', NEW.polygon_name, NEW.parent_name;
+    END IF;
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_tab_polygons_closure_insert ON tab_polygons;
+CREATE TRIGGER trg_tab_polygons_closure_insert
+AFTER INSERT ON tab_polygons
+FOR EACH ROW EXECUTE FUNCTION tab_polygons_maintain_closure();
+
+DROP TRIGGER IF EXISTS trg_tab_polygons_closure_update ON tab_polygons;
+CREATE TRIGGER trg_tab_polygons_closure_update
+AFTER UPDATE OF parent_name ON tab_polygons
+FOR EACH ROW
+WHEN (OLD.parent_name IS DISTINCT FROM NEW.parent_name)
+EXECUTE FUNCTION tab_polygons_maintain_closure();
+
+-- Recompute the whole closure from parent_name (migrations, repairs).
+-- Returns the number of stored pairs.
+CREATE OR REPLACE FUNCTION rebuild_polygon_closure()
+RETURNS int
+LANGUAGE plpgsql AS
+$$
+DECLARE
+  v_count int;
+BEGIN
+  DELETE FROM tab_polygon_closure;
+
+  INSERT INTO tab_polygon_closure (ancestor, descendant, depth)
+  WITH RECURSIVE walk AS (
+    SELECT polygon_name AS ancestor, polygon_name AS descendant, 0 AS depth
+    FROM tab_polygons
+    UNION ALL
+    SELECT w.ancestor, p.polygon_name, w.depth + 1
+    FROM walk w
+    JOIN tab_polygons p ON p.parent_name = w.descendant
+    WHERE w.depth < (SELECT COUNT(*) FROM tab_polygons)  -- stops on legacy cycles
+  )
+  SELECT DISTINCT ON (ancestor, descendant) ancestor, descendant, depth
+  FROM walk
+  ORDER BY ancestor, descendant, depth;
+
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+  RETURN v_count;
+END
+$$;
+
+SELECT rebuild_polygon_closure();
+
+GRANT SELECT ON tab_polygon_closure TO grp_app_terrain_ro;
+GRANT SELECT, INSERT, UPDATE, DELETE ON tab_polygon_closure TO grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION polygon_closure_attach(text, text) TO grp_app_terrain_ro, grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION tab_polygons_maintain_closure() TO grp_app_terrain_ro, grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION rebuild_polygon_closure() TO grp_app_terrain_ro, grp_app_terrain_rw;
+
+COMMIT;
@@ -0,0 +1,112 @@
+-- Adds dirty tracking of polygon geometries: triggers on tab_geopts mark the
+-- polygons whose TOP/BOTTOM binding ranges cover a changed point in
+-- tab_polygon_geom_dirty, and rebuild_dirty_polygon_geoms() rebuilds only
+-- those. Both apps call it before committing a geopts change; a batched pass
+-- (e.g. from cron) can run
+--   psql -d <terrain_db> -c "SELECT rebuild_dirty_polygon_geoms(500)"
+-- Run once in every existing terrain DB (and terrain_db_template) as the DB
+-- owner:
+--   psql -d <terrain_db> -f db/migrations/20261017_polygon_geom_dirty.sql
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS tab_polygon_geom_dirty (
+  polygon_name  text PRIMARY KEY
+                  REFERENCES tab_polygons(polygon_name)
+                  ON UPDATE CASCADE ON DELETE CASCADE,
+  marked_at     timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION mark_polygons_dirty_for_geopts(p_ids int[])
+RETURNS void
+LANGUAGE sql AS
+$$
+  INSERT INTO tab_polygon_geom_dirty (polygon_name)
+  SELECT b.ref_polygon FROM tab_polygon_geopts_binding_top b
+  WHERE EXISTS (SELECT 1 FROM unnest(p_ids) AS c(id_pts) WHERE c.id_pts BETWEEN b.pts_from AND b.pts_to)
+  UNION
+  SELECT b.ref_polygon FROM tab_polygon_geopts_binding_bottom b
+  WHERE EXISTS (SELECT 1 FROM unnest(p_ids) AS c(id_pts) WHERE c.id_pts BETWEEN b.pts_from AND b.pts_to)
+  ON CONFLICT (polygon_name) DO NOTHING;
+$$;
+
+-- statement level with transition tables: one marking query per statement,
+-- UPDATEs that leave pts_geom unchanged (code, notes) mark nothing
+CREATE OR REPLACE FUNCTION tab_geopts_mark_polygons_dirty()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM mark_polygons_dirty_for_geopts(ARRAY(SELECT id_pts FROM new_geopts));
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM mark_polygons_dirty_for_geopts(ARRAY(SELECT id_pts FROM old_geopts));
+  ELSE
+    PERFORM mark_polygons_dirty_for_geopts(ARRAY(
+      SELECT COALESCE(n.id_pts, o.id_pts)
+      FROM new_geopts n
+      FULL JOIN old_geopts o ON o.id_pts = n.id_pts
+      WHERE n.id_pts IS NULL OR o.id_pts IS NULL
+         OR n.pts_geom IS DISTINCT FROM o.pts_geom
+    ));
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_dirty_insert ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_dirty_insert
+AFTER INSERT ON tab_geopts
+REFERENCING NEW TABLE AS new_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_mark_polygons_dirty();
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_dirty_update ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_dirty_update
+AFTER UPDATE ON tab_geopts
+REFERENCING OLD TABLE AS old_geopts NEW TABLE AS new_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_mark_polygons_dirty();
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_dirty_delete ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_dirty_delete
+AFTER DELETE ON tab_geopts
+REFERENCING OLD TABLE AS old_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_mark_polygons_dirty();
+
+-- Rebuild up to p_limit dirty polygons (all when NULL), oldest marks first.
+-- Claimed rows are locked with SKIP LOCKED, so concurrent passes do not wait
+-- for each other. Returns the number of rebuilt polygons.
+CREATE OR REPLACE FUNCTION rebuild_dirty_polygon_geoms(p_limit int DEFAULT NULL)
+RETURNS int
+LANGUAGE plpgsql AS
+$$
+DECLARE
+  v_name  text;
+  v_count int := 0;
+BEGIN
+  FOR v_name IN
+    DELETE FROM tab_polygon_geom_dirty d
+    WHERE d.polygon_name IN (
+      SELECT polygon_name
+      FROM tab_polygon_geom_dirty
+      ORDER BY marked_at, polygon_name
+      LIMIT p_limit
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING d.polygon_name
+  LOOP
+    PERFORM rebuild_polygon_geoms_from_geopts(v_name);
+    v_count := v_count + 1;
+  END LOOP;
+  RETURN v_count;
+END
+$$;
+
+GRANT SELECT ON tab_polygon_geom_dirty TO grp_app_terrain_ro;
+GRANT SELECT, INSERT, UPDATE, DELETE ON tab_polygon_geom_dirty TO grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION mark_polygons_dirty_for_geopts(int[]) TO grp_app_terrain_ro, grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION tab_geopts_mark_polygons_dirty() TO grp_app_terrain_ro, grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION rebuild_dirty_polygon_geoms(int) TO grp_app_terrain_ro, grp_app_terrain_rw;
+
+-- polygons of points changed before this migration are not marked; rebuild
+-- them once with "Rebuild all polygons" in the web app.
+
+COMMIT;
@@ -0,0 +1,164 @@
+-- Stored section lines: tab_section.geom_line plus the functions and
+-- triggers that keep it in sync with tab_section_geopts_binding and
+-- tab_geopts, so maps, exports and reports stop rebuilding every line from
+-- the points. The column gets the SRID the project already uses; existing
+-- lines are built at the end. Run once in every existing terrain DB (and
+-- terrain_db_template) as the DB owner, after
+-- 20261017_binding_range_indexes.sql:
+--   psql -d <terrain_db> -f db/migrations/20261017_section_geom_line.sql
+BEGIN;
+
+DO $$
+DECLARE
+  v_srid int := COALESCE(Find_SRID(current_schema()::text, 'tab_geopts'::text, 'pts_geom'::text), 0);
+BEGIN
+  EXECUTE format('ALTER TABLE tab_section ADD COLUMN IF NOT EXISTS geom_line geometry(LineStringZ, %s) NULL', v_srid);
+END
+$$;
+CREATE INDEX IF NOT EXISTS tab_section_geom_line_gix ON tab_section USING GIST (geom_line);
+
+---
+-- tab_section.geom_line: section line maintained from the geopts bindings
+---
+-- A section line is just the bound points in id_pts order, cheap enough to
+-- rebuild right in the triggers (no dirty queue as for polygons). Binding
+-- changes rebuild the touched sections, geopts changes the sections whose
+-- ranges cover a changed id_pts (through tab_section_geopts_binding_range_gix).
+
+-- Rebuild the lines of the given sections (all when NULL): distinct points
+-- ascending by id_pts, NULL below 2 points. Returns the number of changed rows.
+CREATE OR REPLACE FUNCTION rebuild_section_lines(p_ids int[] DEFAULT NULL)
+RETURNS int
+LANGUAGE plpgsql AS
+$$
+DECLARE
+  v_count int;
+BEGIN
+  UPDATE tab_section s
+  SET geom_line = l.geom
+  FROM (
+    SELECT
+      t.id_section,
+      (
+        SELECT CASE WHEN COUNT(*) >= 2 THEN ST_MakeLine(p.pts_geom ORDER BY p.id_pts) END
+        FROM (
+          SELECT DISTINCT ON (g.id_pts) g.id_pts, g.pts_geom
+          FROM tab_section_geopts_binding b
+          JOIN tab_geopts g
+            ON g.id_pts BETWEEN b.pts_from AND b.pts_to
+          WHERE b.ref_section = t.id_section
+            AND g.pts_geom IS NOT NULL
+          ORDER BY g.id_pts
+        ) p
+      ) AS geom
+    FROM tab_section t
+    WHERE p_ids IS NULL OR t.id_section = ANY (p_ids)
+  ) l
+  WHERE s.id_section = l.id_section
+    AND s.geom_line IS DISTINCT FROM l.geom;
+
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+  RETURN v_count;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION rebuild_section_lines_for_geopts(p_ids int[])
+RETURNS void
+LANGUAGE sql AS
+$$
+  SELECT rebuild_section_lines(ARRAY(
+    SELECT DISTINCT b.ref_section
+    FROM unnest(p_ids) AS c(id_pts)
+    JOIN tab_section_geopts_binding b
+      ON int4range(b.pts_from, b.pts_to, '[]') @> c.id_pts
+  ));
+$$;
+
+CREATE OR REPLACE FUNCTION tab_section_geopts_binding_rebuild_lines()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM rebuild_section_lines(ARRAY(SELECT DISTINCT ref_section FROM new_bindings));
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM rebuild_section_lines(ARRAY(SELECT DISTINCT ref_section FROM old_bindings));
+  ELSE
+    PERFORM rebuild_section_lines(ARRAY(
+      SELECT ref_section FROM new_bindings
+      UNION
+      SELECT ref_section FROM old_bindings
+    ));
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_tab_section_geopts_binding_lines_insert ON tab_section_geopts_binding;
+CREATE TRIGGER trg_tab_section_geopts_binding_lines_insert
+AFTER INSERT ON tab_section_geopts_binding
+REFERENCING NEW TABLE AS new_bindings
+FOR EACH STATEMENT EXECUTE FUNCTION tab_section_geopts_binding_rebuild_lines();
+
+DROP TRIGGER IF EXISTS trg_tab_section_geopts_binding_lines_update ON tab_section_geopts_binding;
+CREATE TRIGGER trg_tab_section_geopts_binding_lines_update
+AFTER UPDATE ON tab_section_geopts_binding
+REFERENCING OLD TABLE AS old_bindings NEW TABLE AS new_bindings
+FOR EACH STATEMENT EXECUTE FUNCTION tab_section_geopts_binding_rebuild_lines();
+
+DROP TRIGGER IF EXISTS trg_tab_section_geopts_binding_lines_delete ON tab_section_geopts_binding;
+CREATE TRIGGER trg_tab_section_geopts_binding_lines_delete
+AFTER DELETE ON tab_section_geopts_binding
+REFERENCING OLD TABLE AS old_bindings
+FOR EACH STATEMENT EXECUTE FUNCTION tab_section_geopts_binding_rebuild_lines();
+
+-- same change detection as tab_geopts_mark_polygons_dirty()
+CREATE OR REPLACE FUNCTION tab_geopts_rebuild_section_lines()
+RETURNS trigger
+LANGUAGE plpgsql AS
+$$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM rebuild_section_lines_for_geopts(ARRAY(SELECT id_pts FROM new_geopts));
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM rebuild_section_lines_for_geopts(ARRAY(SELECT id_pts FROM old_geopts));
+  ELSE
+    PERFORM rebuild_section_lines_for_geopts(ARRAY(
+      SELECT COALESCE(n.id_pts, o.id_pts)
+      FROM new_geopts n
+      FULL JOIN old_geopts o ON o.id_pts = n.id_pts
+      WHERE n.id_pts IS NULL OR o.id_pts IS NULL
+         OR n.pts_geom IS DISTINCT FROM o.pts_geom
+    ));
+  END IF;
+  RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_section_lines_insert ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_section_lines_insert
+AFTER INSERT ON tab_geopts
+REFERENCING NEW TABLE AS new_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_rebuild_section_lines();
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_section_lines_update ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_section_lines_update
+AFTER UPDATE ON tab_geopts
+REFERENCING OLD TABLE AS old_geopts NEW TABLE AS new_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_rebuild_section_lines();
+
+DROP TRIGGER IF EXISTS trg_tab_geopts_section_lines_delete ON tab_geopts;
+CREATE TRIGGER trg_tab_geopts_section_lines_delete
+AFTER DELETE ON tab_geopts
+REFERENCING OLD TABLE AS old_geopts
+FOR EACH STATEMENT EXECUTE FUNCTION tab_geopts_rebuild_section_lines();
+
+
+SELECT rebuild_section_lines();
+
+GRANT EXECUTE ON FUNCTION rebuild_section_lines(int[]) TO grp_app_terrain_ro, grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION rebuild_section_lines_for_geopts(int[]) TO grp_app_terrain_ro, grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION tab_section_geopts_binding_rebuild_lines() TO grp_app_terrain_ro, grp_app_terrain_rw;
+GRANT EXECUTE ON FUNCTION tab_geopts_rebuild_section_lines() TO grp_app_terrain_ro, grp_app_terrain_rw;
+
+COMMIT;
@@ -119,6 +119,83 @@ class CreateDbTemplateTests(unittest.TestCase):
         self.assertIn("DROP COLUMN excav_extent", migration)
         self.assertIn("tab_sj_excav_extent_chk", migration)
 
+    def test_map_layer_tables_bump_data_version(self) -> None:
+        self.assertRegex(self.template_sql, re.compile(r"CREATE TABLE IF NOT EXISTS\s+tab_data_version\s*\("))
+        migration = (DB_DIR / "migrations" / "20261017_add_data_version.sql").read_text(encoding="utf-8")
+
+        for table_name in ("tab_geopts", "tab_polygons", "tab_section_geopts_binding"):
+            trigger = (
+                f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table_name}\n"
+                "FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();"
+            )
+            with self.subTest(table=table_name):
+                self.assertIn(trigger, self.template_sql)
+                self.assertIn(trigger, migration)
+
+        # writers add a row per transaction instead of updating one shared row
+        for sql_text in (self.template_sql, migration):
+            self.assertIn("CREATE TABLE IF NOT EXISTS tab_data_version_log (", sql_text)
+            self.assertIn("INSERT INTO tab_data_version_log (xid) VALUES (txid_current())", sql_text)
+            self.assertIn("pg_try_advisory_xact_lock(hashtext('tab_data_version'))", sql_text)
+            self.assertNotIn("UPDATE tab_data_version SET version = version + 1", sql_text)
+
+    def test_photo_centroid_is_transformed_from_wgs84(self) -> None:
+        transform = "ST_SetSRID(ST_MakePoint(NEW.gps_lon, NEW.gps_lat, COALESCE(NEW.gps_alt, 0)), 4326)"
+        migration = (DB_DIR / "migrations" / "20261017_photo_centroid_from_wgs84.sql").read_text(encoding="utf-8")
+
+        self.assertIn(transform, self.template_sql)
+        self.assertIn(transform, migration)
+        self.assertIn("SET gps_lat = gps_lat", migration)
+
+    def test_geopts_changes_mark_polygons_dirty(self) -> None:
+        migration = (DB_DIR / "migrations" / "20261017_polygon_geom_dirty.sql").read_text(encoding="utf-8")
+
+        for sql_text in (self.template_sql, migration):
+            with self.subTest(sql=sql_text[:40]):
+                self.assertIn("CREATE TABLE IF NOT EXISTS tab_polygon_geom_dirty (", sql_text)
+                self.assertIn("REFERENCING OLD TABLE AS old_geopts NEW TABLE AS new_geopts", sql_text)
+                self.assertIn("CREATE OR REPLACE FUNCTION rebuild_dirty_polygon_geoms(p_limit int DEFAULT NULL)", sql_text)
+                self.assertIn("FOR UPDATE SKIP LOCKED", sql_text)
+
+    def test_binding_ranges_have_gist_indexes(self) -> None:
+        migration = (DB_DIR / "migrations" / "20261017_binding_range_indexes.sql").read_text(encoding="utf-8")
+
+        for table_name, columns in (
+            ("tab_polygon_geopts_binding_top", "pts_from, pts_to"),
+            ("tab_polygon_geopts_binding_bottom", "pts_from, pts_to"),
+            ("tab_section_geopts_binding", "pts_from, pts_to"),
+            ("tabaid_photogram_geopts", "ref_geopt_from, ref_geopt_to"),
+        ):
+            index = f"ON {table_name} USING GIST (int4range({columns}, '[]'));"
+            with self.subTest(table=table_name):
+                self.assertIn(index, self.template_sql)
+                self.assertIn(index, migration)
+
+    def test_section_lines_are_stored_and_maintained_by_triggers(self) -> None:
+        migration = (DB_DIR / "migrations" / "20261017_section_geom_line.sql").read_text(encoding="utf-8")
+
+        self.assertIn("geom_line geometry(LineStringZ) NULL", self.template_sql)
+        self.assertIn("ADD COLUMN IF NOT EXISTS geom_line geometry(LineStringZ, %s) NULL", migration)
+        for sql_text in (self.template_sql, migration):
+            with self.subTest(sql=sql_text[:40]):
+                self.assertIn("ON tab_section USING GIST (geom_line);", sql_text)
+                self.assertIn("CREATE OR REPLACE FUNCTION rebuild_section_lines(p_ids int[] DEFAULT NULL)", sql_text)
+                self.assertIn("REFERENCING OLD TABLE AS old_bindings NEW TABLE AS new_bindings", sql_text)
+                self.assertIn("EXECUTE FUNCTION tab_geopts_rebuild_section_lines();", sql_text)
+        self.assertIn("SELECT rebuild_section_lines();", migration)
+
+    def test_polygon_hierarchy_has_maintained_closure_table(self) -> None:
+        migration = (DB_DIR / "migrations" / "20261017_polygon_closure.sql").read_text(encoding="utf-8")
+
+        for sql_text in (self.template_sql, migration):
+            with self.subTest(sql=sql_text[:40]):
+                self.assertIn("CREATE TABLE IF NOT EXISTS tab_polygon_closure (", sql_text)
+                self.assertIn("PRIMARY KEY (ancestor, descendant)", sql_text)
+                self.assertIn("ON tab_polygon_closure (descendant, depth);", sql_text)
+                self.assertIn("AFTER UPDATE OF parent_name ON tab_polygons", sql_text)
+                self.assertIn("cannot be nested in its own descendant", sql_text)
+        self.assertIn("SELECT rebuild_polygon_closure();", migration)
+
     def test_auth_template_creates_expected_database_and_users_table(self) -> None:
         self.assertIn("CREATE DATABASE auth_db OWNER own_auth_db ENCODING 'UTF8';", self.auth_sql)
         self.assertRegex(
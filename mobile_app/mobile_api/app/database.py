@@ -3,10 +3,27 @@ from contextlib import contextmanager
 import psycopg2
 
 from config import Config
+from app.db_pool import PoolManager
 
 
-def get_auth_connection():
-    return psycopg2.connect(
+POOL_APPLICATION_NAME = getattr(Config, "DB_POOL_APPLICATION_NAME", "archeodb_mobile_pool")
+
+_pools = PoolManager(
+    max_size=int(getattr(Config, "DB_POOL_MAX_PER_DB", 4)),
+    max_databases=int(getattr(Config, "DB_POOL_MAX_DATABASES", 16)),
+    max_idle_seconds=float(getattr(Config, "DB_POOL_IDLE_SECONDS", 300)),
+    checkout_timeout=float(getattr(Config, "DB_POOL_CHECKOUT_TIMEOUT_SECONDS", 10)),
+    healthcheck_after=float(getattr(Config, "DB_POOL_HEALTHCHECK_SECONDS", 30)),
+    slow_wait_seconds=float(getattr(Config, "DB_POOL_SLOW_WAIT_SECONDS", 1)),
+)
+
+
+def _pool_enabled() -> bool:
+    return bool(getattr(Config, "DB_POOL_ENABLED", True))
+
+
+def _auth_kwargs() -> dict:
+    return dict(
         dbname=Config.AUTH_DB_NAME,
         user=Config.AUTH_DB_USER,
         password=Config.AUTH_DB_PASSWORD,
@@ -15,8 +32,8 @@ def get_auth_connection():
     )
 
 
-def get_terrain_connection(dbname: str):
-    return psycopg2.connect(
+def _terrain_kwargs(dbname: str) -> dict:
+    return dict(
         dbname=dbname,
         user=Config.TERRAIN_DB_USER,
         password=Config.TERRAIN_DB_PASSWORD,
@@ -25,29 +42,54 @@ def get_terrain_connection(dbname: str):
     )
 
 
+def get_auth_connection():
+    return psycopg2.connect(**_auth_kwargs())
+
+
+def get_terrain_connection(dbname: str):
+    return psycopg2.connect(**_terrain_kwargs(dbname))
+
+
+def _acquire(connect_kwargs: dict):
+    if not _pool_enabled():
+        return psycopg2.connect(**connect_kwargs)
+    return _pools.getconn({**connect_kwargs, "application_name": POOL_APPLICATION_NAME})
+
+
+def _release(conn) -> None:
+    """Hand a connection back to its pool (rolled back, autocommit off)."""
+    if not _pools.release(conn):
+        conn.close()
+
+
+def pool_stats() -> list[dict]:
+    """Per-DB pool sizes and checkout wait times of this worker process."""
+    return _pools.stats()
+
+
 @contextmanager
 def auth_connection():
-    conn = get_auth_connection()
+    conn = _acquire(_auth_kwargs())
     try:
         yield conn
     finally:
-        conn.close()
+        _release(conn)
 
 
 @contextmanager
 def terrain_connection(dbname: str):
-    conn = get_terrain_connection(dbname)
+    conn = _acquire(_terrain_kwargs(dbname))
     try:
         yield conn
     finally:
-        conn.close()
+        _release(conn)
 
 
 @contextmanager
 def terrain_transaction(dbname: str):
     """Connection with an explicit transaction: commits on success,
-    rolls back on any exception, always closes."""
-    conn = get_terrain_connection(dbname)
+    rolls back on any exception, always releases the connection."""
+    conn = _acquire(_terrain_kwargs(dbname))
     conn.autocommit = False
     try:
         yield conn
@@ -56,4 +98,4 @@ def terrain_transaction(dbname: str):
         conn.rollback()
         raise
     finally:
-        conn.close()
+        _release(conn)
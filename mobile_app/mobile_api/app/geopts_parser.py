@@ -0,0 +1,307 @@
+# Streaming parser for total-station point files (id_pts, x, y, h[, code[, notes]]).
+#
+# Kept identical in web_app (app/utils/geopts_parser.py) and mobile_api
+# (app/geopts_parser.py); the two services are deployed separately, so change
+# both copies together.
+#
+# The encoding (utf-8, cp1250, latin-1) is checked over the whole upload in
+# chunks first and decoding is strict, so no character is silently replaced.
+# The upload is decoded incrementally, the delimiter and header are detected
+# once from the first lines, and rows are collected into fixed-size batches
+# whose numeric columns are converted in one pass into compact arrays. Memory
+# use depends on the batch size, not on the file size.
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+from array import array
+from itertools import islice
+from typing import Iterable, Iterator
+
+DEFAULT_BATCH_SIZE = 5000
+SNIFF_LINES = 10  # delimiter is detected from the first data lines
+SNIFF_BYTES = 64 * 1024
+ENCODINGS = ("utf-8", "cp1250", "latin-1")
+
+
+class ParseStats:
+    """Counters filled while batches are consumed."""
+
+    __slots__ = ("rows", "rejected", "delimiter", "header", "encoding")
+
+    def __init__(self):
+        self.rows = 0
+        self.rejected = 0
+        self.delimiter = None
+        self.header = False
+        self.encoding = None
+
+
+class PointBatch:
+    """Parsed rows in column arrays; line_no is the 1-based line in the file."""
+
+    __slots__ = ("line_no", "id_pts", "x", "y", "h", "code", "notes")
+
+    def __init__(self):
+        self.line_no = array("q")
+        self.id_pts = array("q")
+        self.x = array("d")
+        self.y = array("d")
+        self.h = array("d")
+        self.code: list[str | None] = []
+        self.notes: list[str | None] = []
+
+    def __len__(self) -> int:
+        return len(self.id_pts)
+
+    def rows(self) -> Iterator[tuple]:
+        """(line_no, id_pts, x, y, h, code, notes) tuples, e.g. for COPY."""
+        return zip(self.line_no, self.id_pts, self.x, self.y, self.h, self.code, self.notes)
+
+    def points(self) -> Iterator[dict]:
+        for _line_no, id_pts, x, y, h, code, notes in self.rows():
+            yield {"id_pts": id_pts, "x": x, "y": y, "h": h, "code": code, "notes": notes}
+
+
+class _LimitedReader(io.RawIOBase):
+    """Binary reader that fails once more than max_bytes were read."""
+
+    def __init__(self, stream, max_bytes: int | None):
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self._read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._stream.read(len(buffer))
+        if not chunk:
+            return 0
+        self._read += len(chunk)
+        if self._max_bytes is not None and self._read > self._max_bytes:
+            raise ValueError("Uploaded file is too large.")
+        buffer[: len(chunk)] = chunk
+        return len(chunk)
+
+
+def _decodes_as(stream, encoding: str, max_bytes: int | None) -> bool:
+    decoder = codecs.getincrementaldecoder(encoding)()
+    reader = _LimitedReader(stream, max_bytes)
+    try:
+        while True:
+            chunk = reader.read(SNIFF_BYTES)
+            if not chunk:
+                decoder.decode(b"", final=True)
+                return True
+            decoder.decode(chunk)
+    except UnicodeDecodeError:
+        return False
+
+
+def _detect_encoding(stream, max_bytes: int | None) -> str:
+    """
+    First of ENCODINGS the whole (seekable) stream decodes in, checked in
+    chunks and without keeping the file in memory; the stream is rewound.
+    """
+    start = stream.tell()
+    try:
+        for encoding in ENCODINGS[:-1]:
+            if _decodes_as(stream, encoding, max_bytes):
+                return encoding
+            stream.seek(start)
+    finally:
+        stream.seek(start)
+    return ENCODINGS[-1]  # latin-1 decodes any byte
+
+
+def _detect_sample_encoding(sample: bytes) -> str:
+    for encoding in ENCODINGS:
+        try:
+            # final=False: a multi-byte character may be cut at the sample end
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return ENCODINGS[-1]
+
+
+def _open_text(stream, max_bytes: int | None, stats: ParseStats):
+    # Decoding is strict: a character that does not fit the detected encoding
+    # fails the import instead of being stored as U+FFFD. Only non-seekable
+    # streams, judged by their first SNIFF_BYTES, can run into that.
+    seekable = stream.seekable() if hasattr(stream, "seekable") else False
+    encoding = _detect_encoding(stream, max_bytes) if seekable else None
+    raw = io.BufferedReader(_LimitedReader(stream, max_bytes), buffer_size=SNIFF_BYTES)
+    if encoding is None:
+        encoding = _detect_sample_encoding(raw.peek(SNIFF_BYTES)[:SNIFF_BYTES])
+    stats.encoding = encoding
+    return io.TextIOWrapper(raw, encoding=encoding, newline="")
+
+
+def detect_delimiter(lines: Iterable[str]) -> str | None:
+    """';' or ',' for CSV, None for whitespace separated columns."""
+    sample = "\n".join(lines)
+    if ";" in sample and sample.count(";") >= sample.count(","):
+        return ";"
+    if "," in sample:
+        return ","
+    return None
+
+
+def is_header_row(row: list[str]) -> bool:
+    if not row:
+        return False
+    head = " ".join([cell.lower().strip() for cell in row])
+    return ("id" in head and "x" in head and "y" in head) or ("id_pts" in head)
+
+
+def _split_rows(lines: list[str], delimiter: str | None) -> list[list[str]]:
+    if delimiter is None:
+        return [line.split() for line in lines]
+
+    rows = list(csv.reader(lines, delimiter=delimiter))
+    if len(rows) != len(lines):
+        # an unbalanced quote made csv join lines; parse them one by one
+        rows = [next(csv.reader((line,), delimiter=delimiter), []) for line in lines]
+    return rows
+
+
+def _to_floats(values: list[str]) -> list[float | None]:
+    try:
+        return list(map(float, values))
+    except ValueError:
+        pass
+
+    result = []
+    for value in values:
+        try:
+            result.append(float(value))
+        except ValueError:
+            result.append(None)
+    return result
+
+
+def _to_ints(values: list[str]) -> list[int | None]:
+    try:
+        return list(map(int, values))
+    except ValueError:
+        pass
+
+    result = []
+    for value in values:
+        try:
+            result.append(int(value))
+        except ValueError:
+            result.append(None)
+    return result
+
+
+def _convert_batch(pending: list[tuple[int, list[str]]], stats: ParseStats) -> PointBatch:
+    # Column-wise conversion: one map() per column instead of per-row calls.
+    rows = [row for _line_no, row in pending]
+    ids = _to_ints([row[0] for row in rows])
+    xs = _to_floats([row[1].replace(",", ".") for row in rows])
+    ys = _to_floats([row[2].replace(",", ".") for row in rows])
+    hs = _to_floats([row[3].replace(",", ".") for row in rows])
+
+    if None in ids or None in xs or None in ys or None in hs:
+        keep = [
+            i for i in range(len(rows))
+            if ids[i] is not None and xs[i] is not None and ys[i] is not None and hs[i] is not None
+        ]
+        stats.rejected += len(rows) - len(keep)
+        pending = [pending[i] for i in keep]
+        rows = [rows[i] for i in keep]
+        ids = [ids[i] for i in keep]
+        xs = [xs[i] for i in keep]
+        ys = [ys[i] for i in keep]
+        hs = [hs[i] for i in keep]
+
+    batch = PointBatch()
+    batch.line_no = array("q", [line_no for line_no, _row in pending])
+    batch.id_pts = array("q", ids)
+    batch.x = array("d", xs)
+    batch.y = array("d", ys)
+    batch.h = array("d", hs)
+    batch.code = [row[4].strip() if len(row) >= 5 else None for row in rows]
+    batch.notes = [row[5].strip() if len(row) >= 6 else None for row in rows]
+
+    stats.rows += len(batch)
+    return batch
+
+
+def iter_point_batches(
+    stream,
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_bytes: int | None = None,
+    stats: ParseStats | None = None,
+) -> Iterator[PointBatch]:
+    """
+    Parse a binary point-file stream into PointBatch objects.
+
+    Accepts CSV (comma/semicolon) and whitespace separated files with the
+    columns id_pts, x, y, h, code (optional), notes (optional). Comma decimals
+    are accepted; blank lines and lines starting with '#' or '//' are skipped.
+    Rows that cannot be parsed are counted in stats.rejected. Raises
+    ValueError when the stream is longer than max_bytes.
+    """
+    stats = stats if stats is not None else ParseStats()
+    batch_size = max(1, int(batch_size))
+    text_stream = _open_text(stream, max_bytes, stats)
+
+    delimiter_known = False
+    first_row = True
+    line_offset = 0
+    while True:
+        try:
+            chunk = list(islice(text_stream, batch_size))
+        except UnicodeDecodeError:
+            raise ValueError(
+                f"The file is not valid {stats.encoding} text (after line {line_offset}). "
+                "Save it as UTF-8 and upload it again."
+            ) from None
+        if not chunk:
+            return
+
+        numbered = [
+            (line_no, line)
+            for line_no, line in enumerate((line.strip() for line in chunk), start=line_offset + 1)
+            if line and not line.startswith(("#", "//"))
+        ]
+        line_offset += len(chunk)
+        if not numbered:
+            continue
+
+        if not delimiter_known:
+            delimiter_known = True
+            stats.delimiter = detect_delimiter(line for _line_no, line in numbered[:SNIFF_LINES])
+
+        rows = _split_rows([line for _line_no, line in numbered], stats.delimiter)
+        pairs = [(line_no, row) for (line_no, _line), row in zip(numbered, rows) if any(row)]
+        if first_row and pairs:
+            first_row = False
+            if is_header_row(pairs[0][1]):
+                stats.header = True
+                pairs = pairs[1:]
+
+        pending = [pair for pair in pairs if len(pair[1]) >= 4]
+        stats.rejected += len(pairs) - len(pending)
+
+        if pending:
+            batch = _convert_batch(pending, stats)
+            if len(batch):
+                yield batch
+
+
+def parse_points(data: bytes | str, **kwargs) -> tuple[list[dict], int]:
+    """Whole-file convenience wrapper: returns (points, rejected)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    stats = ParseStats()
+    points = []
+    for batch in iter_point_batches(io.BytesIO(data), stats=stats, **kwargs):
+        points.extend(batch.points())
+    return points, stats.rejected
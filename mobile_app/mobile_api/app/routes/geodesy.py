@@ -2,18 +2,21 @@ import csv
 import io
 import logging
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 
 from config import Config
 from app.auth_tokens import require_mobile_token
 from app.database import terrain_connection, terrain_transaction
+from app.geopts_parser import ParseStats, iter_point_batches
 from app.responses import _json_error
+from app.srid_cache import get_project_srid
 from app.validators import _validate_terrain_db
 
 geodesy_bp = Blueprint("geodesy", __name__)
 logger = logging.getLogger("mobile_api.geodesy")
 
 GEOPT_CODES = ["SU", "FX", "EP", "FO", "NI", "PF", "FI", "PR", "SP"]
+GEOPT_USAGE_KINDS = ("polygon_top", "polygon_bottom", "section", "photogram")
 DEFAULT_LIST_LIMIT = 500
 MAX_LIST_LIMIT = 5000
 DEFAULT_GEOJSON_LIMIT = 5000
@@ -21,10 +24,11 @@ MAX_GEOJSON_LIMIT = 20000
 DEFAULT_POLYGON_GEOJSON_LIMIT = 2000
 MAX_POLYGON_GEOJSON_LIMIT = 10000
 DEFAULT_TEXT_UPLOAD_LIMIT = 8 * 1024 * 1024
-
-
-def _find_geopts_srid_sql():
-    return "SELECT Find_SRID(current_schema()::text, 'tab_geopts'::text, 'pts_geom'::text);"
+MVT_MAX_ZOOM = 24
+GEOPT_CLUSTER_CELL_PX = 32
+GEOPT_CLUSTER_DEFAULT_ZOOM = 16
+WEB_MERCATOR_WORLD_M = 40075016.686
+MVT_MIMETYPE = "application/vnd.mapbox-vector-tile"
 
 
 def _upsert_geopt_sql():
@@ -58,6 +62,82 @@ def _upsert_geopt_sql():
     """
 
 
+def _create_geopts_import_stage_sql():
+    return """
+        CREATE TEMP TABLE geopts_import_stage (
+            line_no integer NOT NULL,
+            id_pts integer NOT NULL,
+            x double precision NOT NULL,
+            y double precision NOT NULL,
+            h double precision NOT NULL,
+            code text,
+            notes text
+        ) ON COMMIT DROP;
+    """
+
+
+def _copy_geopts_import_stage_sql():
+    return """
+        COPY geopts_import_stage (line_no, id_pts, x, y, h, code, notes)
+        FROM STDIN WITH (FORMAT csv)
+    """
+
+
+def _upsert_geopts_from_stage_sql():
+    # A repeated point ID takes its last line, but the last non-empty notes
+    # of its lines, as with per-line upserts.
+    return """
+        WITH last_notes AS (
+            SELECT id_pts, (ARRAY_AGG(notes ORDER BY line_no DESC))[1] AS notes
+            FROM geopts_import_stage
+            WHERE NULLIF(BTRIM(notes), '') IS NOT NULL
+            GROUP BY id_pts
+        ),
+        src AS (
+            SELECT DISTINCT ON (s.id_pts) s.id_pts, s.x, s.y, s.h, s.code, n.notes
+            FROM geopts_import_stage s
+            LEFT JOIN last_notes n ON n.id_pts = s.id_pts
+            ORDER BY s.id_pts, s.line_no DESC
+        ),
+        p AS (
+            SELECT
+                src.*,
+                ST_Transform(
+                    ST_SetSRID(ST_MakePoint(src.x, src.y, src.h), %s),
+                    %s
+                ) AS g
+            FROM src
+        ),
+        upserted AS (
+            INSERT INTO tab_geopts (id_pts, x, y, h, code, notes)
+            SELECT
+                p.id_pts,
+                ST_X(p.g),
+                ST_Y(p.g),
+                p.h,
+                CASE
+                  WHEN NULLIF(BTRIM(p.code), '') IS NULL THEN NULL
+                  WHEN UPPER(BTRIM(p.code)) IN ('SU','FX','EP','FO','NI','PF','FI','PR','SP')
+                    THEN UPPER(BTRIM(p.code))::geopt_code
+                  ELSE NULL
+                END,
+                NULLIF(BTRIM(p.notes), '')
+            FROM p
+            ON CONFLICT (id_pts) DO UPDATE SET
+                x = EXCLUDED.x,
+                y = EXCLUDED.y,
+                h = EXCLUDED.h,
+                code = EXCLUDED.code,
+                notes = COALESCE(EXCLUDED.notes, tab_geopts.notes)
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT
+            COUNT(*) FILTER (WHERE inserted),
+            COUNT(*) FILTER (WHERE NOT inserted)
+        FROM upserted;
+    """
+
+
 def _list_geopts_sql():
     return """
       SELECT id_pts, x, y, h, code::text AS code, notes
@@ -97,6 +177,37 @@ def _delete_geopt_sql():
     return "DELETE FROM tab_geopts WHERE id_pts = %s;"
 
 
+def _geopt_usage_sql():
+    # bindings containing the point, via the *_range_gix GiST indexes
+    return """
+      SELECT 'polygon_top'::text, b.ref_polygon::text, b.pts_from, b.pts_to
+      FROM tab_polygon_geopts_binding_top b
+      WHERE int4range(b.pts_from, b.pts_to, '[]') @> %s::int4
+      UNION ALL
+      SELECT 'polygon_bottom'::text, b.ref_polygon::text, b.pts_from, b.pts_to
+      FROM tab_polygon_geopts_binding_bottom b
+      WHERE int4range(b.pts_from, b.pts_to, '[]') @> %s::int4
+      UNION ALL
+      SELECT 'section'::text, b.ref_section::text, b.pts_from, b.pts_to
+      FROM tab_section_geopts_binding b
+      WHERE int4range(b.pts_from, b.pts_to, '[]') @> %s::int4
+      UNION ALL
+      SELECT 'photogram'::text, b.ref_photogram::text, b.ref_geopt_from, b.ref_geopt_to
+      FROM tabaid_photogram_geopts b
+      WHERE int4range(b.ref_geopt_from, b.ref_geopt_to, '[]') @> %s::int4
+      ORDER BY 1, 2, 3;
+    """
+
+
+def _dirty_polygon_tracking_exists_sql():
+    return "SELECT to_regprocedure('rebuild_dirty_polygon_geoms(integer)') IS NOT NULL;"
+
+
+def _rebuild_dirty_polygon_geoms_sql():
+    # polygons marked by the tab_geopts triggers; NULL = all of them
+    return "SELECT rebuild_dirty_polygon_geoms(NULL::int);"
+
+
 def _geojson_geopts_bbox_sql():
     return """
       WITH
@@ -144,6 +255,80 @@ def _geojson_geopts_bbox_sql():
     """
 
 
+def _geojson_geopts_clusters_bbox_sql():
+    return """
+      WITH
+      bbox AS (
+        SELECT ST_Transform(
+                 ST_MakeEnvelope(%s, %s, %s, %s, 4326),
+                 %s
+               ) AS g
+      ),
+      pts AS (
+        SELECT
+          COALESCE(g.code::text, '') AS code,
+          ST_Transform(ST_Force2D(g.pts_geom), 3857) AS geom_3857
+        FROM tab_geopts g, bbox b
+        WHERE g.pts_geom IS NOT NULL
+          AND ST_Intersects(g.pts_geom, b.g)
+          AND (%s IS NULL OR g.code::text = %s)
+          AND (
+            %s IS NULL
+            OR g.notes ILIKE %s
+            OR g.code::text ILIKE %s
+          )
+          AND (%s IS NULL OR g.id_pts >= %s)
+          AND (%s IS NULL OR g.id_pts <= %s)
+      ),
+      by_code AS (
+        SELECT
+          floor(ST_X(geom_3857) / %s) AS cx,
+          floor(ST_Y(geom_3857) / %s) AS cy,
+          code,
+          COUNT(*) AS n,
+          ST_Collect(geom_3857) AS geom
+        FROM pts
+        GROUP BY 1, 2, code
+      ),
+      clusters AS (
+        SELECT
+          SUM(n)::int AS n,
+          json_object_agg(code, n ORDER BY code) AS codes,
+          ST_Collect(geom) AS geom
+        FROM by_code
+        GROUP BY cx, cy
+        ORDER BY 1 DESC, cx, cy
+        LIMIT %s
+      ),
+      out AS (
+        SELECT
+          n,
+          codes,
+          ST_Transform(ST_Centroid(geom), 4326) AS geom_4326,
+          ST_Transform(ST_Envelope(geom), 4326) AS extent_4326
+        FROM clusters
+      )
+      SELECT json_build_object(
+        'type', 'FeatureCollection',
+        'features', COALESCE(json_agg(
+          json_build_object(
+            'type', 'Feature',
+            'geometry', ST_AsGeoJSON(geom_4326)::json,
+            'properties', json_build_object(
+              'count', n,
+              'codes', codes,
+              'extent', json_build_array(
+                ST_XMin(extent_4326), ST_YMin(extent_4326),
+                ST_XMax(extent_4326), ST_YMax(extent_4326)
+              )
+            )
+          )
+        ), '[]'::json)
+      )
+      FROM out;
+    """
+
+
 def _geojson_polygons_bbox_sql():
     return """
       WITH
@@ -177,6 +362,174 @@ def _geojson_polygons_bbox_sql():
     """
 
 
+def _mvt_geopts_tile_sql():
+    return """
+      WITH
+      tile AS (
+        SELECT ST_TileEnvelope(%s, %s, %s) AS env
+      ),
+      area AS (
+        SELECT env,
+               ST_Transform(ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * 64 / 4096.0), %s) AS g
+        FROM tile
+      ),
+      mvt AS (
+        SELECT
+          g.id_pts,
+          g.code::text AS code,
+          g.notes,
+          g.h,
+          ST_AsMVTGeom(ST_Transform(ST_Force2D(g.pts_geom), 3857), a.env, 4096, 64, true) AS geom
+        FROM tab_geopts g, area a
+        WHERE g.pts_geom IS NOT NULL
+          AND g.pts_geom && a.g
+          AND (%s IS NULL OR g.code::text = %s)
+          AND (
+            %s IS NULL
+            OR g.notes ILIKE %s
+            OR g.code::text ILIKE %s
+          )
+          AND (%s IS NULL OR g.id_pts >= %s)
+          AND (%s IS NULL OR g.id_pts <= %s)
+        ORDER BY g.id_pts
+        LIMIT %s
+      )
+      SELECT ST_AsMVT(mvt, 'geopts', 4096, 'geom')
+      FROM mvt;
+    """
+
+
+def _mvt_polygons_tile_sql():
+    return """
+      WITH
+      tile AS (
+        SELECT ST_TileEnvelope(%s, %s, %s) AS env
+      ),
+      area AS (
+        SELECT env,
+               ST_Transform(ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * 64 / 4096.0), %s) AS g
+        FROM tile
+      ),
+      mvt AS (
+        SELECT
+          p.polygon_name,
+          ST_AsMVTGeom(ST_Transform(ST_Force2D(p.geom_top), 3857), a.env, 4096, 64, true) AS geom
+        FROM tab_polygons p, area a
+        WHERE p.geom_top IS NOT NULL
+          AND p.geom_top && a.g
+        ORDER BY p.polygon_name
+        LIMIT %s
+      )
+      SELECT ST_AsMVT(mvt, 'polygons', 4096, 'geom')
+      FROM mvt
+      WHERE geom IS NOT NULL;
+    """
+
+
+def _section_lines_exist_sql():
+    # tab_section.geom_line comes with migration 20261017_section_geom_line
+    return """
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_attribute
+            WHERE attrelid = to_regclass('tab_section')
+              AND attname = 'geom_line'
+              AND NOT attisdropped
+        );
+    """
+
+
+# Without the stored column the lines are built from the bindings (ascending
+# id_pts, duplicates removed, NULL below 2 points), as before the migration.
+_SECTION_LINES_CTE = """
+      WITH section_lines AS (
+        SELECT s.id_section, s.section_type, l.geom_line
+        FROM tab_section s
+        LEFT JOIN (
+          SELECT d.id_section, ST_MakeLine(d.pts_geom ORDER BY d.id_pts) AS geom_line
+          FROM (
+            SELECT DISTINCT ON (b.ref_section, g.id_pts)
+              b.ref_section::int4 AS id_section,
+              g.id_pts,
+              g.pts_geom
+            FROM tab_section_geopts_binding b
+            JOIN tab_geopts g
+              ON g.id_pts BETWEEN b.pts_from AND b.pts_to
+            WHERE g.pts_geom IS NOT NULL
+            ORDER BY b.ref_section, g.id_pts
+          ) d
+          GROUP BY d.id_section
+          HAVING COUNT(*) >= 2
+        ) l ON l.id_section = s.id_section
+      )"""
+
+
+def _mvt_sections_tile_sql(stored: bool = True):
+    with_sql, sections_table = ("", "tab_section") if stored else (_SECTION_LINES_CTE, "section_lines")
+    return f"""{with_sql}{"," if with_sql else "WITH"}
+      tile AS (
+        SELECT ST_TileEnvelope(%s, %s, %s) AS env
+      ),
+      area AS (
+        SELECT env,
+               ST_Transform(ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * 64 / 4096.0), %s) AS g
+        FROM tile
+      ),
+      mvt AS (
+        SELECT
+          s.id_section,
+          s.section_type::text AS section_type,
+          ST_AsMVTGeom(ST_Transform(ST_Force2D(s.geom_line), 3857), a.env, 4096, 64, true) AS geom
+        FROM {sections_table} s
+        CROSS JOIN area a
+        WHERE s.geom_line && a.g
+        ORDER BY s.id_section
+        LIMIT %s
+      )
+      SELECT ST_AsMVT(mvt, 'sections', 4096, 'geom')
+      FROM mvt
+      WHERE geom IS NOT NULL;
+    """
+
+
+def _mvt_photos_tile_sql():
+    return """
+      WITH
+      tile AS (
+        SELECT ST_TileEnvelope(%s, %s, %s) AS env
+      ),
+      area AS (
+        SELECT env,
+               ST_Transform(ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * 64 / 4096.0), %s) AS g
+        FROM tile
+      ),
+      mvt AS (
+        SELECT
+          ph.id_photo,
+          ph.photo_typ,
+          ph.datum::text AS datum,
+          ph.gps_alt,
+          ST_AsMVTGeom(ST_Transform(ST_Force2D(ph.photo_centroid), 3857), a.env, 4096, 64, true) AS geom
+        FROM tab_photos ph, area a
+        WHERE ph.photo_centroid IS NOT NULL
+          AND ph.photo_centroid && a.g
+        ORDER BY ph.id_photo
+        LIMIT %s
+      )
+      SELECT ST_AsMVT(mvt, 'photos', 4096, 'geom')
+      FROM mvt;
+    """
+
+
+# layer -> (tile query, max features per tile)
+MVT_LAYERS = {
+    "geopts": (_mvt_geopts_tile_sql, 20000),
+    "polygons": (_mvt_polygons_tile_sql, 10000),
+    "sections": (_mvt_sections_tile_sql, 5000),
+    "photos": (_mvt_photos_tile_sql, 20000),
+}
+
+
 def _geopts_extent_4326_sql():
     return """
       SELECT
@@ -189,68 +542,6 @@ def _geopts_extent_4326_sql():
     """
 
 
-def _read_text_file(file_storage) -> str:
-    max_bytes = int(getattr(Config, "MAX_TEXT_UPLOAD_BYTES", DEFAULT_TEXT_UPLOAD_LIMIT))
-    raw = file_storage.read(max_bytes + 1)
-    if len(raw) > max_bytes:
-        raise ValueError("Uploaded text file is too large.")
-    for encoding in ("utf-8", "cp1250", "latin-1"):
-        try:
-            return raw.decode(encoding)
-        except UnicodeDecodeError:
-            continue
-    return raw.decode("utf-8", errors="replace")
-
-
-def _is_header_row(row: list[str]) -> bool:
-    if not row:
-        return False
-    head = " ".join([cell.lower().strip() for cell in row])
-    return ("id" in head and "x" in head and "y" in head) or ("id_pts" in head)
-
-
-def _parse_points(text: str) -> list[dict]:
-    lines = [line.strip() for line in text.splitlines() if line.strip()]
-    lines = [line for line in lines if not line.startswith("#") and not line.startswith("//")]
-    if not lines:
-        return []
-
-    sample = "\n".join(lines[:10])
-    delimiter = None
-    if ";" in sample and sample.count(";") >= sample.count(","):
-        delimiter = ";"
-    elif "," in sample:
-        delimiter = ","
-
-    rows = []
-    if delimiter:
-        reader = csv.reader(io.StringIO("\n".join(lines)), delimiter=delimiter)
-        rows = [[cell.strip() for cell in row] for row in reader if row and any(cell.strip() for cell in row)]
-    else:
-        rows = [line.split() for line in lines]
-
-    if rows and _is_header_row(rows[0]):
-        rows = rows[1:]
-
-    points = []
-    for row in rows:
-        if len(row) < 4:
-            continue
-        try:
-            id_pts = int(str(row[0]).strip())
-            x = float(str(row[1]).strip().replace(",", "."))
-            y = float(str(row[2]).strip().replace(",", "."))
-            h = float(str(row[3]).strip().replace(",", "."))
-        except (TypeError, ValueError):
-            continue
-
-        code = row[4].strip() if len(row) >= 5 and row[4] is not None else None
-        notes = row[5].strip() if len(row) >= 6 and row[5] is not None else None
-        points.append({"id_pts": id_pts, "x": x, "y": y, "h": h, "code": code, "notes": notes})
-
-    return points
-
-
 def _optional_int_arg(name: str) -> int | None:
     raw = (request.args.get(name) or "").strip()
     if not raw:
@@ -288,10 +579,37 @@ def _parse_bbox_arg():
     return minx, miny, maxx, maxy
 
 
-def _target_srid(cur) -> int:
-    cur.execute(_find_geopts_srid_sql())
+def _tile_in_range(z: int, x: int, y: int) -> bool:
+    if z < 0 or z > MVT_MAX_ZOOM:
+        return False
+    return 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _cluster_cell_size(zoom: int | None) -> float:
+    """Web Mercator metres covered by GEOPT_CLUSTER_CELL_PX pixels at zoom (256 px tiles)."""
+    if zoom is None:
+        zoom = GEOPT_CLUSTER_DEFAULT_ZOOM
+    zoom = min(max(zoom, 0), MVT_MAX_ZOOM)
+    return WEB_MERCATOR_WORLD_M / 2 ** (zoom + 8) * GEOPT_CLUSTER_CELL_PX
+
+
+def _target_srid(cur, terrain_db: str) -> int:
+    return get_project_srid(cur, terrain_db).srid
+
+
+_SECTION_LINES_DBS = {}
+
+
+def _has_section_lines(cur, terrain_db: str) -> bool:
+    """True when tab_section has the stored geom_line; only a positive probe is cached."""
+    if _SECTION_LINES_DBS.get(terrain_db):
+        return True
+    cur.execute(_section_lines_exist_sql())
     row = cur.fetchone()
-    return int(row[0]) if row and row[0] else 0
+    if not (row and row[0]):
+        return False
+    _SECTION_LINES_DBS[terrain_db] = True
+    return True
 
 
 def _point_from_row(row) -> dict:
@@ -350,6 +668,41 @@ def _run_point_upsert(cur, point: dict, source_srid: int, target_srid: int):
     )
 
 
+def _bulk_upsert_points(cur, batches, source_srid: int, target_srid: int) -> tuple[int, int, int]:
+    """COPY point batches into a staging table and upsert them in one statement.
+
+    Returns (staged, inserted, updated).
+    """
+    staged = 0
+    cur.execute(_create_geopts_import_stage_sql())
+    for batch in batches:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(batch.rows())
+        buffer.seek(0)
+        cur.copy_expert(_copy_geopts_import_stage_sql(), buffer)
+        staged += len(batch)
+
+    if not staged:
+        return 0, 0, 0
+    cur.execute(_upsert_geopts_from_stage_sql(), (source_srid, target_srid))
+    inserted, updated = cur.fetchone() or (0, 0)
+    return staged, int(inserted or 0), int(updated or 0)
+
+
+def _rebuild_dirty_polygons(cur, terrain_db: str) -> int:
+    """Rebuild polygons whose bound points changed in this transaction (before commit)."""
+    cur.execute(_dirty_polygon_tracking_exists_sql())
+    row = cur.fetchone()
+    if not (row and row[0]):
+        return 0
+    cur.execute(_rebuild_dirty_polygon_geoms_sql())
+    row = cur.fetchone()
+    rebuilt = int(row[0]) if row and row[0] else 0
+    if rebuilt:
+        logger.info("Rebuilt %d polygon geometries with changed points in %s", rebuilt, terrain_db)
+    return rebuilt
+
+
 def _normalized_bbox(row) -> list[float] | None:
     if not row or any(value is None for value in row):
         return None
@@ -375,12 +728,13 @@ def geodesy_meta(terrain_db: str):
     try:
         with terrain_connection(terrain_db) as conn:
             with conn.cursor() as cur:
-                srid = _target_srid(cur)
+                project = get_project_srid(cur, terrain_db)
                 cur.execute("SELECT COALESCE(MAX(id_pts), 0) + 1, COUNT(*) FROM tab_geopts")
                 suggested_id, point_count = cur.fetchone()
         return jsonify(
             {
-                "target_srid": srid,
+                "target_srid": project.srid,
+                "srid_area_of_use": list(project.area_of_use) if project.area_of_use else None,
                 "codes": GEOPT_CODES,
                 "suggested_id": suggested_id,
                 "point_count": point_count,
@@ -430,11 +784,12 @@ def create_geodesy_point(terrain_db: str):
         point = _parse_point_payload(payload)
         with terrain_transaction(terrain_db) as conn:
             with conn.cursor() as cur:
-                target_srid = _target_srid(cur)
+                target_srid = _target_srid(cur, terrain_db)
                 if target_srid <= 0:
                     raise ValueError("Project SRID is not configured for geodetic points.")
                 source_srid = _source_epsg_from_request(target_srid)
                 _run_point_upsert(cur, point, source_srid, target_srid)
+                _rebuild_dirty_polygons(cur, terrain_db)
         return jsonify({"message": f'Point "{point["id_pts"]}" was saved.', "point": point}), 201
     except ValueError as exc:
         return _json_error(str(exc), 400)
@@ -457,16 +812,33 @@ def upload_geodesy_points(terrain_db: str):
     try:
         with terrain_transaction(terrain_db) as conn:
             with conn.cursor() as cur:
-                target_srid = _target_srid(cur)
+                target_srid = _target_srid(cur, terrain_db)
                 if target_srid <= 0:
                     raise ValueError("Project SRID is not configured for geodetic points.")
                 source_srid = _source_epsg_from_request(target_srid)
-                points = _parse_points(_read_text_file(file_storage))
-                if not points:
+                stats = ParseStats()
+                batches = iter_point_batches(
+                    file_storage.stream,
+                    max_bytes=int(getattr(Config, "MAX_TEXT_UPLOAD_BYTES", DEFAULT_TEXT_UPLOAD_LIMIT)),
+                    stats=stats,
+                )
+                staged, inserted, updated = _bulk_upsert_points(cur, batches, source_srid, target_srid)
+                if not staged:
                     raise ValueError("No valid points found in the uploaded file.")
-                for point in points:
-                    _run_point_upsert(cur, point, source_srid, target_srid)
-        return jsonify({"message": f"Import finished: {len(points)} points processed.", "imported": len(points)})
+                _rebuild_dirty_polygons(cur, terrain_db)
+        logger.info(
+            "Geodesy upload for %s: inserted=%d updated=%d rejected=%d rows=%d",
+            terrain_db, inserted, updated, stats.rejected, staged,
+        )
+        return jsonify(
+            {
+                "message": f"Import finished: {inserted} inserted, {updated} updated, {stats.rejected} rejected.",
+                "imported": inserted + updated,
+                "inserted": inserted,
+                "updated": updated,
+                "rejected": stats.rejected,
+            }
+        )
     except ValueError as exc:
         return _json_error(str(exc), 400)
     except Exception as exc:
@@ -501,6 +873,7 @@ def update_geodesy_point(terrain_db: str, id_pts: int):
                 )
                 if cur.rowcount == 0:
                     return _json_error("Point not found.", 404)
+                _rebuild_dirty_polygons(cur, terrain_db)
         return jsonify({"message": f'Point "{id_pts}" was updated.'})
     except ValueError as exc:
         return _json_error(str(exc), 400)
@@ -522,12 +895,35 @@ def delete_geodesy_point(terrain_db: str, id_pts: int):
                 cur.execute(_delete_geopt_sql(), (id_pts,))
                 if cur.rowcount == 0:
                     return _json_error("Point not found.", 404)
+                _rebuild_dirty_polygons(cur, terrain_db)
         return jsonify({"message": f'Point "{id_pts}" was deleted.'})
     except Exception as exc:
         logger.exception("Geodesy point delete failed for %s: %s", terrain_db, exc)
         return _json_error("Internal server error.", 500)
 
 
+@geodesy_bp.get("/api/mobile/terrain/<terrain_db>/geodesy/points/<int:id_pts>/usage")
+@require_mobile_token
+def geodesy_point_usage(terrain_db: str, id_pts: int):
+    db_error = _validate_terrain_db(terrain_db)
+    if db_error:
+        return db_error
+
+    try:
+        with terrain_connection(terrain_db) as conn:
+            with conn.cursor() as cur:
+                cur.execute(_geopt_usage_sql(), (id_pts,) * 4)
+                rows = cur.fetchall()
+    except Exception as exc:
+        logger.exception("Geodesy point usage failed for %s: %s", terrain_db, exc)
+        return _json_error("Internal server error.", 500)
+
+    usage = {kind: [] for kind in GEOPT_USAGE_KINDS}
+    for kind, ref, range_from, range_to in rows:
+        usage[kind].append({"ref": ref, "from": range_from, "to": range_to})
+    return jsonify({"id_pts": id_pts, "usage": usage})
+
+
 @geodesy_bp.get("/api/mobile/terrain/<terrain_db>/geodesy/points/geojson")
 @require_mobile_token
 def geodesy_points_geojson(terrain_db: str):
@@ -545,24 +941,26 @@ def geodesy_points_geojson(terrain_db: str):
     id_to = _optional_int_arg("id_to")
     limit = _limit_arg(DEFAULT_GEOJSON_LIMIT, MAX_GEOJSON_LIMIT)
     q_like = f"%{q}%" if q else None
+    clustered = (request.args.get("cluster") or "").strip().lower() in ("1", "true", "yes")
 
     try:
         with terrain_connection(terrain_db) as conn:
             with conn.cursor() as cur:
-                target_srid = _target_srid(cur)
+                target_srid = _target_srid(cur, terrain_db)
                 if target_srid <= 0:
                     return jsonify({"type": "FeatureCollection", "features": []})
-                cur.execute(
-                    _geojson_geopts_bbox_sql(),
-                    (
-                        bbox[0], bbox[1], bbox[2], bbox[3], target_srid,
-                        code, code,
-                        q, q_like, q_like,
-                        id_from, id_from,
-                        id_to, id_to,
-                        limit,
-                    ),
+                params = (
+                    bbox[0], bbox[1], bbox[2], bbox[3], target_srid,
+                    code, code,
+                    q, q_like, q_like,
+                    id_from, id_from,
+                    id_to, id_to,
                 )
+                if clustered:
+                    cell_size = _cluster_cell_size(_optional_int_arg("zoom"))
+                    cur.execute(_geojson_geopts_clusters_bbox_sql(), params + (cell_size, cell_size, limit))
+                else:
+                    cur.execute(_geojson_geopts_bbox_sql(), params + (limit,))
                 feature_collection = cur.fetchone()[0]
         return jsonify(feature_collection)
     except Exception as exc:
@@ -586,7 +984,7 @@ def geodesy_polygons_geojson(terrain_db: str):
     try:
         with terrain_connection(terrain_db) as conn:
             with conn.cursor() as cur:
-                target_srid = _target_srid(cur)
+                target_srid = _target_srid(cur, terrain_db)
                 if target_srid <= 0:
                     return jsonify({"type": "FeatureCollection", "features": []})
                 cur.execute(
@@ -600,6 +998,45 @@ def geodesy_polygons_geojson(terrain_db: str):
         return _json_error("Internal server error.", 500)
 
 
+@geodesy_bp.get("/api/mobile/terrain/<terrain_db>/geodesy/tiles/<layer>/<int:z>/<int:x>/<int:y>.mvt")
+@require_mobile_token
+def geodesy_tile(terrain_db: str, layer: str, z: int, x: int, y: int):
+    db_error = _validate_terrain_db(terrain_db)
+    if db_error:
+        return db_error
+    if layer not in MVT_LAYERS or not _tile_in_range(z, x, y):
+        return _json_error("Not found.", 404)
+
+    tile_sql, max_features = MVT_LAYERS[layer]
+    limit = _limit_arg(max_features, max_features)
+    filters = ()
+    if layer == "geopts":
+        code = (request.args.get("code") or "").strip().upper() or None
+        q = (request.args.get("q") or "").strip() or None
+        q_like = f"%{q}%" if q else None
+        id_from = _optional_int_arg("id_from")
+        id_to = _optional_int_arg("id_to")
+        filters = (code, code, q, q_like, q_like, id_from, id_from, id_to, id_to)
+
+    try:
+        with terrain_connection(terrain_db) as conn:
+            with conn.cursor() as cur:
+                target_srid = _target_srid(cur, terrain_db)
+                if target_srid <= 0:
+                    return Response(b"", mimetype=MVT_MIMETYPE)
+                if layer == "sections":
+                    sql_text = tile_sql(_has_section_lines(cur, terrain_db))
+                else:
+                    sql_text = tile_sql()
+                cur.execute(sql_text, (z, x, y, target_srid) + filters + (limit,))
+                row = cur.fetchone()
+        tile = bytes(row[0]) if row and row[0] is not None else b""
+        return Response(tile, mimetype=MVT_MIMETYPE)
+    except Exception as exc:
+        logger.exception("Geodesy %s tile %s/%s/%s failed for %s: %s", layer, z, x, y, terrain_db, exc)
+        return _json_error("Internal server error.", 500)
+
+
 @geodesy_bp.get("/api/mobile/terrain/<terrain_db>/geodesy/extent")
 @require_mobile_token
 def geodesy_extent(terrain_db: str):
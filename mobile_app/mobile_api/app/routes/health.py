@@ -1,6 +1,8 @@
 from flask import Blueprint, jsonify
 
 from config import Config
+from app.database import pool_stats
+from app.responses import _json_error
 
 health_bp = Blueprint("health", __name__)
 
@@ -15,3 +17,10 @@ def health():
         }
     )
 
+
+@health_bp.get("/health/db-pools")
+def db_pools():
+    # Off by default: the payload names terrain databases.
+    if not getattr(Config, "DB_POOL_METRICS_ENABLED", False):
+        return _json_error("Not found.", 404)
+    return jsonify({"pools": pool_stats()})
@@ -26,6 +26,23 @@ class Config:
     TERRAIN_DB_HOST = "localhost"
     TERRAIN_DB_PORT = 5432
 
+    # Connection pools (one per database, shared by the threads of a worker).
+    # Keep workers * DB_POOL_MAX_PER_DB * active DBs (plus web_app pools) below
+    # Postgres max_connections. Checkout waits are reported by GET /health/db-pools
+    # and logged when longer than DB_POOL_SLOW_WAIT_SECONDS.
+    DB_POOL_ENABLED = True
+    DB_POOL_MAX_PER_DB = 4  # max open connections to one DB
+    DB_POOL_MAX_DATABASES = 16  # least recently used idle pools above this are closed
+    DB_POOL_IDLE_SECONDS = 300  # idle connections/pools older than this are closed
+    DB_POOL_CHECKOUT_TIMEOUT_SECONDS = 10  # wait for a free connection before failing
+    DB_POOL_HEALTHCHECK_SECONDS = 30  # ping connections idle longer than this on checkout
+    DB_POOL_SLOW_WAIT_SECONDS = 1
+    DB_POOL_APPLICATION_NAME = "archeodb_mobile_pool"
+    DB_POOL_METRICS_ENABLED = False  # expose GET /health/db-pools
+
+    # Project SRID / srtext of each terrain DB is cached this long (0 disables the cache).
+    SRID_CACHE_SECONDS = 300
+
     # JWT signing for mobile access tokens issued by this service
     JWT_SECRET_KEY = "CHANGE_ME_MOBILE_API_SECRET"
 
@@ -0,0 +1,70 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+from app import create_app, db_pool
+from app.routes import health as health_routes
+
+
+class _PooledConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.rolled_back = False
+
+    def get_transaction_status(self):
+        return 0
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class DatabasePoolTests(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(db_pool.psycopg2, "connect", lambda **_kwargs: _PooledConnection())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connections_are_reused_per_database(self):
+        pools = db_pool.PoolManager(max_size=2)
+        first = pools.getconn({"dbname": "01_A"})
+        first.autocommit = True
+        self.assertTrue(pools.release(first))
+
+        self.assertIs(pools.getconn({"dbname": "01_A"}), first)
+        self.assertFalse(first.autocommit)
+        self.assertIsNot(pools.getconn({"dbname": "02_B"}), first)
+        self.assertFalse(pools.release(_PooledConnection()))
+
+    def test_wait_time_and_timeouts_are_recorded(self):
+        pools = db_pool.PoolManager(max_size=1, checkout_timeout=0.05)
+        held = pools.getconn({"dbname": "01_A"})
+
+        with self.assertRaises(db_pool.PoolError):
+            pools.getconn({"dbname": "01_A"})
+
+        releaser = threading.Timer(0.02, pools.release, args=(held,))
+        releaser.start()
+        self.assertIs(pools.getconn({"dbname": "01_A"}), held)
+        releaser.join()
+
+        stats = pools.stats()[0]
+        self.assertEqual(stats["dbname"], "01_A")
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["connects"], 1)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["waits"], 2)
+        self.assertGreater(stats["wait_max_ms"], 0)
+
+    def test_pool_metrics_endpoint_is_disabled_by_default(self):
+        client = create_app().test_client()
+        with patch.object(health_routes.Config, "DB_POOL_METRICS_ENABLED", False, create=True):
+            self.assertEqual(client.get("/health/db-pools").status_code, 404)
+        with patch.object(health_routes.Config, "DB_POOL_METRICS_ENABLED", True, create=True):
+            response = client.get("/health/db-pools")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("pools", response.get_json())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,12 +4,13 @@ from flask import Flask, request, redirect, url_for, jsonify, g, make_response
 from werkzeug.exceptions import RequestEntityTooLarge
 
 from config import Config
-from app.database import get_auth_connection
+from app.database import get_request_auth_connection, release_request_connections
 from app.logger import logger
 from app.extensions import csrf
 from app.queries import get_user_access_state
 from app.reports.service import init_report_generators
 from app.utils.tokens import decode_session_token
+from app.utils.user_state import cache_user_state, get_cached_user_state
 
 def create_app():
     app = Flask(__name__, static_folder="static", template_folder="templates")
@@ -95,19 +96,22 @@ def create_app():
             return _unauthorized()
 
         email = payload.get("email", "") or ""
-        conn = None
-        try:
-            conn = get_auth_connection()
-            user_state = get_user_access_state(conn, email)
-        except Exception as e:
-            logger.error(f"Current user validation failed for {email}: {e}")
-            return _unauthorized()
-        finally:
-            if conn is not None:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+        user_state = get_cached_user_state(email)
+        if user_state is None:
+            conn = None
+            try:
+                conn = get_request_auth_connection()
+                user_state = get_user_access_state(conn, email)
+            except Exception as e:
+                logger.error(f"Current user validation failed for {email}: {e}")
+                return _unauthorized()
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            cache_user_state(email, user_state)
 
         if not user_state or user_state[2] is not True:
             logger.warning(f"Disabled or missing user rejected: {email}")
@@ -123,6 +127,9 @@ def create_app():
             logger.warning(f"Forbidden admin access for {g.user_email} role={g.user_role} -> {request.path}")
             return _forbidden()
 
+    # connections shared through get_request_*_connection go back to the pool here
+    app.teardown_request(release_request_connections)
+
     @app.errorhandler(RequestEntityTooLarge)
     def upload_too_large(_error):
         if _wants_json_response():
@@ -6,41 +6,170 @@ import psycopg2
 import tarfile
 import gzip
 import shutil
+import threading
+from flask import g, has_request_context
+from app.db_pool import PoolManager, reset_session
 from app.logger import logger
+from app.queries import terminate_idle_pooled_sessions_sql
 from app.utils.storage import safe_join, validate_db_name
 
 
 class ClosingConnection(psycopg2.extensions.connection):
-    """A psycopg2 connection whose context manager also closes the socket."""
+    """A psycopg2 connection whose context manager also releases it.
+
+    Pooled connections go back to their pool on close(); anything else
+    closes the socket as before. Request-scoped connections (see
+    get_request_terrain_connection) stay open until the request ends.
+    """
 
     def __exit__(self, exc_type, exc_value, traceback):
         try:
-            return super().__exit__(exc_type, exc_value, traceback)
+            # A nested user of a shared request connection must not commit
+            # or roll back the transaction of the code that borrowed it first.
+            if _request_refs.get(id(self), 0) <= 1:
+                return super().__exit__(exc_type, exc_value, traceback)
         finally:
             self.close()
 
+    def close(self):
+        if _unborrow(self):
+            return
+        if not _pools.release(self):
+            super().close()
+
+
+# id(conn) -> number of open borrows of a request-scoped connection
+_request_refs = {}
+_request_refs_lock = threading.Lock()
+
+
+def _borrow(conn):
+    with _request_refs_lock:
+        _request_refs[id(conn)] = _request_refs.get(id(conn), 0) + 1
+    return conn
+
+
+def _unborrow(conn) -> bool:
+    """Hand a request-scoped connection back; False if conn is not one."""
+    with _request_refs_lock:
+        refs = _request_refs.get(id(conn))
+        if refs is None:
+            return False
+        _request_refs[id(conn)] = max(refs - 1, 0)
+        last = refs <= 1
+    if last:
+        # Same state a freshly checked-out connection would have.
+        reset_session(conn)
+    return True
+
+
+POOL_APPLICATION_NAME = getattr(Config, "DB_POOL_APPLICATION_NAME", "archeodb_web_pool")
+
+_pools = PoolManager(
+    max_size=int(getattr(Config, "DB_POOL_MAX_PER_DB", 4)),
+    max_databases=int(getattr(Config, "DB_POOL_MAX_DATABASES", 16)),
+    max_idle_seconds=float(getattr(Config, "DB_POOL_IDLE_SECONDS", 300)),
+    checkout_timeout=float(getattr(Config, "DB_POOL_CHECKOUT_TIMEOUT_SECONDS", 10)),
+    healthcheck_after=float(getattr(Config, "DB_POOL_HEALTHCHECK_SECONDS", 30)),
+)
+
+
+# CREATE DATABASE ... WITH TEMPLATE refuses to run while anybody is connected
+# to the template, so its connections are never kept open in a pool.
+UNPOOLED_DATABASES = {"terrain_db_template"}
+
+
+def _connect(**kwargs):
+    kwargs["connection_factory"] = ClosingConnection
+    if not getattr(Config, "DB_POOL_ENABLED", True) or kwargs["dbname"] in UNPOOLED_DATABASES:
+        return psycopg2.connect(**kwargs)
+    kwargs["application_name"] = POOL_APPLICATION_NAME
+    return _pools.getconn(kwargs)
+
 
 def get_auth_connection():
-    return psycopg2.connect(
+    return _connect(
         dbname=Config.AUTH_DB_NAME,
         user=Config.AUTH_DB_USER,
         password=Config.AUTH_DB_PASSWORD,
         host=Config.AUTH_DB_HOST,
         port=Config.AUTH_DB_PORT,
-        connection_factory=ClosingConnection,
     )
 
 def get_terrain_connection(dbname):
-    return psycopg2.connect(
+    return _connect(
         dbname=dbname,
         user=Config.TERRAIN_DB_USER,
         password=Config.TERRAIN_DB_PASSWORD,
         host=Config.TERRAIN_DB_HOST,
         port=Config.TERRAIN_DB_PORT,
-        connection_factory=ClosingConnection,
     )
 
 
+def _request_connection(key, opener):
+    if not has_request_context():
+        return opener()
+
+    connections = g.setdefault("_db_connections", {})
+    conn = connections.get(key)
+    if conn is None or conn.closed:
+        if conn is not None:
+            with _request_refs_lock:
+                _request_refs.pop(id(conn), None)
+        conn = opener()
+        connections[key] = conn
+        with _request_refs_lock:
+            _request_refs[id(conn)] = 0
+    return _borrow(conn)
+
+
+def get_request_auth_connection():
+    """Auth DB connection shared by everything that runs in this request."""
+    return _request_connection(("auth",), get_auth_connection)
+
+
+def get_request_terrain_connection(dbname):
+    """Terrain DB connection shared by everything that runs in this request.
+
+    Callers use it exactly like get_terrain_connection(): close() (or leaving
+    a ``with`` block) hands it back, and once the last borrower is done any
+    uncommitted work is rolled back. The connection itself is released to the
+    pool by release_request_connections() when the request ends.
+    """
+    return _request_connection(("terrain", dbname), lambda: get_terrain_connection(dbname))
+
+
+def release_request_connections(exc=None):
+    """teardown_request hook returning this request's connections to the pool."""
+    connections = g.pop("_db_connections", None) or {}
+    for conn in connections.values():
+        with _request_refs_lock:
+            _request_refs.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning(f"Could not release request connection: {e}")
+
+
+def close_pooled_connections(dbname, cur=None):
+    """Close idle pooled connections to dbname before DROP DATABASE.
+
+    Idle sessions of this worker are closed directly. When a cursor is given,
+    idle pooled sessions of the other gunicorn workers are terminated too
+    (best effort: it needs the right to signal those backends).
+    """
+    closed = _pools.close_database(dbname)
+    if cur is not None:
+        try:
+            cur.execute(terminate_idle_pooled_sessions_sql(), (dbname, POOL_APPLICATION_NAME))
+            closed += len(cur.fetchall())
+        except psycopg2.Error as e:
+            logger.warning(f"Could not terminate idle pooled sessions of DB '{dbname}': {e}")
+    if closed:
+        logger.info(f"Closed {closed} pooled connection(s) to DB '{dbname}'")
+    return closed
+
+
 # here the logic for DB backups - will be used in routes.py
 def create_database_backup(dbname):
     validate_db_name(dbname)
@@ -0,0 +1,326 @@
+# web_app/app/db_pool.py
+# Bounded, per-database psycopg2 connection pools.
+#
+# One pool exists per (host, port, dbname, user). Pools are created lazily on
+# first use and kept in LRU order, so rarely used terrain DBs give their
+# sockets back once they fall out of use. Connections are handed out as
+# ordinary ClosingConnection objects; calling close() on a pooled connection
+# returns it to its pool instead of closing the socket.
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from app.logger import logger
+
+
+def _close_socket(conn) -> None:
+    try:
+        extensions.connection.close(conn)
+    except Exception:
+        pass
+
+
+def _is_usable(conn) -> bool:
+    try:
+        if conn.closed:
+            return False
+        return conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+    except Exception:
+        return False
+
+
+def _ping(conn) -> bool:
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.autocommit = False
+        return True
+    except Exception:
+        return False
+
+
+def reset_session(conn) -> bool:
+    """Bring a returned connection back to a clean session state."""
+    try:
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        if conn.autocommit:
+            conn.autocommit = False
+        return conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+    except Exception:
+        return False
+
+
+class DatabasePool:
+    """A bounded pool of connections to one database.
+
+    Callers block for up to ``checkout_timeout`` seconds when all
+    ``max_size`` connections are in use, then get a PoolError.
+    """
+
+    def __init__(self, key, connect_kwargs, *, max_size, checkout_timeout, healthcheck_after):
+        self.key = key
+        self.connect_kwargs = dict(connect_kwargs)
+        self.max_size = max(1, int(max_size))
+        self.checkout_timeout = float(checkout_timeout)
+        self.healthcheck_after = float(healthcheck_after)
+        self.last_used = time.monotonic()
+
+        self._idle = []  # [(conn, returned_at)], most recently returned last
+        self._in_use = {}  # id(conn) -> weak reference to conn
+        self._opening = 0
+        self._cond = threading.Condition()
+
+    @property
+    def dbname(self):
+        return self.connect_kwargs.get("dbname")
+
+    @property
+    def in_use(self) -> int:
+        with self._cond:
+            return len(self._in_use) + self._opening
+
+    @property
+    def idle(self) -> int:
+        with self._cond:
+            return len(self._idle)
+
+    def owns(self, conn) -> bool:
+        conn_id = id(conn)
+        with self._cond:
+            return conn_id in self._in_use or any(id(c) == conn_id for c, _ in self._idle)
+
+    def getconn(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            candidate = None
+            with self._cond:
+                while True:
+                    self.last_used = time.monotonic()
+                    if self._idle:
+                        candidate = self._idle.pop()
+                        self._opening += 1
+                        break
+                    if len(self._in_use) + self._opening < self.max_size:
+                        self._opening += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(
+                            f"connection pool for '{self.dbname}' exhausted "
+                            f"({self.max_size} connections in use)"
+                        )
+                    self._cond.wait(remaining)
+
+            if candidate is not None:
+                conn, returned_at = candidate
+                healthy = self._checkout_is_healthy(conn, returned_at)
+                with self._cond:
+                    self._opening -= 1
+                    if healthy:
+                        self._track(conn)
+                        return conn
+                _close_socket(conn)
+                logger.info(f"Discarded broken pooled connection to DB '{self.dbname}'")
+                continue
+
+            try:
+                conn = psycopg2.connect(**self.connect_kwargs)
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+
+            with self._cond:
+                self._opening -= 1
+                self._track(conn)
+            return conn
+
+    def _track(self, conn) -> None:
+        # A connection dropped without close() frees its slot once it is
+        # garbage collected (psycopg2 closes the socket itself).
+        conn_id = id(conn)
+
+        def _collected(ref):
+            with self._cond:
+                if self._in_use.get(conn_id) is not ref:
+                    return
+                del self._in_use[conn_id]
+                self._cond.notify()
+            logger.warning(f"Pooled connection to DB '{self.dbname}' was dropped without close()")
+
+        try:
+            self._in_use[conn_id] = weakref.ref(conn, _collected)
+        except TypeError:
+            self._in_use[conn_id] = lambda: conn
+
+    def _checkout_is_healthy(self, conn, returned_at) -> bool:
+        if not _is_usable(conn):
+            return False
+        if time.monotonic() - returned_at >= self.healthcheck_after:
+            return _ping(conn)
+        return True
+
+    def putconn(self, conn) -> None:
+        with self._cond:
+            if id(conn) not in self._in_use:
+                return
+
+        reusable = reset_session(conn)
+        with self._cond:
+            self._in_use.pop(id(conn), None)
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self.last_used = time.monotonic()
+            self._cond.notify()
+
+        if not reusable:
+            _close_socket(conn)
+
+    def prune_idle(self, max_idle_seconds: float) -> int:
+        """Close idle connections not used for ``max_idle_seconds``."""
+        cutoff = time.monotonic() - max_idle_seconds
+        with self._cond:
+            stale = [conn for conn, returned_at in self._idle if returned_at < cutoff]
+            self._idle = [(conn, returned_at) for conn, returned_at in self._idle if returned_at >= cutoff]
+
+        for conn in stale:
+            _close_socket(conn)
+        return len(stale)
+
+    def close_idle(self) -> int:
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _close_socket(conn)
+        return len(idle)
+
+
+class PoolManager:
+    """Keeps one DatabasePool per database, evicting idle pools in LRU order."""
+
+    def __init__(self, *, max_size=4, max_databases=16, max_idle_seconds=300,
+                 checkout_timeout=10, healthcheck_after=30):
+        self.max_size = max_size
+        self.max_databases = max(1, int(max_databases))
+        self.max_idle_seconds = float(max_idle_seconds)
+        self.checkout_timeout = checkout_timeout
+        self.healthcheck_after = healthcheck_after
+
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @staticmethod
+    def pool_key(connect_kwargs):
+        return (
+            connect_kwargs.get("host"),
+            connect_kwargs.get("port"),
+            connect_kwargs.get("dbname"),
+            connect_kwargs.get("user"),
+        )
+
+    def _check_fork(self) -> None:
+        # Sockets inherited from a parent process must never be reused or
+        # closed by the child (gunicorn --preload); simply forget them.
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pools = OrderedDict()
+            self._pid = pid
+
+    def _pool_for(self, connect_kwargs) -> DatabasePool:
+        key = self.pool_key(connect_kwargs)
+        with self._lock:
+            self._check_fork()
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = DatabasePool(
+                    key,
+                    connect_kwargs,
+                    max_size=self.max_size,
+                    checkout_timeout=self.checkout_timeout,
+                    healthcheck_after=self.healthcheck_after,
+                )
+                self._pools[key] = pool
+            self._pools.move_to_end(key)
+            evicted = self._evict_locked(keep=key)
+
+        for old in evicted:
+            closed = old.close_idle()
+            logger.info(f"Evicted idle connection pool for DB '{old.dbname}' ({closed} connections closed)")
+        return pool
+
+    def _evict_locked(self, keep):
+        now = time.monotonic()
+        evicted = []
+        for key in list(self._pools):
+            if key == keep:
+                continue
+            pool = self._pools[key]
+            too_many = len(self._pools) > self.max_databases
+            expired = now - pool.last_used >= self.max_idle_seconds
+            if (too_many or expired) and pool.in_use == 0:
+                evicted.append(self._pools.pop(key))
+            else:
+                pool.prune_idle(self.max_idle_seconds)
+        return evicted
+
+    def getconn(self, connect_kwargs):
+        return self._pool_for(connect_kwargs).getconn()
+
+    def _owner_of(self, conn):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            if pool.owns(conn):
+                return pool
+        return None
+
+    def release(self, conn) -> bool:
+        """Return ``conn`` to its pool.
+
+        Returns False when the connection does not belong to any pool, so the
+        caller should close the socket itself. Releasing a connection that is
+        already idle in its pool is a no-op.
+        """
+        pool = self._owner_of(conn)
+        if pool is None:
+            return False
+        pool.putconn(conn)
+        return True
+
+    def close_database(self, dbname: str) -> int:
+        """Close every idle connection to ``dbname`` (needed before DROP/CREATE DATABASE ... TEMPLATE)."""
+        with self._lock:
+            pools = [pool for pool in self._pools.values() if pool.dbname == dbname]
+        return sum(pool.close_idle() for pool in pools)
+
+    def close_all(self) -> None:
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), OrderedDict()
+        for pool in pools:
+            pool.close_idle()
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            pools = list(self._pools.values())
+        return [
+            {
+                "dbname": pool.dbname,
+                "in_use": pool.in_use,
+                "idle": pool.idle,
+                "max_size": pool.max_size,
+            }
+            for pool in pools
+        ]
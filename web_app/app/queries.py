@@ -231,6 +231,19 @@ def detect_db_srid_typmods_sql():
     """
 
 
+def terminate_idle_pooled_sessions_sql():
+    # Use in auth_db before DROP DATABASE. Only idle sessions opened by the
+    # connection pools of this app are touched.
+    return """
+        SELECT pg_terminate_backend(pid)
+        FROM pg_stat_activity
+        WHERE datname = %s
+          AND application_name = %s
+          AND state = 'idle'
+          AND pid <> pg_backend_pid();
+    """
+
+
 def get_terrain_db_list(conn):
     with conn.cursor() as cur:
         cur.execute("""
@@ -545,6 +558,26 @@ def insert_sj_stratigraphy_sql():
     """
 
 
+def lock_sj_stratigraphy_sql():
+    """
+    Serializes saves of stratigraphic relations (two saves that are fine on
+    their own can close a cycle together); readers are not blocked. No params.
+    """
+    return "LOCK TABLE tab_sj_stratigraphy IN SHARE ROW EXCLUSIVE MODE;"
+
+
+def sj_stratigraphy_stamp_sql():
+    """
+    Change stamp of tab_sj_stratigraphy: relations are only inserted (new
+    serial ids) and deleted, so any change moves one of the values. No params.
+    Output: (count, max id_aut, sum id_aut)
+    """
+    return """
+        SELECT count(*), COALESCE(max(id_aut), 0), COALESCE(sum(id_aut), 0)
+        FROM tab_sj_stratigraphy;
+    """
+
+
 
 # --- Harris queries ---
 
@@ -1059,6 +1092,72 @@ def insert_binding_bottom_sql():
     """
 
 
+def upsert_polygons_set_sql():
+    """
+    Set-based variant of insert_polygon_manual_sql for an uploaded file: all
+    polygons get the same parent, allocation and notes.
+    Params: (parent_name, allocation_reason, notes, polygon_names text[])
+    """
+    return """
+        INSERT INTO tab_polygons (polygon_name, parent_name, allocation_reason, notes)
+        SELECT n, NULLIF(%s,''), %s, NULLIF(%s,'')
+        FROM unnest(%s::text[]) AS n
+        ON CONFLICT (polygon_name)
+        DO UPDATE SET
+            parent_name = EXCLUDED.parent_name,
+            allocation_reason = EXCLUDED.allocation_reason,
+            notes = EXCLUDED.notes;
+    """
+
+
+def delete_bindings_set_sql(side: str):
+    """
+    Removes the TOP or BOTTOM ranges of the given polygons.
+    Params: (polygon_names text[],)
+    """
+    if side == "top":
+        return "DELETE FROM tab_polygon_geopts_binding_top WHERE ref_polygon = ANY(%s::text[]);"
+    if side == "bottom":
+        return "DELETE FROM tab_polygon_geopts_binding_bottom WHERE ref_polygon = ANY(%s::text[]);"
+    raise ValueError(f"Unknown polygon side: {side}")
+
+
+def insert_bindings_set_sql(side: str):
+    """
+    Inserts TOP or BOTTOM ranges from parallel arrays.
+    Params: (polygon_names text[], pts_from int[], pts_to int[])
+    """
+    if side not in {"top", "bottom"}:
+        raise ValueError(f"Unknown polygon side: {side}")
+    return f"""
+        INSERT INTO tab_polygon_geopts_binding_{side} (ref_polygon, pts_from, pts_to)
+        SELECT * FROM unnest(%s::text[], %s::int4[], %s::int4[])
+        ON CONFLICT (ref_polygon, pts_from, pts_to) DO NOTHING;
+    """
+
+
+def polygon_upload_results_sql():
+    """
+    Per-polygon outcome of an upload: whether TOP/BOTTOM geometry exists.
+    Params: (polygon_names text[],)
+    Returns: (polygon_name, has_top, has_bottom)
+    """
+    return """
+        SELECT polygon_name, geom_top IS NOT NULL, geom_bottom IS NOT NULL
+        FROM tab_polygons
+        WHERE polygon_name = ANY(%s::text[])
+        ORDER BY polygon_name;
+    """
+
+
+def clear_dirty_polygons_sql():
+    """
+    Drops dirty marks of polygons already rebuilt in this transaction.
+    Params: (polygon_names text[],)
+    """
+    return "DELETE FROM tab_polygon_geom_dirty WHERE polygon_name = ANY(%s::text[]);"
+
+
 def select_polygons_with_bindings_sql():
     return """
         SELECT DISTINCT ref_polygon
@@ -1268,6 +1367,164 @@ def rebuild_geom_sql():
         WHERE p.polygon_name = params.polygon_name;
     """
 
+def rebuild_geoms_set_sql():
+    """
+    Set-based variant of rebuild_geom_sql: rebuilds geom_top and geom_bottom of
+    all polygons with bindings (or of the given names) in one statement, with
+    the same rules (measured id order if it forms a valid polygon, otherwise
+    the convex hull; a side without usable points becomes NULL).
+    Params: (polygon_names text[] | None, polygon_names text[] | None)
+    Returns one row per updated polygon (polygon_name).
+    """
+    return """
+        WITH bindings AS (
+            SELECT 'top'::text AS side, ref_polygon, pts_from, pts_to
+            FROM tab_polygon_geopts_binding_top
+            UNION ALL
+            SELECT 'bottom'::text AS side, ref_polygon, pts_from, pts_to
+            FROM tab_polygon_geopts_binding_bottom
+        ),
+        targets AS (
+            SELECT DISTINCT ref_polygon AS polygon_name
+            FROM bindings
+            WHERE %s::text[] IS NULL OR ref_polygon = ANY(%s::text[])
+        ),
+        side_points AS (
+            SELECT DISTINCT ON (b.ref_polygon, b.side, g.id_pts)
+                b.ref_polygon, b.side, g.id_pts, g.pts_geom
+            FROM bindings b
+            JOIN targets t
+              ON t.polygon_name = b.ref_polygon
+            JOIN tab_geopts g
+              ON g.id_pts BETWEEN b.pts_from AND b.pts_to
+            WHERE g.pts_geom IS NOT NULL
+            ORDER BY b.ref_polygon, b.side, g.id_pts
+        ),
+        side_agg AS (
+            SELECT
+                ref_polygon,
+                side,
+                COUNT(*) AS point_count,
+                CASE
+                  WHEN COUNT(*) >= 3 THEN ST_MakeLine(ARRAY_AGG(pts_geom ORDER BY id_pts))
+                  ELSE NULL
+                END AS ordered_line,
+                CASE
+                  WHEN COUNT(*) >= 3 THEN ST_Collect(pts_geom)
+                  ELSE NULL
+                END AS point_collection
+            FROM side_points
+            GROUP BY ref_polygon, side
+        ),
+        side_ring AS (
+            SELECT
+                ref_polygon,
+                side,
+                point_count,
+                point_collection,
+                CASE
+                  WHEN ordered_line IS NULL THEN NULL
+                  WHEN ST_Equals(ST_StartPoint(ordered_line), ST_EndPoint(ordered_line))
+                    THEN ST_RemoveRepeatedPoints(ordered_line, 1e-7)
+                  ELSE ST_RemoveRepeatedPoints(
+                    ST_AddPoint(ordered_line, ST_StartPoint(ordered_line)),
+                    1e-7
+                  )
+                END AS ring
+            FROM side_agg
+        ),
+        side_ordered_try AS (
+            SELECT
+                ref_polygon,
+                side,
+                point_count,
+                point_collection,
+                CASE
+                  WHEN ring IS NOT NULL
+                   AND ST_NPoints(ring) >= 4
+                   AND ST_IsSimple(ring)
+                    THEN ST_MakePolygon(ring)
+                  ELSE NULL
+                END AS geom
+            FROM side_ring
+        ),
+        side_ordered AS (
+            SELECT
+                ref_polygon,
+                side,
+                point_count,
+                point_collection,
+                CASE
+                  WHEN geom IS NOT NULL
+                   AND ST_IsValid(geom)
+                   AND NOT ST_IsEmpty(geom)
+                   AND ST_GeometryType(geom) = 'ST_Polygon'
+                    THEN ST_Force3D(geom)
+                  ELSE NULL
+                END AS geom
+            FROM side_ordered_try
+        ),
+        side_hull_try AS (
+            SELECT
+                ref_polygon,
+                side,
+                geom AS ordered_geom,
+                CASE
+                  WHEN geom IS NULL AND point_count >= 3 THEN ST_ConvexHull(point_collection)
+                  ELSE NULL
+                END AS hull
+            FROM side_ordered
+        ),
+        side_result AS (
+            SELECT
+                ref_polygon,
+                side,
+                COALESCE(
+                    ordered_geom,
+                    CASE
+                      WHEN hull IS NOT NULL
+                       AND ST_IsValid(hull)
+                       AND NOT ST_IsEmpty(hull)
+                       AND ST_GeometryType(hull) = 'ST_Polygon'
+                        THEN ST_Force3D(hull)
+                      ELSE NULL
+                    END
+                ) AS geom
+            FROM side_hull_try
+        ),
+        polygon_result AS (
+            SELECT
+                t.polygon_name,
+                top.geom AS geom_top,
+                bottom.geom AS geom_bottom
+            FROM targets t
+            LEFT JOIN side_result top
+              ON top.ref_polygon = t.polygon_name AND top.side = 'top'
+            LEFT JOIN side_result bottom
+              ON bottom.ref_polygon = t.polygon_name AND bottom.side = 'bottom'
+        )
+        UPDATE tab_polygons p
+        SET
+            geom_top = r.geom_top,
+            geom_bottom = r.geom_bottom
+        FROM polygon_result r
+        WHERE p.polygon_name = r.polygon_name
+        RETURNING p.polygon_name;
+    """
+
+def dirty_polygon_tracking_exists_sql():
+    """True when the terrain DB tracks stale polygon geometries (migration 20261017_polygon_geom_dirty). No params."""
+    return "SELECT to_regprocedure('rebuild_dirty_polygon_geoms(integer)') IS NOT NULL;"
+
+def rebuild_dirty_polygon_geoms_sql():
+    """
+    Rebuilds polygons marked in tab_polygon_geom_dirty by the tab_geopts
+    triggers and clears their marks.
+    Params: (limit int | None,)  -- None = all dirty polygons
+    Output: (rebuilt_count,)
+    """
+    return "SELECT rebuild_dirty_polygon_geoms(%s::int);"
+
 def find_geopts_srid_sql():
     """
     Returns SRID assigned to tab_geopts.pts_geom typmod (after set_project_srid).
@@ -1433,28 +1690,214 @@ def polygons_geojson_top_bottom_sql():
     """
 
 
-def polygons_hierarchy_sql():
-    """Returns (polygon_name, parent_name) for hierarchy diagram."""
+def gis_export_polygons_sql():
+    """
+    TOP/BOTTOM polygons in the project SRID for the SHP/GPKG export
+    (read with a server-side cursor). No params.
+    Output: (polygon_name, side, wkb)
+    """
     return """
-        SELECT polygon_name, parent_name
-        FROM tab_polygons
-        ORDER BY polygon_name;
+        SELECT p.polygon_name, s.side, ST_AsBinary(s.geom)
+        FROM tab_polygons p
+        CROSS JOIN LATERAL (
+            VALUES ('top', p.geom_top), ('bottom', p.geom_bottom)
+        ) AS s(side, geom)
+        WHERE s.geom IS NOT NULL
+        ORDER BY p.polygon_name, s.side DESC;
+    """
+
+
+def polygons_geojson_all_sql():
+    """
+    Complete /polygons/geojson?mode=all body, built in Postgres so the app can
+    pass it through unparsed:
+      {"top": FeatureCollection, "bottom": FeatureCollection}
+    Geometries are 2D in EPSG:4326, simplified with ST_SimplifyPreserveTopology
+    (tolerance in degrees, 0 = off) and written with maxdecimaldigits.
+    Features carry properties {name, side}.
+    Params: (tolerance, digits)
+    Output: (body,)
+    """
+    return """
+        WITH params AS (
+            SELECT %s::float8 AS tol, %s::int AS digits
+        ),
+        sides AS (
+            SELECT p.polygon_name, s.side, ST_Transform(ST_Force2D(s.geom), 4326) AS geom
+            FROM tab_polygons p
+            CROSS JOIN LATERAL (
+                VALUES ('top', p.geom_top), ('bottom', p.geom_bottom)
+            ) AS s(side, geom)
+            WHERE s.geom IS NOT NULL
+        ),
+        features AS (
+            SELECT
+                f.polygon_name,
+                f.side,
+                '{"type":"Feature","properties":'
+                  || json_build_object('name', f.polygon_name, 'side', f.side)::text
+                  || ',"geometry":'
+                  || ST_AsGeoJSON(
+                       CASE WHEN params.tol > 0 THEN ST_SimplifyPreserveTopology(f.geom, params.tol) ELSE f.geom END,
+                       params.digits
+                     )
+                  || '}' AS feature
+            FROM sides f, params
+        )
+        SELECT
+            '{"top":{"type":"FeatureCollection","features":['
+            || COALESCE(string_agg(feature, ',' ORDER BY polygon_name) FILTER (WHERE side = 'top'), '')
+            || ']},"bottom":{"type":"FeatureCollection","features":['
+            || COALESCE(string_agg(feature, ',' ORDER BY polygon_name) FILTER (WHERE side = 'bottom'), '')
+            || ']}}'
+        FROM features;
+    """
+
+
+def polygon_closure_exists_sql():
+    """True when the terrain DB has tab_polygon_closure (template / migration 20261017_polygon_closure). No params."""
+    return "SELECT to_regclass('tab_polygon_closure') IS NOT NULL;"
+
+
+# DBs without the migration get the same (ancestor, descendant, depth) rows
+# from a recursive walk; the depth cap guards against parent_name cycles,
+# which only the closure triggers reject.
+_POLYGON_CLOSURE_CTE = """
+        WITH RECURSIVE polygon_closure (ancestor, descendant, depth) AS (
+            SELECT polygon_name, polygon_name, 0
+            FROM tab_polygons
+            UNION ALL
+            SELECT c.ancestor, p.polygon_name, c.depth + 1
+            FROM polygon_closure c
+            JOIN tab_polygons p ON p.parent_name = c.descendant
+            WHERE c.depth < 64
+        )"""
+
+
+def _polygon_closure(closure: bool) -> tuple[str, str]:
+    """(WITH prefix, relation name) of the polygon closure rows."""
+    if closure:
+        return "", "tab_polygon_closure"
+    return _POLYGON_CLOSURE_CTE, "polygon_closure"
+
+
+def polygons_hierarchy_sql(closure: bool = True):
+    """
+    Returns (polygon_name, parent_name, depth, descendants, su_count, area)
+    for hierarchy diagram, from tab_polygon_closure (closure=False: walked
+    recursively, for DBs without the migration):
+      - depth: 1 for root polygons
+      - descendants: number of polygons nested below (all levels)
+      - su_count: distinct SUs linked to the polygon or any descendant
+      - area: 2D area of the TOP edge (NULL without geometry)
+    """
+    with_sql, closure_table = _polygon_closure(closure)
+    return f"""{with_sql}
+        SELECT
+            p.polygon_name,
+            p.parent_name,
+            d.depth + 1 AS depth,
+            s.descendants,
+            COALESCE(su.su_count, 0) AS su_count,
+            ST_Area(p.geom_top) AS area
+        FROM tab_polygons p
+        JOIN LATERAL (
+            SELECT MAX(c.depth) AS depth
+            FROM {closure_table} c
+            WHERE c.descendant = p.polygon_name
+        ) d ON true
+        JOIN LATERAL (
+            SELECT COUNT(*) - 1 AS descendants
+            FROM {closure_table} c
+            WHERE c.ancestor = p.polygon_name
+        ) s ON true
+        LEFT JOIN (
+            SELECT c.ancestor, COUNT(DISTINCT x.ref_sj)::int AS su_count
+            FROM {closure_table} c
+            JOIN tabaid_sj_polygon x ON x.ref_polygon = c.descendant
+            GROUP BY c.ancestor
+        ) su ON su.ancestor = p.polygon_name
+        ORDER BY p.polygon_name;
+    """
+
+
+def polygon_subtree_sql(closure: bool = True):
+    """
+    Returns (polygon_name, parent_name, depth) for all polygons nested below
+    the given one (any level), depth being the distance from it (1 = child).
+    Params: (polygon_name,)
+    """
+    with_sql, closure_table = _polygon_closure(closure)
+    return f"""{with_sql}
+        SELECT p.polygon_name, p.parent_name, c.depth
+        FROM {closure_table} c
+        JOIN tab_polygons p ON p.polygon_name = c.descendant
+        WHERE c.ancestor = %s
+          AND c.depth > 0
+        ORDER BY c.depth, p.polygon_name;
     """
 
 # ----------------------------------------------------
 # Sections: SQL helpers (manual create + bindings + SU links)
 # ----------------------------------------------------
 
-def get_sections_list_sql():
+def section_lines_exist_sql():
+    """True when tab_section has the stored geom_line (template / migration 20261017_section_geom_line). No params."""
+    return """
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_attribute
+            WHERE attrelid = to_regclass('tab_section')
+              AND attname = 'geom_line'
+              AND NOT attisdropped
+        );
+    """
+
+
+# DBs without the migration get the tab_section rows with the line built on
+# the fly from the bindings (ascending id_pts, duplicates removed, NULL below
+# 2 points), as before the column existed.
+_SECTION_LINES_CTE = """
+        WITH section_lines AS (
+            SELECT s.id_section, s.section_type, s.description, l.geom_line
+            FROM tab_section s
+            LEFT JOIN (
+                SELECT d.id_section, ST_MakeLine(d.pts_geom ORDER BY d.id_pts) AS geom_line
+                FROM (
+                    SELECT DISTINCT ON (b.ref_section, g.id_pts)
+                        b.ref_section::int4 AS id_section,
+                        g.id_pts,
+                        g.pts_geom
+                    FROM tab_section_geopts_binding b
+                    JOIN tab_geopts g
+                      ON g.id_pts BETWEEN b.pts_from AND b.pts_to
+                    WHERE g.pts_geom IS NOT NULL
+                    ORDER BY b.ref_section, g.id_pts
+                ) d
+                GROUP BY d.id_section
+                HAVING COUNT(*) >= 2
+            ) l ON l.id_section = s.id_section
+        )"""
+
+
+def _section_lines(stored: bool) -> tuple[str, str]:
+    """(WITH prefix, relation name) of the tab_section rows with their geom_line."""
+    if stored:
+        return "", "tab_section"
+    return _SECTION_LINES_CTE, "section_lines"
+
+
+def get_sections_list_sql(stored: bool = True):
     """
     Listing for /sections:
-      - srid_txt: SRID inferred from geopts used by section (— / <srid> / mixed)
+      - srid_txt: SRID of the section line (— without a line)
       - ranges_txt: e.g. "1-4, 7-9, 12-13"
       - sj_nr: count of linked SUs
       - ranges_from/ranges_to and sj_ids are used to pre-fill the edit modal
+    stored=False builds the lines on the fly, for DBs without tab_section.geom_line.
     """
-    return """
-        WITH r AS (
+    with_sql, sections_table = _section_lines(stored)
+    return f"""{with_sql}{"," if with_sql else "WITH"} r AS (
             SELECT
                 b.ref_section::int4 AS id_section,
                 STRING_AGG((b.pts_from::text || '-' || b.pts_to::text), ', ' ORDER BY b.pts_from, b.pts_to) AS ranges_txt,
@@ -1470,34 +1913,20 @@ def get_sections_list_sql():
                 ARRAY_AGG(x.ref_sj::int4 ORDER BY x.ref_sj::int4) AS sj_ids
             FROM tabaid_sj_section x
             GROUP BY x.ref_section::int4
-        ),
-        sr AS (
-            SELECT
-                b.ref_section::int4 AS id_section,
-                CASE
-                    WHEN COUNT(g.id_pts) = 0 THEN '—'
-                    WHEN COUNT(DISTINCT ST_SRID(g.pts_geom)) = 1 THEN MIN(ST_SRID(g.pts_geom))::text
-                    ELSE 'mixed'
-                END AS srid_txt
-            FROM tab_section_geopts_binding b
-            LEFT JOIN tab_geopts g
-              ON g.id_pts BETWEEN b.pts_from AND b.pts_to
-            GROUP BY b.ref_section::int4
         )
         SELECT
             s.id_section,
             s.section_type,
             s.description,
-            COALESCE(sr.srid_txt, '—') AS srid_txt,
+            COALESCE(ST_SRID(s.geom_line)::text, '—') AS srid_txt,
             COALESCE(r.ranges_txt, '—') AS ranges_txt,
             COALESCE(sj.sj_nr, 0) AS sj_nr,
             COALESCE(r.ranges_from, ARRAY[]::int4[]) AS ranges_from,
             COALESCE(r.ranges_to, ARRAY[]::int4[]) AS ranges_to,
             COALESCE(sj.sj_ids, ARRAY[]::int4[]) AS sj_ids
-        FROM tab_section s
+        FROM {sections_table} s
         LEFT JOIN r  ON r.id_section  = s.id_section
         LEFT JOIN sj ON sj.id_section = s.id_section
-        LEFT JOIN sr ON sr.id_section = s.id_section
         ORDER BY s.id_section;
     """
 
@@ -1602,102 +2031,92 @@ def select_sections_with_bindings_sql():
     """
 
 
-def section_line_geojson_by_id_sql():
+def section_line_geojson_by_id_sql(stored: bool = True):
     """
-    Returns one row: (line_geojson) for given section id, built from bindings + tab_geopts.
-    Line is built ascending by id_pts, duplicates removed.
+    Returns one row: (line_geojson) for given section id from the stored
+    tab_section.geom_line (NULL below 2 points; stored=False builds it on the fly).
     Params: (id_section,)
     """
-    return """
-        WITH pts AS (
-            SELECT
-                g.id_pts,
-                g.pts_geom
-            FROM tab_section_geopts_binding b
-            JOIN tab_geopts g
-              ON g.id_pts BETWEEN b.pts_from AND b.pts_to
-            WHERE b.ref_section::int4 = %s
-        ),
-        dpts AS (
-            SELECT DISTINCT ON (id_pts) id_pts, pts_geom
-            FROM pts
-            ORDER BY id_pts
-        )
-        SELECT
-            CASE
-              WHEN COUNT(*) < 2 THEN NULL
-              ELSE ST_AsGeoJSON(ST_Force2D(ST_MakeLine(pts_geom ORDER BY id_pts)))
-            END AS line_gj
-        FROM dpts;
+    with_sql, sections_table = _section_lines(stored)
+    return f"""{with_sql}
+        SELECT ST_AsGeoJSON(ST_Force2D(geom_line)) AS line_gj
+        FROM {sections_table}
+        WHERE id_section = %s;
     """
 
 
-def sections_lines_geojson_sql():
+def sections_lines_geojson_sql(stored: bool = True):
     """
-    Returns (id_section, line_geojson) for ALL sections, built from bindings + tab_geopts.
-    Line is built ascending by id_pts, duplicates removed.
+    Returns (id_section, line_geojson) for ALL sections from the stored
+    tab_section.geom_line (NULL below 2 points; stored=False builds it on the fly).
     """
-    return """
-        WITH pts AS (
-            SELECT
-                b.ref_section::int4 AS id_section,
-                g.id_pts,
-                g.pts_geom
-            FROM tab_section_geopts_binding b
-            JOIN tab_geopts g
-              ON g.id_pts BETWEEN b.pts_from AND b.pts_to
-        ),
-        dpts AS (
-            SELECT DISTINCT ON (id_section, id_pts)
-                id_section, id_pts, pts_geom
-            FROM pts
-            ORDER BY id_section, id_pts
-        )
+    with_sql, sections_table = _section_lines(stored)
+    return f"""{with_sql}
         SELECT
             id_section,
-            CASE
-              WHEN COUNT(*) < 2 THEN NULL
-              ELSE ST_AsGeoJSON(ST_Force2D(ST_MakeLine(pts_geom ORDER BY id_pts)))
-            END AS line_gj
-        FROM dpts
-        GROUP BY id_section
+            ST_AsGeoJSON(ST_Force2D(geom_line)) AS line_gj
+        FROM {sections_table}
         ORDER BY id_section;
     """
 
 
-def sections_lines_geojson_4326_sql():
+def gis_export_sections_sql(stored: bool = True):
     """
-    Returns (id_section, line_geojson) for ALL sections transformed to EPSG:4326 for Leaflet.
-    Line is built ascending by id_pts, duplicates removed.
+    Stored section lines in the project SRID for the SHP/GPKG export
+    (stored=False builds them on the fly). No params.
+    Output: (id_section, wkb)
     """
-    return """
-        WITH pts AS (
-            SELECT
-                b.ref_section::int4 AS id_section,
-                g.id_pts,
-                g.pts_geom
-            FROM tab_section_geopts_binding b
-            JOIN tab_geopts g
-              ON g.id_pts BETWEEN b.pts_from AND b.pts_to
-        ),
-        dpts AS (
-            SELECT DISTINCT ON (id_section, id_pts)
-                id_section, id_pts, pts_geom
-            FROM pts
-            ORDER BY id_section, id_pts
-        )
+    with_sql, sections_table = _section_lines(stored)
+    return f"""{with_sql}
+        SELECT id_section, ST_AsBinary(geom_line)
+        FROM {sections_table}
+        WHERE geom_line IS NOT NULL
+        ORDER BY id_section;
+    """
+
+
+def sections_lines_geojson_4326_sql(stored: bool = True):
+    """
+    Returns (id_section, line_geojson) for ALL sections transformed to EPSG:4326 for Leaflet,
+    from the stored tab_section.geom_line (NULL below 2 points; stored=False
+    builds it on the fly).
+    """
+    with_sql, sections_table = _section_lines(stored)
+    return f"""{with_sql}
         SELECT
             id_section,
-            CASE
-              WHEN COUNT(*) < 2 THEN NULL
-              ELSE ST_AsGeoJSON(ST_Transform(ST_Force2D(ST_MakeLine(pts_geom ORDER BY id_pts)), 4326))
-            END AS line_gj
-        FROM dpts
-        GROUP BY id_section
+            ST_AsGeoJSON(ST_Transform(ST_Force2D(geom_line), 4326)) AS line_gj
+        FROM {sections_table}
         ORDER BY id_section;
     """
 
 
+def rebuild_section_lines_sql():
+    """
+    Recomputes tab_section.geom_line of all sections in one set-based UPDATE.
+    Returns one row: (changed_count,)
+    """
+    return "SELECT rebuild_section_lines(NULL);"
+
+
+def section_line_counts_sql(stored: bool = True):
+    """
+    Sections with geopts bindings split by whether they have a stored line
+    (stored=False: whether one can be built from their points).
+    Returns one row: (with_line, without_line)
+    """
+    with_sql, sections_table = _section_lines(stored)
+    return f"""{with_sql}
+        SELECT
+            COUNT(*) FILTER (WHERE s.geom_line IS NOT NULL)::int,
+            COUNT(*) FILTER (WHERE s.geom_line IS NULL)::int
+        FROM {sections_table} s
+        WHERE EXISTS (
+            SELECT 1 FROM tab_section_geopts_binding b WHERE b.ref_section = s.id_section
+        );
+    """
+
+
 def upsert_geopt_sql():
     """
     Upsert into tab_geopts with XY transformed from source_epsg -> target_srid.
@@ -1734,6 +2153,94 @@ def upsert_geopt_sql():
     """
 
 
+
+def create_geopts_import_stage_sql():
+    """
+    Session-local staging table for bulk point imports (dropped at commit).
+    Filled by COPY (see copy_geopts_import_stage_sql), then merged by
+    upsert_geopts_from_stage_sql in one statement.
+    """
+    return """
+        CREATE TEMP TABLE geopts_import_stage (
+            line_no integer NOT NULL,
+            id_pts  integer NOT NULL,
+            x       double precision NOT NULL,
+            y       double precision NOT NULL,
+            h       double precision NOT NULL,
+            code    text,
+            notes   text
+        ) ON COMMIT DROP;
+    """
+
+
+def copy_geopts_import_stage_sql():
+    return """
+        COPY geopts_import_stage (line_no, id_pts, x, y, h, code, notes)
+        FROM STDIN WITH (FORMAT csv)
+    """
+
+
+def upsert_geopts_from_stage_sql():
+    """
+    Set-based variant of upsert_geopt_sql over geopts_import_stage.
+    Params: (source_epsg, target_srid)
+    When a point ID repeats in the file, its last line gives the coordinates
+    and code, and its notes are the last non-empty ones of those lines (the
+    DB notes stay when there are none), the same result as upserting line
+    by line. Returns one row: (inserted, updated).
+    """
+    return """
+        WITH last_notes AS (
+            SELECT id_pts, (ARRAY_AGG(notes ORDER BY line_no DESC))[1] AS notes
+            FROM geopts_import_stage
+            WHERE NULLIF(BTRIM(notes), '') IS NOT NULL
+            GROUP BY id_pts
+        ),
+        src AS (
+            SELECT DISTINCT ON (s.id_pts) s.id_pts, s.x, s.y, s.h, s.code, n.notes
+            FROM geopts_import_stage s
+            LEFT JOIN last_notes n ON n.id_pts = s.id_pts
+            ORDER BY s.id_pts, s.line_no DESC
+        ),
+        p AS (
+            SELECT
+                src.*,
+                ST_Transform(
+                    ST_SetSRID(ST_MakePoint(src.x, src.y, src.h), %s),
+                    %s
+                ) AS g
+            FROM src
+        ),
+        upserted AS (
+            INSERT INTO tab_geopts (id_pts, x, y, h, code, notes)
+            SELECT
+                p.id_pts,
+                ST_X(p.g),
+                ST_Y(p.g),
+                p.h,
+                CASE
+                  WHEN NULLIF(BTRIM(p.code), '') IS NULL THEN NULL
+                  WHEN UPPER(BTRIM(p.code)) IN ('SU','FX','EP','FO','NI','PF','FI','PR','SP')
+                    THEN UPPER(BTRIM(p.code))::geopt_code
+                  ELSE NULL
+                END,
+                NULLIF(BTRIM(p.notes), '')
+            FROM p
+            ON CONFLICT (id_pts) DO UPDATE SET
+                x    = EXCLUDED.x,
+                y    = EXCLUDED.y,
+                h    = EXCLUDED.h,
+                code = EXCLUDED.code,
+                notes = COALESCE(EXCLUDED.notes, tab_geopts.notes)
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT
+            COUNT(*) FILTER (WHERE inserted),
+            COUNT(*) FILTER (WHERE NOT inserted)
+        FROM upserted;
+    """
+
+
 #############################
 ## Geodesy queries
 #############################
@@ -1776,6 +2283,28 @@ def export_geopts_sql():
     """
 
 
+def gis_export_geopts_sql():
+    """
+    Points matching the modal filters in the project SRID for the SHP/GPKG export.
+    Params: same as export_geopts_sql
+    Output: (id_pts, code, notes, h, wkb)
+    """
+    return """
+      SELECT id_pts, code::text AS code, notes, h, ST_AsBinary(pts_geom)
+      FROM tab_geopts
+      WHERE
+        pts_geom IS NOT NULL
+        AND (
+          %s IS NULL
+          OR code::text ILIKE %s
+          OR notes ILIKE %s
+        )
+        AND (%s IS NULL OR id_pts >= %s)
+        AND (%s IS NULL OR id_pts <= %s)
+      ORDER BY id_pts;
+    """
+
+
 def count_geopts_sql():
     """Count points matching the modal filters."""
     return """
@@ -1826,6 +2355,34 @@ def update_geopt_sql():
     """
 
 
+def geopt_usage_sql():
+    """
+    Reverse lookup: bindings whose range contains a point, served by the
+    *_range_gix GiST indexes on int4range(from, to, '[]').
+    Params: (id_pts, id_pts, id_pts, id_pts)
+    Output: (kind, ref, range_from, range_to), kind in
+            polygon_top | polygon_bottom | section | photogram
+    """
+    return """
+        SELECT 'polygon_top'::text, b.ref_polygon::text, b.pts_from, b.pts_to
+        FROM tab_polygon_geopts_binding_top b
+        WHERE int4range(b.pts_from, b.pts_to, '[]') @> %s::int4
+        UNION ALL
+        SELECT 'polygon_bottom'::text, b.ref_polygon::text, b.pts_from, b.pts_to
+        FROM tab_polygon_geopts_binding_bottom b
+        WHERE int4range(b.pts_from, b.pts_to, '[]') @> %s::int4
+        UNION ALL
+        SELECT 'section'::text, b.ref_section::text, b.pts_from, b.pts_to
+        FROM tab_section_geopts_binding b
+        WHERE int4range(b.pts_from, b.pts_to, '[]') @> %s::int4
+        UNION ALL
+        SELECT 'photogram'::text, b.ref_photogram::text, b.ref_geopt_from, b.ref_geopt_to
+        FROM tabaid_photogram_geopts b
+        WHERE int4range(b.ref_geopt_from, b.ref_geopt_to, '[]') @> %s::int4
+        ORDER BY 1, 2, 3;
+    """
+
+
 def geojson_geopts_bbox_sql():
     """
     Returns FeatureCollection of points inside bbox (bbox in EPSG:4326).
@@ -1877,6 +2434,89 @@ def geojson_geopts_bbox_sql():
     """
 
 
+def geojson_geopts_clusters_bbox_sql():
+    """
+    Points inside bbox (bbox in EPSG:4326) aggregated on a Web Mercator grid
+    of cell_size metres (zoom dependent, chosen by the caller). One feature per
+    non-empty cell at the centroid of its points, with count, code histogram
+    ({code: count}, '' for points without code) and extent
+    [minx, miny, maxx, maxy] in EPSG:4326. Largest clusters first.
+    Params: (minx, miny, maxx, maxy, target_srid, code_filter, q_like, q_like, id_from, id_to,
+             cell_size, cell_size, limit)
+    """
+    return """
+      WITH
+      bbox AS (
+        SELECT ST_Transform(
+                 ST_MakeEnvelope(%s, %s, %s, %s, 4326),
+                 %s
+               ) AS g
+      ),
+      pts AS (
+        SELECT
+          COALESCE(g.code::text, '') AS code,
+          ST_Transform(ST_Force2D(g.pts_geom), 3857) AS geom_3857
+        FROM tab_geopts g, bbox b
+        WHERE g.pts_geom IS NOT NULL
+          AND ST_Intersects(g.pts_geom, b.g)
+          AND (%s IS NULL OR g.code::text = %s)
+          AND (
+            %s IS NULL
+            OR g.notes ILIKE %s
+            OR g.code::text ILIKE %s
+          )
+          AND (%s IS NULL OR g.id_pts >= %s)
+          AND (%s IS NULL OR g.id_pts <= %s)
+      ),
+      by_code AS (
+        SELECT
+          floor(ST_X(geom_3857) / %s) AS cx,
+          floor(ST_Y(geom_3857) / %s) AS cy,
+          code,
+          COUNT(*) AS n,
+          ST_Collect(geom_3857) AS geom
+        FROM pts
+        GROUP BY 1, 2, code
+      ),
+      clusters AS (
+        SELECT
+          SUM(n)::int AS n,
+          json_object_agg(code, n ORDER BY code) AS codes,
+          ST_Collect(geom) AS geom
+        FROM by_code
+        GROUP BY cx, cy
+        ORDER BY 1 DESC, cx, cy
+        LIMIT %s
+      ),
+      out AS (
+        SELECT
+          n,
+          codes,
+          ST_Transform(ST_Centroid(geom), 4326) AS geom_4326,
+          ST_Transform(ST_Envelope(geom), 4326) AS extent_4326
+        FROM clusters
+      )
+      SELECT json_build_object(
+        'type', 'FeatureCollection',
+        'features', COALESCE(json_agg(
+          json_build_object(
+            'type', 'Feature',
+            'geometry', ST_AsGeoJSON(geom_4326)::json,
+            'properties', json_build_object(
+              'count', n,
+              'codes', codes,
+              'extent', json_build_array(
+                ST_XMin(extent_4326), ST_YMin(extent_4326),
+                ST_XMax(extent_4326), ST_YMax(extent_4326)
+              )
+            )
+          )
+        ), '[]'::json)
+      )
+      FROM out;
+    """
+
+
 def geojson_polygons_bbox_sql():
     """
     Overlay polygons (geom_top) inside bbox (bbox in EPSG:4326).
@@ -1916,30 +2556,91 @@ def geojson_polygons_bbox_sql():
 
 def geojson_photos_bbox_sql():
     """
-    Photo centroids from tab_photos (gps_lon, gps_lat, gps_alt). Assumed WGS84.
-    Params: (minx, miny, maxx, maxy, limit)
+    Photo centroids (tab_photos.photo_centroid, project SRID) inside bbox (bbox in EPSG:4326).
+    The bbox filter runs on tab_photos_centroid_gix, the LIMIT after it.
+    Params: (minx, miny, maxx, maxy, target_srid, limit)
     """
     return """
       WITH
       bbox AS (
-        SELECT ST_MakeEnvelope(%s, %s, %s, %s, 4326) AS g
+        SELECT ST_Transform(
+                 ST_MakeEnvelope(%s, %s, %s, %s, 4326),
+                 %s
+               ) AS g
       ),
       ph AS (
         SELECT
-          id_foto,
-          file_name,
-          gps_lat,
-          gps_lon,
-          gps_alt,
-          ST_SetSRID(ST_MakePoint(gps_lon, gps_lat, COALESCE(gps_alt, 0)), 4326) AS geom_4326
-        FROM tab_photos
-        WHERE gps_lat IS NOT NULL AND gps_lon IS NOT NULL
+          p.id_photo,
+          p.photo_typ,
+          p.datum,
+          p.gps_alt,
+          ST_Transform(ST_Force2D(p.photo_centroid), 4326) AS geom_4326
+        FROM tab_photos p, bbox b
+        WHERE p.photo_centroid IS NOT NULL
+          AND ST_Intersects(p.photo_centroid, b.g)
+        ORDER BY p.id_photo
         LIMIT %s
+      )
+      SELECT json_build_object(
+        'type', 'FeatureCollection',
+        'features', COALESCE(json_agg(
+          json_build_object(
+            'type', 'Feature',
+            'geometry', ST_AsGeoJSON(geom_4326)::json,
+            'properties', json_build_object(
+              'id_photo', id_photo,
+              'photo_typ', photo_typ,
+              'datum', datum,
+              'gps_alt', gps_alt,
+              'count', 1
+            )
+          )
+        ), '[]'::json)
+      )
+      FROM ph;
+    """
+
+
+def geojson_photo_clusters_bbox_sql():
+    """
+    Photo centroids inside bbox (EPSG:4326) aggregated on a grid of about
+    grid_cells x grid_cells cells over the bbox; one feature per non-empty cell
+    (centroid of its photos) with count, extent [minx, miny, maxx, maxy] and
+    id_photo when the cell holds a single photo. Largest clusters first.
+    Params: (minx, miny, maxx, maxy, target_srid, grid_cells, limit)
+    """
+    return """
+      WITH
+      bbox AS (
+        SELECT ST_Transform(
+                 ST_MakeEnvelope(%s, %s, %s, %s, 4326),
+                 %s
+               ) AS g
+      ),
+      grid AS (
+        SELECT g, GREATEST(ST_XMax(g) - ST_XMin(g), ST_YMax(g) - ST_YMin(g)) / %s AS cell
+        FROM bbox
+      ),
+      ph AS (
+        SELECT
+          p.id_photo,
+          ST_Force2D(p.photo_centroid) AS geom,
+          floor(ST_X(p.photo_centroid) / gr.cell) AS cx,
+          floor(ST_Y(p.photo_centroid) / gr.cell) AS cy
+        FROM tab_photos p, grid gr
+        WHERE p.photo_centroid IS NOT NULL
+          AND ST_Intersects(p.photo_centroid, gr.g)
       ),
-      inside AS (
-        SELECT *
-        FROM ph, bbox
-        WHERE ST_Intersects(ph.geom_4326, bbox.g)
+      clusters AS (
+        SELECT
+          COUNT(*) AS n,
+          MIN(id_photo) AS first_photo,
+          ST_Transform(ST_Centroid(ST_Collect(geom)), 4326) AS geom_4326,
+          ST_Transform(ST_Envelope(ST_Collect(geom)), 4326) AS extent_4326
+        FROM ph
+        GROUP BY cx, cy
+        ORDER BY n DESC, first_photo
+        LIMIT %s
       )
       SELECT json_build_object(
         'type', 'FeatureCollection',
@@ -1948,14 +2649,188 @@ def geojson_photos_bbox_sql():
             'type', 'Feature',
             'geometry', ST_AsGeoJSON(geom_4326)::json,
             'properties', json_build_object(
-              'id_foto', id_foto,
-              'file_name', file_name,
-              'gps_alt', gps_alt
+              'count', n,
+              'id_photo', CASE WHEN n = 1 THEN first_photo END,
+              'extent', json_build_array(
+                ST_XMin(extent_4326), ST_YMin(extent_4326),
+                ST_XMax(extent_4326), ST_YMax(extent_4326)
+              )
             )
           )
         ), '[]'::json)
       )
-      FROM inside;
+      FROM clusters;
+    """
+
+
+def data_version_table_exists_sql():
+    """
+    True when the terrain DB has tab_data_version with its per-transaction
+    tab_data_version_log (template / migration 20261017). No params.
+    """
+    return "SELECT to_regclass('tab_data_version_log') IS NOT NULL;"
+
+
+def data_version_sql():
+    """
+    Current map data version (bumped by triggers on geopts, polygons, section bindings):
+    the folded tab_data_version.version plus the tab_data_version_log rows of
+    committed transactions not folded yet.
+    The DB oid is returned too: a DB dropped and created again under the same
+    name starts counting from 0 again. No params.
+    Output: (db_oid, version)
+    """
+    return """
+        SELECT d.oid::int8, v.version + (SELECT COUNT(*) FROM tab_data_version_log)
+        FROM tab_data_version v, pg_database d
+        WHERE v.id AND d.datname = current_database();
+    """
+
+
+# -------------------------
+# Mapbox Vector Tiles (z/x/y in Web Mercator)
+# -------------------------
+# Every tile query takes (z, x, y, target_srid, ..., limit) and returns one
+# bytea row. The tile envelope (plus the 64 px render buffer) is transformed
+# into the project SRID once, so the && filter runs on the GiST indexes of the
+# stored geometries instead of transforming every row.
+
+def mvt_geopts_tile_sql():
+    """
+    MVT layer 'geopts' for one tile.
+    Params: (z, x, y, target_srid, code, code, q, q_like, q_like, id_from, id_from, id_to, id_to, limit)
+    """
+    return """
+      WITH
+      tile AS (
+        SELECT ST_TileEnvelope(%s, %s, %s) AS env
+      ),
+      area AS (
+        SELECT env,
+               ST_Transform(ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * 64 / 4096.0), %s) AS g
+        FROM tile
+      ),
+      mvt AS (
+        SELECT
+          g.id_pts,
+          g.code::text AS code,
+          g.notes,
+          g.h,
+          ST_AsMVTGeom(ST_Transform(ST_Force2D(g.pts_geom), 3857), a.env, 4096, 64, true) AS geom
+        FROM tab_geopts g, area a
+        WHERE g.pts_geom IS NOT NULL
+          AND g.pts_geom && a.g
+          AND (%s IS NULL OR g.code::text = %s)
+          AND (
+            %s IS NULL
+            OR g.notes ILIKE %s
+            OR g.code::text ILIKE %s
+          )
+          AND (%s IS NULL OR g.id_pts >= %s)
+          AND (%s IS NULL OR g.id_pts <= %s)
+        ORDER BY g.id_pts
+        LIMIT %s
+      )
+      SELECT ST_AsMVT(mvt, 'geopts', 4096, 'geom')
+      FROM mvt;
+    """
+
+
+def mvt_polygons_tile_sql():
+    """
+    MVT layer 'polygons' (geom_top) for one tile. ST_AsMVTGeom clips and
+    snaps the rings to the tile grid, so low zooms get coarser outlines.
+    Params: (z, x, y, target_srid, limit)
+    """
+    return """
+      WITH
+      tile AS (
+        SELECT ST_TileEnvelope(%s, %s, %s) AS env
+      ),
+      area AS (
+        SELECT env,
+               ST_Transform(ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * 64 / 4096.0), %s) AS g
+        FROM tile
+      ),
+      mvt AS (
+        SELECT
+          p.polygon_name,
+          ST_AsMVTGeom(ST_Transform(ST_Force2D(p.geom_top), 3857), a.env, 4096, 64, true) AS geom
+        FROM tab_polygons p, area a
+        WHERE p.geom_top IS NOT NULL
+          AND p.geom_top && a.g
+        ORDER BY p.polygon_name
+        LIMIT %s
+      )
+      SELECT ST_AsMVT(mvt, 'polygons', 4096, 'geom')
+      FROM mvt
+      WHERE geom IS NOT NULL;
+    """
+
+
+def mvt_sections_tile_sql(stored: bool = True):
+    """
+    MVT layer 'sections' for one tile: stored tab_section.geom_line, picked
+    through its GiST index (stored=False builds the lines on the fly).
+    Params: (z, x, y, target_srid, limit)
+    """
+    with_sql, sections_table = _section_lines(stored)
+    return f"""{with_sql}{"," if with_sql else "WITH"}
+      tile AS (
+        SELECT ST_TileEnvelope(%s, %s, %s) AS env
+      ),
+      area AS (
+        SELECT env,
+               ST_Transform(ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * 64 / 4096.0), %s) AS g
+        FROM tile
+      ),
+      mvt AS (
+        SELECT
+          s.id_section,
+          s.section_type::text AS section_type,
+          ST_AsMVTGeom(ST_Transform(ST_Force2D(s.geom_line), 3857), a.env, 4096, 64, true) AS geom
+        FROM {sections_table} s
+        CROSS JOIN area a
+        WHERE s.geom_line && a.g
+        ORDER BY s.id_section
+        LIMIT %s
+      )
+      SELECT ST_AsMVT(mvt, 'sections', 4096, 'geom')
+      FROM mvt
+      WHERE geom IS NOT NULL;
+    """
+
+
+def mvt_photos_tile_sql():
+    """
+    MVT layer 'photos' (photo_centroid maintained by trg_tab_photos_set_centroid) for one tile.
+    Params: (z, x, y, target_srid, limit)
+    """
+    return """
+      WITH
+      tile AS (
+        SELECT ST_TileEnvelope(%s, %s, %s) AS env
+      ),
+      area AS (
+        SELECT env,
+               ST_Transform(ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * 64 / 4096.0), %s) AS g
+        FROM tile
+      ),
+      mvt AS (
+        SELECT
+          ph.id_photo,
+          ph.photo_typ,
+          ph.datum::text AS datum,
+          ph.gps_alt,
+          ST_AsMVTGeom(ST_Transform(ST_Force2D(ph.photo_centroid), 3857), a.env, 4096, 64, true) AS geom
+        FROM tab_photos ph, area a
+        WHERE ph.photo_centroid IS NOT NULL
+          AND ph.photo_centroid && a.g
+        ORDER BY ph.id_photo
+        LIMIT %s
+      )
+      SELECT ST_AsMVT(mvt, 'photos', 4096, 'geom')
+      FROM mvt;
     """
 
 # this query serves for getting extent of geodesy points - then used for scaling map automatically
@@ -3193,26 +4068,17 @@ def bulk_update_drawings_meta_sql(set_author: bool, set_date: bool, set_notes: b
 # DONUT STATS (pie charts)
 # ---------------------------
 
-def stats_polygons_by_order_sql():
+def stats_polygons_by_order_sql(closure: bool = True):
     """
     Donut: polygons by nesting depth (order).
-    depth=1 => root polygons (parent_name IS NULL)
+    depth=1 => root polygons (parent_name IS NULL), read from tab_polygon_closure
     """
-    return """
-        WITH RECURSIVE t AS (
-          SELECT polygon_name, parent_name, 1 AS depth
-          FROM tab_polygons
-          WHERE parent_name IS NULL
-          UNION ALL
-          SELECT p.polygon_name, p.parent_name, t.depth + 1
-          FROM tab_polygons p
-          JOIN t ON t.polygon_name = p.parent_name
-        ),
+    with_sql, closure_table = _polygon_closure(closure)
+    return f"""{with_sql}{"," if with_sql else "WITH"}
         allp AS (
-          -- in case of any "orphan" rows (shouldn't happen due FK), include them as depth=1
-          SELECT p.polygon_name, COALESCE(t.depth, 1) AS depth
-          FROM tab_polygons p
-          LEFT JOIN t ON t.polygon_name = p.polygon_name
+          SELECT descendant AS polygon_name, MAX(depth) + 1 AS depth
+          FROM {closure_table}
+          GROUP BY descendant
         )
         SELECT ('order ' || depth::text) AS label, COUNT(*)::bigint AS value
         FROM allp
@@ -3316,12 +4182,23 @@ def stats_photograms_by_type_sql():
 
 # --- ANALYZE / STATS -------------------------------------------------
 
-def stats_polygons_by_row_sql():
-    return """
-        SELECT
-          SUM(CASE WHEN parent_name IS NULL THEN 1 ELSE 0 END)::int AS row1,
-          SUM(CASE WHEN parent_name IS NOT NULL THEN 1 ELSE 0 END)::int AS row2
-        FROM tab_polygons;
+def stats_polygons_by_row_sql(closure: bool = True):
+    """
+    Polygons per nesting row, the depth in tab_polygon_closure ('row 1' =
+    root polygons), the same rows POLY_OVERLAP compares.
+    Output: (label, count) ordered by row
+    """
+    with_sql, closure_table = _polygon_closure(closure)
+    return f"""{with_sql}{"," if with_sql else "WITH"}
+        polygon_rows AS (
+          SELECT MAX(depth) + 1 AS row_no
+          FROM {closure_table}
+          GROUP BY descendant
+        )
+        SELECT ('row ' || row_no::text) AS label, COUNT(*)::int AS value
+        FROM polygon_rows
+        GROUP BY row_no
+        ORDER BY row_no;
     """
 
 
@@ -3491,34 +4368,32 @@ def rule_polygons_without_su_sql():
     """
 
 
-def rule_polygons_overlap_same_row_sql():
-    # same nesting row: (parent_name IS NULL) boolean equality
-    return """
-        WITH p AS (
-          SELECT polygon_name, parent_name, geom_top, geom_bottom
-          FROM tab_polygons
-        ),
-        pairs_top AS (
-          SELECT a.polygon_name AS a, b.polygon_name AS b
-          FROM p a
-          JOIN p b ON a.polygon_name < b.polygon_name
-          WHERE (a.parent_name IS NULL) = (b.parent_name IS NULL)
-            AND a.geom_top IS NOT NULL AND b.geom_top IS NOT NULL
-            AND ST_Intersects(a.geom_top, b.geom_top)
-            AND (ST_Overlaps(a.geom_top, b.geom_top) OR ST_Area(ST_Intersection(a.geom_top, b.geom_top)) > 0)
-        ),
-        pairs_bottom AS (
-          SELECT a.polygon_name AS a, b.polygon_name AS b
-          FROM p a
-          JOIN p b ON a.polygon_name < b.polygon_name
-          WHERE (a.parent_name IS NULL) = (b.parent_name IS NULL)
-            AND a.geom_bottom IS NOT NULL AND b.geom_bottom IS NOT NULL
-            AND ST_Intersects(a.geom_bottom, b.geom_bottom)
-            AND (ST_Overlaps(a.geom_bottom, b.geom_bottom) OR ST_Area(ST_Intersection(a.geom_bottom, b.geom_bottom)) > 0)
-        )
-        SELECT 'top' AS side, a, b FROM pairs_top
+def rule_polygons_overlap_same_row_sql(closure: bool = True):
+    # same nesting row: equal depth in tab_polygon_closure (the distance to
+    # the root, i.e. the pair (root, polygon) with the largest depth).
+    # Candidates come from an && join on tab_polygons_geom_*_gix (the closure
+    # is only read in the depth subqueries, so the join still sees the
+    # indexes); interiors sharing an area (DE-9IM '2********') replaces
+    # ST_Overlaps OR ST_Area(ST_Intersection) > 0.
+    with_sql, closure_table = _polygon_closure(closure)
+    return f"""{with_sql}
+        SELECT 'top' AS side, a.polygon_name AS a, b.polygon_name AS b
+        FROM tab_polygons a
+        JOIN tab_polygons b
+          ON a.geom_top && b.geom_top
+         AND a.polygon_name < b.polygon_name
+        WHERE (SELECT MAX(depth) FROM {closure_table} WHERE descendant = a.polygon_name)
+            = (SELECT MAX(depth) FROM {closure_table} WHERE descendant = b.polygon_name)
+          AND ST_Relate(a.geom_top, b.geom_top, '2********')
         UNION ALL
-        SELECT 'bottom' AS side, a, b FROM pairs_bottom
+        SELECT 'bottom' AS side, a.polygon_name AS a, b.polygon_name AS b
+        FROM tab_polygons a
+        JOIN tab_polygons b
+          ON a.geom_bottom && b.geom_bottom
+         AND a.polygon_name < b.polygon_name
+        WHERE (SELECT MAX(depth) FROM {closure_table} WHERE descendant = a.polygon_name)
+            = (SELECT MAX(depth) FROM {closure_table} WHERE descendant = b.polygon_name)
+          AND ST_Relate(a.geom_bottom, b.geom_bottom, '2********')
         ORDER BY side, a, b;
     """
 
@@ -3586,9 +4461,19 @@ def rule_polygons_missing_geopts_sql():
           SELECT ref_polygon, 'bottom'::text AS side, pts_from, pts_to
           FROM tab_polygon_geopts_binding_bottom
         ),
+        -- only ranges with fewer points than ids are expanded id by id;
+        -- complete ranges cost one index range count on tab_geopts
+        incomplete AS (
+          SELECT r.*
+          FROM ranges r
+          WHERE (
+            SELECT COUNT(*) FROM tab_geopts g
+            WHERE g.id_pts BETWEEN r.pts_from AND r.pts_to
+          ) < r.pts_to::int8 - r.pts_from + 1
+        ),
         expected AS (
           SELECT ref_polygon, side, generate_series(pts_from, pts_to) AS id_pts
-          FROM ranges
+          FROM incomplete
         ),
         missing AS (
           SELECT e.ref_polygon, e.side, e.id_pts
@@ -4184,13 +5069,14 @@ def report_sections_cards_list_sections_sql():
     """
 
 
-def report_sections_cards_detail_sql():
+def report_sections_cards_detail_sql(stored: bool = True):
     """
-    Returns basic info + derived srid_txt and ranges_txt (same logic as get_sections_list_sql()).
-    Params: (id_section,)
+    Returns basic info + srid_txt (SRID of the section line) and ranges_txt
+    (same logic as get_sections_list_sql(), including ``stored``).
+    Params: (id_section, id_section, id_section)
     """
-    return """
-        WITH r AS (
+    with_sql, sections_table = _section_lines(stored)
+    return f"""{with_sql}{"," if with_sql else "WITH"} r AS (
             SELECT
                 b.ref_section::int4 AS id_section,
                 STRING_AGG((b.pts_from::text || '-' || b.pts_to::text), ', ' ORDER BY b.pts_from, b.pts_to) AS ranges_txt
@@ -4205,32 +5091,17 @@ def report_sections_cards_detail_sql():
             FROM tabaid_sj_section x
             WHERE x.ref_section::int4 = %s
             GROUP BY x.ref_section::int4
-        ),
-        sr AS (
-            SELECT
-                b.ref_section::int4 AS id_section,
-                CASE
-                    WHEN COUNT(g.id_pts) = 0 THEN '—'
-                    WHEN COUNT(DISTINCT ST_SRID(g.pts_geom)) = 1 THEN MIN(ST_SRID(g.pts_geom))::text
-                    ELSE 'mixed'
-                END AS srid_txt
-            FROM tab_section_geopts_binding b
-            LEFT JOIN tab_geopts g
-              ON g.id_pts BETWEEN b.pts_from AND b.pts_to
-            WHERE b.ref_section::int4 = %s
-            GROUP BY b.ref_section::int4
         )
         SELECT
             s.id_section,
             s.section_type,
             s.description,
-            COALESCE(sr.srid_txt, '—') AS srid_txt,
+            COALESCE(ST_SRID(s.geom_line)::text, '—') AS srid_txt,
             COALESCE(r.ranges_txt, '—') AS ranges_txt,
             COALESCE(sj.sj_nr, 0) AS sj_nr
-        FROM tab_section s
+        FROM {sections_table} s
         LEFT JOIN r  ON r.id_section  = s.id_section
         LEFT JOIN sj ON sj.id_section = s.id_section
-        LEFT JOIN sr ON sr.id_section = s.id_section
         WHERE s.id_section = %s;
     """
 
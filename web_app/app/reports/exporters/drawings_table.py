@@ -6,7 +6,7 @@ from typing import Any, Dict, List
 from openpyxl import Workbook
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 from app.queries import report_drawings_table_list_all_sql
 
@@ -19,7 +19,7 @@ class DrawingsTableExporter:
     export_id = "drawings_table"
 
     def _fetch_rows(self, ctx: ReportContext) -> List[Dict[str, Any]]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_drawings_table_list_all_sql())
                 rows = cur.fetchall()
@@ -83,7 +83,7 @@ class DrawingsTableExporter:
             out += ["COMMIT;", ""]
             return "\n".join(out)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out.append(dump_table_inserts(cur, "tab_drawings", "WHERE id_drawing = ANY(%s)", (ids,)))
                 out.append(dump_table_inserts(cur, "tabaid_sj_drawings", "WHERE ref_drawing = ANY(%s)", (ids,)))
@@ -6,7 +6,7 @@ from typing import Any, Dict, List
 from openpyxl import Workbook
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 
 from app.queries import report_finds_list_all_sql
@@ -20,7 +20,7 @@ class FindsTableExporter:
     export_id = "finds_table"
 
     def _fetch_finds(self, ctx: ReportContext) -> List[Dict[str, Any]]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_finds_list_all_sql())
                 rows = cur.fetchall()
@@ -93,7 +93,7 @@ class FindsTableExporter:
             out += ["COMMIT;", ""]
             return "\n".join(out)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out.append(dump_table_inserts(cur, "tab_finds", "WHERE id_find = ANY(%s)", (ids,)))
                 out.append(dump_table_inserts(cur, "tabaid_finds_photos", "WHERE ref_find = ANY(%s)", (ids,)))
@@ -8,7 +8,7 @@ from typing import Any, Dict, List
 from openpyxl import Workbook
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 
 from app.queries import (
@@ -27,7 +27,7 @@ class GeoptsTableExporter:
         ws = wb.active
         ws.title = "Geopts"
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_geopts_list_all_sql())
                 rows = cur.fetchall()
@@ -55,7 +55,7 @@ class GeoptsTableExporter:
             "",
         ]
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out.append(dump_table_inserts_columns(
                     cur,
@@ -7,7 +7,7 @@ from openpyxl import Workbook
 import json
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 
 from app.queries import (
@@ -53,7 +53,7 @@ class ObjectsCardsExporter:
 
 
     def _fetch_object_ids(self, ctx: ReportContext) -> List[int]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_objects_cards_list_objects_sql())
                 return [int(r[0]) for r in cur.fetchall()]
@@ -117,7 +117,7 @@ class ObjectsCardsExporter:
         ws_links = wb.create_sheet("Object_SJ")
         ws_links.append(["id_object", "id_sj"])
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             for oid in obj_ids:
                 o = self._fetch_object_detail(conn, oid)
                 if not o:
@@ -195,7 +195,7 @@ class ObjectsCardsExporter:
             out += ["COMMIT;", ""]
             return "\n".join(out)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 id_list = list(map(int, obj_ids))
 
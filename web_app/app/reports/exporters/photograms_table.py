@@ -5,7 +5,7 @@ from io import BytesIO
 from typing import Any, Dict, List
 from openpyxl import Workbook
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 from app.queries import report_photograms_table_list_all_sql
 
@@ -18,7 +18,7 @@ class PhotogramsTableExporter:
     export_id = "photograms_table"
 
     def _fetch_rows(self, ctx: ReportContext) -> List[Dict[str, Any]]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_photograms_table_list_all_sql())
                 rows = cur.fetchall()
@@ -89,7 +89,7 @@ class PhotogramsTableExporter:
             out += ["COMMIT;", ""]
             return "\n".join(out)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out.append(dump_table_inserts(cur, "tab_photograms", "WHERE id_photogram = ANY(%s)", (ids,)))
                 out.append(dump_table_inserts(cur, "tabaid_photogram_geopts", "WHERE ref_photogram = ANY(%s)", (ids,)))
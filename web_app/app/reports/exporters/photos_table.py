@@ -10,7 +10,7 @@ from typing import Any, Dict, List
 from openpyxl import Workbook
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 from app.queries import report_photos_table_list_all_sql
 
@@ -38,7 +38,7 @@ class PhotosTableExporter:
             return str(exif_val)
 
     def _fetch_rows(self, ctx: ReportContext) -> List[Dict[str, Any]]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_photos_table_list_all_sql())
                 rows = cur.fetchall()
@@ -145,7 +145,7 @@ class PhotosTableExporter:
             out += ["COMMIT;", ""]
             return "\n".join(out)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out.append(dump_table_inserts_columns(
                     cur,
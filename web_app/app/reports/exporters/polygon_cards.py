@@ -6,7 +6,7 @@ from typing import Any, Dict, List, Tuple
 from openpyxl import Workbook
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 
 from app.queries import (
@@ -27,7 +27,7 @@ class PolygonCardsExporter:
     export_id = "polygon_cards"
 
     def _fetch_polygon_names(self, ctx: ReportContext) -> List[str]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_polygon_cards_list_polygons_sql())
                 return [str(r[0]) for r in cur.fetchall()]
@@ -73,7 +73,7 @@ class PolygonCardsExporter:
         ws_media = wb.create_sheet("MediaLinks")
         ws_media.append(["ref_polygon", "kind", "ref_media", "files"])
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             for poly in names:
                 d = self._fetch_polygon_detail(conn, poly)
                 if not d:
@@ -146,7 +146,7 @@ class PolygonCardsExporter:
         if not names:
             return "\n".join(header + ["COMMIT;", ""])
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out: List[str] = header[:]
 
@@ -8,7 +8,7 @@ from typing import Any, Dict, List
 from openpyxl import Workbook
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 
 from app.queries import report_samples_list_all_sql
@@ -22,7 +22,7 @@ class SamplesTableExporter:
     export_id = "samples_table"
 
     def _fetch_samples(self, ctx: ReportContext) -> List[Dict[str, Any]]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_samples_list_all_sql())
                 rows = cur.fetchall()
@@ -93,7 +93,7 @@ class SamplesTableExporter:
             out += ["COMMIT;", ""]
             return "\n".join(out)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out.append(dump_table_inserts(cur, "tab_samples", "WHERE id_sample = ANY(%s)", (ids,)))
                 out.append(dump_table_inserts(cur, "tabaid_samples_photos", "WHERE ref_sample = ANY(%s)", (ids,)))
@@ -8,8 +8,9 @@ from typing import Any, Dict, List
 from openpyxl import Workbook
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
+from app.utils.geom_utils import has_section_lines
 
 from app.queries import (
     report_sections_cards_list_sections_sql,
@@ -27,15 +28,15 @@ class SectionsCardsExporter:
     export_id = "sections_cards"
 
     def _fetch_section_ids(self, ctx: ReportContext) -> List[int]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_sections_cards_list_sections_sql())
                 return [int(r[0]) for r in cur.fetchall()]
 
-    def _fetch_section_detail(self, conn, sid: int) -> Dict[str, Any]:
+    def _fetch_section_detail(self, conn, sid: int, stored: bool = True) -> Dict[str, Any]:
         with conn.cursor() as cur:
-            # same 4 params as in PDF detail
-            cur.execute(report_sections_cards_detail_sql(), (sid, sid, sid, sid))
+            # same 3 params as in PDF detail
+            cur.execute(report_sections_cards_detail_sql(stored), (sid, sid, sid))
             row = cur.fetchone()
             if not row:
                 return {}
@@ -68,9 +69,11 @@ class SectionsCardsExporter:
         ]
         ws.append(headers)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
+            with conn.cursor() as cur:
+                stored = has_section_lines(cur, ctx.selected_db)
             for sid in section_ids:
-                s = self._fetch_section_detail(conn, sid)
+                s = self._fetch_section_detail(conn, sid, stored)
                 if not s:
                     continue
 
@@ -123,7 +126,7 @@ class SectionsCardsExporter:
             out += ["COMMIT;", ""]
             return "\n".join(out)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out.append(dump_table_inserts(cur, "tab_section", "WHERE id_section = ANY(%s)", (section_ids,)))
                 out.append(dump_table_inserts(cur, "tab_section_geopts_binding", "WHERE ref_section = ANY(%s)", (section_ids,)))
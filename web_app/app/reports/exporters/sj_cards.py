@@ -8,7 +8,7 @@ from typing import Any, Dict, List, Tuple
 from openpyxl import Workbook
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 
 from app.queries import (
@@ -26,7 +26,7 @@ class SjCardsExporter:
     export_id = "sj_cards"
 
     def _fetch_sj_ids(self, ctx: ReportContext) -> List[int]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_sj_cards_list_sj_sql())
                 return [int(r[0]) for r in cur.fetchall()]
@@ -76,7 +76,7 @@ class SjCardsExporter:
         ]
         ws.append(headers)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             for sj_id in sj_ids:
                 sj = self._fetch_sj_detail(conn, sj_id)
                 if not sj:
@@ -163,7 +163,7 @@ class SjCardsExporter:
 
         id_list = list(map(int, sj_ids))
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out: List[str] = header[:]
 
@@ -8,7 +8,7 @@ from typing import Any, Dict, List
 from openpyxl import Workbook
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.reports.context import ReportContext
 from app.queries import report_sketches_table_list_all_sql
 
@@ -21,7 +21,7 @@ class SketchesTableExporter:
     export_id = "sketches_table"
 
     def _fetch_rows(self, ctx: ReportContext) -> List[Dict[str, Any]]:
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(report_sketches_table_list_all_sql())
                 rows = cur.fetchall()
@@ -87,7 +87,7 @@ class SketchesTableExporter:
             out += ["COMMIT;", ""]
             return "\n".join(out)
 
-        with get_terrain_connection(ctx.selected_db) as conn:
+        with get_request_terrain_connection(ctx.selected_db) as conn:
             with conn.cursor() as cur:
                 out.append(dump_table_inserts(cur, "tab_sketches", "WHERE id_sketch = ANY(%s)", (ids,)))
                 out.append(dump_table_inserts(cur, "tabaid_finds_sketches", "WHERE ref_sketch = ANY(%s)", (ids,)))
@@ -15,7 +15,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 
 from app.logger import logger
 from app.reports.context import ReportContext
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 
 from app.queries import (
     report_geopts_list_all_sql,
@@ -61,7 +61,7 @@ def _detect_srid(ctx: ReportContext) -> Tuple[str, str]:
     """
     Returns (primary_srid_txt, extra_info_txt)
     """
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         with conn.cursor() as cur:
             # primary: Find_SRID on tab_geopts.pts_geom typmod
             srid = None
@@ -128,7 +128,7 @@ def generate_geopts_table_pdf(ctx: ReportContext, payload: dict) -> bytes:
         author=ctx.user_email or "",
     )
 
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(report_geopts_list_all_sql())
             rows = cur.fetchall()
@@ -18,7 +18,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 
 from app.logger import logger
 from app.reports.context import ReportContext
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 
 from app.queries import (
     report_objects_cards_list_objects_sql,
@@ -175,7 +175,7 @@ def _fetch_inhum(conn, id_object: int) -> Optional[Dict[str, Any]]:
 
 
 def _fetch_object_ids(ctx: ReportContext) -> List[int]:
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(report_objects_cards_list_objects_sql())
             return [int(r[0]) for r in cur.fetchall()]
@@ -461,7 +461,7 @@ def generate_objects_cards_pdf(ctx: ReportContext, payload: dict) -> bytes:
 
     story: List[Any] = []
 
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         for idx, oid in enumerate(obj_ids, start=1):
             o = _fetch_object_detail(conn, oid)
             if not o:
@@ -16,7 +16,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 
 from app.logger import logger
 from app.reports.context import ReportContext
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.queries import report_photos_table_list_all_sql
 from config import Config
 
@@ -158,7 +158,7 @@ def generate_photos_table_pdf(ctx: ReportContext, payload: dict) -> bytes:
         author=ctx.user_email or "",
     )
 
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(report_photos_table_list_all_sql())
             rows = cur.fetchall()
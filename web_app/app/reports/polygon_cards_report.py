@@ -16,7 +16,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 
 from app.logger import logger
 from app.reports.context import ReportContext
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 
 from app.queries import (
     report_polygon_cards_list_polygons_sql,
@@ -424,7 +424,7 @@ def generate_polygon_cards_pdf(ctx: ReportContext, payload: dict) -> bytes:
 
     story: List[Any] = []
 
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(report_polygon_cards_list_polygons_sql())
             polygon_names = [str(r[0]) for r in cur.fetchall()]
@@ -437,7 +437,7 @@ def generate_polygon_cards_pdf(ctx: ReportContext, payload: dict) -> bytes:
         page_no = canv.getPageNumber()
         _footer(canv, d, footer_left, f"{ctx.t('common.page')} {page_no}/{total_pages}")
 
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         for idx, poly_name in enumerate(polygon_names, start=1):
             p = _fetch_polygon_detail(conn, poly_name)
             if not p:
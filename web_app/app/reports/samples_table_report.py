@@ -16,7 +16,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 
 from app.logger import logger
 from app.reports.context import ReportContext
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 
 from app.queries import report_samples_list_all_sql
 
@@ -149,7 +149,7 @@ def generate_samples_table_pdf(ctx: ReportContext, payload: dict) -> bytes:
 
     footer_left = f"{ctx.t('common.generated_on')}: {ts}"
 
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(report_samples_list_all_sql())
             rows = cur.fetchall()
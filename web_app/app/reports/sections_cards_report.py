@@ -16,7 +16,8 @@ from reportlab.pdfbase.ttfonts import TTFont
 
 from app.logger import logger
 from app.reports.context import ReportContext
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
+from app.utils.geom_utils import has_section_lines
 
 from app.queries import (
     report_sections_cards_list_sections_sql,
@@ -141,9 +142,9 @@ def _top4_and_more(ids_desc: List[str]) -> Tuple[List[str], int]:
     return top, more
 
 
-def _fetch_section_detail(conn, sid: int) -> Dict[str, Any]:
+def _fetch_section_detail(conn, sid: int, stored: bool = True) -> Dict[str, Any]:
     with conn.cursor() as cur:
-        cur.execute(report_sections_cards_detail_sql(), (sid, sid, sid, sid))
+        cur.execute(report_sections_cards_detail_sql(stored), (sid, sid, sid))
         row = cur.fetchone()
         if not row:
             return {}
@@ -317,7 +318,7 @@ def generate_sections_cards_pdf(ctx: ReportContext, payload: dict) -> bytes:
         author=ctx.user_email or "",
     )
 
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(report_sections_cards_list_sections_sql())
             section_ids = [int(r[0]) for r in cur.fetchall()]
@@ -331,9 +332,11 @@ def generate_sections_cards_pdf(ctx: ReportContext, payload: dict) -> bytes:
 
     story: List[Any] = []
 
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
+        with conn.cursor() as cur:
+            stored = has_section_lines(cur, ctx.selected_db)
         for idx, sid in enumerate(section_ids, start=1):
-            s = _fetch_section_detail(conn, sid)
+            s = _fetch_section_detail(conn, sid, stored)
             if not s:
                 continue
 
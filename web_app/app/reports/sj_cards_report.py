@@ -24,7 +24,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 
 from app.logger import logger
 from app.reports.context import ReportContext
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 
 from app.queries import (
     report_sj_cards_list_sj_sql,
@@ -523,7 +523,7 @@ def generate_sj_cards_pdf(ctx: ReportContext, payload: dict) -> bytes:
     story: List[Any] = []
 
     # List SJ IDs
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(report_sj_cards_list_sj_sql())
             sj_ids = [r[0] for r in cur.fetchall()]
@@ -536,7 +536,7 @@ def generate_sj_cards_pdf(ctx: ReportContext, payload: dict) -> bytes:
         page_no = canv.getPageNumber()
         _footer(canv, d, footer_left, f"{ctx.t('common.page')} {page_no}/{total_pages}")
 
-    with get_terrain_connection(ctx.selected_db) as conn:
+    with get_request_terrain_connection(ctx.selected_db) as conn:
         for idx, sj_id in enumerate(sj_ids, start=1):
             sj = _fetch_sj_detail(conn, sj_id)
             if not sj:
@@ -9,7 +9,12 @@ from psycopg2 import sql
 
 from config import Config
 from app.logger import logger
-from app.database import get_auth_connection, create_database_backup, get_terrain_connection
+from app.database import (
+    get_request_auth_connection,
+    create_database_backup,
+    get_request_terrain_connection,
+    close_pooled_connections,
+)
 from app.queries import (
     get_terrain_db_list,
     get_terrain_db_sizes,
@@ -27,8 +32,10 @@ from app.utils.admin import (
     sync_single_db,
 )
 from app.utils.geom_utils import update_geometry_srid, detect_db_srid, epsg_exists_in_template_spatial_ref_sys
+from app.utils.srid_cache import invalidate_project_srid
 from app.utils.decorators import archeolog_required
 from app.utils.storage import safe_join, validate_db_name
+from app.utils.user_state import invalidate_user_state
 
 admin_bp = Blueprint('admin', __name__)
 USER_ROLES = ("archeolog", "documentator", "analyst")
@@ -36,7 +43,7 @@ USER_ROLES = ("archeolog", "documentator", "analyst")
 
 def _terrain_database_available(dbname: str) -> bool:
     validate_db_name(dbname)
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     try:
         return dbname in get_terrain_db_list(conn)
     finally:
@@ -55,7 +62,7 @@ def srid_search():
     if not q:
         return jsonify([])
 
-    conn = get_terrain_connection("terrain_db_template")
+    conn = get_request_terrain_connection("terrain_db_template")
     try:
         with conn.cursor() as cur:
             if re.fullmatch(r"\d{3,6}", q):
@@ -84,7 +91,7 @@ def srid_search():
 def admin():
     user_email = g.user_email
 
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     cur = conn.cursor()
 
     # pagination
@@ -141,7 +148,7 @@ def admin():
 @archeolog_required
 def add_user():
     current_user_email = g.user_email
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     cur = conn.cursor()
 
     # reading data from form
@@ -218,7 +225,7 @@ def edit_user():
         flash("Invalid user role.", "danger")
         return redirect(url_for('admin.admin'))
 
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     cur = conn.cursor()
     try:
         cur.execute(get_app_user_for_edit_sql(), (user_mail,))
@@ -228,6 +235,7 @@ def edit_user():
 
         cur.execute(update_app_user_profile_sql(), (name, group_role, user_mail))
         conn.commit()
+        invalidate_user_state(user_mail)
     except Exception as e:
         conn.rollback()
         logger.error(f"Error while editing user {user_mail}: {e}")
@@ -258,11 +266,12 @@ def disable_user():
         flash("Missing email of user to be deactivated", "danger")
         return redirect('/admin')
 
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     cur = conn.cursor()
     try:
         cur.execute("UPDATE app_users SET enabled = false WHERE mail = %s", (user_to_disable,))
         conn.commit()
+        invalidate_user_state(user_to_disable)
         logger.info(f"User {current_user} deactivated user {user_to_disable}")
         flash(f"User {user_to_disable} was disabled.", "success")
     except Exception as e:
@@ -279,7 +288,7 @@ def disable_user():
 def enable_user():
     user_email = g.user_email
 
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     cur = conn.cursor()
 
     mail_to_enable = request.form.get('mail')
@@ -294,6 +303,7 @@ def enable_user():
         WHERE mail = %s
     """, (mail_to_enable,))
     conn.commit()
+    invalidate_user_state(mail_to_enable)
 
     logger.info(f"User {user_email} activated user {mail_to_enable}")
     conn.close()
@@ -380,14 +390,16 @@ def delete_database():
         return redirect('/admin')
 
     try:
-        conn = get_auth_connection()
+        conn = get_request_auth_connection()
         conn.autocommit = True
         cur = conn.cursor()
 
-        # 1. DROP DATABASE
+        # 1. DROP DATABASE (pooled idle sessions would block it)
+        close_pooled_connections(dbname, cur)
         cur.execute(sql.SQL("DROP DATABASE {}").format(sql.Identifier(dbname)))
         cur.close()
         conn.close()
+        invalidate_project_srid(dbname)
 
         logger.warning(f"Database '{dbname}' was deleted.")
         flash(f"Database '{dbname}' was successfully deleted.", "warning")
@@ -440,7 +452,7 @@ def create_database():
 
     try:
         # Creating DB from template
-        conn = get_auth_connection()
+        conn = get_request_auth_connection()
         conn.autocommit = True
         cur = conn.cursor()
         cur.execute(
@@ -452,7 +464,7 @@ def create_database():
         logger.info(f"Database '{dbname}' was created.")
 
         # Users synchronisation to terrain databases
-        auth_conn = get_auth_connection()
+        auth_conn = get_request_auth_connection()
         with auth_conn.cursor() as auth_cur:
             auth_cur.execute("SELECT mail, name, group_role FROM app_users WHERE enabled = TRUE")
             users = auth_cur.fetchall()
@@ -5,9 +5,10 @@ from typing import Any, Dict, List
 
 from flask import Blueprint, jsonify, render_template, session
 
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.utils.decorators import require_selected_db
 from app.utils.analyze_checks import run_analyze_checks
+from app.utils.geom_utils import has_polygon_closure
 
 from app.queries import (
     # stats
@@ -60,32 +61,18 @@ def analyze_stats_json():
     selected_db = session["selected_db"]
     charts: List[Dict[str, Any]] = []
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
-            # 1) polygons row1/row2 (can return NULLs)
-            cur.execute(stats_polygons_by_row_sql())
-            row = cur.fetchone()
-            if not row:
-                row1, row2 = 0, 0
-            else:
-                # row might contain None values
-                row1 = row[0] if len(row) > 0 else 0
-                row2 = row[1] if len(row) > 1 else 0
-
-            charts.append(
-                _as_pie(
-                    ["row1 (no parent)", "row2 (has parent)"],
-                    [_i0(row1), _i0(row2)],
-                    "Polygons by nesting level",
-                )
-            )
-
             # Helper: rows -> pie (label,value)
             def _rows_to_pie(rows, title: str):
                 labels = [(r[0] if r and len(r) > 0 else "") for r in rows]
                 values = [_i0(r[1]) if r and len(r) > 1 else 0 for r in rows]
                 charts.append(_as_pie(labels, values, title))
 
+            # 1) polygons per nesting row (closure depth)
+            cur.execute(stats_polygons_by_row_sql(has_polygon_closure(cur, selected_db)))
+            _rows_to_pie(cur.fetchall(), "Polygons by nesting level")
+
             # 2) SU by type
             cur.execute(stats_su_by_type_sql())
             _rows_to_pie(cur.fetchall(), "Stratigraphic units by type")
@@ -21,7 +21,7 @@ from weasyprint import HTML
 
 from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.utils.decorators import require_selected_db
 
 from app.queries import (
@@ -115,7 +115,7 @@ def objects():
     selected_db = session["selected_db"]
     form_data = None
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         suggested_id = _get_next_object_id(conn)
         object_types = _get_object_types(conn)
@@ -251,7 +251,7 @@ def define_object_type():
         logger.warning(f"[{selected_db}] Attempt to create empty object type.")
         return jsonify({"error": "Object type name is missing."}), 400
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(
@@ -282,7 +282,7 @@ def define_object_type():
 @require_selected_db
 def api_get_object(id_object: int):
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         obj = q_get_object_with_sjs(conn, id_object)
         if not obj:
@@ -352,7 +352,7 @@ def update_object():
     except Exception as e:
         return jsonify({"error": f"Invalid input: {e}"}), 400
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         if not q_object_exists(conn, id_object):
             return jsonify({"error": f"Object #{id_object} does not exist."}), 404
@@ -441,7 +441,7 @@ def delete_object():
     except Exception:
         return jsonify({"error": "Invalid object id."}), 400
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         if not q_object_exists(conn, id_object):
             return jsonify({"error": f"Object #{id_object} does not exist."}), 404
@@ -478,7 +478,7 @@ def delete_object():
 @require_selected_db
 def list_objects():
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         objects_rows = q_list_objects_with_sjs(conn)
         return render_template("list_objects.html", objects=objects_rows)
@@ -497,7 +497,7 @@ def list_objects():
 @require_selected_db
 def generate_objects_pdf():
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         objects_rows = q_list_objects_with_sjs(conn)
         rendered = render_template("pdf_objects.html", objects=objects_rows)
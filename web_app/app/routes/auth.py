@@ -10,7 +10,7 @@ from flask import Blueprint, current_app, request, render_template, jsonify, red
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from app.logger import logger
-from app.database import get_auth_connection
+from app.database import get_request_auth_connection
 from app.queries import (
     is_user_enabled,
     update_user_password_hash,
@@ -108,7 +108,7 @@ def _reset_url(token: str) -> str:
 def _load_reset_account(token: str):
     payload = decode_password_reset_token(token)
     email = payload["email"]
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     try:
         user_name = get_enabled_user_name_by_email(conn, email)
         password_hash = get_user_password_hash(conn, email)
@@ -123,7 +123,7 @@ def _load_reset_account(token: str):
 def _consume_reset_token(token: str, new_password: str):
     payload = decode_password_reset_token(token)
     email = payload["email"]
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     try:
         reset_state = get_password_reset_state_for_update(conn, email)
         if not reset_state or not password_reset_token_matches(payload, reset_state[1]):
@@ -173,7 +173,7 @@ def login():
 
     conn = None
     try:
-        conn = get_auth_connection()
+        conn = get_request_auth_connection()
 
         # account enabled?
         enabled = is_user_enabled(conn, email)
@@ -356,7 +356,7 @@ def forgot_password():
 
     conn = None
     try:
-        conn = get_auth_connection()
+        conn = get_request_auth_connection()
         user_name = get_enabled_user_name_by_email(conn, email)
 
         if not user_name:
@@ -402,7 +402,7 @@ def profile():
     user_role = getattr(g, "user_role", "")
     user_name_from_token = getattr(g, "user_name", "")
 
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     cur = conn.cursor()
     try:
         if request.method == "POST":
@@ -21,7 +21,7 @@ from flask import (
 
 from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.utils.decorators import require_selected_db
 from app.utils import (
     cleanup_upload,
@@ -186,7 +186,7 @@ def api_search_authors():
         return jsonify({"results": []})
 
     selected_db = session["selected_db"]
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -220,7 +220,7 @@ def api_search_sj():
         return jsonify({"results": []})
 
     selected_db = session["selected_db"]
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -254,7 +254,7 @@ def api_search_sections():
         return jsonify({"results": []})
 
     selected_db = session["selected_db"]
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -293,7 +293,7 @@ def drawings():
 
     page, per_page, offset = gallery_page_args(request.args.get("page"))
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             # stats
             cur.execute(drawings_stats_sql())
@@ -409,7 +409,7 @@ def upload_drawings():
     items: List[Dict[str, Any]] = []
     batch_checksums = set()
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
 
     try:
@@ -553,7 +553,7 @@ def api_drawing_detail(id_drawing: str):
     selected_db = session["selected_db"]
     id_drawing = (id_drawing or "").strip()
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(select_drawing_detail_sql(), (id_drawing,))
             row = cur.fetchone()
@@ -610,7 +610,7 @@ def edit_drawing(id_drawing: str):
     replacement_installed = False
     replacement_thumb_installed = False
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
 
     try:
@@ -761,7 +761,7 @@ def delete_drawing(id_drawing: str):
 
     final_path, thumb_path = _final_paths(selected_db, id_drawing)
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(delete_drawing_sql(), (id_drawing,))
         conn.commit()
@@ -793,7 +793,7 @@ def bulk_drawings():
     action = (request.form.get("action") or "").strip()
 
     if action == "delete":
-        with get_terrain_connection(selected_db) as conn:
+        with get_request_terrain_connection(selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(bulk_delete_drawings_sql(), (ids,))
             conn.commit()
@@ -823,7 +823,7 @@ def bulk_drawings():
             flash("Nothing to update.", "warning")
             return redirect(url_for("drawings.drawings"))
 
-        with get_terrain_connection(selected_db) as conn:
+        with get_request_terrain_connection(selected_db) as conn:
             with conn.cursor() as cur:
                 if set_author:
                     cur.execute("SELECT 1 FROM gloss_personalia WHERE mail=%s LIMIT 1;", (author,))
@@ -17,7 +17,7 @@ from flask import (
 
 from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.utils.decorators import require_selected_db
 
 from app.utils import storage
@@ -123,7 +123,7 @@ def finds_samples():
     selected_db = session["selected_db"]
     open_edit_find_id = request.args.get("edit_find", type=int)
     open_edit_sample_id = request.args.get("edit_sample", type=int)
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
 
     try:
         with conn.cursor() as cur:
@@ -176,7 +176,7 @@ def add_find_type():
         flash("Type code is required.", "warning")
         return redirect(url_for("finds_samples.finds_samples"))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(insert_find_type_sql(), (type_code,))
@@ -203,7 +203,7 @@ def add_sample_type():
         flash("Type code is required.", "warning")
         return redirect(url_for("finds_samples.finds_samples"))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(insert_sample_type_sql(), (type_code,))
@@ -247,7 +247,7 @@ def add_find():
         flash(str(e), "danger")
         return redirect(url_for("finds_samples.finds_samples"))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(find_exists_sql(), (id_find,))
@@ -280,7 +280,7 @@ def list_finds():
     selected_db = session["selected_db"]
     limit, offset = _pagination_args()
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(count_finds_sql())
@@ -316,7 +316,7 @@ def list_finds():
 @require_selected_db
 def delete_find(id_find: int):
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(delete_find_sql(), (id_find,))
@@ -355,7 +355,7 @@ def update_find(id_find: int):
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 400
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(
@@ -398,7 +398,7 @@ def add_sample():
         flash(str(e), "danger")
         return redirect(url_for("finds_samples.finds_samples"))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(sample_exists_sql(), (id_sample,))
@@ -431,7 +431,7 @@ def list_samples():
     selected_db = session["selected_db"]
     limit, offset = _pagination_args()
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(count_samples_sql())
@@ -465,7 +465,7 @@ def list_samples():
 @require_selected_db
 def delete_sample(id_sample: int):
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(delete_sample_sql(), (id_sample,))
@@ -502,7 +502,7 @@ def update_sample(id_sample: int):
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 400
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(
@@ -528,7 +528,7 @@ def update_sample(id_sample: int):
 @require_selected_db
 def find_detail(id_find: int):
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(get_find_sql(), (id_find,))
@@ -576,7 +576,7 @@ def find_detail(id_find: int):
 @require_selected_db
 def sample_detail(id_sample: int):
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(get_sample_sql(), (id_sample,))
@@ -624,7 +624,7 @@ def sample_detail(id_sample: int):
 @require_selected_db
 def print_find_label(id_find: int):
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(get_find_sql(), (id_find,))
@@ -657,7 +657,7 @@ def print_find_label(id_find: int):
 @require_selected_db
 def print_sample_label(id_sample: int):
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(get_sample_sql(), (id_sample,))
@@ -717,7 +717,7 @@ def upload_find_media(media_type: str):
         return redirect(url_for("finds_samples.finds_samples"))
 
     # verify find exists
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(find_exists_sql(), (id_find,))
@@ -742,118 +742,139 @@ def upload_find_media(media_type: str):
         return redirect(url_for("finds_samples.finds_samples"))
 
     ok, failed = 0, []
+    stored = []
 
-    for f in files:
-        tmp_path = None
-        final_path = None
-        thumb_path = None
-
-        try:
-            # A) temp store
-            tmp_path, _ = storage.save_to_uploads(Config.UPLOAD_FOLDER, f)
-
-            # B) pk + ext validation
-            pk_name = storage.make_pk(selected_db, f.filename)
-            storage.validate_pk(pk_name)
-            ext = pk_name.rsplit(".", 1)[-1].lower()
-            validate_extension(ext, ALLOWED_EXT)
-
-            # C) final paths + collision
-            media_dir = MEDIA_DIRS[media_type]
-            final_path, thumb_path = storage.final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
-            if os.path.exists(final_path):
-                raise ValueError(f"File already exists: {pk_name}")
-
-            # D) move into place then MIME validate
-            storage.move_into_place(tmp_path, final_path)
+    conn = get_request_terrain_connection(selected_db)
+    conn.autocommit = False
+    try:
+        for f in files:
             tmp_path = None
+            final_path = None
+            thumb_path = None
 
-            mime = detect_mime(final_path)
-            validate_mime(mime, ALLOWED_MIME)
-            checksum = sha256_file(final_path)
-
-            # thumb best-effort
-            try:
-                make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
-            except Exception:
-                pass
-
-            # E) EXIF for photos only (JPEG/TIFF)
-            shoot_dt = gps_lat = gps_lon = gps_alt = None
-            exif_json = {}
-            if media_type == "photos" and mime in ("image/jpeg", "image/tiff"):
-                sdt, la, lo, al, exif = extract_exif(final_path)
-                shoot_dt, gps_lat, gps_lon, gps_alt, exif_json = sdt, la, lo, al, exif
-
-            # F) DB insert + link (commit per file)
-            conn2 = get_terrain_connection(selected_db)
-            cur2 = conn2.cursor()
             try:
-                if media_type == "photos":
-                    cur2.execute(
-                        insert_photo_sql(),
-                        (
-                            pk_name,
-                            photo_typ or "",
-                            datum,
-                            author,
-                            notes,
-                            mime,
-                            os.path.getsize(final_path),
-                            checksum,
-                            shoot_dt, gps_lat, gps_lon, gps_alt,
-                            Json(exif_json),
-                        ),
-                    )
-                    cur2.execute(link_find_photo_sql(), (id_find, pk_name, id_find, pk_name))
-
-                elif media_type == "sketches":
-                    cur2.execute(
-                        insert_sketch_sql(),
-                        (
-                            pk_name,
-                            sketch_typ or "",
-                            author,
-                            datum,
-                            notes,
-                            mime,
-                            os.path.getsize(final_path),
-                            checksum,
-                        ),
-                    )
-                    cur2.execute(link_find_sketch_sql(), (id_find, pk_name, id_find, pk_name))
-
-                conn2.commit()
-                ok += 1
-
-            except Exception:
-                conn2.rollback()
+                # A) temp store
+                tmp_path, _ = storage.save_to_uploads(Config.UPLOAD_FOLDER, f)
+
+                # B) pk + ext validation
+                pk_name = storage.make_pk(selected_db, f.filename)
+                storage.validate_pk(pk_name)
+                ext = pk_name.rsplit(".", 1)[-1].lower()
+                validate_extension(ext, ALLOWED_EXT)
+
+                # C) final paths + collision
+                media_dir = MEDIA_DIRS[media_type]
+                final_path, thumb_path = storage.final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
+                if os.path.exists(final_path):
+                    raise ValueError(f"File already exists: {pk_name}")
+
+                # D) move into place then MIME validate
+                storage.move_into_place(tmp_path, final_path)
+                tmp_path = None
+
+                mime = detect_mime(final_path)
+                validate_mime(mime, ALLOWED_MIME)
+                checksum = sha256_file(final_path)
+
+                # thumb best-effort
                 try:
-                    storage.delete_media_files(final_path, thumb_path)
+                    make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
                 except Exception:
                     pass
-                raise
 
-            finally:
-                try:
-                    cur2.close()
-                except Exception:
-                    pass
+                # E) EXIF for photos only (JPEG/TIFF)
+                shoot_dt = gps_lat = gps_lon = gps_alt = None
+                exif_json = {}
+                if media_type == "photos" and mime in ("image/jpeg", "image/tiff"):
+                    sdt, la, lo, al, exif = extract_exif(final_path)
+                    shoot_dt, gps_lat, gps_lon, gps_alt, exif_json = sdt, la, lo, al, exif
+
+                # F) DB insert + link (savepoint per file, one commit for the batch)
+                cur2 = conn.cursor()
                 try:
-                    conn2.close()
+                    cur2.execute("SAVEPOINT find_media_file")
+                    if media_type == "photos":
+                        cur2.execute(
+                            insert_photo_sql(),
+                            (
+                                pk_name,
+                                photo_typ or "",
+                                datum,
+                                author,
+                                notes,
+                                mime,
+                                os.path.getsize(final_path),
+                                checksum,
+                                shoot_dt, gps_lat, gps_lon, gps_alt,
+                                Json(exif_json),
+                            ),
+                        )
+                        cur2.execute(link_find_photo_sql(), (id_find, pk_name, id_find, pk_name))
+
+                    elif media_type == "sketches":
+                        cur2.execute(
+                            insert_sketch_sql(),
+                            (
+                                pk_name,
+                                sketch_typ or "",
+                                author,
+                                datum,
+                                notes,
+                                mime,
+                                os.path.getsize(final_path),
+                                checksum,
+                            ),
+                        )
+                        cur2.execute(link_find_sketch_sql(), (id_find, pk_name, id_find, pk_name))
+
+                    cur2.execute("RELEASE SAVEPOINT find_media_file")
+                    stored.append((final_path, thumb_path))
+                    ok += 1
+
                 except Exception:
-                    pass
+                    try:
+                        cur2.execute("ROLLBACK TO SAVEPOINT find_media_file")
+                    except Exception:
+                        pass
+                    try:
+                        storage.delete_media_files(final_path, thumb_path)
+                    except Exception:
+                        pass
+                    raise
+
+                finally:
+                    try:
+                        cur2.close()
+                    except Exception:
+                        pass
+
+            except Exception as e:
+                failed.append(f"{f.filename}: {e}")
+                logger.warning(f"[{selected_db}] find media upload failed ({media_type}) {f.filename}: {e}")
 
-        except Exception as e:
-            failed.append(f"{f.filename}: {e}")
-            logger.warning(f"[{selected_db}] find media upload failed ({media_type}) {f.filename}: {e}")
+            finally:
+                if tmp_path:
+                    try:
+                        storage.cleanup_upload(tmp_path)
+                    except Exception:
+                        pass
 
-        finally:
-            if tmp_path:
+        try:
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for final_path, thumb_path in stored:
                 try:
-                    storage.cleanup_upload(tmp_path)
+                    storage.delete_media_files(final_path, thumb_path)
                 except Exception:
                     pass
+            logger.error(f"[{selected_db}] find media upload commit failed ({media_type}): {e}")
+            ok, failed = 0, failed + [f"commit failed: {e}"]
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
     if failed:
         flash(
@@ -896,7 +917,7 @@ def upload_sample_media(media_type: str):
         return redirect(url_for("finds_samples.finds_samples"))
 
     # verify sample exists
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(sample_exists_sql(), (id_sample,))
@@ -921,111 +942,132 @@ def upload_sample_media(media_type: str):
         return redirect(url_for("finds_samples.finds_samples"))
 
     ok, failed = 0, []
+    stored = []
 
-    for f in files:
-        tmp_path = None
-        final_path = None
-        thumb_path = None
+    conn = get_request_terrain_connection(selected_db)
+    conn.autocommit = False
+    try:
+        for f in files:
+            tmp_path = None
+            final_path = None
+            thumb_path = None
 
-        try:
-            tmp_path, _ = storage.save_to_uploads(Config.UPLOAD_FOLDER, f)
+            try:
+                tmp_path, _ = storage.save_to_uploads(Config.UPLOAD_FOLDER, f)
 
-            pk_name = storage.make_pk(selected_db, f.filename)
-            storage.validate_pk(pk_name)
-            ext = pk_name.rsplit(".", 1)[-1].lower()
-            validate_extension(ext, ALLOWED_EXT)
+                pk_name = storage.make_pk(selected_db, f.filename)
+                storage.validate_pk(pk_name)
+                ext = pk_name.rsplit(".", 1)[-1].lower()
+                validate_extension(ext, ALLOWED_EXT)
 
-            media_dir = MEDIA_DIRS[media_type]
-            final_path, thumb_path = storage.final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
-            if os.path.exists(final_path):
-                raise ValueError(f"File already exists: {pk_name}")
+                media_dir = MEDIA_DIRS[media_type]
+                final_path, thumb_path = storage.final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
+                if os.path.exists(final_path):
+                    raise ValueError(f"File already exists: {pk_name}")
 
-            storage.move_into_place(tmp_path, final_path)
-            tmp_path = None
+                storage.move_into_place(tmp_path, final_path)
+                tmp_path = None
 
-            mime = detect_mime(final_path)
-            validate_mime(mime, ALLOWED_MIME)
-            checksum = sha256_file(final_path)
+                mime = detect_mime(final_path)
+                validate_mime(mime, ALLOWED_MIME)
+                checksum = sha256_file(final_path)
 
-            try:
-                make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
-            except Exception:
-                pass
-
-            shoot_dt = gps_lat = gps_lon = gps_alt = None
-            exif_json = {}
-            if media_type == "photos" and mime in ("image/jpeg", "image/tiff"):
-                sdt, la, lo, al, exif = extract_exif(final_path)
-                shoot_dt, gps_lat, gps_lon, gps_alt, exif_json = sdt, la, lo, al, exif
-
-            conn2 = get_terrain_connection(selected_db)
-            cur2 = conn2.cursor()
-            try:
-                if media_type == "photos":
-                    cur2.execute(
-                        insert_photo_sql(),
-                        (
-                            pk_name,
-                            photo_typ or "",
-                            datum,
-                            author,
-                            notes,
-                            mime,
-                            os.path.getsize(final_path),
-                            checksum,
-                            shoot_dt, gps_lat, gps_lon, gps_alt,
-                            Json(exif_json),
-                        ),
-                    )
-                    cur2.execute(link_sample_photo_sql(), (id_sample, pk_name, id_sample, pk_name))
-
-                elif media_type == "sketches":
-                    cur2.execute(
-                        insert_sketch_sql(),
-                        (
-                            pk_name,
-                            sketch_typ or "",
-                            author,
-                            datum,
-                            notes,
-                            mime,
-                            os.path.getsize(final_path),
-                            checksum,
-                        ),
-                    )
-                    cur2.execute(link_sample_sketch_sql(), (id_sample, pk_name, id_sample, pk_name))
-
-                conn2.commit()
-                ok += 1
-
-            except Exception:
-                conn2.rollback()
                 try:
-                    storage.delete_media_files(final_path, thumb_path)
+                    make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
                 except Exception:
                     pass
-                raise
 
-            finally:
-                try:
-                    cur2.close()
-                except Exception:
-                    pass
+                shoot_dt = gps_lat = gps_lon = gps_alt = None
+                exif_json = {}
+                if media_type == "photos" and mime in ("image/jpeg", "image/tiff"):
+                    sdt, la, lo, al, exif = extract_exif(final_path)
+                    shoot_dt, gps_lat, gps_lon, gps_alt, exif_json = sdt, la, lo, al, exif
+
+                cur2 = conn.cursor()
                 try:
-                    conn2.close()
+                    cur2.execute("SAVEPOINT sample_media_file")
+                    if media_type == "photos":
+                        cur2.execute(
+                            insert_photo_sql(),
+                            (
+                                pk_name,
+                                photo_typ or "",
+                                datum,
+                                author,
+                                notes,
+                                mime,
+                                os.path.getsize(final_path),
+                                checksum,
+                                shoot_dt, gps_lat, gps_lon, gps_alt,
+                                Json(exif_json),
+                            ),
+                        )
+                        cur2.execute(link_sample_photo_sql(), (id_sample, pk_name, id_sample, pk_name))
+
+                    elif media_type == "sketches":
+                        cur2.execute(
+                            insert_sketch_sql(),
+                            (
+                                pk_name,
+                                sketch_typ or "",
+                                author,
+                                datum,
+                                notes,
+                                mime,
+                                os.path.getsize(final_path),
+                                checksum,
+                            ),
+                        )
+                        cur2.execute(link_sample_sketch_sql(), (id_sample, pk_name, id_sample, pk_name))
+
+                    cur2.execute("RELEASE SAVEPOINT sample_media_file")
+                    stored.append((final_path, thumb_path))
+                    ok += 1
+
                 except Exception:
-                    pass
+                    try:
+                        cur2.execute("ROLLBACK TO SAVEPOINT sample_media_file")
+                    except Exception:
+                        pass
+                    try:
+                        storage.delete_media_files(final_path, thumb_path)
+                    except Exception:
+                        pass
+                    raise
+
+                finally:
+                    try:
+                        cur2.close()
+                    except Exception:
+                        pass
+
+            except Exception as e:
+                failed.append(f"{f.filename}: {e}")
+                logger.warning(f"[{selected_db}] sample media upload failed ({media_type}) {f.filename}: {e}")
 
-        except Exception as e:
-            failed.append(f"{f.filename}: {e}")
-            logger.warning(f"[{selected_db}] sample media upload failed ({media_type}) {f.filename}: {e}")
+            finally:
+                if tmp_path:
+                    try:
+                        storage.cleanup_upload(tmp_path)
+                    except Exception:
+                        pass
 
-        finally:
-            if tmp_path:
+        try:
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for final_path, thumb_path in stored:
                 try:
-                    storage.cleanup_upload(tmp_path)
+                    storage.delete_media_files(final_path, thumb_path)
                 except Exception:
                     pass
+            logger.error(f"[{selected_db}] sample media upload commit failed ({media_type}): {e}")
+            ok, failed = 0, failed + [f"commit failed: {e}"]
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
     if failed:
         flash(
@@ -4,130 +4,71 @@ from __future__ import annotations
 
 import csv
 import io
+import json
 
-from flask import Blueprint, jsonify, render_template, request, flash, redirect, send_file, url_for, session
+from flask import Blueprint, Response, abort, jsonify, render_template, request, flash, redirect, send_file, url_for, session
 
+from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
-from app.utils.decorators import require_selected_db, float_or_none
-from app.utils.storage import read_upload_bytes
+from app.database import get_request_terrain_connection
+from app.utils.decorators import require_selected_db
+from app.utils.geom_utils import bulk_upsert_geopts, has_section_lines, rebuild_dirty_polygons
+from app.utils.gis_export import EXPORT_DOWNLOADS, EXPORT_FORMATS, ExportLayer, export_layer
+from app.utils.geopts_parser import ParseStats, iter_point_batches
+from app.utils.map_cache import cache_map_json, data_version, get_cached_map_json, snap_bbox
+from app.utils.srid_cache import get_project_srid
 
 from app.queries import (
-    find_geopts_srid_sql,
-    upsert_geopt_sql,
     list_geopts_sql,
     export_geopts_sql,
+    gis_export_geopts_sql,
     count_geopts_sql,
     geopts_overview_sql,
     delete_geopt_sql,
     update_geopt_sql,
+    geopt_usage_sql,
     geojson_geopts_bbox_sql,
+    geojson_geopts_clusters_bbox_sql,
     geojson_polygons_bbox_sql,
     geojson_photos_bbox_sql,
-    geopts_extent_4326_sql
+    geojson_photo_clusters_bbox_sql,
+    geopts_extent_4326_sql,
+    mvt_geopts_tile_sql,
+    mvt_polygons_tile_sql,
+    mvt_sections_tile_sql,
+    mvt_photos_tile_sql,
 )
 from app.utils.pagination import search_page_args
 
 geodesy_bp = Blueprint('geodesy', __name__)
 
 GEOPT_CODES = ('SU', 'FX', 'EP', 'FO', 'NI', 'PF', 'FI', 'PR', 'SP')
+# binding kinds returned by geopt_usage_sql
+GEOPT_USAGE_KINDS = ('polygon_top', 'polygon_bottom', 'section', 'photogram')
 
+# layer -> (tile query, max features per tile)
+MVT_LAYERS = {
+    'geopts': (mvt_geopts_tile_sql, 20000),
+    'polygons': (mvt_polygons_tile_sql, 10000),
+    'sections': (mvt_sections_tile_sql, 5000),
+    'photos': (mvt_photos_tile_sql, 20000),
+}
+MVT_MAX_ZOOM = 24
 
-# -------------------------
-# Helpers (local for now)
-# -------------------------
-
-def _read_text_file(file_storage) -> str:
-    """
-    Read uploaded file as text. Tries UTF-8 first, then CP1250, then Latin-1.
-    """
-    raw = read_upload_bytes(file_storage)
-    for enc in ("utf-8", "cp1250", "latin-1"):
-        try:
-            return raw.decode(enc)
-        except Exception:
-            continue
-    return raw.decode("utf-8", errors="replace")
+# clustered geopts: grid cell of GEOPT_CLUSTER_CELL_PX screen pixels at the requested zoom
+GEOPT_CLUSTER_CELL_PX = 32
+GEOPT_CLUSTER_DEFAULT_ZOOM = 16
+WEB_MERCATOR_WORLD_M = 40075016.686
 
+# photos-geojson aggregates photos into grid clusters below this map zoom
+PHOTO_CLUSTER_BELOW_ZOOM = 18
+PHOTO_CLUSTER_GRID_CELLS = 48
+MVT_MIMETYPE = 'application/vnd.mapbox-vector-tile'
 
-def _is_header_row(row: list[str]) -> bool:
-    if not row:
-        return False
-    head = " ".join([c.lower().strip() for c in row])
-    return ("id" in head and "x" in head and "y" in head) or ("id_pts" in head)
-
-
-def _parse_points(text: str) -> list[dict]:
-    """
-    Accepts:
-      - CSV (comma/semicolon)
-      - whitespace separated
-    Expected columns:
-      id_pts, x, y, h, code(optional), notes(optional)
-
-    Returns list of dicts: {id_pts, x, y, h, code, notes}
-    """
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    lines = [ln for ln in lines if not ln.startswith("#") and not ln.startswith("//")]
-
-    if not lines:
-        return []
-
-    sample = "\n".join(lines[:10])
-    delim = None
-    if ";" in sample and sample.count(";") >= sample.count(","):
-        delim = ";"
-    elif "," in sample:
-        delim = ","
-
-    rows: list[list[str]] = []
-    if delim:
-        reader = csv.reader(io.StringIO("\n".join(lines)), delimiter=delim)
-        for row in reader:
-            row = [c.strip() for c in row]
-            if row and not all(not c for c in row):
-                rows.append(row)
-    else:
-        for ln in lines:
-            rows.append(ln.split())
-
-    if rows and _is_header_row(rows[0]):
-        rows = rows[1:]
-
-    pts: list[dict] = []
-    for row in rows:
-        if len(row) < 4:
-            continue
-
-        try:
-            id_pts = int(str(row[0]).strip())
-        except Exception:
-            continue
-
-        # allow comma decimal
-        x = float_or_none(str(row[1]).strip().replace(",", "."))
-        y = float_or_none(str(row[2]).strip().replace(",", "."))
-        h = float_or_none(str(row[3]).strip().replace(",", "."))
-
-        if x is None or y is None or h is None:
-            continue
-
-        code = row[4].strip() if len(row) >= 5 and row[4] is not None else None
-        notes = row[5].strip() if len(row) >= 6 and row[5] is not None else None
-
-        pts.append(
-            dict(
-                id_pts=id_pts,
-                x=x,
-                y=y,
-                h=h,
-                code=code,
-                notes=notes,
-            )
-        )
-
-    return pts
 
+# -------------------------
+# Helpers (local for now)
+# -------------------------
 
 def _parse_bbox(bbox_str: str):
     """
@@ -182,12 +123,27 @@ def _geopt_filter_params() -> tuple:
     )
 
 
-def _get_target_srid(conn) -> int:
+def _tile_in_range(z: int, x: int, y: int) -> bool:
+    if z < 0 or z > MVT_MAX_ZOOM:
+        return False
+    return 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _cluster_cell_size(zoom: int | None) -> float:
+    """Web Mercator metres covered by GEOPT_CLUSTER_CELL_PX pixels at zoom (256 px tiles)."""
+    if zoom is None:
+        zoom = GEOPT_CLUSTER_DEFAULT_ZOOM
+    zoom = min(max(zoom, 0), MVT_MAX_ZOOM)
+    return WEB_MERCATOR_WORLD_M / 2 ** (zoom + 8) * GEOPT_CLUSTER_CELL_PX
+
+
+def _json_body_response(body: str) -> Response:
+    return Response(body, mimetype='application/json')
+
+
+def _get_target_srid(conn, dbname: str) -> int:
     with conn.cursor() as cur:
-        cur.execute(find_geopts_srid_sql())
-        row = cur.fetchone()
-        srid = int(row[0]) if row and row[0] else 0
-    return srid
+        return get_project_srid(cur, dbname).srid
 
 
 # -------------------------
@@ -201,9 +157,9 @@ def geodesy():
     Page with upload form + Leaflet preview map.
     """
     selected_db = session.get('selected_db')
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
-        target_srid = _get_target_srid(conn)
+        target_srid = _get_target_srid(conn, selected_db)
         with conn.cursor() as cur:
             cur.execute(geopts_overview_sql())
             overview_row = cur.fetchone() or (0, None)
@@ -237,9 +193,9 @@ def upload_geopts():
         flash('Musíš vybrat soubor (CSV/TXT).', 'danger')
         return redirect(url_for('geodesy.geodesy'))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
-        target_srid = _get_target_srid(conn)
+        target_srid = _get_target_srid(conn, selected_db)
         if target_srid <= 0:
             flash('Projektový SRID není nastaven (Find_SRID pro tab_geopts.pts_geom).', 'danger')
             return redirect(url_for('geodesy.geodesy'))
@@ -250,34 +206,33 @@ def upload_geopts():
             flash('Source EPSG must be an integer.', 'danger')
             return redirect(url_for('geodesy.geodesy'))
 
-        text = _read_text_file(file)
-        pts = _parse_points(text)
+        stats = ParseStats()
+        stream = getattr(file, "stream", file)
+        stream.seek(0)
+        batches = iter_point_batches(
+            stream,
+            max_bytes=int(getattr(Config, "MAX_TEXT_UPLOAD_BYTES", 8 * 1024 * 1024)),
+            stats=stats,
+        )
+        staged, inserted, updated = bulk_upsert_geopts(
+            conn, (list(batch.rows()) for batch in batches), src_epsg, target_srid
+        )
 
-        if not pts:
+        if not staged:
+            conn.rollback()
             flash('No valid points in text file.', 'warning')
             return redirect(url_for('geodesy.geodesy'))
 
-        sql = upsert_geopt_sql()
-        upserted = 0
-
-        with conn.cursor() as cur:
-            for p in pts:
-                # upsert_geopt_sql expects code 3x (CASE uses it 3 times)
-                notes = (p.get('notes') or '').strip()
-                cur.execute(
-                    sql,
-                    (
-                        p['x'], p['y'], p['h'], src_epsg, target_srid,
-                        p['id_pts'], p['h'],
-                        p.get('code'), p.get('code'), p.get('code'),
-                        notes,
-                    ),
-                )
-                upserted += 1
-
+        rebuild_dirty_polygons(conn, selected_db)
         conn.commit()
-        logger.info(f"[{selected_db}] geodesy upload: upserted={upserted}, source_epsg={src_epsg}, target_srid={target_srid}")
-        flash(f'Import finished: {upserted} points processed.', 'success')
+        logger.info(
+            f"[{selected_db}] geodesy upload: inserted={inserted}, updated={updated}, rejected={stats.rejected}, "
+            f"rows={staged}, source_epsg={src_epsg}, target_srid={target_srid}"
+        )
+        flash(
+            f'Import finished: {inserted} inserted, {updated} updated, {stats.rejected} rejected.',
+            'success' if not stats.rejected else 'warning',
+        )
         return redirect(url_for('geodesy.geodesy'))
 
     except Exception as e:
@@ -305,7 +260,7 @@ def list_geopts():
         default_limit=25,
         max_limit=100,
     )
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(count_geopts_sql(), filter_params)
@@ -350,10 +305,34 @@ def list_geopts():
 @geodesy_bp.route('/geodesy/download', methods=['GET'])
 @require_selected_db
 def download_geopts():
-    """Download all geodetic points matching the modal filters as tab-separated text."""
+    """
+    Download all geodetic points matching the modal filters as tab-separated
+    text, or with ?format=shp|gpkg as PointZ layer in the project SRID.
+    """
     selected_db = session.get('selected_db')
-    conn = get_terrain_connection(selected_db)
+    fmt = (request.args.get('format') or 'txt').lower()
+    if fmt != 'txt' and fmt not in EXPORT_FORMATS:
+        flash('Unsupported export format.', 'warning')
+        return redirect(url_for('geodesy.geodesy'))
+
+    conn = get_request_terrain_connection(selected_db)
     try:
+        if fmt in EXPORT_FORMATS:
+            with conn.cursor() as cur:
+                project = get_project_srid(cur, selected_db)
+            layer = ExportLayer(
+                f'{selected_db}_geodesy_points',
+                'POINT',
+                (('id_pts', 'N'), ('code', 'C'), ('notes', 'C'), ('h', 'F')),
+                gis_export_geopts_sql(),
+                _geopt_filter_params(),
+            )
+            output, written = export_layer(conn, layer, fmt, project.srid, project.srtext)
+            conn.rollback()  # end the read transaction of the server-side cursor
+            logger.info(f"[{selected_db}] geodesy {fmt} export: points={written}")
+            mimetype, ext = EXPORT_DOWNLOADS[fmt]
+            return send_file(output, mimetype=mimetype, as_attachment=True, download_name=f'{layer.name}.{ext}', max_age=0)
+
         with conn.cursor() as cur:
             cur.execute(export_geopts_sql(), _geopt_filter_params())
             rows = cur.fetchall()
@@ -387,7 +366,7 @@ def delete_geopt(id_pts: int):
     Delete one point by id_pts.
     """
     selected_db = session.get('selected_db')
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(delete_geopt_sql(), (id_pts,))
@@ -395,6 +374,7 @@ def delete_geopt(id_pts: int):
         if deleted == 0:
             conn.rollback()
             return jsonify({"ok": False, "error": "Point not found."}), 404
+        rebuild_dirty_polygons(conn, selected_db)
         conn.commit()
         logger.info(f"[{selected_db}] geodesy delete id_pts={id_pts}")
         return jsonify({"ok": True})
@@ -426,7 +406,7 @@ def update_geopt(id_pts: int):
     code = (payload.get('code') or '').strip()
     notes = (payload.get('notes') or '').strip()
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             # update_geopt_sql uses code 3x
@@ -435,6 +415,7 @@ def update_geopt(id_pts: int):
         if updated == 0:
             conn.rollback()
             return jsonify({"ok": False, "error": "Point not found."}), 404
+        rebuild_dirty_polygons(conn, selected_db)
         conn.commit()
         logger.info(f"[{selected_db}] geodesy update id_pts={id_pts}")
         return jsonify({"ok": True})
@@ -446,6 +427,27 @@ def update_geopt(id_pts: int):
         conn.close()
 
 
+@geodesy_bp.route('/geodesy/usage/<int:id_pts>', methods=['GET'])
+@require_selected_db
+def geopt_usage(id_pts: int):
+    """
+    Which polygons (top/bottom), sections and photograms bind point id_pts.
+    """
+    selected_db = session.get('selected_db')
+    conn = get_request_terrain_connection(selected_db)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(geopt_usage_sql(), (id_pts,) * 4)
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    usage = {kind: [] for kind in GEOPT_USAGE_KINDS}
+    for kind, ref, range_from, range_to in rows:
+        usage[kind].append({"ref": ref, "from": range_from, "to": range_to})
+    return jsonify({"ok": True, "id_pts": id_pts, "usage": usage})
+
+
 @geodesy_bp.route('/geodesy/geojson', methods=['GET'])
 @require_selected_db
 def geopts_geojson():
@@ -457,6 +459,7 @@ def geopts_geojson():
       q=free text
       id_from, id_to
       limit
+      cluster=1 + zoom   one feature per grid cell (count, codes histogram, extent)
     """
     selected_db = session.get('selected_db')
     bbox = _parse_bbox(request.args.get('bbox', ''))
@@ -469,29 +472,42 @@ def geopts_geojson():
     id_to_v = _optional_int_arg('id_to')
     limit = _limit_arg(default=5000, maximum=20000)
     q_like = f"%{q}%" if q else None
+    clustered = (request.args.get('cluster') or '').strip().lower() in ('1', 'true', 'yes')
+    cell_size = _cluster_cell_size(_optional_int_arg('zoom')) if clustered else None
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
-        target_srid = _get_target_srid(conn)
+        version = data_version(conn, selected_db)
+        if version is not None:
+            bbox = snap_bbox(bbox)
+        cache_key = (selected_db, 'geopts', bbox, code, q, id_from_v, id_to_v, limit, cell_size, version)
+        body = get_cached_map_json(cache_key) if version is not None else None
+        if body is not None:
+            return _json_body_response(body)
+
+        target_srid = _get_target_srid(conn, selected_db)
         if target_srid <= 0:
             return jsonify({"type": "FeatureCollection", "features": []})
 
+        params = (
+            bbox[0], bbox[1], bbox[2], bbox[3],
+            target_srid,
+            code, code,
+            q, q_like, q_like,
+            id_from_v, id_from_v,
+            id_to_v, id_to_v,
+        )
         with conn.cursor() as cur:
-            cur.execute(
-                geojson_geopts_bbox_sql(),
-                (
-                    bbox[0], bbox[1], bbox[2], bbox[3],
-                    target_srid,
-                    code, code,
-                    q, q_like, q_like,
-                    id_from_v, id_from_v,
-                    id_to_v, id_to_v,
-                    limit,
-                ),
-            )
+            if clustered:
+                cur.execute(geojson_geopts_clusters_bbox_sql(), params + (cell_size, cell_size, limit))
+            else:
+                cur.execute(geojson_geopts_bbox_sql(), params + (limit,))
             fc = cur.fetchone()[0]
 
-        return jsonify(fc)
+        body = json.dumps(fc, separators=(',', ':'))
+        if version is not None:
+            cache_map_json(cache_key, body)
+        return _json_body_response(body)
 
     except Exception as e:
         logger.exception(f"[{selected_db}] geodesy geojson failed: {e}")
@@ -516,9 +532,17 @@ def polygons_geojson():
 
     limit = _limit_arg(default=2000, maximum=10000)
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
-        target_srid = _get_target_srid(conn)
+        version = data_version(conn, selected_db)
+        if version is not None:
+            bbox = snap_bbox(bbox)
+        cache_key = (selected_db, 'polygons', bbox, limit, version)
+        body = get_cached_map_json(cache_key) if version is not None else None
+        if body is not None:
+            return _json_body_response(body)
+
+        target_srid = _get_target_srid(conn, selected_db)
         if target_srid <= 0:
             return jsonify({"type": "FeatureCollection", "features": []})
 
@@ -529,7 +553,10 @@ def polygons_geojson():
             )
             fc = cur.fetchone()[0]
 
-        return jsonify(fc)
+        body = json.dumps(fc, separators=(',', ':'))
+        if version is not None:
+            cache_map_json(cache_key, body)
+        return _json_body_response(body)
 
     except Exception as e:
         logger.exception(f"[{selected_db}] geodesy polygons geojson failed: {e}")
@@ -542,25 +569,39 @@ def polygons_geojson():
 @require_selected_db
 def photos_geojson():
     """
-    GeoJSON FeatureCollection of photo points (gps_lon/gps_lat) inside bbox (EPSG:4326).
+    GeoJSON FeatureCollection of photo centroids inside bbox (EPSG:4326).
     Query params:
       bbox=minx,miny,maxx,maxy
-      limit
+      zoom   map zoom; below PHOTO_CLUSTER_BELOW_ZOOM photos come as grid
+             clusters (properties: count, extent, id_photo if count == 1)
+      limit  max features, applied after the bbox filter
     """
     selected_db = session.get('selected_db')
     bbox = _parse_bbox(request.args.get('bbox', ''))
     if not bbox:
         return jsonify({"type": "FeatureCollection", "features": []})
 
+    zoom = _optional_int_arg('zoom')
+    clustered = zoom is not None and zoom < PHOTO_CLUSTER_BELOW_ZOOM
     limit = _limit_arg(default=5000, maximum=20000)
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
+        target_srid = _get_target_srid(conn, selected_db)
+        if target_srid <= 0:
+            return jsonify({"type": "FeatureCollection", "features": []})
+
         with conn.cursor() as cur:
-            cur.execute(
-                geojson_photos_bbox_sql(),
-                (bbox[0], bbox[1], bbox[2], bbox[3], limit),
-            )
+            if clustered:
+                cur.execute(
+                    geojson_photo_clusters_bbox_sql(),
+                    (bbox[0], bbox[1], bbox[2], bbox[3], target_srid, PHOTO_CLUSTER_GRID_CELLS, limit),
+                )
+            else:
+                cur.execute(
+                    geojson_photos_bbox_sql(),
+                    (bbox[0], bbox[1], bbox[2], bbox[3], target_srid, limit),
+                )
             fc = cur.fetchone()[0]
 
         return jsonify(fc)
@@ -571,6 +612,49 @@ def photos_geojson():
     finally:
         conn.close()
 
+
+@geodesy_bp.route('/geodesy/tiles/<layer>/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+@require_selected_db
+def geodesy_tile(layer: str, z: int, x: int, y: int):
+    """
+    Mapbox Vector Tile of one map layer (geopts, polygons, sections, photos).
+    The geopts layer accepts the same filters as /geodesy/geojson
+    (code, q, id_from, id_to). An empty body means an empty tile.
+    """
+    if layer not in MVT_LAYERS or not _tile_in_range(z, x, y):
+        abort(404)
+
+    selected_db = session.get('selected_db')
+    tile_sql, max_features = MVT_LAYERS[layer]
+    limit = _limit_arg(default=max_features, maximum=max_features)
+
+    conn = get_request_terrain_connection(selected_db)
+    try:
+        target_srid = _get_target_srid(conn, selected_db)
+        if target_srid <= 0:
+            return Response(b'', mimetype=MVT_MIMETYPE)
+
+        filters = ()
+        if layer == 'geopts':
+            code = (request.args.get('code') or '').strip().upper() or None
+            filters = (code, code) + _geopt_filter_params()
+
+        with conn.cursor() as cur:
+            # sections: DBs without tab_section.geom_line build the lines on the fly
+            sql_text = tile_sql(has_section_lines(cur, selected_db)) if layer == 'sections' else tile_sql()
+            cur.execute(sql_text, (z, x, y, target_srid) + filters + (limit,))
+            row = cur.fetchone()
+
+        tile = bytes(row[0]) if row and row[0] is not None else b''
+        return Response(tile, mimetype=MVT_MIMETYPE)
+
+    except Exception as e:
+        logger.exception(f"[{selected_db}] geodesy {layer} tile {z}/{x}/{y} failed: {e}")
+        return jsonify({"ok": False, "error": str(e)}), 500
+    finally:
+        conn.close()
+
+
 # route for adjusting geodesy map preview extent
 @geodesy_bp.route('/geodesy/extent', methods=['GET'])
 @require_selected_db
@@ -580,7 +664,7 @@ def geopts_extent():
       { ok: True, bbox: [minx, miny, maxx, maxy] }  or bbox: null if no points
     """
     selected_db = session.get('selected_db')
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(geopts_extent_4326_sql())
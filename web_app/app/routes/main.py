@@ -14,7 +14,7 @@ from reportlab.graphics.shapes import Drawing
 
 from config import Config
 from app.logger import logger
-from app.database import get_auth_connection
+from app.database import get_request_auth_connection
 from app.queries import (
     get_user_name_and_last_login,
     get_pg_version,
@@ -78,7 +78,7 @@ def _create_mobile_login_code(user_email: str) -> str:
     token_hash = hashlib.sha256(login_code.encode("ascii")).hexdigest()
     expires_at = datetime.now(timezone.utc) + timedelta(seconds=_mobile_login_grant_seconds())
 
-    conn = get_auth_connection()
+    conn = get_request_auth_connection()
     try:
         create_mobile_login_grant(conn, user_email, token_hash, expires_at)
     finally:
@@ -117,7 +117,7 @@ def index():
     selected_db_bad_checks = None
 
     try:
-        conn = get_auth_connection()
+        conn = get_request_auth_connection()
         cur = conn.cursor()
 
         # User info (including last_login from DB if available)
@@ -221,7 +221,7 @@ def select_db():
 
     conn = None
     try:
-        conn = get_auth_connection()
+        conn = get_request_auth_connection()
         if selected_db not in get_terrain_db_list(conn):
             session.pop("selected_db", None)
             logger.warning(f"Rejected unavailable terrain DB selection: {selected_db}")
@@ -12,7 +12,7 @@ from psycopg2.extras import Json
 
 from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 
 from app.utils import (
     save_to_uploads, cleanup_upload, move_into_place, delete_media_files_checked,
@@ -168,7 +168,7 @@ def photograms():
 
     page, per_page, offset = gallery_page_args(request.args.get("page"))
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(photograms_stats_sql())
             total_cnt, total_bytes, orphan_cnt = cur.fetchone()
@@ -320,7 +320,7 @@ def upload_photograms():
     items = []
     batch_checksums = set()
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
 
     try:
@@ -500,7 +500,7 @@ def bulk_photograms():
         flash("Invalid bulk action.", "danger")
         return redirect(url_for("photograms.photograms"))
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             def _assert_exists(sql: str, value, err: str):
                 cur.execute(sql, (value,))
@@ -573,7 +573,7 @@ def api_detail(id_photogram: str):
     selected_db = session["selected_db"]
     pid = (id_photogram or "").strip()
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(select_photogram_detail_sql(), (pid,))
             row = cur.fetchone()
@@ -652,7 +652,7 @@ def edit_photogram(id_photogram: str):
     replacement_thumb_installed = False
 
     try:
-        with get_terrain_connection(selected_db) as conn:
+        with get_request_terrain_connection(selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(photogram_exists_sql(), (pid,))
                 if not cur.fetchone():
@@ -813,7 +813,7 @@ def delete_photogram(id_photogram: str):
     final_path, thumb_path = _final_paths(selected_db, pid)
 
     try:
-        with get_terrain_connection(selected_db) as conn:
+        with get_request_terrain_connection(selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(delete_photogram_sql(), (pid,))
             conn.commit()
@@ -879,7 +879,7 @@ def _api_search(selected_db: str, sql: str, q: str):
         max_limit=50,
     )
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (f"%{q}%", limit, offset))
             rows = cur.fetchall()
@@ -11,7 +11,7 @@ from psycopg2.extras import Json
 
 from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 
 # SQLs imports from queries
 from app.queries import (
@@ -292,7 +292,7 @@ def photos():
     list_sql = list_photos_sql(where_sql=where_sql, order_sql=order_sql, limit_sql=limit_sql)
     count_sql = count_photos_sql(where_sql=where_sql)
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(stats_basic_sql())
@@ -437,7 +437,7 @@ def upload_photos():
     thumbs_planned: List[Tuple[str, str]] = []  # (final_path, thumb_path) for post-commit thumb generation
     blocks: List[Dict[str, Any]] = []
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
 
     try:
@@ -669,7 +669,7 @@ def serve_photo_thumb(id_photo: str):
 def api_photo_detail(id_photo: str):
     selected_db = session["selected_db"]
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(get_photo_sql(), (id_photo,))
@@ -735,7 +735,7 @@ def edit_photo(id_photo: str):
     find_ids = _parse_int_list(request.form.getlist("ref_find"))
     sample_ids = _parse_int_list(request.form.getlist("ref_sample"))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
     try:
         with conn.cursor() as cur:
@@ -791,7 +791,7 @@ def delete_photo(id_photo: str):
     final_path, thumb_path = _final_paths(selected_db, id_photo)
     legacy_thumb_path = _legacy_photo_thumb_path(selected_db, id_photo)
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
     try:
         with conn.cursor() as cur:
@@ -862,7 +862,7 @@ def bulk_photos():
         flash("No links selected for bulk operation.", "warning")
         return redirect(url_for("photos.photos"))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
     try:
         with conn.cursor() as cur:
@@ -929,7 +929,7 @@ def api_search_authors():
     qtxt, limit, offset = _paginate()
     like = f"%{qtxt}%"
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(search_authors_sql(), (like, limit, offset))
@@ -951,7 +951,7 @@ def api_search_sj():
     qtxt, limit, offset = _paginate()
     like = f"%{qtxt}%"
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(search_sj_sql(), (like, limit, offset))
@@ -973,7 +973,7 @@ def api_search_polygons():
     qtxt, limit, offset = _paginate()
     like = f"%{qtxt}%"
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(search_polygons_sql(), (like, limit, offset))
@@ -995,7 +995,7 @@ def api_search_sections():
     qtxt, limit, offset = _paginate()
     like = f"%{qtxt}%"
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(search_sections_sql(), (like, limit, offset))
@@ -1017,7 +1017,7 @@ def api_search_finds():
     qtxt, limit, offset = _paginate()
     like = f"%{qtxt}%"
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(search_finds_sql(), (like, limit, offset))
@@ -1039,7 +1039,7 @@ def api_search_samples():
     qtxt, limit, offset = _paginate()
     like = f"%{qtxt}%"
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(search_samples_sql(), (like, limit, offset))
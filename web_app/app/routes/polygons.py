@@ -1,21 +1,24 @@
 # app/routes/polygons.py
 # logic for archeological polygons
 
-from io import BytesIO
+import math
 import os
 from datetime import date
 from psycopg2.extras import Json
 import json
-import zipfile
-import shapefile  # pyshp
 
-from flask import Blueprint, request, render_template, redirect, url_for, flash, session, send_file, jsonify
+from flask import Blueprint, Response, request, render_template, redirect, url_for, flash, session, send_file, jsonify
 
 from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.utils.decorators import require_selected_db
-from app.utils.geom_utils import process_polygon_upload
+from app.utils.gis_export import EXPORT_DOWNLOADS, EXPORT_FORMATS, ExportLayer, export_layer
+from app.utils.geom_utils import (
+    bulk_upsert_geopts, has_polygon_closure, process_polygon_upload, rebuild_dirty_polygons, rebuild_polygon_geoms,
+)
+from app.utils.map_cache import cache_map_json, data_version, get_cached_map_json
+from app.utils.srid_cache import get_project_srid
 from app.utils import storage
 from app.utils.validators import validate_extension, validate_mime, sha256_file
 from app.utils.images import detect_mime, make_thumbnail, extract_exif
@@ -24,10 +27,11 @@ from app.utils.images import detect_mime, make_thumbnail, extract_exif
 from app.queries import (
     insert_polygon_manual_sql, delete_bindings_top_sql, delete_bindings_bottom_sql,
     insert_binding_top_sql, insert_binding_bottom_sql, rebuild_geom_sql, select_polygons_with_bindings_sql,
-    srtext_by_srid_sql, get_polygons_list, list_authors_sql, find_geopts_srid_sql, upsert_geopt_sql, 
-    polygon_geoms_geojson_sql, find_polygons_srid_sql, polygons_geojson_top_bottom_sql, srtext_by_srid_sql, get_polygon_parent_sql, reparent_children_sql, delete_polygon_sql,
+    get_polygons_list, list_authors_sql,
+    upsert_polygons_set_sql, delete_bindings_set_sql, insert_bindings_set_sql, rebuild_geoms_set_sql, polygon_upload_results_sql,
+    polygon_geoms_geojson_sql, polygons_geojson_all_sql, get_polygon_parent_sql, reparent_children_sql, delete_polygon_sql,
     polygon_exists_sql, insert_photo_sql, insert_sketch_sql, insert_photogram_sql, link_polygon_photo_sql, link_polygon_sketch_sql, link_polygon_photogram_sql,
-    polygons_geojson_top_bottom_sql, polygons_hierarchy_sql
+    polygons_hierarchy_sql, polygon_subtree_sql, gis_export_polygons_sql
 )
 
 
@@ -40,6 +44,10 @@ MEDIA_DIRS = Config.MEDIA_DIRS  # {"photos": "photos", ...}
 ALLOWED_EXT = Config.ALLOWED_EXTENSIONS
 ALLOWED_MIME = Config.ALLOWED_MIME
 
+# mode=all: zoom range of the simplification and ST_AsGeoJSON's default precision
+POLYGON_GEOJSON_MAX_ZOOM = 24
+POLYGON_GEOJSON_MAX_DIGITS = 9
+
 ALLOWED_ALLOCATIONS = {
     "physical_separation",
     "research_phase",
@@ -72,7 +80,7 @@ def polygons():
     )
 
     # list polygons
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     polys = []
     authors = []
     try:
@@ -168,7 +176,7 @@ def new_polygon_manual():
         if not top_ranges and not bot_ranges:
             raise ValueError("Provide at least one TOP or BOTTOM range of points.")
 
-        conn = get_terrain_connection(selected_db)
+        conn = get_request_terrain_connection(selected_db)
         conn.autocommit = False
         try:
             with conn.cursor() as cur:
@@ -239,7 +247,7 @@ def edit_polygon():
         if not top_ranges and not bot_ranges:
             raise ValueError("Provide at least one TOP or BOTTOM range of points.")
 
-        conn = get_terrain_connection(selected_db)
+        conn = get_request_terrain_connection(selected_db)
         conn.autocommit = False
         try:
             with conn.cursor() as cur:
@@ -309,7 +317,7 @@ def upload_polygons():
 
     epsg_code = int(epsg)
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
 
     try:
@@ -323,59 +331,60 @@ def upload_polygons():
 
         with conn.cursor() as cur:
             # Determine project SRID from tab_geopts.pts_geom typmod (after set_project_srid)
-            cur.execute(find_geopts_srid_sql())
-            target_srid = (cur.fetchone() or [None])[0]
-            if not target_srid or int(target_srid) <= 0:
+            target_srid = get_project_srid(cur, selected_db).srid
+            if target_srid <= 0:
                 # fallback: if typmod SRID is still unknown, we will just "assign" source coords
                 target_srid = epsg_code
 
-            # Choose binding SQL by side
-            if side == "top":
-                delete_bindings_sql = delete_bindings_top_sql()
-                insert_binding_sql = insert_binding_top_sql()
-            else:
-                delete_bindings_sql = delete_bindings_bottom_sql()
-                insert_binding_sql = insert_binding_bottom_sql()
-
-            polygons_done = 0
-            points_done = 0
-            ranges_done = 0
-
-            for polygon_name, data in parsed.items():
-                points = data["points"]
-                ranges = data["ranges"]
+            names = [name for name in parsed if name]
 
-                if not polygon_name:
-                    continue
-
-                # Upsert polygon metadata (allocation is required by DDL)
-                cur.execute(insert_polygon_manual_sql(), (polygon_name, parent_name, allocation, notes))
-
-                # Upsert points into tab_geopts (transform XY from source EPSG to target SRID)
-                for (id_pts, x, y, h, code) in points:
-                    cur.execute(
-                        upsert_geopt_sql(),
-                        (x, y, h, epsg_code, int(target_srid), id_pts, h, code, code, code, None)
-                    )
-                    points_done += 1
+            # 1) polygon metadata in one upsert (allocation is required by DDL)
+            cur.execute(upsert_polygons_set_sql(), (parent_name, allocation, notes, names))
 
+            # 2) ranges of the uploaded side replaced for all polygons at once (idempotent)
+            range_names, range_from, range_to = [], [], []
+            for polygon_name in names:
+                for f_i, t_i in parsed[polygon_name]["ranges"]:
+                    range_names.append(polygon_name)
+                    range_from.append(f_i)
+                    range_to.append(t_i)
+            cur.execute(delete_bindings_set_sql(side), (names,))
+            cur.execute(insert_bindings_set_sql(side), (range_names, range_from, range_to))
+            ranges_done = len(range_names)
+
+        # 3) points COPYed into the staging table and upserted set-based
+        #    (XY transformed from the source EPSG to the project SRID); file
+        #    order is kept, so a point repeated in the file keeps its last row
+        point_rows = [
+            (line_no, id_pts, x, y, h, code, None)
+            for line_no, (id_pts, x, y, h, code) in enumerate(
+                (point for polygon_name in names for point in parsed[polygon_name]["points"]), start=1
+            )
+        ]
+        points_done, _inserted, _updated = bulk_upsert_geopts(conn, [point_rows], epsg_code, int(target_srid))
 
-                # Replace bindings for given side (idempotent)
-                cur.execute(delete_bindings_sql, (polygon_name,))
-                for f_i, t_i in ranges:
-                    cur.execute(insert_binding_sql, (polygon_name, f_i, t_i))
-                    ranges_done += 1
+        with conn.cursor() as cur:
+            # 4) one set-based rebuild of both sides (the pooled parallel
+            #    rebuild would not see this uncommitted transaction)
+            cur.execute(rebuild_geoms_set_sql(), (names, names))
+            cur.execute(polygon_upload_results_sql(), (names,))
+            results = cur.fetchall()
 
-                # Rebuild both geom_top/geom_bottom (function handles missing side gracefully)
-                cur.execute(rebuild_geom_sql(), (polygon_name,))
-                polygons_done += 1
+        polygons_done = len(results)
+        missing = [name for name, has_top, has_bottom in results if not (has_top if side == "top" else has_bottom)]
 
+        # other polygons sharing the uploaded points
+        rebuild_dirty_polygons(conn, selected_db, rebuilt_names=names)
         conn.commit()
         logger.info(
             f"[{selected_db}] upload-polygons: polygons={polygons_done}, points={points_done}, "
-            f"ranges={ranges_done}, source_epsg={epsg_code}, side={side}, target_srid={target_srid}"
+            f"ranges={ranges_done}, without_{side}_geom={len(missing)}, source_epsg={epsg_code}, "
+            f"side={side}, target_srid={target_srid}"
         )
         flash(f"Uploaded {polygons_done} polygon(s); inserted/updated {points_done} point(s).", 'success')
+        if missing:
+            shown = ", ".join(missing[:20]) + (f" (+{len(missing) - 20} more)" if len(missing) > 20 else "")
+            flash(f"No valid {side.upper()} geometry for {len(missing)} polygon(s): {shown}", 'warning')
 
     except Exception as e:
         conn.rollback()
@@ -393,14 +402,37 @@ def upload_polygons():
 
 # making GeoJSON for export to Leaflet (showing geometry in modal window)
 #    mode:
-#      - all:        returns {top:[{name,geojson}], bottom:[...]}
+#      - all:        returns {top:FeatureCollection, bottom:FeatureCollection}
+#                    (zoom=<map zoom> or tolerance=<degrees> simplifies the rings)
 #      - one:        returns {name, top:geojson|null, bottom:geojson|null}
-#      - hierarchy:  returns {nodes:[{name,parent}]}
+#      - hierarchy:  returns {nodes:[{name,parent,depth,descendants,su_count,area}]}
+#      - subtree:    returns {name, nodes:[{name,parent,depth}]} (all polygons below name)
 #
 #    Backward-friendly:
 #      If mode is missing and name is provided -> behaves like mode=one.
 #      If mode is missing and nothing provided -> behaves like mode=all.
 
+def _simplify_params() -> tuple[float, int]:
+    """
+    (tolerance in degrees, maxdecimaldigits) for polygons_geojson_all_sql.
+    zoom=Z simplifies to half a pixel at that zoom and rounds coordinates to
+    what is still visible; tolerance=<degrees> sets the tolerance directly.
+    Neither means full precision.
+    """
+    tolerance = 0.0
+    digits = POLYGON_GEOJSON_MAX_DIGITS
+    zoom = request.args.get('zoom', type=int)
+    if zoom is not None:
+        zoom = min(max(zoom, 0), POLYGON_GEOJSON_MAX_ZOOM)
+        pixel_deg = 360.0 / 2 ** (zoom + 8)
+        tolerance = pixel_deg / 2
+        digits = min(POLYGON_GEOJSON_MAX_DIGITS, max(5, math.ceil(math.log10(1 / pixel_deg)) + 1))
+    explicit = request.args.get('tolerance', type=float)
+    if explicit is not None and math.isfinite(explicit):
+        tolerance = min(max(explicit, 0.0), 1.0)
+    return tolerance, digits
+
+
 @polygons_bp.route('/polygons/geojson', methods=['GET'])
 @require_selected_db
 def polygons_geojson():
@@ -413,14 +445,32 @@ def polygons_geojson():
     if not mode:
         mode = 'one' if name else 'all'
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             if mode == 'hierarchy':
-                cur.execute(polygons_hierarchy_sql())
-                nodes = [{"name": r[0], "parent": r[1]} for r in cur.fetchall()]
+                cur.execute(polygons_hierarchy_sql(has_polygon_closure(cur, selected_db)))
+                nodes = [
+                    {
+                        "name": r[0],
+                        "parent": r[1],
+                        "depth": r[2],
+                        "descendants": r[3],
+                        "su_count": r[4],
+                        "area": float(r[5]) if r[5] is not None else None,
+                    }
+                    for r in cur.fetchall()
+                ]
                 return jsonify({"nodes": nodes})
 
+            if mode == 'subtree':
+                if not name:
+                    return jsonify({"error": "Missing 'name'"}), 400
+
+                cur.execute(polygon_subtree_sql(has_polygon_closure(cur, selected_db)), (name,))
+                nodes = [{"name": r[0], "parent": r[1], "depth": r[2]} for r in cur.fetchall()]
+                return jsonify({"name": name, "nodes": nodes})
+
             if mode == 'one':
                 if not name:
                     return jsonify({"error": "Missing 'name'"}), 400
@@ -442,16 +492,19 @@ def polygons_geojson():
                 return jsonify({"name": row[0], "top": top, "bottom": bottom})
 
             # mode == 'all'
-            cur.execute(polygons_geojson_top_bottom_sql())
-            top_list = []
-            bottom_list = []
-            for polygon_name, top_gj, bottom_gj in cur.fetchall():
-                if top_gj:
-                    top_list.append({"name": polygon_name, "geojson": json.loads(top_gj)})
-                if bottom_gj:
-                    bottom_list.append({"name": polygon_name, "geojson": json.loads(bottom_gj)})
-
-            return jsonify({"top": top_list, "bottom": bottom_list})
+            tolerance, digits = _simplify_params()
+            version = data_version(conn, selected_db)
+            cache_key = (selected_db, 'polygons_all', tolerance, digits, version)
+            body = get_cached_map_json(cache_key) if version is not None else None
+            if body is not None:
+                return Response(body, mimetype='application/json')
+
+            # the body is assembled by Postgres and passed through as text
+            cur.execute(polygons_geojson_all_sql(), (tolerance, digits))
+            body = cur.fetchone()[0]
+            if version is not None:
+                cache_map_json(cache_key, body)
+            return Response(body, mimetype='application/json')
 
     except Exception as e:
         logger.error(f"[{selected_db}] /polygons/geojson error: {e}")
@@ -473,7 +526,7 @@ def delete_polygon():
         flash("Missing polygon name.", "warning")
         return redirect(url_for('polygons.polygons'))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
 
     try:
@@ -520,7 +573,7 @@ def delete_polygon():
 @require_selected_db
 def rebuild_all_polygons():
     selected_db = session.get('selected_db')
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     rebuilt = 0
     try:
         with conn.cursor() as cur:
@@ -528,10 +581,7 @@ def rebuild_all_polygons():
             cur.execute(select_polygons_with_bindings_sql())
             names = [r[0] for r in cur.fetchall()]
 
-            for polygon_name in names:
-                cur.execute(rebuild_geom_sql(), (polygon_name,))
-                rebuilt += 1
-
+        rebuilt = rebuild_polygon_geoms(conn, selected_db, names)
         conn.commit()
         flash(f"Geometry rebuilt for {rebuilt} polygon(s).", "success")
         logger.info(f"[{selected_db}] rebuilt geometry for {rebuilt} polygons.")
@@ -553,80 +603,32 @@ def rebuild_all_polygons():
 @polygons_bp.route('/download-polygons')
 @require_selected_db
 def download_polygons():
+    """TOP/BOTTOM polygons in the project SRID; ?format=shp (zip, default) or gpkg."""
     selected_db = session.get('selected_db')
-    conn = get_terrain_connection(selected_db)
+    fmt = (request.args.get('format') or 'shp').lower()
+    if fmt not in EXPORT_FORMATS:
+        flash('Unsupported export format.', 'warning')
+        return redirect(url_for('polygons.polygons'))
 
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
-            cur.execute(find_polygons_srid_sql())
-            srid_row = cur.fetchone()
-            srid = srid_row[0] if srid_row else None
-
-            prj_wkt = ''
-            if srid:
-                cur.execute(srtext_by_srid_sql(), (srid,))
-                prj_wkt = (cur.fetchone() or [''])[0] or ''
-
-            cur.execute(polygons_geojson_top_bottom_sql())
-            results = cur.fetchall()  # (name, top_gj, bottom_gj)
-
-        # Build SHP in-memory
-        shp_io = BytesIO()
-        shx_io = BytesIO()
-        dbf_io = BytesIO()
-
-        
-        with shapefile.Writer(shp=shp_io, shx=shx_io, dbf=dbf_io, shapeType=shapefile.POLYGON) as shp:
-            shp.field('name', 'C', size=254)
-            shp.field('side', 'C', size=10)  # 'top' | 'bottom'
-
-            for name, top_gj, bottom_gj in results:
-                # helper to write one geojson polygon/multipolygon
-                def _write_geojson(gj_str, side):
-                    if not gj_str:
-                        return
-                    gj = json.loads(gj_str)
-                    gtype = gj.get('type')
-
-                    if gtype == 'Polygon':
-                        polys = [gj['coordinates']]
-                    elif gtype == 'MultiPolygon':
-                        polys = gj['coordinates']
-                    else:
-                        return
-
-                    for rings in polys:
-                        parts = []
-                        for ring in rings:
-                            pts = [(float(x), float(y)) for x, y in ring]
-                            parts.append(pts)
-                        shp.poly(parts)
-                        shp.record(name, side)
-
-                _write_geojson(top_gj, 'top')
-                _write_geojson(bottom_gj, 'bottom')
-
-        # Zip outputs (+ .prj)
-        zip_io = BytesIO()
-        with zipfile.ZipFile(zip_io, 'w') as zipf:
-            base = f"{selected_db}_polygons"
-            zipf.writestr(f"{base}.shp", shp_io.getvalue())
-            zipf.writestr(f"{base}.shx", shx_io.getvalue())
-            zipf.writestr(f"{base}.dbf", dbf_io.getvalue())
-            if prj_wkt:
-                zipf.writestr(f"{base}.prj", prj_wkt)
-
-        zip_io.seek(0)
-        return send_file(
-            zip_io,
-            mimetype='application/zip',
-            download_name=f"{selected_db}_polygons.zip",
-            as_attachment=True
+            # set_project_srid assigns one SRID to all geometry columns
+            project = get_project_srid(cur, selected_db)
+
+        layer = ExportLayer(
+            f"{selected_db}_polygons", 'POLYGON', (('name', 'C'), ('side', 'C')), gis_export_polygons_sql(),
         )
+        output, written = export_layer(conn, layer, fmt, project.srid, project.srtext)
+        conn.rollback()  # end the read transaction of the server-side cursor
+        logger.info(f"[{selected_db}] polygons {fmt} export: features={written}")
+
+        mimetype, ext = EXPORT_DOWNLOADS[fmt]
+        return send_file(output, mimetype=mimetype, download_name=f"{layer.name}.{ext}", as_attachment=True)
 
     except Exception as e:
-        logger.error(f"[{selected_db}] SHP export error: {e}")
-        flash(f'Error while generating SHP: {str(e)}', 'danger')
+        logger.error(f"[{selected_db}] polygons {fmt} export error: {e}")
+        flash(f'Error while generating {fmt.upper()}: {str(e)}', 'danger')
         return redirect(url_for('polygons.polygons'))
     finally:
         try:
@@ -662,7 +664,7 @@ def upload_polygon_media(media_type):
         return redirect(url_for("polygons.polygons"))
 
     # 4) verify polygon exists
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(polygon_exists_sql(), (polygon_name,))
@@ -699,137 +701,158 @@ def upload_polygon_media(media_type):
 
 
     ok, failed = 0, []
+    stored = []
 
-    for f in files:
-        tmp_path = None
-        final_path = None
-        thumb_path = None
-
-        try:
-            # A) temp store
-            tmp_path, tmp_size = storage.save_to_uploads(Config.UPLOAD_FOLDER, f)
-
-            # B) pk + ext validation
-            pk_name = storage.make_pk(selected_db, f.filename)
-            storage.validate_pk(pk_name)
-            ext = pk_name.rsplit(".", 1)[-1].lower()
-            validate_extension(ext, Config.ALLOWED_EXTENSIONS)
-
-            # C) final paths + collision
-            media_dir = Config.MEDIA_DIRS[media_type]
-            final_path, thumb_path = storage.final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
-            if os.path.exists(final_path):
-                raise ValueError(f"File already exists: {pk_name}")
-
-            # D) move into place then MIME validate
-            storage.move_into_place(tmp_path, final_path)
+    conn = get_request_terrain_connection(selected_db)
+    conn.autocommit = False
+    try:
+        for f in files:
             tmp_path = None
+            final_path = None
+            thumb_path = None
 
-            mime = detect_mime(final_path)
-            validate_mime(mime, Config.ALLOWED_MIME)
-            checksum = sha256_file(final_path)
-
-            # thumb best-effort
             try:
-                make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
-            except Exception:
-                pass
+                # A) temp store
+                tmp_path, tmp_size = storage.save_to_uploads(Config.UPLOAD_FOLDER, f)
+
+                # B) pk + ext validation
+                pk_name = storage.make_pk(selected_db, f.filename)
+                storage.validate_pk(pk_name)
+                ext = pk_name.rsplit(".", 1)[-1].lower()
+                validate_extension(ext, Config.ALLOWED_EXTENSIONS)
+
+                # C) final paths + collision
+                media_dir = Config.MEDIA_DIRS[media_type]
+                final_path, thumb_path = storage.final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
+                if os.path.exists(final_path):
+                    raise ValueError(f"File already exists: {pk_name}")
+
+                # D) move into place then MIME validate
+                storage.move_into_place(tmp_path, final_path)
+                tmp_path = None
+
+                mime = detect_mime(final_path)
+                validate_mime(mime, Config.ALLOWED_MIME)
+                checksum = sha256_file(final_path)
+
+                # thumb best-effort
+                try:
+                    make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
+                except Exception:
+                    pass
 
-            # E) EXIF for photos only (JPEG/TIFF)
-            shoot_dt = gps_lat = gps_lon = gps_alt = None
-            exif_json = {}
-            if media_type == "photos" and mime in ("image/jpeg", "image/tiff"):
-                sdt, la, lo, al, exif = extract_exif(final_path)
-                shoot_dt, gps_lat, gps_lon, gps_alt, exif_json = sdt, la, lo, al, exif
+                # E) EXIF for photos only (JPEG/TIFF)
+                shoot_dt = gps_lat = gps_lon = gps_alt = None
+                exif_json = {}
+                if media_type == "photos" and mime in ("image/jpeg", "image/tiff"):
+                    sdt, la, lo, al, exif = extract_exif(final_path)
+                    shoot_dt, gps_lat, gps_lon, gps_alt, exif_json = sdt, la, lo, al, exif
 
-            # F) DB insert + link (commit per file)
-            conn2 = get_terrain_connection(selected_db)
-            cur2 = conn2.cursor()
-            try:
-                if media_type == "photos":
-                    cur2.execute(
-                        insert_photo_sql(),
-                        (
-                            pk_name,
-                            photo_typ or "",
-                            datum,
-                            author,
-                            notes,
-                            mime,
-                            os.path.getsize(final_path),
-                            checksum,
-                            shoot_dt, gps_lat, gps_lon, gps_alt,
-                            Json(exif_json),
+                # F) DB insert + link (savepoint per file, one commit for the batch)
+                cur2 = conn.cursor()
+                try:
+                    cur2.execute("SAVEPOINT polygon_media_file")
+                    if media_type == "photos":
+                        cur2.execute(
+                            insert_photo_sql(),
+                            (
+                                pk_name,
+                                photo_typ or "",
+                                datum,
+                                author,
+                                notes,
+                                mime,
+                                os.path.getsize(final_path),
+                                checksum,
+                                shoot_dt, gps_lat, gps_lon, gps_alt,
+                                Json(exif_json),
+                            )
                         )
-                    )
-                    cur2.execute(link_polygon_photo_sql(), (polygon_name, pk_name))
-
-                elif media_type == "sketches":
-                    cur2.execute(
-                        insert_sketch_sql(),
-                        (
-                            pk_name,
-                            sketch_typ or "",
-                            author,
-                            datum,
-                            notes,
-                            mime,
-                            os.path.getsize(final_path),
-                            checksum,
+                        cur2.execute(link_polygon_photo_sql(), (polygon_name, pk_name))
+
+                    elif media_type == "sketches":
+                        cur2.execute(
+                            insert_sketch_sql(),
+                            (
+                                pk_name,
+                                sketch_typ or "",
+                                author,
+                                datum,
+                                notes,
+                                mime,
+                                os.path.getsize(final_path),
+                                checksum,
+                            )
                         )
-                    )
-                    cur2.execute(link_polygon_sketch_sql(), (polygon_name, pk_name))
-
-                else:  # photograms
-                    cur2.execute(
-                        insert_photogram_sql(),
-                        (
-                            pk_name,
-                            photogram_typ or "",
-                            datum,
-                            ref_sketch,          # ref_sketch
-                            notes,               # notes
-                            mime,                # mime_type
-                            os.path.getsize(final_path),
-                            checksum,
-                            ref_photo_from,      # ref_photo_from
-                            ref_photo_to,        # ref_photo_to
+                        cur2.execute(link_polygon_sketch_sql(), (polygon_name, pk_name))
+
+                    else:  # photograms
+                        cur2.execute(
+                            insert_photogram_sql(),
+                            (
+                                pk_name,
+                                photogram_typ or "",
+                                datum,
+                                ref_sketch,          # ref_sketch
+                                notes,               # notes
+                                mime,                # mime_type
+                                os.path.getsize(final_path),
+                                checksum,
+                                ref_photo_from,      # ref_photo_from
+                                ref_photo_to,        # ref_photo_to
+                            )
                         )
-                    )
-                    cur2.execute(link_polygon_photogram_sql(), (polygon_name, pk_name))
+                        cur2.execute(link_polygon_photogram_sql(), (polygon_name, pk_name))
 
-                conn2.commit()
-                ok += 1
+                    cur2.execute("RELEASE SAVEPOINT polygon_media_file")
+                    stored.append((final_path, thumb_path))
+                    ok += 1
 
-            except Exception:
-                conn2.rollback()
-                # cleanup FS garbage if DB fails
-                try:
-                    storage.delete_media_files(final_path, thumb_path)
                 except Exception:
-                    pass
-                raise
+                    try:
+                        cur2.execute("ROLLBACK TO SAVEPOINT polygon_media_file")
+                    except Exception:
+                        pass
+                    # cleanup FS garbage if DB fails
+                    try:
+                        storage.delete_media_files(final_path, thumb_path)
+                    except Exception:
+                        pass
+                    raise
+
+                finally:
+                    try:
+                        cur2.close()
+                    except Exception:
+                        pass
+
+            except Exception as e:
+                failed.append(f"{f.filename}: {e}")
+                logger.warning(f"[{selected_db}] polygon media upload failed ({media_type}) {f.filename}: {e}")
 
             finally:
-                try:
-                    cur2.close()
-                except Exception:
-                    pass
-                try:
-                    conn2.close()
-                except Exception:
-                    pass
+                if tmp_path:
+                    try:
+                        storage.cleanup_upload(tmp_path)
+                    except Exception:
+                        pass
 
+        try:
+            conn.commit()
         except Exception as e:
-            failed.append(f"{f.filename}: {e}")
-            logger.warning(f"[{selected_db}] polygon media upload failed ({media_type}) {f.filename}: {e}")
-
-        finally:
-            if tmp_path:
+            conn.rollback()
+            for final_path, thumb_path in stored:
                 try:
-                    storage.cleanup_upload(tmp_path)
+                    storage.delete_media_files(final_path, thumb_path)
                 except Exception:
                     pass
+            logger.error(f"[{selected_db}] polygon media upload commit failed ({media_type}): {e}")
+            ok, failed = 0, failed + [f"commit failed: {e}"]
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
     if failed:
         flash(
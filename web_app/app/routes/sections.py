@@ -3,22 +3,22 @@
 
 import os
 from psycopg2.extras import Json
-from io import BytesIO
 import json
-import zipfile
-import shapefile
 
 from flask import Blueprint, request, render_template, redirect, url_for, flash, session, send_file, jsonify
 
 from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.utils.decorators import require_selected_db
 from app.utils import storage
 from app.utils.validators import validate_extension, validate_mime, sha256_file
 from app.utils.images import detect_mime, make_thumbnail, extract_exif
 
 from app.utils.media_map import MEDIA_TABLES, LINK_TABLES_SECTION
+from app.utils.srid_cache import get_project_srid
+from app.utils.geom_utils import has_section_lines
+from app.utils.gis_export import EXPORT_DOWNLOADS, EXPORT_FORMATS, ExportLayer, export_layer
 
 from app.queries import (
     # list page data
@@ -32,11 +32,9 @@ from app.queries import (
     insert_section_geopts_binding_sql,
     delete_section_sj_links_sql,
     insert_section_sj_link_sql,
-    select_sections_with_bindings_sql,
-    section_line_geojson_by_id_sql,
-    find_geopts_srid_sql,
-    srtext_by_srid_sql,
-    sections_lines_geojson_sql,
+    rebuild_section_lines_sql,
+    section_line_counts_sql,
+    gis_export_sections_sql,
     sections_lines_geojson_4326_sql,
 
     # existence
@@ -165,13 +163,13 @@ def sections():
     selected_db = session.get("selected_db")
     open_edit_section_id = request.args.get("edit_section", type=int)
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     sections_rows = []
     authors = []
     sj_ids = []
     try:
         with conn.cursor() as cur:
-            cur.execute(get_sections_list_sql())
+            cur.execute(get_sections_list_sql(has_section_lines(cur, selected_db)))
             sections_rows = []
             for r in cur.fetchall():
                 ranges_from = r[6] if len(r) > 6 and r[6] else []
@@ -245,7 +243,7 @@ def new_section_manual():
 
         sj_ids = _parse_int_list(sj_list_raw)
 
-        conn = get_terrain_connection(selected_db)
+        conn = get_request_terrain_connection(selected_db)
         conn.autocommit = False
         try:
             with conn.cursor() as cur:
@@ -306,7 +304,7 @@ def delete_section():
         flash("Invalid section id.", "warning")
         return redirect(url_for("sections.sections"))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
     try:
         with conn.cursor() as cur:
@@ -334,11 +332,11 @@ def delete_section():
 @require_selected_db
 def sections_geojson():
     selected_db = session.get("selected_db")
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
 
     try:
         with conn.cursor() as cur:
-            cur.execute(sections_lines_geojson_4326_sql())
+            cur.execute(sections_lines_geojson_4326_sql(has_section_lines(cur, selected_db)))
             sections_rows = []
             for id_section, line_gj in cur.fetchall():
                 if not line_gj:
@@ -398,104 +396,116 @@ def upload_section_media(media_type):
         flash(str(ve), "warning")
         return redirect(url_for("sections.sections"))
 
-    # Verify section exists
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
+    conn.autocommit = False
+    ok, failed = 0, []
+    stored = []
+
     try:
+        # Verify section exists
         with conn.cursor() as cur:
             cur.execute(section_exists_sql(), (id_section,))
             if not cur.fetchone():
                 flash(f'Section "{id_section}" not found.', "danger")
                 return redirect(url_for("sections.sections"))
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
-
-    ok, failed = 0, []
 
-    for f in files:
-        tmp_path = None
-        final_path = None
-        thumb_path = None
-
-        try:
-            # 1) temp store
-            tmp_path, _tmp_size = storage.save_to_uploads(Config.UPLOAD_FOLDER, f)
-
-            # 2) PK + extension validation
-            pk_name = storage.make_pk(selected_db, f.filename)
-            storage.validate_pk(pk_name)
-            ext = pk_name.rsplit(".", 1)[-1].lower()
-            validate_extension(ext, ALLOWED_EXT)
-
-            # 3) final paths + collision
-            media_dir = MEDIA_DIRS[media_type]
-            final_path, thumb_path = storage.final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
-            if os.path.exists(final_path):
-                raise ValueError(f"File already exists: {pk_name}")
-
-            # 4) move into place then MIME validate
-            storage.move_into_place(tmp_path, final_path)
+        for f in files:
             tmp_path = None
+            final_path = None
+            thumb_path = None
 
-            mime = detect_mime(final_path)
-            validate_mime(mime, ALLOWED_MIME)
-            checksum = sha256_file(final_path)
-
-            # 5) thumbnail best-effort
             try:
-                make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
-            except Exception:
-                pass
+                # 1) temp store
+                tmp_path, _tmp_size = storage.save_to_uploads(Config.UPLOAD_FOLDER, f)
+
+                # 2) PK + extension validation
+                pk_name = storage.make_pk(selected_db, f.filename)
+                storage.validate_pk(pk_name)
+                ext = pk_name.rsplit(".", 1)[-1].lower()
+                validate_extension(ext, ALLOWED_EXT)
+
+                # 3) final paths + collision
+                media_dir = MEDIA_DIRS[media_type]
+                final_path, thumb_path = storage.final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
+                if os.path.exists(final_path):
+                    raise ValueError(f"File already exists: {pk_name}")
+
+                # 4) move into place then MIME validate
+                storage.move_into_place(tmp_path, final_path)
+                tmp_path = None
+
+                mime = detect_mime(final_path)
+                validate_mime(mime, ALLOWED_MIME)
+                checksum = sha256_file(final_path)
+
+                # 5) thumbnail best-effort
+                try:
+                    make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
+                except Exception:
+                    pass
 
-            # 6) DB insert + link (transaction per file)
-            file_size = os.path.getsize(final_path)
-
-            sql_ins, vals_ins = _build_insert_sql_and_vals(
-                media_type=media_type,
-                pk_name=pk_name,
-                mime=mime,
-                file_size=file_size,
-                checksum=checksum,
-                form=request.form,
-                final_path=final_path,
-            )
+                # 6) DB insert + link (savepoint per file, one commit for the batch)
+                file_size = os.path.getsize(final_path)
+
+                sql_ins, vals_ins = _build_insert_sql_and_vals(
+                    media_type=media_type,
+                    pk_name=pk_name,
+                    mime=mime,
+                    file_size=file_size,
+                    checksum=checksum,
+                    form=request.form,
+                    final_path=final_path,
+                )
 
-            sql_link, _fk_section, _fk_media = _build_link_sql(media_type)
+                sql_link, _fk_section, _fk_media = _build_link_sql(media_type)
 
-            conn2 = get_terrain_connection(selected_db)
-            conn2.autocommit = False
-            try:
-                with conn2.cursor() as cur2:
-                    cur2.execute(sql_ins, vals_ins)
-                    cur2.execute(sql_link, (id_section, pk_name))
-                conn2.commit()
-                ok += 1
-            except Exception:
-                conn2.rollback()
-                # cleanup file if DB failed
                 try:
-                    storage.delete_media_files(final_path, thumb_path)
+                    with conn.cursor() as cur2:
+                        cur2.execute("SAVEPOINT section_media_file")
+                        try:
+                            cur2.execute(sql_ins, vals_ins)
+                            cur2.execute(sql_link, (id_section, pk_name))
+                        except Exception:
+                            cur2.execute("ROLLBACK TO SAVEPOINT section_media_file")
+                            raise
+                        cur2.execute("RELEASE SAVEPOINT section_media_file")
+                    stored.append((final_path, thumb_path))
+                    ok += 1
                 except Exception:
-                    pass
-                raise
+                    # cleanup file if DB failed
+                    try:
+                        storage.delete_media_files(final_path, thumb_path)
+                    except Exception:
+                        pass
+                    raise
+
+            except Exception as e:
+                failed.append(f"{f.filename}: {e}")
+                logger.warning(f"[{selected_db}] section media upload failed ({media_type}) {f.filename}: {e}")
+
             finally:
-                try:
-                    conn2.close()
-                except Exception:
-                    pass
+                if tmp_path:
+                    try:
+                        storage.cleanup_upload(tmp_path)
+                    except Exception:
+                        pass
 
+        try:
+            conn.commit()
         except Exception as e:
-            failed.append(f"{f.filename}: {e}")
-            logger.warning(f"[{selected_db}] section media upload failed ({media_type}) {f.filename}: {e}")
-
-        finally:
-            if tmp_path:
+            conn.rollback()
+            for final_path, thumb_path in stored:
                 try:
-                    storage.cleanup_upload(tmp_path)
+                    storage.delete_media_files(final_path, thumb_path)
                 except Exception:
                     pass
+            logger.error(f"[{selected_db}] section media upload commit failed ({media_type}): {e}")
+            ok, failed = 0, failed + [f"commit failed: {e}"]
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
     if failed:
         flash(
@@ -510,42 +520,39 @@ def upload_section_media(media_type):
 
 
 # -------------------------
-# Geo routines for sections - validation and SHP creation
+# Geo routines for sections - line rebuild and SHP/GPKG export
 # -------------------------
-## Rebuilds Polyline geometry for section/cut. Actualy it only validates while its not stored
+## Recomputes the stored section lines (tab_section.geom_line) in one set-based statement.
+## Triggers keep them current on binding/geopts changes; this is the manual full pass.
+## DBs without the column only get the lines validated, as they are built on read.
 @sections_bp.route("/sections/rebuild-all", methods=["POST"])
 @require_selected_db
 def rebuild_all_sections():
     selected_db = session.get("selected_db")
-    conn = get_terrain_connection(selected_db)
-
-    validated = 0
-    skipped = 0
+    conn = get_request_terrain_connection(selected_db)
 
     try:
         with conn.cursor() as cur:
-            cur.execute(select_sections_with_bindings_sql())
-            ids = [r[0] for r in cur.fetchall()]
-
-            for sid in ids:
-                cur.execute(section_line_geojson_by_id_sql(), (sid,))
-                gj = (cur.fetchone() or [None])[0]
-                if gj:
-                    validated += 1
-                else:
-                    skipped += 1
+            stored = has_section_lines(cur, selected_db)
+            changed = 0
+            if stored:
+                cur.execute(rebuild_section_lines_sql())
+                changed = (cur.fetchone() or [0])[0] or 0
+            cur.execute(section_line_counts_sql(stored))
+            built, skipped = cur.fetchone() or (0, 0)
 
         conn.commit()
+        done = f"Geometry rebuilt for {built} section(s) ({changed} changed)." if stored \
+            else f"Geometry validated for {built} section(s)."
         flash(
-            f"Geometry validated for {validated} section(s). "
-            f"Skipped {skipped} (not enough points).",
-            "success" if validated else "warning",
+            f"{done} Skipped {skipped} (not enough points).",
+            "success" if built else "warning",
         )
-        logger.info(f"[{selected_db}] sections validate: ok={validated} skipped={skipped}")
+        logger.info(f"[{selected_db}] sections rebuild: ok={built} changed={changed} skipped={skipped}")
     except Exception as e:
         conn.rollback()
-        logger.error(f"[{selected_db}] sections rebuild-all/validate error: {e}")
-        flash(f"Error during geometry validation: {e}", "danger")
+        logger.error(f"[{selected_db}] sections rebuild-all error: {e}")
+        flash(f"Error during geometry rebuild: {e}", "danger")
     finally:
         try:
             conn.close()
@@ -554,82 +561,35 @@ def rebuild_all_sections():
 
     return redirect(url_for("sections.sections"))
 
-## This constructs SHP and provide it for donwload
+## Streams the section lines as SHP (zip) or GeoPackage for download
 @sections_bp.route("/download-sections")
 @require_selected_db
 def download_sections():
     selected_db = session.get("selected_db")
-    conn = get_terrain_connection(selected_db)
+    fmt = (request.args.get("format") or "shp").lower()
+    if fmt not in EXPORT_FORMATS:
+        flash("Unsupported export format.", "warning")
+        return redirect(url_for("sections.sections"))
 
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
-            # SRID + PRJ from tab_geopts geometry typmod
-            cur.execute(find_geopts_srid_sql())
-            srid = (cur.fetchone() or [None])[0]
-
-            prj_wkt = ""
-            if srid:
-                cur.execute(srtext_by_srid_sql(), (srid,))
-                prj_wkt = (cur.fetchone() or [""])[0] or ""
+            project = get_project_srid(cur, selected_db)
+            stored = has_section_lines(cur, selected_db)
 
-            # all lines (GeoJSON)
-            cur.execute(sections_lines_geojson_sql())
-            results = cur.fetchall()  # (id_section, line_gj)
-
-        # Build SHP in-memory
-        shp_io = BytesIO()
-        shx_io = BytesIO()
-        dbf_io = BytesIO()
-
-        with shapefile.Writer(shp=shp_io, shx=shx_io, dbf=dbf_io, shapeType=shapefile.POLYLINE) as shp:
-            shp.field("id", "N", decimal=0)
-
-            for sid, line_gj in results:
-                if not line_gj:
-                    continue
-                gj = json.loads(line_gj)
-                gtype = gj.get("type")
-
-                if gtype == "LineString":
-                    coords = gj.get("coordinates") or []
-                    pts = [(float(x), float(y)) for x, y in coords]
-                    if len(pts) < 2:
-                        continue
-                    shp.line([pts])   # one-part polyline
-                    shp.record(int(sid))
-
-                elif gtype == "MultiLineString":
-                    # write each part as a separate shape record with same id
-                    for coords in gj.get("coordinates", []):
-                        pts = [(float(x), float(y)) for x, y in coords]
-                        if len(pts) < 2:
-                            continue
-                        shp.line([pts])
-                        shp.record(int(sid))
-
-                # else: ignore unsupported types silently
-
-        # Zip outputs (+ .prj)
-        zip_io = BytesIO()
-        with zipfile.ZipFile(zip_io, "w") as zipf:
-            base = f"{selected_db}_sections"
-            zipf.writestr(f"{base}.shp", shp_io.getvalue())
-            zipf.writestr(f"{base}.shx", shx_io.getvalue())
-            zipf.writestr(f"{base}.dbf", dbf_io.getvalue())
-            if prj_wkt:
-                zipf.writestr(f"{base}.prj", prj_wkt)
-
-        zip_io.seek(0)
-        return send_file(
-            zip_io,
-            mimetype="application/zip",
-            download_name=f"{selected_db}_sections.zip",
-            as_attachment=True,
+        layer = ExportLayer(
+            f"{selected_db}_sections", "LINESTRING", (("id", "N"),), gis_export_sections_sql(stored)
         )
+        output, written = export_layer(conn, layer, fmt, project.srid, project.srtext)
+        conn.rollback()  # end the read transaction of the server-side cursor
+        logger.info(f"[{selected_db}] sections {fmt} export: features={written}")
+
+        mimetype, ext = EXPORT_DOWNLOADS[fmt]
+        return send_file(output, mimetype=mimetype, download_name=f"{layer.name}.{ext}", as_attachment=True)
 
     except Exception as e:
-        logger.error(f"[{selected_db}] sections SHP export error: {e}")
-        flash(f"Error while generating SHP: {e}", "danger")
+        logger.error(f"[{selected_db}] sections {fmt} export error: {e}")
+        flash(f"Error while generating {fmt.upper()}: {e}", "danger")
         return redirect(url_for("sections.sections"))
     finally:
         try:
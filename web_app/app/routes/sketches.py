@@ -10,7 +10,7 @@ from flask import Blueprint, abort, render_template, request, redirect, url_for,
 
 from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.utils.decorators import require_selected_db
 
 from app.utils import (
@@ -129,7 +129,7 @@ def sketches():
 
     page, per_page, offset = gallery_page_args(request.args.get("page"))
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             # stats
             cur.execute(sketches_stats_sql())
@@ -289,7 +289,7 @@ def upload_sketches():
     items = []
     batch_checksums = set()
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
 
     try:
@@ -478,7 +478,7 @@ def bulk_sketches():
         flash("Invalid bulk action.", "danger")
         return redirect(url_for("sketches.sketches"))
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             for sid in ids:
                 sid = (sid or "").strip()
@@ -545,7 +545,7 @@ def api_detail(id_sketch: str):
     selected_db = session["selected_db"]
     sid = (id_sketch or "").strip()
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(select_sketch_detail_sql(), (sid,))
             row = cur.fetchone()
@@ -613,7 +613,7 @@ def edit_sketch(id_sketch: str):
     replacement_thumb_installed = False
 
     try:
-        with get_terrain_connection(selected_db) as conn:
+        with get_request_terrain_connection(selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(sketch_exists_sql(), (sid,))
                 if not cur.fetchone():
@@ -770,7 +770,7 @@ def delete_sketch(id_sketch: str):
     final_path, thumb_path = _final_paths(selected_db, sid)
 
     try:
-        with get_terrain_connection(selected_db) as conn:
+        with get_request_terrain_connection(selected_db) as conn:
             with conn.cursor() as cur:
                 cur.execute(delete_sketch_sql(), (sid,))
             conn.commit()
@@ -834,7 +834,7 @@ def _api_search(selected_db: str, sql: str, q: str):
         default_limit=20,
         max_limit=50,
     )
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (f"%{q}%", limit, offset))
             rows = cur.fetchall()
@@ -2,18 +2,17 @@
 import os
 import re
 import json
+import glob
+import hashlib
+import tempfile
+import threading
 from datetime import datetime
+from collections import OrderedDict
 from psycopg2.extras import Json
 
+import shutil
 import networkx as nx
-from networkx.algorithms.dag import transitive_reduction
-import matplotlib
-
-matplotlib.use("Agg")  # backend without GUI (no Tk)
-
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from collections import Counter, defaultdict
+from collections import Counter
 
 from flask import (
     Blueprint,
@@ -29,9 +28,12 @@ from flask import (
 
 from config import Config
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.utils.decorators import require_selected_db, float_or_none
 from app.utils.admin import get_hmatrix_dirs
+from app.utils.harris_layout import layered_layout
+from app.utils.harris_render import build_scene, click_areas, render_svg, render_tiles
+from app.utils.stratigraphy_graph import StratigraphyCycleError, StratigraphyIndex, hasse_edges
 
 from app.queries import (
     count_sj_by_type,
@@ -40,6 +42,7 @@ from app.queries import (
     count_sj_without_relation,
     count_total_sj,
     fetch_stratigraphy_relations,
+    get_stratigraphy_relations,
     get_all_sj_with_types,
     get_all_objects,
     get_sj_with_object_refs,
@@ -62,6 +65,8 @@ from app.queries import (
     delete_sj_polygon_links_sql,
     delete_sj_stratigraphy_links_sql,
     insert_sj_stratigraphy_sql,
+    lock_sj_stratigraphy_sql,
+    sj_stratigraphy_stamp_sql,
 )
 
 from app.utils import (
@@ -85,27 +90,117 @@ from app.utils.media_map import MEDIA_TABLES, LINK_TABLES_SJ
 su_bp = Blueprint("su", __name__)
 
 
+# Bump when the graph, layout or drawing changes so cached images are rebuilt.
+HARRIS_CACHE_VERSION = 4
+
+# (dbname, graph hash) -> (graph, label_map, node_type_map, dsu, positions); oldest first
+_HARRIS_GRAPH_CACHE = OrderedDict()
+_HARRIS_GRAPH_CACHE_LOCK = threading.Lock()
+
+
+def _harris_hash(payload):
+    data = json.dumps(payload, separators=(",", ":"), sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _harris_graph_key(rels, all_sj_rows):
+    """Content hash of what the graph and its layout depend on: relations and SU types."""
+    return _harris_hash(
+        {
+            "version": HARRIS_CACHE_VERSION,
+            "rels": sorted((int(a), str(rel or "").strip(), int(b)) for a, rel, b in rels),
+            "sj": sorted((int(row[0]), (row[1] or "").lower()) for row in all_sj_rows),
+        }
+    )
+
+
+def _harris_image_key(graph_key, color_map, draw_objects, obj_rows, sj_obj_rows):
+    """Content hash of the rendered image: graph plus colors and object boxes."""
+    return _harris_hash(
+        {
+            "graph": graph_key,
+            "colors": color_map,
+            "draw_objects": draw_objects,
+            "objects": sorted((int(row[0]), row[1] or "") for row in obj_rows) if draw_objects else [],
+            "sj_objects": sorted(
+                (int(sj_id), int(obj_id)) for sj_id, obj_id in sj_obj_rows if obj_id is not None
+            ) if draw_objects else [],
+        }
+    )
+
+
+def _cached_harris_graph(selected_db, graph_key):
+    with _HARRIS_GRAPH_CACHE_LOCK:
+        entry = _HARRIS_GRAPH_CACHE.get((selected_db, graph_key))
+        if entry is not None:
+            _HARRIS_GRAPH_CACHE.move_to_end((selected_db, graph_key))
+        return entry
+
+
+def _cache_harris_graph(selected_db, graph_key, entry):
+    max_entries = int(getattr(Config, "HARRIS_GRAPH_CACHE_ENTRIES", 8))
+    if max_entries <= 0:
+        return
+    with _HARRIS_GRAPH_CACHE_LOCK:
+        _HARRIS_GRAPH_CACHE[(selected_db, graph_key)] = entry
+        _HARRIS_GRAPH_CACHE.move_to_end((selected_db, graph_key))
+        while len(_HARRIS_GRAPH_CACHE) > max_entries:
+            _HARRIS_GRAPH_CACHE.popitem(last=False)
+
+
+def _cleanup_harris_images(images_dir, selected_db, keep_filename):
+    """Keep the HARRIS_IMAGES_KEEP most recently used images (and their links), delete the rest."""
+    keep = max(1, int(getattr(Config, "HARRIS_IMAGES_KEEP", 5)))
+    prefix = os.path.join(glob.escape(images_dir), glob.escape(selected_db))
+    older = sorted(
+        (
+            path
+            for pattern in (f"{prefix}_*.svg", f"{prefix}_*.png")  # .png: matplotlib era images
+            for path in glob.glob(pattern)
+            if os.path.basename(path) != keep_filename
+        ),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in older[keep - 1:]:
+        name = os.path.basename(path)
+        try:
+            shutil.rmtree(os.path.join(images_dir, _harris_tiles_dirname(name)), ignore_errors=True)
+            for stale in (os.path.join(images_dir, _harris_links_filename(name)), path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        except OSError as exc:
+            logger.warning(f"[{selected_db}] cannot remove old Harris Matrix files of {name}: {exc}")
+
+
 def _harris_links_filename(image_filename):
     return f"{image_filename}.links.json"
 
 
+def _harris_tiles_dirname(image_filename):
+    return f"{image_filename}.tiles"
+
+
 def _load_harris_links(selected_db, image_filename):
+    """Viewer data saved next to an image (size, click areas, tiles), {} when missing."""
     if not image_filename:
-        return []
+        return {}
     images_dir, _ = get_hmatrix_dirs(selected_db)
     path = os.path.join(images_dir, _harris_links_filename(os.path.basename(image_filename)))
     try:
         with open(path, "r", encoding="utf-8") as handle:
             data = json.load(handle)
     except (OSError, json.JSONDecodeError):
-        return []
-    return data.get("areas") or []
+        return {}
+    return data if isinstance(data, dict) else {}
 
 
-def _save_harris_links(images_dir, image_filename, areas):
+def _save_harris_links(images_dir, image_filename, view):
     path = os.path.join(images_dir, _harris_links_filename(image_filename))
-    with open(path, "w", encoding="utf-8") as handle:
-        json.dump({"image": image_filename, "areas": areas}, handle, ensure_ascii=False)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump({"image": image_filename, **view}, handle, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
 
 
 def _date_or_none(value):
@@ -145,6 +240,75 @@ def _su_id_list(value, current_id):
     return ids
 
 
+# dbname -> (stamp, StratigraphyIndex) as of the last committed relation save.
+# A save takes the entry out and puts it back only after its commit, so a
+# failed save never leaves a half-applied index behind.
+_STRATIGRAPHY_INDEXES = {}
+_STRATIGRAPHY_INDEXES_LOCK = threading.Lock()
+
+
+def _stratigraphy_stamp(cur):
+    cur.execute(sj_stratigraphy_stamp_sql())
+    return tuple(int(value) for value in cur.fetchone())
+
+
+def _stratigraphy_index_for_save(cur, selected_db):
+    """
+    Lock the relations for this transaction and return the index of what is
+    stored, reusing the cached one while the table is unchanged. None when the
+    stored relations already contain a cycle (the Harris matrix reports it).
+    """
+    cur.execute(lock_sj_stratigraphy_sql())
+    stamp = _stratigraphy_stamp(cur)
+    with _STRATIGRAPHY_INDEXES_LOCK:
+        cached = _STRATIGRAPHY_INDEXES.pop(selected_db, None)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    cur.execute(get_stratigraphy_relations())
+    rows = []
+    skipped = 0
+    for ref_sj1, relation, ref_sj2 in cur.fetchall():
+        # nullable columns without FKs: legacy rows may be incomplete
+        if ref_sj1 is None or ref_sj2 is None or (relation or "").strip() not in {">", "<", "="}:
+            skipped += 1
+            continue
+        rows.append((ref_sj1, relation, ref_sj2))
+    if skipped:
+        logger.warning(f"[{selected_db}] {skipped} incomplete stratigraphic relation(s) ignored by the cycle check")
+
+    try:
+        return StratigraphyIndex(rows)
+    except StratigraphyCycleError as exc:
+        logger.warning(
+            f"[{selected_db}] stored relations already contain a cycle "
+            f"({_format_stratigraphy_cycle(exc)}), relation saves are not checked"
+        )
+        return None
+
+
+def _check_su_relations(index, sj_id, relations, replace=False):
+    """Apply (relation, related_id) pairs of sj_id to the index; ValueError naming the cycle."""
+    if index is None:
+        return
+    if replace:
+        index.remove_unit(sj_id)
+    for rel, related_id in relations:
+        try:
+            index.add(sj_id, rel, related_id)
+        except StratigraphyCycleError as exc:
+            raise ValueError(
+                f"Relation {sj_id} {rel} {related_id} would close a cycle in stratigraphic relations. "
+                f"Cycle: {_format_stratigraphy_cycle(exc)}"
+            ) from None
+
+
+def _keep_stratigraphy_index(selected_db, stamp, index):
+    if index is not None:
+        with _STRATIGRAPHY_INDEXES_LOCK:
+            _STRATIGRAPHY_INDEXES[selected_db] = (stamp, index)
+
+
 def _su_row_to_dict(row):
     recorded = row[4].isoformat() if row[4] else ""
     return {
@@ -239,7 +403,7 @@ def _save_su_subtype(cur, sj_id, sj_typ, form):
 def add_su():
     selected_db = session["selected_db"]
     open_edit_su_id = request.args.get("edit_su", type=int)
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     cur = conn.cursor()
 
     # values needed for rendering (always)
@@ -417,6 +581,7 @@ def add_su():
                     ("=", request.form.get("equal")),
                 ]
 
+                relations = []
                 for rel, sj_str in relation_inputs:
                     sj_str = (sj_str or "").strip()
                     if not sj_str:
@@ -429,7 +594,11 @@ def add_su():
                             "warning",
                         )
                         continue
+                    relations.append((rel, related_sj))
 
+                stratigraphy_index = _stratigraphy_index_for_save(cur, selected_db)
+                _check_su_relations(stratigraphy_index, id_sj, relations)
+                for rel, related_sj in relations:
                     cur.execute(
                         """
                         INSERT INTO tab_sj_stratigraphy (ref_sj1, relation, ref_sj2)
@@ -437,8 +606,10 @@ def add_su():
                         """,
                         (id_sj, rel, related_sj),
                     )
+                stratigraphy_stamp = _stratigraphy_stamp(cur)
 
                 conn.commit()
+                _keep_stratigraphy_index(selected_db, stratigraphy_stamp, stratigraphy_index)
                 flash(f"SU #{id_sj} has been saved.", "success")
                 logger.info(f"[{selected_db}] SU saved id={id_sj} type={sj_typ}")
 
@@ -492,7 +663,7 @@ def delete_su():
         flash("Invalid SU ID.", "warning")
         return redirect(url_for("su.add_su"))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
 
     try:
@@ -577,7 +748,7 @@ def edit_su():
         flash(f"Invalid SU edit data: {e}", "warning")
         return redirect(url_for("su.add_su"))
 
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     conn.autocommit = False
 
     try:
@@ -615,16 +786,22 @@ def edit_su():
                 for polygon_name in polygon_names:
                     cur.execute(insert_link_sql, (sj_id, polygon_name))
 
+            relations = (
+                [(">", related_id) for related_id in above_ids]
+                + [("<", related_id) for related_id in below_ids]
+                + [("=", related_id) for related_id in equal_ids]
+            )
+            stratigraphy_index = _stratigraphy_index_for_save(cur, selected_db)
+            _check_su_relations(stratigraphy_index, sj_id, relations, replace=True)
+
             cur.execute(delete_sj_stratigraphy_links_sql(), (sj_id, sj_id))
             insert_relation_sql = insert_sj_stratigraphy_sql()
-            for related_id in above_ids:
-                cur.execute(insert_relation_sql, (sj_id, ">", related_id))
-            for related_id in below_ids:
-                cur.execute(insert_relation_sql, (sj_id, "<", related_id))
-            for related_id in equal_ids:
-                cur.execute(insert_relation_sql, (sj_id, "=", related_id))
+            for rel, related_id in relations:
+                cur.execute(insert_relation_sql, (sj_id, rel, related_id))
+            stratigraphy_stamp = _stratigraphy_stamp(cur)
 
         conn.commit()
+        _keep_stratigraphy_index(selected_db, stratigraphy_stamp, stratigraphy_index)
         flash(f"SU #{sj_id} updated.", "success")
         logger.info(f"[{selected_db}] SU updated id={sj_id} type={sj_typ}")
 
@@ -659,139 +836,153 @@ def upload_su_media(sj_id, media_type):
         flash("No files provided.", "warning")
         return redirect(request.referrer or url_for("su.add_su"))
 
-    # verify SU exists (clear error, avoids FS garbage)
-    conn_chk = get_terrain_connection(selected_db)
+    meta_cols = MEDIA_TABLES[media_type]["extra_cols"]
+    ok, failed = 0, []
+    stored = []
+
+    conn = get_request_terrain_connection(selected_db)
+    conn.autocommit = False
     try:
-        with conn_chk.cursor() as cur_chk:
+        # verify SU exists (clear error, avoids FS garbage)
+        with conn.cursor() as cur_chk:
             cur_chk.execute("SELECT 1 FROM tab_sj WHERE id_sj=%s;", (sj_id,))
             if not cur_chk.fetchone():
                 flash(f"SU #{sj_id} not found.", "danger")
                 return redirect(request.referrer or url_for("su.add_su"))
-    finally:
-        try:
-            conn_chk.close()
-        except Exception:
-            pass
-
-    meta_cols = MEDIA_TABLES[media_type]["extra_cols"]
-    ok, failed = 0, []
-
-    for f in files:
-        tmp_path = None
-        final_path = None
-        thumb_path = None
 
-        try:
-            # 1) temporary storing
-            tmp_path, _tmp_size = save_to_uploads(Config.UPLOAD_FOLDER, f)
-
-            # 2) extension / pk
-            pk_name = make_pk(selected_db, f.filename)  # e.g. "456_IMG_25.jpg"
-            validate_pk(pk_name)
-            ext = pk_name.rsplit(".", 1)[-1].lower()
-            validate_extension(ext, Config.ALLOWED_EXTENSIONS)
-
-            # 3) final storage + collision
-            media_dir = Config.MEDIA_DIRS[media_type]
-            final_path, thumb_path = final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
-            if os.path.exists(final_path):
-                raise ValueError(f"File already exists: {pk_name}")
-
-            # 4) move + mime + checksum + thumb
-            move_into_place(tmp_path, final_path)
+        for f in files:
             tmp_path = None
-
-            mime = detect_mime(final_path)
-            validate_mime(mime, Config.ALLOWED_MIME)
-            checksum = sha256_file(final_path)
+            final_path = None
+            thumb_path = None
 
             try:
-                make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
-            except Exception:
-                pass
+                # 1) temporary storing
+                tmp_path, _tmp_size = save_to_uploads(Config.UPLOAD_FOLDER, f)
 
-            # 5) EXIF (only photos JPEG/TIFF)
-            shoot_dt = gps_lat = gps_lon = gps_alt = None
-            exif_json = {}
-            if media_type == "photos" and mime in ("image/jpeg", "image/tiff"):
-                sdt, la, lo, al, exif = extract_exif(final_path)
-                shoot_dt, gps_lat, gps_lon, gps_alt, exif_json = sdt, la, lo, al, exif
+                # 2) extension / pk
+                pk_name = make_pk(selected_db, f.filename)  # e.g. "456_IMG_25.jpg"
+                validate_pk(pk_name)
+                ext = pk_name.rsplit(".", 1)[-1].lower()
+                validate_extension(ext, Config.ALLOWED_EXTENSIONS)
 
-            # 6) insert into tab_<type> + link to tabaid_*
-            t = MEDIA_TABLES[media_type]
-            table, id_col = t["table"], t["id_col"]
-            vals = [request.form.get(k) or None for k in meta_cols]
+                # 3) final storage + collision
+                media_dir = Config.MEDIA_DIRS[media_type]
+                final_path, thumb_path = final_paths(Config.DATA_DIR, selected_db, media_dir, pk_name)
+                if os.path.exists(final_path):
+                    raise ValueError(f"File already exists: {pk_name}")
 
-            conn = get_terrain_connection(selected_db)
-            cur = conn.cursor()
-            try:
-                if media_type == "photos":
-                    cur.execute(
-                        f"""INSERT INTO {table}
-                            ({id_col}, {", ".join(meta_cols)},
-                             mime_type, file_size, checksum_sha256,
-                             shoot_datetime, gps_lat, gps_lon, gps_alt, exif_json)
-                           VALUES (%s, {", ".join(['%s']*len(meta_cols))}, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                        [
-                            pk_name,
-                            *vals,
-                            mime,
-                            os.path.getsize(final_path),
-                            checksum,
-                            shoot_dt,
-                            gps_lat,
-                            gps_lon,
-                            gps_alt,
-                            Json(exif_json),
-                        ],
-                    )
-                else:
-                    cur.execute(
-                        f"""INSERT INTO {table}
-                            ({id_col}, {", ".join(meta_cols)},
-                             mime_type, file_size, checksum_sha256)
-                           VALUES (%s, {", ".join(['%s']*len(meta_cols))}, %s, %s, %s)""",
-                        [pk_name, *vals, mime, os.path.getsize(final_path), checksum],
-                    )
+                # 4) move + mime + checksum + thumb
+                move_into_place(tmp_path, final_path)
+                tmp_path = None
 
-                link = LINK_TABLES_SJ[media_type]
-                cur.execute(
-                    f"INSERT INTO {link['table']} ({link['fk_sj']}, {link['fk_media']}) VALUES (%s, %s)",
-                    (sj_id, pk_name),
-                )
+                mime = detect_mime(final_path)
+                validate_mime(mime, Config.ALLOWED_MIME)
+                checksum = sha256_file(final_path)
 
-                conn.commit()
-                ok += 1
-
-            except Exception:
-                conn.rollback()
-                # cleanup FS garbage if DB fails
                 try:
-                    delete_media_files(final_path, thumb_path)
+                    make_thumbnail(final_path, thumb_path, Config.THUMB_MAX_SIDE)
                 except Exception:
                     pass
-                raise
 
-            finally:
-                try:
-                    cur.close()
-                except Exception:
-                    pass
+                # 5) EXIF (only photos JPEG/TIFF)
+                shoot_dt = gps_lat = gps_lon = gps_alt = None
+                exif_json = {}
+                if media_type == "photos" and mime in ("image/jpeg", "image/tiff"):
+                    sdt, la, lo, al, exif = extract_exif(final_path)
+                    shoot_dt, gps_lat, gps_lon, gps_alt, exif_json = sdt, la, lo, al, exif
+
+                # 6) insert into tab_<type> + link to tabaid_* (savepoint per file, one commit for the batch)
+                t = MEDIA_TABLES[media_type]
+                table, id_col = t["table"], t["id_col"]
+                vals = [request.form.get(k) or None for k in meta_cols]
+
+                cur = conn.cursor()
                 try:
-                    conn.close()
+                    cur.execute("SAVEPOINT su_media_file")
+                    if media_type == "photos":
+                        cur.execute(
+                            f"""INSERT INTO {table}
+                                ({id_col}, {", ".join(meta_cols)},
+                                 mime_type, file_size, checksum_sha256,
+                                 shoot_datetime, gps_lat, gps_lon, gps_alt, exif_json)
+                               VALUES (%s, {", ".join(['%s']*len(meta_cols))}, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                            [
+                                pk_name,
+                                *vals,
+                                mime,
+                                os.path.getsize(final_path),
+                                checksum,
+                                shoot_dt,
+                                gps_lat,
+                                gps_lon,
+                                gps_alt,
+                                Json(exif_json),
+                            ],
+                        )
+                    else:
+                        cur.execute(
+                            f"""INSERT INTO {table}
+                                ({id_col}, {", ".join(meta_cols)},
+                                 mime_type, file_size, checksum_sha256)
+                               VALUES (%s, {", ".join(['%s']*len(meta_cols))}, %s, %s, %s)""",
+                            [pk_name, *vals, mime, os.path.getsize(final_path), checksum],
+                        )
+
+                    link = LINK_TABLES_SJ[media_type]
+                    cur.execute(
+                        f"INSERT INTO {link['table']} ({link['fk_sj']}, {link['fk_media']}) VALUES (%s, %s)",
+                        (sj_id, pk_name),
+                    )
+
+                    cur.execute("RELEASE SAVEPOINT su_media_file")
+                    stored.append((final_path, thumb_path))
+                    ok += 1
+
                 except Exception:
-                    pass
+                    try:
+                        cur.execute("ROLLBACK TO SAVEPOINT su_media_file")
+                    except Exception:
+                        pass
+                    # cleanup FS garbage if DB fails
+                    try:
+                        delete_media_files(final_path, thumb_path)
+                    except Exception:
+                        pass
+                    raise
 
-        except Exception as e:
-            failed.append(f"{f.filename}: {e}")
-            logger.warning(f"[{selected_db}] SU media upload failed ({media_type}) file={f.filename}: {e}")
+                finally:
+                    try:
+                        cur.close()
+                    except Exception:
+                        pass
 
-        finally:
-            if tmp_path:
+            except Exception as e:
+                failed.append(f"{f.filename}: {e}")
+                logger.warning(f"[{selected_db}] SU media upload failed ({media_type}) file={f.filename}: {e}")
+
+            finally:
+                if tmp_path:
+                    try:
+                        cleanup_upload(tmp_path)
+                    except Exception:
+                        pass
+
+        try:
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for final_path, thumb_path in stored:
                 try:
-                    cleanup_upload(tmp_path)
+                    delete_media_files(final_path, thumb_path)
                 except Exception:
                     pass
+            logger.error(f"[{selected_db}] SU media upload commit failed ({media_type}): {e}")
+            ok, failed = 0, failed + [f"commit failed: {e}"]
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
     if failed:
         flash(
@@ -820,7 +1011,7 @@ def unlink_su_media(sj_id, media_type, pk_name):
         return redirect(request.referrer or url_for("su.add_su"))
 
     link = LINK_TABLES_SJ[media_type]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     cur = conn.cursor()
     try:
         cur.execute(
@@ -852,7 +1043,7 @@ def unlink_su_media(sj_id, media_type, pk_name):
 @require_selected_db
 def harrismatrix():
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     cur = conn.cursor()
 
     try:
@@ -879,7 +1070,21 @@ def harrismatrix():
             pass
 
     harris_image = session.get("harrismatrix_image")
-    harris_links = _load_harris_links(selected_db, harris_image)
+    harris_view = _load_harris_links(selected_db, harris_image)
+    if not (harris_image or "").endswith(".svg"):
+        harris_view = {}  # PNG of the matplotlib renderer, regenerate
+    harris_svg = None
+    harris_tiles_base = None
+    if harris_view.get("tiles"):
+        harris_tiles_base = url_for("su.harrismatrix_image", filename=_harris_tiles_dirname(harris_image))
+    elif harris_view:
+        # inline, so the units' data-hmatrix-* attributes are clickable
+        images_dir, _ = get_hmatrix_dirs(selected_db)
+        try:
+            with open(os.path.join(images_dir, os.path.basename(harris_image)), encoding="utf-8") as handle:
+                harris_svg = handle.read()
+        except OSError:
+            harris_view = {}
 
     return render_template(
         "harrismatrix.html",
@@ -889,7 +1094,9 @@ def harrismatrix():
         sj_without_relation=sj_without_relation,
         sj_type_counts=sj_type_counts,
         harris_image=harris_image,
-        harris_links=harris_links,
+        harris_view=harris_view,
+        harris_svg=harris_svg,
+        harris_tiles_base=harris_tiles_base,
     )
 
 
@@ -975,7 +1182,7 @@ def _harris_object_payload(obj, inhum_grave):
 @require_selected_db
 def harrismatrix_su_detail(sj_id):
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         with conn.cursor() as cur:
             cur.execute(harris_su_detail_sql(), (sj_id,))
@@ -994,7 +1201,7 @@ def harrismatrix_su_detail(sj_id):
 @require_selected_db
 def harrismatrix_object_detail(object_id):
     selected_db = session["selected_db"]
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
     try:
         obj = q_get_object_with_sjs(conn, object_id)
         if not obj:
@@ -1049,6 +1256,12 @@ def _format_harris_cycle(cycle, label_map):
     return " -> ".join(label_map.get(node, str(node)) for node in nodes)
 
 
+def _format_stratigraphy_cycle(exc):
+    """Cycle of a StratigraphyIndex error (groups of unit ids) in Harris matrix notation."""
+    label_map = {group: "=".join(str(unit) for unit in group) for group in exc.cycle}
+    return _format_harris_cycle(list(zip(exc.cycle, exc.cycle[1:])), label_map)
+
+
 def _build_harris_matrix_data(rels, all_sj_rows):
     """Build a top-to-bottom Hasse graph from stored SU relations."""
     normalized_rels = []
@@ -1086,9 +1299,7 @@ def _build_harris_matrix_data(rels, all_sj_rows):
         for rep, members in groups.items()
     }
 
-    graph = nx.DiGraph()
-    graph.add_nodes_from(sorted(groups))
-
+    edges = set()
     for a, rel, b in normalized_rels:
         if rel == "=":
             continue
@@ -1098,23 +1309,19 @@ def _build_harris_matrix_data(rels, all_sj_rows):
             continue
 
         if rel == ">":
-            graph.add_edge(u, v)
+            edges.add((u, v))
         else:
-            graph.add_edge(v, u)
+            edges.add((v, u))
 
-    if not nx.is_directed_acyclic_graph(graph):
-        try:
-            cycle = nx.find_cycle(graph, orientation="original")
-        except nx.NetworkXNoCycle:
-            cycle = []
-        detail = _format_harris_cycle(cycle, label_map)
-        message = "A cycle was found in stratigraphic relations."
-        if detail:
-            message = f"{message} Cycle: {detail}"
-        raise ValueError(message)
-
-    hasse_graph = transitive_reduction(graph)
-    hasse_graph.add_nodes_from(graph.nodes)
+    try:
+        hasse = hasse_edges(groups, edges)
+    except StratigraphyCycleError as exc:
+        detail = _format_harris_cycle(list(zip(exc.cycle, exc.cycle[1:])), label_map)
+        raise ValueError(f"{exc} Cycle: {detail}") from None
+
+    hasse_graph = nx.DiGraph()
+    hasse_graph.add_nodes_from(sorted(groups))
+    hasse_graph.add_edges_from(hasse)
 
     return hasse_graph, label_map, node_type_map, dsu
 
@@ -1137,158 +1344,11 @@ def _color_or_default(value, default):
     return default
 
 
-def _harris_levels(graph):
-    levels = {}
-    for node in nx.topological_sort(graph):
-        predecessors = list(graph.predecessors(node))
-        levels[node] = max((levels[pred] + 1 for pred in predecessors), default=0)
-    return levels
-
-
-def _fallback_harris_layout(graph, label_map):
-    if graph.number_of_nodes() == 0:
-        return {}
-
-    levels = _harris_levels(graph)
-    nodes_by_level = defaultdict(list)
-    for node, level in levels.items():
-        nodes_by_level[level].append(node)
-    for nodes in nodes_by_level.values():
-        nodes.sort(key=lambda node: _natural_node_key(node, label_map))
-
-    positions = {}
-    x_spacing = 1.7
-    y_spacing = 1.05
-
-    for level in sorted(nodes_by_level):
-        nodes = nodes_by_level[level]
-        if level == min(nodes_by_level):
-            row_width = len(nodes) - 1
-            assigned = [
-                (node, (index - row_width / 2) * x_spacing)
-                for index, node in enumerate(nodes)
-            ]
-        else:
-            groups_by_parent = defaultdict(list)
-            for node in nodes:
-                parents = tuple(
-                    sorted(
-                        graph.predecessors(node),
-                        key=lambda pred: _natural_node_key(pred, label_map),
-                    )
-                )
-                groups_by_parent[parents].append(node)
-
-            assigned = []
-            for parents, children in sorted(
-                groups_by_parent.items(),
-                key=lambda item: (
-                    _parent_x(item[0], positions),
-                    [_natural_node_key(node, label_map) for node in item[1]],
-                ),
-            ):
-                base_x = _parent_x(parents, positions)
-                width = len(children) - 1
-                for index, node in enumerate(children):
-                    assigned.append((node, base_x + (index - width / 2) * x_spacing))
-
-            assigned = _separate_harris_level(assigned, x_spacing, label_map)
-
-        for node, x in assigned:
-            y = -level * y_spacing
-            positions[node] = (x, y)
-
-    return positions
-
-
-def _parent_x(parents, positions):
-    xs = [positions[parent][0] for parent in parents if parent in positions]
-    if not xs:
-        return 0.0
-    return sum(xs) / len(xs)
-
-
-def _separate_harris_level(assigned, min_spacing, label_map):
-    if len(assigned) < 2:
-        return assigned
-
-    ordered = sorted(
-        assigned,
-        key=lambda item: (item[1], _natural_node_key(item[0], label_map)),
-    )
-    original_center = sum(x for _, x in ordered) / len(ordered)
-    separated = []
-    previous_x = None
-    for node, x in ordered:
-        if previous_x is not None and x < previous_x + min_spacing:
-            x = previous_x + min_spacing
-        separated.append((node, x))
-        previous_x = x
-
-    new_center = sum(x for _, x in separated) / len(separated)
-    shift = original_center - new_center
-    return [(node, x + shift) for node, x in separated]
-
-
-def _graphviz_harris_layout(graph, label_map):
-    if graph.number_of_nodes() == 0:
-        return {}
-
-    dot_graph = nx.DiGraph()
-    dot_graph.graph["graph"] = {
-        "rankdir": "TB",
-        "nodesep": "0.7",
-        "ranksep": "0.55",
-        "splines": "line",
-    }
-    dot_graph.graph["node"] = {
-        "shape": "box",
-        "fixedsize": "true",
-        "width": "0.9",
-        "height": "0.45",
-    }
-
-    for node in graph.nodes:
-        dot_graph.add_node(node, label=label_map.get(node, str(node)))
-    dot_graph.add_edges_from(graph.edges)
-
-    try:
-        raw_positions = nx.drawing.nx_pydot.graphviz_layout(dot_graph, prog="dot")
-    except Exception as exc:
-        logger.info(f"Graphviz Harris layout unavailable, using fallback layout: {exc}")
-        return None
-
-    if len(raw_positions) != graph.number_of_nodes():
-        return None
-
-    xs = [float(point[0]) for point in raw_positions.values()]
-    center_x = (min(xs) + max(xs)) / 2
-    scale = 72.0
-
-    return {
-        node: ((float(point[0]) - center_x) / scale, float(point[1]) / scale)
-        for node, point in raw_positions.items()
-    }
-
-
 def _harris_matrix_layout(graph, label_map):
-    positions = _graphviz_harris_layout(graph, label_map)
-    if positions is not None:
-        return positions
-    return _fallback_harris_layout(graph, label_map)
-
-
-def _harris_figure_size(positions):
-    if not positions:
-        return (6, 4)
-
-    xs = [point[0] for point in positions.values()]
-    ys = [point[1] for point in positions.values()]
-    width = max(xs) - min(xs)
-    height = max(ys) - min(ys)
-    return (
-        min(max(width * 1.6 + 3, 7), 18),
-        min(max(height * 1.3 + 2.5, 5), 24),
+    return layered_layout(
+        graph.nodes,
+        graph.edges,
+        sort_key=lambda node: _natural_node_key(node, label_map),
     )
 
 
@@ -1327,138 +1387,6 @@ def _harris_object_boxes(positions, obj_rows, sj_obj_rows, dsu):
     return boxes
 
 
-def _draw_harris_object_boxes(ax, object_boxes):
-    for box in object_boxes:
-        rect = mpatches.FancyBboxPatch(
-            (box["x0"], box["y0"]),
-            box["x1"] - box["x0"],
-            box["y1"] - box["y0"],
-            boxstyle="round,pad=0.02,rounding_size=0.04",
-            linewidth=1.0,
-            edgecolor="#767676",
-            facecolor="none",
-            alpha=0.55,
-            zorder=0,
-        )
-        ax.add_patch(rect)
-
-        ax.text(
-            box["x1"] - 0.05,
-            box["y1"] - 0.05,
-            box["label"],
-            ha="right",
-            va="top",
-            fontsize=9,
-            color="#333333",
-            zorder=3,
-            bbox=dict(boxstyle="round,pad=0.2", fc="white", ec="none", alpha=0.8),
-        )
-
-
-def _harris_node_box(label, x, y):
-    width = max(0.82, 0.18 * len(label) + 0.48)
-    height = 0.46
-    return x - width / 2, y - height / 2, x + width / 2, y + height / 2
-
-
-def _draw_harris_nodes(ax, positions, label_map, node_type_map, color_map):
-    for node, (x, y) in positions.items():
-        label = label_map.get(node, str(node))
-        x0, y0, x1, y1 = _harris_node_box(label, x, y)
-        node_type = node_type_map.get(node, "")
-
-        rect = mpatches.Rectangle(
-            (x0, y0),
-            x1 - x0,
-            y1 - y0,
-            facecolor=color_map.get(node_type, "#E9E9E9"),
-            edgecolor="#555555",
-            linewidth=0.9,
-            zorder=5,
-        )
-        ax.add_patch(rect)
-        ax.text(
-            x,
-            y,
-            label,
-            ha="center",
-            va="center",
-            fontsize=10,
-            color="#1f1f1f",
-            zorder=6,
-        )
-
-
-def _harris_label_ids(label):
-    ids = []
-    seen = set()
-    for token in re.findall(r"\d+", str(label)):
-        value = int(token)
-        if value not in seen:
-            ids.append(value)
-            seen.add(value)
-    return ids
-
-
-def _pct_bbox(ax, fig, x0, y0, x1, y1):
-    fig_width, fig_height = fig.canvas.get_width_height()
-    p0 = ax.transData.transform((x0, y0))
-    p1 = ax.transData.transform((x1, y1))
-
-    left_px = max(0.0, min(p0[0], p1[0]))
-    right_px = min(float(fig_width), max(p0[0], p1[0]))
-    bottom_px = max(0.0, min(p0[1], p1[1]))
-    top_px = min(float(fig_height), max(p0[1], p1[1]))
-
-    if right_px <= left_px or top_px <= bottom_px:
-        return None
-
-    return {
-        "left": round((left_px / fig_width) * 100, 4),
-        "top": round(((fig_height - top_px) / fig_height) * 100, 4),
-        "width": round(((right_px - left_px) / fig_width) * 100, 4),
-        "height": round(((top_px - bottom_px) / fig_height) * 100, 4),
-    }
-
-
-def _harris_click_areas(ax, fig, positions, label_map, object_boxes):
-    areas = []
-    fig.canvas.draw()
-
-    for node, (x, y) in positions.items():
-        label = label_map.get(node, str(node))
-        bbox = _harris_node_box(label, x, y)
-        pct = _pct_bbox(ax, fig, *bbox)
-        ids = _harris_label_ids(label)
-        if not pct or not ids:
-            continue
-        areas.append(
-            {
-                **pct,
-                "kind": "su",
-                "id": ids[0],
-                "ids": ids,
-                "label": label,
-            }
-        )
-
-    for box in object_boxes:
-        pct = _pct_bbox(ax, fig, box["x0"], box["y0"], box["x1"], box["y1"])
-        if not pct:
-            continue
-        areas.append(
-            {
-                **pct,
-                "kind": "object",
-                "id": box["id"],
-                "ids": [box["id"]],
-                "label": box["label"],
-            }
-        )
-
-    return areas
-
-
 def _save_harris_matrix_image(
     graph,
     positions,
@@ -1471,37 +1399,27 @@ def _save_harris_matrix_image(
     obj_rows=None,
     sj_obj_rows=None,
     dsu=None,
+    tiles_dir=None,
 ):
-    fig, ax = plt.subplots(figsize=_harris_figure_size(positions))
-    fig.patch.set_facecolor("white")
-    ax.set_facecolor("white")
-    ax.axis("off")
-
+    """
+    Write the matrix as SVG to filepath (and a tile pyramid to tiles_dir when
+    given). Returns the viewer data: scene size, click areas, tiles meta.
+    """
     object_boxes = []
     if draw_objects and obj_rows and sj_obj_rows and dsu:
         object_boxes = _harris_object_boxes(positions, obj_rows, sj_obj_rows, dsu)
-        _draw_harris_object_boxes(ax, object_boxes)
 
-    for source, target in graph.edges:
-        x0, y0 = positions[source]
-        x1, y1 = positions[target]
-        ax.plot([x0, x1], [y0, y1], color="#202020", linewidth=1.2, zorder=1)
+    scene = build_scene(positions, graph.edges, label_map, node_type_map, color_map, object_boxes)
+    with open(filepath, "w", encoding="utf-8") as handle:
+        handle.write(render_svg(scene))
 
-    _draw_harris_nodes(ax, positions, label_map, node_type_map, color_map)
-
-    if positions:
-        xs = [point[0] for point in positions.values()]
-        ys = [point[1] for point in positions.values()]
-        ax.set_xlim(min(xs) - 1.0, max(xs) + 1.0)
-        ax.set_ylim(min(ys) - 0.8, max(ys) + 0.8)
-        ax.set_aspect("equal", adjustable="box")
-
-    fig.subplots_adjust(left=0.03, right=0.97, top=0.97, bottom=0.03)
-    click_areas = _harris_click_areas(ax, fig, positions, label_map, object_boxes)
-
-    fig.savefig(filepath, format="png", dpi=180)
-    plt.close(fig)
-    return click_areas
+    tiles = render_tiles(scene, tiles_dir) if tiles_dir else None
+    return {
+        "width": scene["width"],
+        "height": scene["height"],
+        "tiles": tiles,
+        "areas": click_areas(scene),
+    }
 
 
 @su_bp.route("/generate-harrismatrix", methods=["POST"])
@@ -1522,46 +1440,86 @@ def generate_harrismatrix():
 
     conn = None
     try:
-        conn = get_terrain_connection(selected_db)
+        conn = get_request_terrain_connection(selected_db)
 
         rels = fetch_stratigraphy_relations(conn)
         all_sj_rows = get_all_sj_with_types(conn)
-        harris_graph, label_map, node_type_map, dsu = _build_harris_matrix_data(
-            rels,
-            all_sj_rows,
-        )
-
-        if harris_graph.number_of_nodes() == 0:
-            flash("No stratigraphic units found.", "warning")
-            return redirect(url_for("su.harrismatrix"))
-
-        positions = _harris_matrix_layout(harris_graph, label_map)
         obj_rows = []
         sj_obj_rows = []
         if draw_objects:
             obj_rows = get_all_objects(conn)
             sj_obj_rows = get_sj_with_object_refs(conn)
 
+        # images are named by a hash of everything they show, so regenerating
+        # unchanged data just reuses the existing image and click areas
+        graph_key = _harris_graph_key(rels, all_sj_rows)
+        image_key = _harris_image_key(graph_key, color_map, draw_objects, obj_rows, sj_obj_rows)
+        filename = f"{selected_db}_harris_{image_key[:24]}.svg"
         images_dir, _ = get_hmatrix_dirs(selected_db)
-        os.makedirs(images_dir, exist_ok=True)
-        filename = f"{selected_db}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
         filepath = os.path.join(images_dir, filename)
-        click_areas = _save_harris_matrix_image(
-            harris_graph,
-            positions,
-            label_map,
-            node_type_map,
-            color_map,
-            filepath,
-            draw_objects=draw_objects,
-            obj_rows=obj_rows,
-            sj_obj_rows=sj_obj_rows,
-            dsu=dsu,
-        )
+        # the links file is written last, so it marks a complete image
+        if os.path.exists(filepath) and os.path.exists(os.path.join(images_dir, _harris_links_filename(filename))):
+            os.utime(filepath)  # most recently used, survives the cleanup
+            session["harrismatrix_image"] = filename
+            session.pop("harrismatrix_links", None)
+            logger.info(f"[{selected_db}] Harris Matrix unchanged, reusing {filename}")
+            flash("Harris Matrix is up to date.", "success")
+            return redirect(url_for("su.harrismatrix"))
+
+        cached = _cached_harris_graph(selected_db, graph_key)
+        if cached is None:
+            harris_graph, label_map, node_type_map, dsu = _build_harris_matrix_data(
+                rels,
+                all_sj_rows,
+            )
+            positions = _harris_matrix_layout(harris_graph, label_map) if harris_graph.number_of_nodes() else {}
+            cached = (harris_graph, label_map, node_type_map, dsu, positions)
+            _cache_harris_graph(selected_db, graph_key, cached)
+        harris_graph, label_map, node_type_map, dsu, positions = cached
+
+        if harris_graph.number_of_nodes() == 0:
+            flash("No stratigraphic units found.", "warning")
+            return redirect(url_for("su.harrismatrix"))
+
+        # very large matrices also get raster tiles for the Leaflet viewer
+        tiles_min_nodes = int(getattr(Config, "HARRIS_TILES_MIN_NODES", 2000))
+        use_tiles = 0 < tiles_min_nodes <= harris_graph.number_of_nodes()
+
+        os.makedirs(images_dir, exist_ok=True)
+        # render next to the target and rename, so a concurrent request never
+        # serves a half-written image
+        fd, tmp_path = tempfile.mkstemp(suffix=".svg.tmp", dir=images_dir)
+        os.close(fd)
+        tmp_tiles = tempfile.mkdtemp(suffix=".tiles.tmp", dir=images_dir) if use_tiles else None
+        try:
+            view = _save_harris_matrix_image(
+                harris_graph,
+                positions,
+                label_map,
+                node_type_map,
+                color_map,
+                tmp_path,
+                draw_objects=draw_objects,
+                obj_rows=obj_rows,
+                sj_obj_rows=sj_obj_rows,
+                dsu=dsu,
+                tiles_dir=tmp_tiles,
+            )
+            if tmp_tiles:
+                tiles_path = os.path.join(images_dir, _harris_tiles_dirname(filename))
+                shutil.rmtree(tiles_path, ignore_errors=True)
+                os.replace(tmp_tiles, tiles_path)
+            os.replace(tmp_path, filepath)
+            _save_harris_links(images_dir, filename, view)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if tmp_tiles and os.path.exists(tmp_tiles):
+                shutil.rmtree(tmp_tiles, ignore_errors=True)
 
         session["harrismatrix_image"] = filename
         session.pop("harrismatrix_links", None)
-        _save_harris_links(images_dir, filename, click_areas)
+        _cleanup_harris_images(images_dir, selected_db, filename)
         flash("Harris Matrix was generated.", "success")
         return redirect(url_for("su.harrismatrix"))
 
@@ -8,7 +8,7 @@ from werkzeug.utils import secure_filename
 from PIL import Image
 
 from app.logger import logger
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.utils.admin import get_photo_dirs
 from app.utils.decorators import require_selected_db
 
@@ -18,7 +18,7 @@ terr_photo_bp = Blueprint('terr_photo', __name__)
 @require_selected_db
 def upload_foto():
     selected_db = session.get('selected_db')
-    conn = get_terrain_connection(selected_db)
+    conn = get_request_terrain_connection(selected_db)
 
     base_dir, thumb_dir = get_photo_dirs(selected_db)
     os.makedirs(base_dir, exist_ok=True)
@@ -30,6 +30,8 @@
   let modalRows = new Map();
 
   const modalPageSize = 25;
+  // below this zoom the server returns point clusters instead of single points
+  const clusterBelowZoom = 18;
 
   function byId(id) {
     return document.getElementById(id);
@@ -148,19 +150,36 @@
   async function reloadPoints(generation) {
     const bbox = buildBboxParam();
     const f = getFilters();
-    const gj = await fetchGeoJSON(EP.geopts, {
+    const zoom = map.getZoom();
+    const params = {
       bbox,
       code: f.code,
       q: f.q,
       id_from: f.id_from,
       id_to: f.id_to,
       limit: 5000
-    });
+    };
+    if (zoom < clusterBelowZoom) {
+      params.cluster = 1;
+      params.zoom = zoom;
+    }
+    const gj = await fetchGeoJSON(EP.geopts, params);
     if (generation !== reloadGeneration) return;
 
     layerPts = replaceLayer(layerPts, L.geoJSON(gj, {
       pointToLayer: (feature, latlng) => {
-        const code = feature?.properties?.code || "";
+        const p = feature?.properties || {};
+        if (p.codes) {
+          const codes = Object.keys(p.codes);
+          const color = codes.length === 1 ? (codeColors[codes[0]] || "#111111") : "#111111";
+          return L.circleMarker(latlng, {
+            radius: Math.min(5 + 2 * Math.log2(Number(p.count) || 1), 18),
+            weight: 1,
+            fillOpacity: 0.6,
+            color
+          });
+        }
+        const code = p.code || "";
         const color = codeColors[code] || "#111111";
         return L.circleMarker(latlng, {
           radius: 5,
@@ -171,6 +190,19 @@
       },
       onEachFeature: (feature, layer) => {
         const p = feature.properties || {};
+        if (p.codes) {
+          const histogram = Object.entries(p.codes)
+            .map(([code, count]) => `${escapeHtml(code || "-")}: ${escapeHtml(count)}`)
+            .join("<br>");
+          layer.bindTooltip(`<strong>${escapeHtml(p.count)} points</strong><br>${histogram}`);
+          layer.on("click", () => {
+            const e = p.extent;
+            if (Array.isArray(e) && e.length === 4) {
+              map.fitBounds([[e[1], e[0]], [e[3], e[2]]], { maxZoom: clusterBelowZoom });
+            }
+          });
+          return;
+        }
         layer.bindPopup(`
           <div>
             <strong>ID:</strong> ${escapeHtml(p.id_pts)}<br>
@@ -212,22 +244,33 @@
     }
 
     const bbox = buildBboxParam();
-    const gj = await fetchGeoJSON(EP.photos, { bbox, limit: 5000 });
+    const gj = await fetchGeoJSON(EP.photos, { bbox, zoom: map.getZoom(), limit: 5000 });
     if (generation !== reloadGeneration) return;
 
     layerPhotos = replaceLayer(layerPhotos, L.geoJSON(gj, {
-      pointToLayer: (_feature, latlng) => {
+      pointToLayer: (feature, latlng) => {
+        const count = Number(feature?.properties?.count) || 1;
         return L.circleMarker(latlng, {
-          radius: 4,
+          radius: count > 1 ? Math.min(4 + 2 * Math.log2(count), 16) : 4,
           weight: 1,
           fillOpacity: 0.8
         });
       },
       onEachFeature: (feature, layer) => {
         const p = feature?.properties || {};
+        if (Number(p.count) > 1) {
+          layer.bindTooltip(`${escapeHtml(p.count)} photos`);
+          layer.on("click", () => {
+            const e = p.extent;
+            if (Array.isArray(e) && e.length === 4) {
+              map.fitBounds([[e[1], e[0]], [e[3], e[2]]], { maxZoom: map.getZoom() + 3 });
+            }
+          });
+          return;
+        }
         layer.bindPopup(`
-          <strong>Photo:</strong> ${escapeHtml(p.id_foto)}<br>
-          ${escapeHtml(p.file_name)}<br>
+          <strong>Photo:</strong> ${escapeHtml(p.id_photo)}<br>
+          ${escapeHtml(p.photo_typ)} ${escapeHtml(p.datum)}<br>
           alt: ${escapeHtml(p.gps_alt)}
         `);
       }
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import json
 from collections import OrderedDict
 from typing import Any
 
 from flask import url_for
 
-from app.database import get_terrain_connection
+from app.database import get_request_terrain_connection
 from app.logger import logger
+from app.utils.geom_utils import has_polygon_closure
+from app.utils.map_cache import cache_map_json, data_version, get_cached_map_json
 from app.queries import (
     rule_geopts_outside_srid_envelope_sql,
     rule_objects_without_su_sql,
@@ -69,6 +72,10 @@ def _sql_for_exists(sql: str) -> str:
 
 Rule = dict[str, Any]
 
+# "versioned": True marks rules that read only tables bumping tab_data_version
+# (tab_polygons, tab_geopts); their rows are cached per data version.
+# "closure": True marks rules whose sql() takes the has_polygon_closure() flag.
+
 
 RULES: list[Rule] = [
     {
@@ -85,6 +92,8 @@ RULES: list[Rule] = [
         "code": "POLY_OVERLAP",
         "title": "Same-level polygons overlap",
         "sql": rule_polygons_overlap_same_row_sql,
+        "versioned": True,
+        "closure": True,
         "columns": [("side", "Side"), ("polygon_a", "Polygon A"), ("polygon_b", "Polygon B")],
         "links": [("polygon", "polygon_a", "Edit polygon A"), ("polygon", "polygon_b", "Edit polygon B")],
         "module": "polygons.polygons",
@@ -109,6 +118,7 @@ RULES: list[Rule] = [
         "code": "POLY_BOTTOM_OUTSIDE_TOP",
         "title": "Polygon BOTTOM edge lies outside TOP edge",
         "sql": rule_polygons_bottom_outside_top_sql,
+        "versioned": True,
         "columns": [("polygon_name", "Polygon"), ("outside_area", "Outside area")],
         "links": [("polygon", "polygon_name", "Edit polygon")],
         "module": "polygons.polygons",
@@ -217,6 +227,7 @@ RULES: list[Rule] = [
         "code": "GEOPT_OUTSIDE_ENVELOPE",
         "title": "Geodetic points outside SRID envelope",
         "sql": rule_geopts_outside_srid_envelope_sql,
+        "versioned": True,
         "columns": [
             ("id_pts", "Point"),
             ("x", "X"),
@@ -257,11 +268,49 @@ def _module_link(rule: Rule) -> dict[str, str] | None:
     return {"label": "Open module", "url": url_for(endpoint)}
 
 
+def _rule_sql(cur, selected_db: str, rule: Rule) -> tuple[str, tuple]:
+    """(sql, cache key part) of a rule."""
+    if rule.get("closure"):
+        closure = has_polygon_closure(cur, selected_db)
+        return rule["sql"](closure), (closure,)
+    return rule["sql"](), ()
+
+
+def _rule_rows(cur, selected_db: str, rule: Rule, version) -> list:
+    sql, variant = _rule_sql(cur, selected_db, rule)
+    if not (rule.get("versioned") and version):
+        cur.execute(sql)
+        return cur.fetchall()
+
+    key = (selected_db, "analyze", rule["code"]) + variant + version
+    cached = get_cached_map_json(key)
+    if cached is not None:
+        return [tuple(row) for row in json.loads(cached)]
+    cur.execute(sql)
+    rows = cur.fetchall()
+    cache_map_json(key, json.dumps(rows, default=str))
+    return rows
+
+
+def _run_rule(cur, check):
+    # every rule runs in its own savepoint: all rules share one transaction,
+    # and a failing one must not abort the rest
+    cur.execute("SAVEPOINT analyze_rule;")
+    try:
+        result = check()
+    except Exception:
+        cur.execute("ROLLBACK TO SAVEPOINT analyze_rule;")
+        raise
+    cur.execute("RELEASE SAVEPOINT analyze_rule;")
+    return result
+
+
 def run_analyze_checks(selected_db: str) -> dict[str, Any]:
     grouped: OrderedDict[str, dict[str, Any]] = OrderedDict()
     flat_results = []
 
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
+        version = data_version(conn, selected_db)
         with conn.cursor() as cur:
             for rule in RULES:
                 result = {
@@ -275,8 +324,7 @@ def run_analyze_checks(selected_db: str) -> dict[str, Any]:
                 }
 
                 try:
-                    cur.execute(rule["sql"]())
-                    rows = cur.fetchall()
+                    rows = _run_rule(cur, lambda: _rule_rows(cur, selected_db, rule, version))
                     result["count"] = len(rows)
                     result["issues"] = [_build_issue(rule, row) for row in rows]
                     result["module_link"] = _module_link(rule)
@@ -304,14 +352,24 @@ def run_analyze_checks(selected_db: str) -> dict[str, Any]:
     }
 
 
+def _rule_found(cur, selected_db: str, rule: Rule, version) -> bool:
+    if rule.get("versioned") and version:
+        # full rows, so the analyze page reuses them
+        return bool(_rule_rows(cur, selected_db, rule, version))
+    sql, _variant = _rule_sql(cur, selected_db, rule)
+    cur.execute(f"SELECT EXISTS ({_sql_for_exists(sql)})")
+    return bool(cur.fetchone()[0])
+
+
 def count_bad_checks(selected_db: str) -> int:
     bad = 0
-    with get_terrain_connection(selected_db) as conn:
+    with get_request_terrain_connection(selected_db) as conn:
+        version = data_version(conn, selected_db)
         with conn.cursor() as cur:
             for rule in RULES:
                 try:
-                    cur.execute(f"SELECT EXISTS ({_sql_for_exists(rule['sql']())})")
-                    if bool(cur.fetchone()[0]):
+                    found = _run_rule(cur, lambda: _rule_found(cur, selected_db, rule, version))
+                    if found:
                         bad += 1
                 except Exception as e:
                     bad += 1
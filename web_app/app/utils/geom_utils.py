@@ -3,6 +3,7 @@
 
 #imports from standard library
 from typing import Optional, Union
+from concurrent.futures import ThreadPoolExecutor
 import re
 import io, csv
 import psycopg2
@@ -11,9 +12,20 @@ from psycopg2 import sql, errors
 from app.logger import logger
 from app.database import get_terrain_connection
 from app.logger import logger
+from app.utils.srid_cache import invalidate_project_srid
+from config import Config
 from app.queries import (
     detect_db_srid_typmods_sql,
     epsg_exists_in_spatial_ref_sys_sql,
+    rebuild_geoms_set_sql,
+    dirty_polygon_tracking_exists_sql,
+    polygon_closure_exists_sql,
+    section_lines_exist_sql,
+    rebuild_dirty_polygon_geoms_sql,
+    clear_dirty_polygons_sql,
+    create_geopts_import_stage_sql,
+    copy_geopts_import_stage_sql,
+    upsert_geopts_from_stage_sql,
 )
 
 # After new DB creation we have no SRID assigned. This function sets
@@ -50,6 +62,7 @@ def update_geometry_srid(dbname: str, target_srid: int, schema: Optional[str] =
         logger.error(f"Error while updating SRID in DB '{dbname}': {e}")
         raise
     finally:
+        invalidate_project_srid(dbname)
         try:
             conn.close()
         except Exception:
@@ -102,6 +115,142 @@ def epsg_exists_in_template_spatial_ref_sys(epsg_int: int) -> bool:
             pass
 
 
+def _rebuild_polygon_chunk(dbname: str, polygon_names: list) -> int:
+    conn = get_terrain_connection(dbname)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(rebuild_geoms_set_sql(), (polygon_names, polygon_names))
+            rebuilt = cur.rowcount
+        conn.commit()
+        return rebuilt
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def rebuild_polygon_geoms(conn, dbname: str, polygon_names: list) -> int:
+    """
+    Rebuild geom_top/geom_bottom of the given polygons with the set-based
+    rebuild_geoms_set_sql. Returns the number of rebuilt polygons.
+
+    Up to POLYGON_REBUILD_PARALLEL_MIN names this is one UPDATE on ``conn``
+    and the caller commits. Longer lists are split across
+    POLYGON_REBUILD_WORKERS pooled connections (at most the pool size minus
+    the caller's connection); every chunk commits on its own, so after a
+    failure the other chunks stay rebuilt - the rebuild is idempotent, just
+    run it again.
+    """
+    if not polygon_names:
+        return 0
+
+    workers = int(getattr(Config, "POLYGON_REBUILD_WORKERS", 1))
+    workers = min(workers, int(getattr(Config, "DB_POOL_MAX_PER_DB", 4)) - 1, len(polygon_names))
+    if workers <= 1 or len(polygon_names) < int(getattr(Config, "POLYGON_REBUILD_PARALLEL_MIN", 500)):
+        with conn.cursor() as cur:
+            cur.execute(rebuild_geoms_set_sql(), (polygon_names, polygon_names))
+            return cur.rowcount
+
+    chunks = [polygon_names[i::workers] for i in range(workers)]
+    logger.info(f"[{dbname}] rebuilding {len(polygon_names)} polygons with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="polygon-rebuild") as pool:
+        return sum(pool.map(lambda chunk: _rebuild_polygon_chunk(dbname, chunk), chunks))
+
+
+# dbname -> True once the DB is known to have the dirty tracking functions
+_DIRTY_TRACKING_DBS = {}
+# dbname -> True once the DB is known to have tab_polygon_closure
+_POLYGON_CLOSURE_DBS = {}
+
+
+def has_polygon_closure(cur, dbname: str) -> bool:
+    """
+    True when the terrain DB has tab_polygon_closure (migration
+    20261017_polygon_closure). Queries reading the polygon hierarchy take the
+    result as their ``closure`` flag and walk parent_name recursively without it.
+    """
+    if _POLYGON_CLOSURE_DBS.get(dbname):
+        return True
+    cur.execute(polygon_closure_exists_sql())
+    row = cur.fetchone()
+    if not (row and row[0]):
+        return False
+    _POLYGON_CLOSURE_DBS[dbname] = True
+    return True
+
+
+_SECTION_LINES_DBS = {}
+
+
+def has_section_lines(cur, dbname: str) -> bool:
+    """
+    True when tab_section has the stored geom_line (migration
+    20261017_section_geom_line). Queries reading section lines take the
+    result as their ``stored`` flag and build the lines on the fly without it.
+    """
+    if _SECTION_LINES_DBS.get(dbname):
+        return True
+    cur.execute(section_lines_exist_sql())
+    row = cur.fetchone()
+    if not (row and row[0]):
+        return False
+    _SECTION_LINES_DBS[dbname] = True
+    return True
+
+
+def rebuild_dirty_polygons(conn, dbname: str, rebuilt_names: list | None = None) -> int:
+    """
+    Rebuild the polygons whose TOP/BOTTOM ranges cover points changed in the
+    current transaction (marked by the tab_geopts triggers). Call it before
+    committing a geopts change; DBs without the migration are skipped.
+    Polygons in ``rebuilt_names`` were already rebuilt by the caller, their
+    marks are just dropped.
+    """
+    with conn.cursor() as cur:
+        if not _DIRTY_TRACKING_DBS.get(dbname):
+            cur.execute(dirty_polygon_tracking_exists_sql())
+            row = cur.fetchone()
+            if not (row and row[0]):
+                return 0
+            _DIRTY_TRACKING_DBS[dbname] = True
+
+        if rebuilt_names:
+            cur.execute(clear_dirty_polygons_sql(), (list(rebuilt_names),))
+        cur.execute(rebuild_dirty_polygon_geoms_sql(), (None,))
+        row = cur.fetchone()
+    rebuilt = int(row[0]) if row and row[0] else 0
+    if rebuilt:
+        logger.info(f"[{dbname}] rebuilt geometry of {rebuilt} polygon(s) with changed points")
+    return rebuilt
+
+
+def bulk_upsert_geopts(conn, row_batches, src_epsg: int, target_srid: int) -> tuple[int, int, int]:
+    """
+    COPY batches of (line_no, id_pts, x, y, h, code, notes) rows into a temp
+    staging table and upsert them into tab_geopts with one set-based
+    statement. Returns (staged, inserted, updated).
+    """
+    staged = 0
+    with conn.cursor() as cur:
+        cur.execute(create_geopts_import_stage_sql())
+        for rows in row_batches:
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator="\n").writerows(rows)
+            buf.seek(0)
+            cur.copy_expert(copy_geopts_import_stage_sql(), buf)
+            staged += len(rows)
+
+        if not staged:
+            return 0, 0, 0
+        cur.execute(upsert_geopts_from_stage_sql(), (src_epsg, target_srid))
+        inserted, updated = cur.fetchone() or (0, 0)
+    return staged, int(inserted or 0), int(updated or 0)
+
+
 def _compress_consecutive_ids(ids):
     """Given sorted unique ids [1,2,3,7,8] -> [(1,3),(7,8)]"""
     if not ids:
@@ -0,0 +1,332 @@
+# Streaming GIS export of map layers as zipped Shapefile or GeoPackage.
+#
+# Geometries are read as WKB in the project SRID through a server-side cursor
+# (FETCH_ROWS rows at a time) and written feature by feature into temporary
+# files; the finished zip / .gpkg is returned as a SpooledTemporaryFile, so
+# memory use depends on the batch size, not on the project size.
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import zipfile
+from typing import Iterator, NamedTuple
+
+import shapefile
+
+from config import Config
+
+EXPORT_FORMATS = ("shp", "gpkg")
+# format -> (mimetype, file extension of the download)
+EXPORT_DOWNLOADS = {
+    "shp": ("application/zip", "zip"),
+    "gpkg": ("application/geopackage+sqlite3", "gpkg"),
+}
+FETCH_ROWS = 2000
+DEFAULT_SPOOL_BYTES = 8 * 1024 * 1024
+
+# WKB base type -> name (ISO: +1000 for Z; EWKB: 0x80000000 flag)
+_WKB_TYPES = {
+    1: "POINT",
+    2: "LINESTRING",
+    3: "POLYGON",
+    4: "MULTIPOINT",
+    5: "MULTILINESTRING",
+    6: "MULTIPOLYGON",
+}
+_SHP_TYPES = {
+    "POINT": shapefile.POINTZ,
+    "LINESTRING": shapefile.POLYLINE,
+    "POLYGON": shapefile.POLYGON,
+}
+_GPKG_COLUMN_TYPES = {"C": "TEXT", "N": "INTEGER", "F": "REAL"}
+
+
+class ExportLayer(NamedTuple):
+    name: str  # file / table name
+    geometry_type: str  # POINT | LINESTRING | POLYGON (multi parts are split for SHP)
+    # (name, dbf type) with dbf type C (text), N (integer) or F (float);
+    # the query returns these columns followed by the WKB geometry
+    fields: tuple[tuple[str, str], ...]
+    sql: str
+    params: tuple = ()
+
+
+def _spool_bytes() -> int:
+    return int(getattr(Config, "GIS_EXPORT_SPOOL_BYTES", DEFAULT_SPOOL_BYTES))
+
+
+# -------------------------
+# WKB
+# -------------------------
+def _read_wkb(data: bytes, offset: int = 0):
+    """Parse one WKB geometry; returns ((type name, parts), next offset).
+
+    parts: POINT (x, y, z), LINESTRING [points], POLYGON [rings],
+    MULTI* [parts of the single type].
+    """
+    endian = "<" if data[offset] == 1 else ">"
+    (raw_type,) = struct.unpack_from(endian + "I", data, offset + 1)
+    offset += 5
+    has_z = bool(raw_type & 0x80000000) or (raw_type & 0xFFFF) // 1000 in (1, 3)
+    has_m = bool(raw_type & 0x40000000) or (raw_type & 0xFFFF) // 1000 in (2, 3)
+    if raw_type & 0x20000000:  # EWKB SRID
+        offset += 4
+    base = _WKB_TYPES.get((raw_type & 0xFFFF) % 1000)
+    if base is None:
+        raise ValueError(f"Unsupported WKB geometry type {raw_type}.")
+
+    dims = 2 + has_z + has_m
+    point_fmt = endian + "d" * dims
+
+    def points(count, at):
+        coords = []
+        for _ in range(count):
+            values = struct.unpack_from(point_fmt, data, at)
+            coords.append((values[0], values[1], values[2] if has_z else 0.0))
+            at += 8 * dims
+        return coords, at
+
+    if base == "POINT":
+        values = struct.unpack_from(point_fmt, data, offset)
+        return (base, (values[0], values[1], values[2] if has_z else 0.0)), offset + 8 * dims
+    (count,) = struct.unpack_from(endian + "I", data, offset)
+    offset += 4
+    if base == "LINESTRING":
+        coords, offset = points(count, offset)
+        return (base, coords), offset
+    if base == "POLYGON":
+        rings = []
+        for _ in range(count):
+            (ring_count,) = struct.unpack_from(endian + "I", data, offset)
+            ring, offset = points(ring_count, offset + 4)
+            rings.append(ring)
+        return (base, rings), offset
+
+    members = []
+    for _ in range(count):
+        (_member_type, parts), offset = _read_wkb(data, offset)
+        members.append(parts)
+    return (base, members), offset
+
+
+def _single_parts(geometry_type: str, wkb: bytes) -> list:
+    """Parts of a (multi) geometry as single geometries of geometry_type."""
+    (kind, parts), _ = _read_wkb(bytes(wkb))
+    if kind == geometry_type:
+        return [parts]
+    if kind == "MULTI" + geometry_type:
+        return parts
+    return []
+
+
+def _envelope(geometry_type: str, parts: list) -> tuple[float, float, float, float] | None:
+    xs, ys = [], []
+    for part in parts:
+        if geometry_type == "POINT":
+            coords = [part]
+        elif geometry_type == "POLYGON":
+            coords = [pt for ring in part for pt in ring]
+        else:
+            coords = part
+        xs.extend(pt[0] for pt in coords)
+        ys.extend(pt[1] for pt in coords)
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+# -------------------------
+# reading
+# -------------------------
+def iter_layer_rows(conn, layer: ExportLayer, itersize: int = FETCH_ROWS) -> Iterator[tuple]:
+    """Rows of the layer query from a server-side cursor (needs a transaction)."""
+    with conn.cursor(name=f"gis_export_{layer.name}") as cur:
+        cur.itersize = itersize
+        cur.execute(layer.sql, layer.params)
+        for row in cur:
+            if row[-1] is not None:
+                yield row
+
+
+# -------------------------
+# writers
+# -------------------------
+def _write_shapefile_zip(rows, layer: ExportLayer, srtext: str, out) -> int:
+    spool = _spool_bytes()
+    shp_io = tempfile.SpooledTemporaryFile(max_size=spool)
+    shx_io = tempfile.SpooledTemporaryFile(max_size=spool)
+    dbf_io = tempfile.SpooledTemporaryFile(max_size=spool)
+    written = 0
+    try:
+        writer = shapefile.Writer(shp=shp_io, shx=shx_io, dbf=dbf_io, shapeType=_SHP_TYPES[layer.geometry_type])
+        for name, dbf_type in layer.fields:
+            if dbf_type == "C":
+                writer.field(name, "C", size=254)
+            elif dbf_type == "F":
+                writer.field(name, "F", size=19, decimal=6)
+            else:
+                writer.field(name, "N", size=18, decimal=0)
+
+        for row in rows:
+            for part in _single_parts(layer.geometry_type, row[-1]):
+                if layer.geometry_type == "POINT":
+                    writer.pointz(*part)
+                elif layer.geometry_type == "POLYGON":
+                    writer.poly([[(x, y) for x, y, _z in ring] for ring in part])
+                else:
+                    if len(part) < 2:
+                        continue
+                    writer.line([[(x, y) for x, y, _z in part]])
+                writer.record(*row[:-1])
+                written += 1
+        writer.close()
+
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zipf:
+            for ext, part_io in (("shp", shp_io), ("shx", shx_io), ("dbf", dbf_io)):
+                part_io.seek(0)
+                with zipf.open(f"{layer.name}.{ext}", "w") as target:
+                    shutil.copyfileobj(part_io, target)
+            if srtext:
+                zipf.writestr(f"{layer.name}.prj", srtext)
+    finally:
+        shp_io.close()
+        shx_io.close()
+        dbf_io.close()
+    return written
+
+
+def _gpkg_header(srid: int, envelope) -> bytes:
+    if envelope is None:
+        return b"GP" + struct.pack("<BBi", 0, 0x01, srid)
+    # flags: little endian header, envelope [minx, maxx, miny, maxy]
+    minx, miny, maxx, maxy = envelope
+    return b"GP" + struct.pack("<BBi4d", 0, 0x03, srid, minx, maxx, miny, maxy)
+
+
+def _write_geopackage(rows, layer: ExportLayer, srid: int, srtext: str, path: str) -> int:
+    # no project SRID yet: the seeded 'Undefined cartesian SRS' row
+    srs_id = srid if srid > 0 else -1
+    db = sqlite3.connect(path)
+    written = 0
+    extent = None
+    try:
+        db.executescript(
+            """
+            PRAGMA application_id = 1196444487;  -- 'GPKG'
+            PRAGMA user_version = 10300;
+            CREATE TABLE gpkg_spatial_ref_sys (
+              srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL,
+              organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT
+            );
+            CREATE TABLE gpkg_contents (
+              table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+              description TEXT DEFAULT '',
+              last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+              min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE,
+              srs_id INTEGER REFERENCES gpkg_spatial_ref_sys(srs_id)
+            );
+            CREATE TABLE gpkg_geometry_columns (
+              table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL,
+              srs_id INTEGER NOT NULL REFERENCES gpkg_spatial_ref_sys(srs_id), z TINYINT NOT NULL, m TINYINT NOT NULL,
+              PRIMARY KEY (table_name, column_name),
+              FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name)
+            );
+            INSERT INTO gpkg_spatial_ref_sys VALUES
+              ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', NULL),
+              ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', NULL);
+            """
+        )
+        if srs_id != 4326:
+            db.execute(
+                "INSERT INTO gpkg_spatial_ref_sys VALUES ('WGS 84 geodetic', 4326, 'EPSG', 4326, ?, NULL)",
+                ('GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],'
+                 'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433]]',),
+            )
+        if srs_id > 0:
+            db.execute(
+                "INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, 'EPSG', ?, ?, NULL)",
+                (f"EPSG:{srs_id}", srs_id, srs_id, srtext or "undefined"),
+            )
+
+        columns = "".join(f', "{name}" {_GPKG_COLUMN_TYPES[dbf_type]}' for name, dbf_type in layer.fields)
+        db.execute(f'CREATE TABLE "{layer.name}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom {layer.geometry_type}{columns})')
+        db.execute(
+            "INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', ?, ?, 1, 0)",
+            (layer.name, layer.geometry_type, srs_id),
+        )
+        names = "".join(f', "{name}"' for name, _dbf_type in layer.fields)
+        insert = f'INSERT INTO "{layer.name}" (geom{names}) VALUES (?{", ?" * len(layer.fields)})'
+
+        for row in rows:
+            # multi geometries are split into single parts like in the Shapefile export
+            for part in _single_parts(layer.geometry_type, row[-1]):
+                envelope = _envelope(layer.geometry_type, [part])
+                blob = _gpkg_header(srs_id, envelope) + _to_wkb(layer.geometry_type, part)
+                db.execute(insert, (blob,) + tuple(row[:-1]))
+                written += 1
+                if envelope:
+                    extent = envelope if extent is None else (
+                        min(extent[0], envelope[0]), min(extent[1], envelope[1]),
+                        max(extent[2], envelope[2]), max(extent[3], envelope[3]),
+                    )
+
+        db.execute(
+            "INSERT INTO gpkg_contents (table_name, data_type, identifier, min_x, min_y, max_x, max_y, srs_id) "
+            "VALUES (?, 'features', ?, ?, ?, ?, ?, ?)",
+            (layer.name, layer.name) + (extent or (None, None, None, None)) + (srs_id,),
+        )
+        db.commit()
+    finally:
+        db.close()
+    return written
+
+
+def _to_wkb(geometry_type: str, part) -> bytes:
+    """ISO WKB (little endian, Z) of a single part returned by _read_wkb."""
+    code = {"POINT": 1001, "LINESTRING": 1002, "POLYGON": 1003}[geometry_type]
+    out = [struct.pack("<BI", 1, code)]
+
+    def coords(points):
+        out.append(struct.pack("<I", len(points)))
+        out.extend(struct.pack("<3d", *pt) for pt in points)
+
+    if geometry_type == "POINT":
+        out.append(struct.pack("<3d", *part))
+    elif geometry_type == "LINESTRING":
+        coords(part)
+    else:
+        out.append(struct.pack("<I", len(part)))
+        for ring in part:
+            coords(ring)
+    return b"".join(out)
+
+
+def export_layer(conn, layer: ExportLayer, fmt: str, srid: int, srtext: str):
+    """
+    Export one layer; returns (file object positioned at 0, feature count).
+    fmt 'shp' gives a zip with .shp/.shx/.dbf(/.prj), 'gpkg' a GeoPackage.
+    The caller sends and closes the file.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    rows = iter_layer_rows(conn, layer)
+    out = tempfile.SpooledTemporaryFile(max_size=_spool_bytes())
+    try:
+        if fmt == "shp":
+            written = _write_shapefile_zip(rows, layer, srtext, out)
+        else:
+            # SQLite needs a real file; it is copied into the spooled output
+            with tempfile.TemporaryDirectory(prefix="gpkg_export_") as tmp_dir:
+                path = os.path.join(tmp_dir, f"{layer.name}.gpkg")
+                written = _write_geopackage(rows, layer, srid, srtext, path)
+                with open(path, "rb") as gpkg:
+                    shutil.copyfileobj(gpkg, out)
+        out.seek(0)
+        return out, written
+    except Exception:
+        out.close()
+        raise
@@ -0,0 +1,257 @@
+# Layered (Sugiyama style) layout of Harris matrix graphs, computed in process.
+#
+# 1. Ranks: longest path from the top, then units without anything above them
+#    are pulled down next to their highest child, so they don't hang from the
+#    top row with long edges.
+# 2. Edges spanning several ranks get one dummy node per crossed rank. Long
+#    edges only get EDGE_STUB_RANKS dummies below their upper and above their
+#    lower end: that keeps room next to the units they join, and the dummy
+#    count stays linear in the edge count however deep the sequence is.
+# 3. Crossing reduction: alternating down/up sweeps order every rank by the
+#    median position of its neighbours in the previous rank; the ordering with
+#    the fewest crossings is kept.
+# 4. X coordinates: alternating up/down passes move every node towards the
+#    mean of its neighbours in the previous rank; each rank is then placed as
+#    close to those targets as its order and the minimum spacing allow
+#    (isotonic regression, pool adjacent violators), exact and linear per rank.
+#
+# Nodes are plain integers/strings (hashable and sortable by sort_key); the
+# result maps every node to (x, y) with y = -rank * y_spacing and x centred
+# on 0, the same units the Harris matrix renderer already uses. Ties are
+# always broken by sort_key, so the same graph gives the same layout.
+#
+# Timings on synthetic 10k unit sequences: tests/bench_harris_layout.py.
+from __future__ import annotations
+
+from bisect import bisect_right, insort
+from typing import Callable, Hashable, Iterable
+
+X_SPACING = 1.7
+Y_SPACING = 1.05
+DUMMY_WIDTH = 0.3  # fraction of a unit box reserved for an edge passing a rank
+EDGE_STUB_RANKS = 2  # dummies kept at each end of an edge crossing more ranks
+SWEEPS = 8  # down+up sweep pairs of the crossing reduction
+PLACEMENT_PASSES = 4
+
+
+def _ranks(count, succ, pred):
+    indeg = [len(parents) for parents in pred]
+    order = [v for v in range(count) if indeg[v] == 0]
+    for v in order:  # grows while iterating: Kahn's algorithm
+        for w in succ[v]:
+            indeg[w] -= 1
+            if indeg[w] == 0:
+                order.append(w)
+    if len(order) != count:
+        raise ValueError("Harris matrix layout needs an acyclic graph.")
+
+    rank = [0] * count
+    for v in order:
+        for w in succ[v]:
+            if rank[w] <= rank[v]:
+                rank[w] = rank[v] + 1
+
+    for v in reversed(order):
+        if not pred[v] and succ[v]:
+            rank[v] = min(rank[w] for w in succ[v]) - 1
+    return rank
+
+
+def _median(values):
+    values.sort()
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2
+
+
+def _sweep(layers, pos, neighbours, indices):
+    for r in indices:
+        layer = layers[r]
+        keys = {}
+        for v in layer:
+            adjacent = neighbours[v]
+            if len(adjacent) == 1:  # most vertices, dummies always
+                keys[v] = (pos[adjacent[0]], pos[v])
+            elif adjacent:
+                keys[v] = (_median([pos[w] for w in adjacent]), pos[v])
+            else:
+                keys[v] = (pos[v], pos[v])
+        layer.sort(key=keys.__getitem__)
+        for index, v in enumerate(layer):
+            pos[v] = index
+
+
+def _crossings(layers, pos, down):
+    total = 0
+    for layer in layers[:-1]:
+        ends = sorted((pos[v], pos[w]) for v in layer for w in down[v])
+        seen = []
+        for _start, end in ends:
+            total += len(seen) - bisect_right(seen, end)
+            insort(seen, end)
+    return total
+
+
+def _order(layers, pos, up, down):
+    best = [list(layer) for layer in layers]
+    best_crossings = _crossings(layers, pos, down)
+    downward = range(1, len(layers))
+    upward = range(len(layers) - 2, -1, -1)
+    stale = 0
+    for _ in range(SWEEPS):
+        if best_crossings == 0 or stale >= 2:
+            break
+        _sweep(layers, pos, up, downward)
+        _sweep(layers, pos, down, upward)
+        crossings = _crossings(layers, pos, down)
+        if crossings < best_crossings:
+            best = [list(layer) for layer in layers]
+            best_crossings = crossings
+            stale = 0
+        else:
+            stale += 1
+
+    for layer in best:
+        for index, v in enumerate(layer):
+            pos[v] = index
+    return best
+
+
+def _fit(targets, gaps):
+    """Positions closest (least squares) to targets keeping order and gaps."""
+    # shift every target by the minimum offset of its slot; what is left is a
+    # plain isotonic regression, solved by pooling adjacent violators
+    offsets = []
+    offset = 0.0
+    for gap in gaps:
+        offset += gap
+        offsets.append(offset)
+    blocks = []  # [mean, weight]
+    for target, offset in zip(targets, offsets):
+        mean, weight = target - offset, 1
+        while blocks and blocks[-1][0] >= mean:
+            prev_mean, prev_weight = blocks.pop()
+            mean = (prev_mean * prev_weight + mean * weight) / (prev_weight + weight)
+            weight += prev_weight
+        blocks.append([mean, weight])
+
+    fitted = []
+    for mean, weight in blocks:
+        fitted.extend([mean] * weight)
+    return [value + offset for value, offset in zip(fitted, offsets)]
+
+
+def _place(layers, up, down, widths, x_spacing):
+    gaps_by_layer = []
+    x = [0.0] * len(widths)
+    for layer in layers:
+        gaps = [0.0]
+        gaps.extend(
+            x_spacing * (widths[a] + widths[b]) / 2
+            for a, b in zip(layer, layer[1:])
+        )
+        gaps_by_layer.append(gaps)
+        for v, value in zip(layer, _fit([0.0] * len(layer), gaps)):
+            x[v] = value
+
+    def relax(indices, neighbours):
+        for r in indices:
+            layer = layers[r]
+            targets = []
+            for v in layer:
+                adjacent = neighbours(v)
+                if len(adjacent) == 1:
+                    targets.append(x[adjacent[0]])
+                elif adjacent:
+                    targets.append(sum([x[w] for w in adjacent]) / len(adjacent))
+                else:
+                    targets.append(x[v])
+            for v, value in zip(layer, _fit(targets, gaps_by_layer[r])):
+                x[v] = value
+
+    downward = range(1, len(layers))
+    upward = range(len(layers) - 2, -1, -1)
+    # the last pass goes down, so chains hang straight below their parents
+    for _ in range(PLACEMENT_PASSES):
+        relax(upward, lambda v: down[v])
+        relax(downward, lambda v: up[v])
+    return x
+
+
+def layered_layout(
+    nodes: Iterable[Hashable],
+    edges: Iterable[tuple[Hashable, Hashable]],
+    sort_key: Callable | None = None,
+    x_spacing: float = X_SPACING,
+    y_spacing: float = Y_SPACING,
+) -> dict:
+    """
+    Top-down layered layout of a DAG (edge u -> v puts u above v).
+
+    Returns {node: (x, y)}. Raises ValueError when the graph has a cycle.
+    """
+    key = sort_key or (lambda node: node)
+    node_list = sorted(set(nodes), key=key)
+    if not node_list:
+        return {}
+
+    count = len(node_list)
+    index = {node: i for i, node in enumerate(node_list)}
+    succ = [[] for _ in range(count)]
+    pred = [[] for _ in range(count)]
+    for u, v in sorted({(index[u], index[v]) for u, v in edges}):
+        succ[u].append(v)
+        pred[v].append(u)
+
+    rank = _ranks(count, succ, pred)
+
+    # vertices 0..count-1 are the nodes, the rest are dummies; a dummy sorts
+    # right after the node its edge starts from
+    up = [[] for _ in range(count)]
+    down = [[] for _ in range(count)]
+    widths = [1.0] * count
+    initial = list(range(count))
+    for u in range(count):
+        for v in succ[u]:
+            crossed = list(range(rank[u] + 1, rank[v]))
+            if len(crossed) > 2 * EDGE_STUB_RANKS:
+                # None breaks the chain: the stub below u and the one above v
+                crossed = crossed[:EDGE_STUB_RANKS] + [None] + crossed[-EDGE_STUB_RANKS:]
+            previous = u
+            for r in crossed:
+                if r is None:
+                    previous = None
+                    continue
+                dummy = len(up)
+                up.append([] if previous is None else [previous])
+                down.append([])
+                widths.append(DUMMY_WIDTH)
+                initial.append(u + 0.5)
+                rank.append(r)
+                if previous is not None:
+                    down[previous].append(dummy)
+                previous = dummy
+            down[previous].append(v)
+            up[v].append(previous)
+
+    top = min(rank)
+    layers = [[] for _ in range(max(rank) - top + 1)]
+    for v in range(len(up)):
+        layers[rank[v] - top].append(v)
+
+    pos = [0] * len(up)
+    for layer in layers:
+        layer.sort(key=initial.__getitem__)
+        for i, v in enumerate(layer):
+            pos[v] = i
+
+    layers = _order(layers, pos, up, down)
+    x = _place(layers, up, down, widths, x_spacing)
+
+    xs = [x[v] for v in range(count)]
+    center = (min(xs) + max(xs)) / 2
+    return {
+        node: (xs[i] - center, -(rank[i] - top) * y_spacing)
+        for i, node in enumerate(node_list)
+    }
@@ -0,0 +1,336 @@
+# Harris matrix rendering without matplotlib: an SVG document plus, for very
+# large matrices, a raster tile pyramid for the Leaflet viewer.
+#
+# Layout units (harris_layout) are scaled to PX_PER_UNIT scene pixels and the
+# y axis is flipped, so the scene is a plain top-down pixel space shared by
+# the SVG (viewBox), the tiles (full resolution at the highest zoom) and the
+# click areas. Every unit and object is an SVG group whose id and data-hmatrix-*
+# attributes identify it, so the page needs no separate hotspot overlay.
+#
+# Tiles are drawn one full-width row at a time at the highest zoom (only the
+# items crossing that row); every two rows are halved into a row of the zoom
+# below right away, so the full-size image never exists in memory and no tile
+# is read back. Tiles nothing was drawn on are not written.
+from __future__ import annotations
+
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image, ImageDraw, ImageFont
+
+PX_PER_UNIT = 72.0
+MARGIN = 0.8  # layout units around the drawing
+TILE_SIZE = 256
+TILE_WORKERS = 4  # PNG encoding releases the GIL
+FONT_SIZE = 13
+OBJECT_FONT_SIZE = 12
+
+NODE_STROKE = "#555555"
+NODE_TEXT = "#1f1f1f"
+EDGE_COLOR = "#202020"
+OBJECT_STROKE = "#767676"
+OBJECT_TEXT = "#333333"
+DEFAULT_FILL = "#E9E9E9"
+
+
+def node_box(label, x, y):
+    """(x0, y0, x1, y1) of a unit box around a layout position, in layout units."""
+    width = max(0.82, 0.18 * len(label) + 0.48)
+    height = 0.46
+    return x - width / 2, y - height / 2, x + width / 2, y + height / 2
+
+
+def label_ids(label):
+    """SU ids of a node label such as '12=14'."""
+    ids = []
+    seen = set()
+    for token in re.findall(r"\d+", str(label)):
+        value = int(token)
+        if value not in seen:
+            ids.append(value)
+            seen.add(value)
+    return ids
+
+
+def build_scene(positions, edges, label_map, node_type_map, color_map, object_boxes=()):
+    """
+    Everything to draw, in scene pixels (origin top left).
+
+    object_boxes are dicts with id, label and x0/y0/x1/y1 in layout units.
+    Returns a dict with width, height, nodes, edges and objects.
+    """
+    boxes = {}
+    for node, (x, y) in positions.items():
+        label = label_map.get(node, str(node))
+        boxes[node] = (label, node_box(label, x, y))
+
+    extents = [box for _label, box in boxes.values()]
+    extents.extend((box["x0"], box["y0"], box["x1"], box["y1"]) for box in object_boxes)
+    if not extents:
+        return {"width": 0, "height": 0, "nodes": [], "edges": [], "objects": []}
+
+    left = min(box[0] for box in extents) - MARGIN
+    top = max(box[3] for box in extents) + MARGIN
+    width = (max(box[2] for box in extents) + MARGIN - left) * PX_PER_UNIT
+    height = (top - min(box[1] for box in extents) + MARGIN) * PX_PER_UNIT
+
+    def px(x, y):
+        return round((x - left) * PX_PER_UNIT, 1), round((top - y) * PX_PER_UNIT, 1)
+
+    def rect(x0, y0, x1, y1):
+        # layout y grows upwards, scene y downwards
+        (px0, py0), (px1, py1) = px(x0, y1), px(x1, y0)
+        return px0, py0, px1, py1
+
+    nodes = []
+    for node, (label, box) in boxes.items():
+        nodes.append(
+            {
+                "id": node,
+                "label": label,
+                "ids": label_ids(label),
+                "fill": color_map.get(node_type_map.get(node, ""), DEFAULT_FILL),
+                "box": rect(*box),
+            }
+        )
+
+    objects = [
+        {
+            "id": int(box["id"]),
+            "label": box["label"],
+            "box": rect(box["x0"], box["y0"], box["x1"], box["y1"]),
+        }
+        for box in object_boxes
+    ]
+
+    lines = [
+        (*px(*positions[source]), *px(*positions[target]))
+        for source, target in edges
+        if source in positions and target in positions
+    ]
+
+    return {
+        "width": math.ceil(width),
+        "height": math.ceil(height),
+        "nodes": nodes,
+        "edges": lines,
+        "objects": objects,
+    }
+
+
+def click_areas(scene):
+    """Clickable units and objects in scene pixels (used by the tile viewer)."""
+    areas = []
+    for node in scene["nodes"]:
+        if not node["ids"]:
+            continue
+        x0, y0, x1, y1 = node["box"]
+        areas.append(
+            {
+                "kind": "su",
+                "id": node["ids"][0],
+                "ids": node["ids"],
+                "label": node["label"],
+                "x": x0,
+                "y": y0,
+                "width": round(x1 - x0, 1),
+                "height": round(y1 - y0, 1),
+            }
+        )
+    for obj in scene["objects"]:
+        x0, y0, x1, y1 = obj["box"]
+        areas.append(
+            {
+                "kind": "object",
+                "id": obj["id"],
+                "ids": [obj["id"]],
+                "label": obj["label"],
+                "x": x0,
+                "y": y0,
+                "width": round(x1 - x0, 1),
+                "height": round(y1 - y0, 1),
+            }
+        )
+    return areas
+
+
+def _num(value):
+    return f"{value:g}"
+
+
+def _data_attrs(kind, entity_id, ids, label):
+    return (
+        f' data-hmatrix-kind="{kind}" data-hmatrix-id="{entity_id}"'
+        f' data-hmatrix-ids="{",".join(str(value) for value in ids)}"'
+        f" data-hmatrix-label={quoteattr(label)}"
+    )
+
+
+def render_svg(scene):
+    """Standalone SVG document of a scene."""
+    width, height = scene["width"], scene["height"]
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" class="hmatrix-svg" width="{width}" height="{height}"'
+        f' viewBox="0 0 {width} {height}" font-family="DejaVu Sans, Arial, sans-serif">',
+        '<rect width="100%" height="100%" fill="#ffffff"/>',
+    ]
+
+    if scene["objects"]:
+        parts.append(f'<g class="hmatrix-objects" font-size="{OBJECT_FONT_SIZE}">')
+        for obj in scene["objects"]:
+            x0, y0, x1, y1 = obj["box"]
+            parts.append(
+                f'<g id="hmatrix-object-{obj["id"]}" class="hmatrix-object"'
+                f'{_data_attrs("object", obj["id"], [obj["id"]], obj["label"])}>'
+                f'<rect x="{_num(x0)}" y="{_num(y0)}" width="{_num(x1 - x0)}" height="{_num(y1 - y0)}"'
+                f' rx="3" fill="none" stroke="{OBJECT_STROKE}" stroke-opacity="0.55"/>'
+                f'<text x="{_num(x1 - 4)}" y="{_num(y0 + 4)}" text-anchor="end" dominant-baseline="hanging"'
+                f' fill="{OBJECT_TEXT}">{escape(obj["label"])}</text></g>'
+            )
+        parts.append("</g>")
+
+    if scene["edges"]:
+        path = "".join(
+            f"M{_num(x0)} {_num(y0)}L{_num(x1)} {_num(y1)}" for x0, y0, x1, y1 in scene["edges"]
+        )
+        parts.append(f'<path class="hmatrix-edges" d="{path}" fill="none" stroke="{EDGE_COLOR}" stroke-width="1.2"/>')
+
+    parts.append(
+        f'<g class="hmatrix-units" font-size="{FONT_SIZE}" text-anchor="middle"'
+        f' dominant-baseline="central" fill="{NODE_TEXT}">'
+    )
+    for node in scene["nodes"]:
+        x0, y0, x1, y1 = node["box"]
+        attrs = _data_attrs("su", node["ids"][0], node["ids"], node["label"]) if node["ids"] else ""
+        parts.append(
+            f'<g id="hmatrix-su-{escape(str(node["id"]))}" class="hmatrix-su"{attrs}>'
+            f'<rect x="{_num(x0)}" y="{_num(y0)}" width="{_num(x1 - x0)}" height="{_num(y1 - y0)}"'
+            f' fill="{node["fill"]}" stroke="{NODE_STROKE}" stroke-width="0.9"/>'
+            f'<text x="{_num((x0 + x1) / 2)}" y="{_num((y0 + y1) / 2)}">{escape(node["label"])}</text></g>'
+        )
+    parts.append("</g></svg>")
+    return "\n".join(parts)
+
+
+def _font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _draw_items(scene):
+    """(x0, y0, x1, y1, draw(draw, dy)) per scene item, in drawing order."""
+    font = _font(FONT_SIZE)
+    object_font = _font(OBJECT_FONT_SIZE)
+    items = []
+
+    for obj in scene["objects"]:
+        x0, y0, x1, y1 = obj["box"]
+
+        def draw_object(draw, dy, x0=x0, y0=y0, x1=x1, y1=y1, label=obj["label"]):
+            # OBJECT_STROKE at the SVG's 0.55 opacity on white
+            draw.rounded_rectangle((x0, y0 + dy, x1, y1 + dy), radius=3, outline="#adadad")
+            draw.text((x1 - 4, y0 + 4 + dy), label, fill=OBJECT_TEXT, font=object_font, anchor="ra")
+
+        items.append((x0, y0, x1, y1, draw_object))
+
+    for x0, y0, x1, y1 in scene["edges"]:
+        def draw_edge(draw, dy, x0=x0, y0=y0, x1=x1, y1=y1):
+            draw.line((x0, y0 + dy, x1, y1 + dy), fill=EDGE_COLOR, width=1)
+
+        items.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1), draw_edge))
+
+    for node in scene["nodes"]:
+        x0, y0, x1, y1 = node["box"]
+
+        def draw_node(draw, dy, x0=x0, y0=y0, x1=x1, y1=y1, node=node):
+            draw.rectangle((x0, y0 + dy, x1, y1 + dy), fill=node["fill"], outline=NODE_STROKE)
+            draw.text(((x0 + x1) / 2, (y0 + y1) / 2 + dy), node["label"], fill=NODE_TEXT, font=font, anchor="mm")
+
+        items.append((x0, y0, x1, y1, draw_node))
+
+    return items
+
+
+class _Pyramid:
+    """
+    Receives full-width rows of tiles of the highest zoom, top to bottom, and
+    writes them out; every two rows of a zoom are halved into one row of the
+    zoom below as soon as both exist, so only one pending row per zoom is kept.
+    """
+
+    def __init__(self, tiles_dir, max_zoom, columns, rows, tile_size, pool):
+        self.tiles_dir = tiles_dir
+        self.pool = pool
+        self.tile_size = tile_size
+        self.levels = {}  # zoom -> (columns, rows)
+        for zoom in range(max_zoom, -1, -1):
+            self.levels[zoom] = (columns, rows)
+            columns, rows = math.ceil(columns / 2), math.ceil(rows / 2)
+        self.pending = {}  # zoom -> (row image, used columns) of an even row
+
+    def add_row(self, zoom, row, image, used):
+        """image is columns * tile_size wide; used = columns with any drawing."""
+        size = self.tile_size
+
+        def save(column):
+            path = os.path.join(self.tiles_dir, str(zoom), str(column), f"{row}.png")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image.crop((column * size, 0, (column + 1) * size, size)).save(path, format="PNG", compress_level=1)
+
+        list(self.pool.map(save, sorted(used)))
+
+        if zoom == 0:
+            return
+        rows = self.levels[zoom][1]
+        if row % 2 == 0 and row + 1 < rows:
+            self.pending[zoom] = (image, used)
+            return
+
+        upper, upper_used = self.pending.pop(zoom, (None, set())) if row % 2 else (None, set())
+        columns = self.levels[zoom - 1][0]
+        merged = Image.new("RGB", (columns * size * 2, size * 2), "white")
+        if upper is not None:
+            merged.paste(upper, (0, 0))
+            merged.paste(image, (0, size))
+        else:
+            merged.paste(image, (0, 0))
+        used = {column // 2 for column in upper_used | used}
+        self.add_row(zoom - 1, row // 2, merged.reduce(2), used)
+
+
+def render_tiles(scene, tiles_dir, tile_size=TILE_SIZE):
+    """
+    Write a z/x/y.png tile pyramid of the scene; zoom max_zoom is full size,
+    every zoom below halves it, zoom 0 fits one tile. Returns the tiles meta
+    for the viewer.
+    """
+    width, height = scene["width"], scene["height"]
+    max_zoom = max(0, math.ceil(math.log2(max(width, height, 1) / tile_size)))
+    columns = max(1, math.ceil(width / tile_size))
+    rows = max(1, math.ceil(height / tile_size))
+
+    by_row = [[] for _ in range(rows)]
+    used_by_row = [set() for _ in range(rows)]
+    for x0, y0, x1, y1, draw_item in _draw_items(scene):
+        # 2 px slack for strokes and text overhang
+        first_column = max(0, int((x0 - 2) // tile_size))
+        last_column = min(columns - 1, int((x1 + 2) // tile_size))
+        for row in range(max(0, int((y0 - 2) // tile_size)), min(rows - 1, int((y1 + 2) // tile_size)) + 1):
+            by_row[row].append(draw_item)
+            used_by_row[row].update(range(first_column, last_column + 1))
+
+    with ThreadPoolExecutor(max_workers=TILE_WORKERS, thread_name_prefix="harris-tiles") as pool:
+        pyramid = _Pyramid(tiles_dir, max_zoom, columns, rows, tile_size, pool)
+        for row in range(rows):
+            strip = Image.new("RGB", (columns * tile_size, tile_size), "white")
+            draw = ImageDraw.Draw(strip)
+            for draw_item in by_row[row]:
+                draw_item(draw, -row * tile_size)
+            pyramid.add_row(max_zoom, row, strip, used_by_row[row])
+
+    return {"max_zoom": max_zoom, "tile_size": tile_size}
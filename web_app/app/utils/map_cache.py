@@ -0,0 +1,118 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from app.logger import logger
+from app.queries import data_version_sql, data_version_table_exists_sql
+
+
+# (dbname, layer, ..., data_version) -> serialized JSON body; oldest entries first.
+# The data version is bumped by triggers in the same transaction as the change,
+# so an entry keyed on an older version is simply never asked for again - in
+# any worker - and ages out of the LRU.
+_MAP_CACHE = OrderedDict()
+_MAP_CACHE_LOCK = threading.Lock()
+_map_cache_bytes = 0
+
+# dbname -> (checked_at, has tab_data_version_log); DBs created before the
+# migration are re-checked now and then and served uncached meanwhile.
+_VERSIONED_DBS = {}
+VERSION_TABLE_RECHECK_SECONDS = 300
+
+
+def _max_entries() -> int:
+    return int(getattr(Config, "MAP_CACHE_MAX_ENTRIES", 512))
+
+
+def _max_bytes() -> int:
+    return int(getattr(Config, "MAP_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+def _has_version_table(conn, dbname: str) -> bool:
+    now = time.monotonic()
+    checked = _VERSIONED_DBS.get(dbname)
+    if checked is not None and (checked[1] or now - checked[0] < VERSION_TABLE_RECHECK_SECONDS):
+        return checked[1]
+
+    with conn.cursor() as cur:
+        cur.execute(data_version_table_exists_sql())
+        row = cur.fetchone()
+    exists = bool(row and row[0])
+    if not exists and checked is None:
+        logger.info(f"[{dbname}] tab_data_version_log missing, map responses are not cached")
+    _VERSIONED_DBS[dbname] = (now, exists)
+    return exists
+
+
+def data_version(conn, dbname: str) -> tuple[int, int] | None:
+    """(db oid, data version) of a terrain DB, or None when caching is off or unsupported."""
+    if _max_entries() <= 0 or not _has_version_table(conn, dbname):
+        return None
+
+    with conn.cursor() as cur:
+        cur.execute(data_version_sql())
+        row = cur.fetchone()
+    if not row or row[1] is None:
+        return None
+    return int(row[0]), int(row[1])
+
+
+def snap_bbox(bbox):
+    """
+    Grow a lon/lat bbox outwards to a grid of about a quarter of its span, so
+    small pans of the map reuse the same cache key. The grid cell is a power
+    of two (in degrees), so zooming in/out lands on the same grids too. The
+    result is clamped to valid lon/lat, it goes straight into ST_Transform.
+    Only snap when the response is cached: the grown box also widens the
+    area the feature limit applies to.
+    """
+    minx, miny, maxx, maxy = bbox
+    span = max(maxx - minx, maxy - miny)
+    cell = 2.0 ** math.ceil(math.log2(span / 4))
+    return (
+        max(-180.0, math.floor(minx / cell) * cell),
+        max(-90.0, math.floor(miny / cell) * cell),
+        min(180.0, math.ceil(maxx / cell) * cell),
+        min(90.0, math.ceil(maxy / cell) * cell),
+    )
+
+
+def get_cached_map_json(key):
+    with _MAP_CACHE_LOCK:
+        body = _MAP_CACHE.get(key)
+        if body is not None:
+            _MAP_CACHE.move_to_end(key)
+        return body
+
+
+def cache_map_json(key, body: str) -> None:
+    global _map_cache_bytes
+    size = len(body)
+    if _max_entries() <= 0 or size > _max_bytes():
+        return
+
+    with _MAP_CACHE_LOCK:
+        old = _MAP_CACHE.pop(key, None)
+        if old is not None:
+            _map_cache_bytes -= len(old)
+        _MAP_CACHE[key] = body
+        _map_cache_bytes += size
+        while len(_MAP_CACHE) > _max_entries() or _map_cache_bytes > _max_bytes():
+            _old_key, old = _MAP_CACHE.popitem(last=False)
+            _map_cache_bytes -= len(old)
+
+
+def invalidate_map_cache(dbname: str | None = None) -> None:
+    """Drop cached responses of one terrain DB (or all of them when dbname is None)."""
+    global _map_cache_bytes
+    with _MAP_CACHE_LOCK:
+        if dbname is None:
+            _MAP_CACHE.clear()
+            _map_cache_bytes = 0
+            _VERSIONED_DBS.clear()
+            return
+        for key in [key for key in _MAP_CACHE if key[0] == dbname]:
+            _map_cache_bytes -= len(_MAP_CACHE.pop(key))
+        _VERSIONED_DBS.pop(dbname, None)
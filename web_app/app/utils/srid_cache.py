@@ -0,0 +1,111 @@
+# Per-terrain-DB cache of the project spatial reference: SRID of the geometry
+# typmods (set_project_srid), srtext for .prj files and the SRID's area of use.
+#
+# Kept identical in web_app (app/utils/srid_cache.py) and mobile_api
+# (app/srid_cache.py); the two services are deployed separately, so change
+# both copies together.
+#
+# The project SRID is assigned once when a terrain DB is created, so it is
+# looked up once per process and DB name instead of running Find_SRID on
+# every map request. The web admin invalidates its own entry when it calls
+# update_geometry_srid or drops a DB; other processes (gunicorn workers,
+# the mobile API) pick the change up after SRID_CACHE_SECONDS. DBs without an
+# SRID yet are never cached.
+from __future__ import annotations
+
+import threading
+import time
+from typing import NamedTuple
+
+from config import Config
+
+DEFAULT_TTL_SECONDS = 300
+
+
+def find_project_srid_sql():
+    """SRID of the tab_geopts.pts_geom typmod (0/NULL before set_project_srid). No params."""
+    return "SELECT Find_SRID(current_schema()::text, 'tab_geopts'::text, 'pts_geom'::text);"
+
+
+def project_srs_sql():
+    """
+    srtext of an SRID plus whether postgis_srs() (PostGIS >= 3.4) can report
+    its area of use. Params: (srid,)
+    """
+    return """
+        SELECT
+          (SELECT srtext FROM spatial_ref_sys WHERE srid = %s),
+          to_regprocedure('postgis_srs(text, text)') IS NOT NULL;
+    """
+
+
+def srs_area_of_use_sql():
+    """
+    Area of use of an SRID as (west, south, east, north) in EPSG:4326.
+    Params: (srid,)
+    """
+    return """
+        SELECT ST_X(point_sw), ST_Y(point_sw), ST_X(point_ne), ST_Y(point_ne)
+        FROM postgis_srs('EPSG', %s::text);
+    """
+
+
+class ProjectSrid(NamedTuple):
+    srid: int
+    srtext: str = ""
+    # (west, south, east, north) in EPSG:4326, None when PostGIS cannot tell
+    area_of_use: tuple[float, float, float, float] | None = None
+
+
+# dbname -> (stored_at, ProjectSrid)
+_SRID_CACHE: dict[str, tuple[float, ProjectSrid]] = {}
+_SRID_CACHE_LOCK = threading.Lock()
+
+
+def _ttl_seconds() -> float:
+    return float(getattr(Config, "SRID_CACHE_SECONDS", DEFAULT_TTL_SECONDS))
+
+
+def _load(cur) -> ProjectSrid:
+    cur.execute(find_project_srid_sql())
+    row = cur.fetchone()
+    srid = int(row[0]) if row and row[0] else 0
+    if srid <= 0:
+        return ProjectSrid(0)
+
+    cur.execute(project_srs_sql(), (srid,))
+    srtext, has_postgis_srs = cur.fetchone() or ("", False)
+
+    area_of_use = None
+    if has_postgis_srs:
+        cur.execute(srs_area_of_use_sql(), (srid,))
+        bounds = cur.fetchone()
+        if bounds and all(value is not None for value in bounds):
+            area_of_use = tuple(float(value) for value in bounds)
+
+    return ProjectSrid(srid, srtext or "", area_of_use)
+
+
+def get_project_srid(cur, dbname: str) -> ProjectSrid:
+    """Cached ProjectSrid of the terrain DB ``cur`` is connected to (srid 0 = not set)."""
+    ttl = _ttl_seconds()
+    now = time.monotonic()
+    with _SRID_CACHE_LOCK:
+        cached = _SRID_CACHE.get(dbname)
+    if cached is not None and now - cached[0] < ttl:
+        return cached[1]
+
+    project = _load(cur)
+    if project.srid > 0 and ttl > 0:
+        with _SRID_CACHE_LOCK:
+            _SRID_CACHE[dbname] = (now, project)
+    return project
+
+
+def invalidate_project_srid(dbname: str | None = None) -> None:
+    """Forget the SRID of one terrain DB (or of all of them when dbname is None)."""
+    with _SRID_CACHE_LOCK:
+        if dbname is None:
+            _SRID_CACHE.clear()
+        else:
+            _SRID_CACHE.pop(dbname, None)
@@ -0,0 +1,298 @@
+# Cycle check and Hasse (transitive) reduction of stratigraphic DAGs.
+#
+# Nodes get compact integer indices in topological order (Kahn's algorithm,
+# which also detects cycles). Walking that order backwards, the descendants of
+# every node are kept as one bitset (a Python int, bit i = i-th node in
+# topological order). A node's edges are visited nearest child first; an edge
+# is redundant exactly when its child is already in the bitset collected from
+# the closer children, so the reduction needs one OR per edge instead of the
+# per-node graph searches networkx does. For 10k units the bitsets take about
+# n²/8 bytes (12 MB) at most.
+#
+# StratigraphyIndex keeps the relations of one terrain DB ready for cycle
+# checks while SUs are saved. Units joined by '=' form groups and every group
+# has a level, smaller than the level of every group below it (a pseudo
+# topological order). A new relation that agrees with the levels cannot close
+# a cycle; otherwise only groups between the two levels are searched, and
+# afterwards only the groups below the new relation that now sit too high are
+# moved down. Removing relations never invalidates the levels.
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Hashable, Iterable
+
+
+class StratigraphyCycleError(ValueError):
+    """The relations contain a cycle; ``cycle`` lists its nodes, first == last."""
+
+    def __init__(self, cycle):
+        self.cycle = list(cycle)
+        super().__init__("A cycle was found in stratigraphic relations.")
+
+
+def _find_cycle(succ, remaining):
+    # every node left after Kahn's algorithm has a predecessor that is left
+    # too, so walking backwards along such predecessors must revisit a node;
+    # going forwards we may walk into a dead end instead
+    pred = {v: [] for v in remaining}
+    for v in remaining:
+        for w in succ[v]:
+            if w in pred:
+                pred[w].append(v)
+
+    start = min(remaining)
+    seen = {}
+    path = []
+    v = start
+    while v not in seen:
+        seen[v] = len(path)
+        path.append(v)
+        v = min(pred[v])
+    cycle = path[seen[v]:]
+    cycle.reverse()
+    first = cycle.index(min(cycle))
+    cycle = cycle[first:] + cycle[:first]
+    cycle.append(cycle[0])
+    return cycle
+
+
+def topological_order(count: int, succ: list[list[int]]) -> list[int]:
+    """Kahn order of nodes 0..count-1; raises StratigraphyCycleError (with indices)."""
+    indeg = [0] * count
+    for children in succ:
+        for w in children:
+            indeg[w] += 1
+    order = [v for v in range(count) if indeg[v] == 0]
+    for v in order:  # grows while iterating
+        for w in succ[v]:
+            indeg[w] -= 1
+            if indeg[w] == 0:
+                order.append(w)
+    if len(order) != count:
+        raise StratigraphyCycleError(_find_cycle(succ, {v for v in range(count) if indeg[v] > 0}))
+    return order
+
+
+def hasse_edges(nodes: Iterable[Hashable], edges: Iterable[tuple[Hashable, Hashable]]):
+    """
+    Transitive reduction of the DAG given by nodes and edges (u -> v).
+
+    Returns the kept edges sorted by (u, v). Self loops are ignored, edges may
+    mention nodes missing from ``nodes``. Raises StratigraphyCycleError with the
+    cycle in terms of the original nodes.
+    """
+    edges = list(edges)
+    node_list = sorted(set(nodes).union(node for edge in edges for node in edge))
+    index = {node: i for i, node in enumerate(node_list)}
+    count = len(node_list)
+
+    children = [set() for _ in range(count)]
+    for u, v in edges:
+        if u != v:
+            children[index[u]].add(index[v])
+    succ = [sorted(targets) for targets in children]
+
+    try:
+        order = topological_order(count, succ)
+    except StratigraphyCycleError as exc:
+        raise StratigraphyCycleError([node_list[i] for i in exc.cycle]) from None
+
+    position = [0] * count
+    for i, v in enumerate(order):
+        position[v] = i
+
+    below_of = [0] * count  # descendants bitset, bits by topological position
+    kept = []
+    for v in reversed(order):
+        below = 0
+        for w in sorted(succ[v], key=position.__getitem__):
+            if (below >> position[w]) & 1:
+                continue  # reachable through a closer child
+            kept.append((node_list[v], node_list[w]))
+            below |= below_of[w] | (1 << position[w])
+        below_of[v] = below
+    kept.sort()
+    return kept
+
+
+class StratigraphyIndex:
+    """
+    Stored relations (ref_sj1, relation, ref_sj2) with incremental cycle checks.
+
+    add() raises StratigraphyCycleError before changing anything for the
+    offending relation; ``cycle`` then lists groups as sorted tuples of unit
+    ids, first == last. Relations applied earlier in the same save are kept,
+    so callers drop the index when the save fails.
+    """
+
+    def __init__(self, rels=()):
+        self._rows = defaultdict(set)  # unit -> normalized rows mentioning it
+        self._equal = defaultdict(set)  # unit -> units related by '='
+        self._below = defaultdict(set)  # unit -> units directly below it
+        self._group = {}  # unit -> group representative (lowest unit id)
+        self._members = {}  # representative -> units of the group
+        self._level = {}  # representative -> level
+
+        rows = {self._normalize(a, rel, b) for a, rel, b in rels}
+        for row in rows:
+            self._store(row)
+        for unit in sorted(self._rows):
+            if unit not in self._group:
+                component = self._component(unit, self._rows.keys())
+                self._set_group(component, 0)
+
+        reps = sorted(self._members)
+        index = {rep: i for i, rep in enumerate(reps)}
+        succ = [sorted({index[w] for w in self._successors(rep)}) for rep in reps]
+        for i, w in enumerate(reps):
+            if i in succ[i]:
+                raise StratigraphyCycleError([self._key(w), self._key(w)])
+        try:
+            order = topological_order(len(reps), succ)
+        except StratigraphyCycleError as exc:
+            raise StratigraphyCycleError([self._key(reps[i]) for i in exc.cycle]) from None
+        for v in order:
+            for w in succ[v]:
+                rep, below = reps[v], reps[w]
+                self._level[below] = max(self._level[below], self._level[rep] + 1)
+
+    @staticmethod
+    def _normalize(a, rel, b):
+        rel = (rel or "").strip()
+        a, b = int(a), int(b)
+        if rel == "=":
+            return "=", min(a, b), max(a, b)
+        if rel == ">":
+            return ">", a, b
+        if rel == "<":
+            return ">", b, a
+        raise ValueError(f"Invalid stratigraphic relation: {rel!r}")
+
+    def _store(self, row):
+        kind, a, b = row
+        self._rows[a].add(row)
+        self._rows[b].add(row)
+        if kind == "=":
+            self._equal[a].add(b)
+            self._equal[b].add(a)
+        else:
+            self._below[a].add(b)
+
+    def _ensure(self, unit):
+        if unit not in self._group:
+            self._set_group({unit}, 0)
+        return self._group[unit]
+
+    def _set_group(self, units, level):
+        rep = min(units)
+        for unit in units:
+            self._group[unit] = rep
+        self._members[rep] = set(units)
+        self._level[rep] = level
+        return rep
+
+    def _component(self, unit, allowed):
+        seen = {unit}
+        stack = [unit]
+        while stack:
+            for other in self._equal.get(stack.pop(), ()):
+                if other not in seen and other in allowed:
+                    seen.add(other)
+                    stack.append(other)
+        return seen
+
+    def _successors(self, rep):
+        return {self._group[w] for unit in self._members[rep] for w in self._below.get(unit, ())}
+
+    def _key(self, rep):
+        return tuple(sorted(self._members[rep]))
+
+    def _path(self, start, target):
+        """Groups from start down to target, or None; only levels up to target's are searched."""
+        limit = self._level[target]
+        parent = {start: None}
+        stack = [start]
+        while stack:
+            rep = stack.pop()
+            for child in sorted(self._successors(rep)):
+                if child in parent or self._level[child] > limit:
+                    continue
+                parent[child] = rep
+                if child == target:
+                    path = [child]
+                    while parent[path[-1]] is not None:
+                        path.append(parent[path[-1]])
+                    path.reverse()
+                    return path
+                stack.append(child)
+        return None
+
+    def _push_down(self, rep, level):
+        """Give rep at least ``level`` and move the groups below it out of the way."""
+        if self._level[rep] >= level:
+            return
+        self._level[rep] = level
+        stack = [rep]
+        while stack:
+            upper = stack.pop()
+            for child in self._successors(upper):
+                if self._level[child] <= self._level[upper]:
+                    self._level[child] = self._level[upper] + 1
+                    stack.append(child)
+
+    def remove_unit(self, unit):
+        """Drop every relation mentioning unit (as delete_sj_stratigraphy_links_sql does)."""
+        rows = self._rows.pop(unit, set())
+        regroup = set()
+        for row in rows:
+            kind, a, b = row
+            other = b if a == unit else a
+            self._rows[other].discard(row)
+            if kind == "=":
+                self._equal[a].discard(b)
+                self._equal[b].discard(a)
+                regroup.add(self._group[unit])
+            else:
+                self._below[a].discard(b)
+
+        for rep in regroup:
+            members = self._members.pop(rep)
+            level = self._level.pop(rep)
+            while members:
+                component = self._component(min(members), members)
+                members -= component
+                self._set_group(component, level)
+
+    def add(self, a, rel, b):
+        """Add one relation unless it closes a cycle (StratigraphyCycleError)."""
+        row = self._normalize(a, rel, b)
+        kind, a, b = row
+        ga, gb = self._ensure(a), self._ensure(b)
+
+        if kind == "=":
+            if ga != gb:
+                upper, lower = sorted((ga, gb), key=self._level.__getitem__)
+                path = self._path(upper, lower) if self._level[upper] < self._level[lower] else None
+                if path:
+                    merged = tuple(sorted(self._members[ga] | self._members[gb]))
+                    raise StratigraphyCycleError(
+                        [merged, *(self._key(rep) for rep in path[1:-1]), merged]
+                    )
+                level = max(self._level[ga], self._level[gb])
+                units = self._members.pop(ga) | self._members.pop(gb)
+                del self._level[ga], self._level[gb]
+                rep = self._set_group(units, level)
+                self._store(row)
+                for child in self._successors(rep):
+                    self._push_down(child, level + 1)
+                return
+        else:
+            if ga == gb:
+                raise StratigraphyCycleError([self._key(ga), self._key(ga)])
+            if self._level[ga] > self._level[gb]:
+                path = self._path(gb, ga)
+                if path:
+                    raise StratigraphyCycleError([self._key(rep) for rep in [ga, *path]])
+            self._push_down(gb, self._level[ga] + 1)
+
+        self._store(row)
@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+
+# email -> (stored_at, (name, group_role, enabled)); oldest entries first.
+# Each gunicorn worker has its own cache: admin changes invalidate the worker
+# that handled them at once, the other workers pick them up after the TTL.
+_USER_STATE_CACHE = OrderedDict()
+_USER_STATE_CACHE_LOCK = threading.Lock()
+
+
+def _ttl_seconds() -> float:
+    return float(getattr(Config, "USER_STATE_CACHE_SECONDS", 30))
+
+
+def _max_entries() -> int:
+    return max(1, int(getattr(Config, "USER_STATE_CACHE_MAX_ENTRIES", 1024)))
+
+
+def get_cached_user_state(email: str):
+    """Return the cached (name, group_role, enabled) row, or None when missing/expired."""
+    ttl = _ttl_seconds()
+    if ttl <= 0:
+        return None
+
+    now = time.monotonic()
+    with _USER_STATE_CACHE_LOCK:
+        cached = _USER_STATE_CACHE.get(email)
+        if cached is None:
+            return None
+        if now - cached[0] >= ttl:
+            del _USER_STATE_CACHE[email]
+            return None
+        return cached[1]
+
+
+def cache_user_state(email: str, state) -> None:
+    if not state or _ttl_seconds() <= 0:
+        return
+
+    with _USER_STATE_CACHE_LOCK:
+        _USER_STATE_CACHE.pop(email, None)
+        _USER_STATE_CACHE[email] = (time.monotonic(), tuple(state))
+        while len(_USER_STATE_CACHE) > _max_entries():
+            _USER_STATE_CACHE.popitem(last=False)
+
+
+def invalidate_user_state(email: str | None = None) -> None:
+    """Drop the cached state of one user (or of everybody when email is None)."""
+    with _USER_STATE_CACHE_LOCK:
+        if email is None:
+            _USER_STATE_CACHE.clear()
+        else:
+            _USER_STATE_CACHE.pop(email, None)
@@ -21,6 +21,47 @@ class Config:
     TERRAIN_DB_HOST = "XXX"
     TERRAIN_DB_PORT = 5432 # or port Postgres listens
 
+    # Connection pools (one per database, per gunicorn worker).
+    # Keep workers * DB_POOL_MAX_PER_DB * active DBs below Postgres max_connections.
+    DB_POOL_ENABLED = True
+    DB_POOL_MAX_PER_DB = 4  # max open connections to one DB
+    DB_POOL_MAX_DATABASES = 16  # least recently used idle pools above this are closed
+    DB_POOL_IDLE_SECONDS = 300  # idle connections/pools older than this are closed
+    DB_POOL_CHECKOUT_TIMEOUT_SECONDS = 10  # wait for a free connection before failing
+    DB_POOL_HEALTHCHECK_SECONDS = 30  # ping connections idle longer than this on checkout
+    DB_POOL_APPLICATION_NAME = "archeodb_web_pool"
+
+    # Per-worker cache of the user state (name, role, enabled) checked on every request.
+    # Admin edits apply at once in the worker handling them, elsewhere after this TTL.
+    USER_STATE_CACHE_SECONDS = 30  # 0 disables the cache
+    USER_STATE_CACHE_MAX_ENTRIES = 1024
+
+    # Per-worker cache of map GeoJSON responses, keyed on the terrain DB data version
+    # (tab_data_version, see db/migrations/20261017_add_data_version.sql).
+    MAP_CACHE_MAX_ENTRIES = 512  # 0 disables the cache
+    MAP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+    # Per-process cache of each terrain DB's project SRID / srtext; other workers
+    # see an SRID change (admin) after this many seconds.
+    SRID_CACHE_SECONDS = 300  # 0 disables the cache
+
+    # Harris Matrix: images are named by a hash of the data they show; the newest
+    # HARRIS_IMAGES_KEEP per terrain DB are kept. Built graphs and layouts are
+    # cached per process for HARRIS_GRAPH_CACHE_ENTRIES data states.
+    HARRIS_IMAGES_KEEP = 5
+    HARRIS_GRAPH_CACHE_ENTRIES = 8  # 0 disables the cache
+    # Matrices with at least this many units also get a raster tile pyramid and are
+    # shown in a Leaflet viewer instead of the inline SVG.
+    HARRIS_TILES_MIN_NODES = 2000  # 0 disables tiles
+
+    # "Rebuild all polygons": lists of at least POLYGON_REBUILD_PARALLEL_MIN polygons
+    # are split across this many pooled connections (capped at DB_POOL_MAX_PER_DB - 1).
+    POLYGON_REBUILD_WORKERS = 1
+    POLYGON_REBUILD_PARALLEL_MIN = 500
+
+    # SHP/GPKG exports are written to temp files kept in memory up to this size
+    GIS_EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
     # Secret key for JWT
     SECRET_KEY = "XXX"
 
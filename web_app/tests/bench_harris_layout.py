@@ -0,0 +1,55 @@
+"""
+Benchmark of the Harris matrix layout (app.utils.harris_layout.layered_layout)
+on synthetic stratigraphic DAGs: a dense sequence where units cut/cover a few
+of the previous 60, and one where a share of the edges span hundreds of
+ranks (only stubs of dummy nodes at their ends, see EDGE_STUB_RANKS).
+
+Not collected by pytest; run from web_app/:
+
+    python tests/bench_harris_layout.py [nodes ...]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.harris_layout import layered_layout  # noqa: E402
+
+
+def random_sequence(count, seed=7):
+    """Each unit lies below one or two of the previous 60."""
+    rng = random.Random(seed)
+    return [
+        (max(0, node - rng.randint(1, 60)), node)
+        for node in range(1, count)
+        for _ in range(rng.choice((1, 1, 1, 2)))
+    ]
+
+
+def long_edge_sequence(count, seed=7):
+    """A deep chain where every tenth unit also lies below one far above it."""
+    rng = random.Random(seed)
+    edges = [(node - 1, node) for node in range(1, count)]
+    edges += [
+        (max(0, node - rng.randint(50, 500)), node)
+        for node in range(10, count, 10)
+    ]
+    return edges
+
+
+def main(sizes):
+    print(f"{'graph':>10} {'nodes':>7} {'edges':>7} {'seconds':>8}")
+    for count in sizes:
+        for name, build in (("random", random_sequence), ("long-edge", long_edge_sequence)):
+            edges = build(count)
+            started = time.perf_counter()
+            positions = layered_layout(range(count), edges)
+            seconds = time.perf_counter() - started
+            assert len(positions) == count
+            print(f"{name:>10} {count:>7} {len(edges):>7} {seconds:>8.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 5000, 10000])
@@ -0,0 +1,61 @@
+"""
+Benchmark of the Harris matrix reduction: app.utils.stratigraphy_graph
+against the networkx path it replaced (is_directed_acyclic_graph +
+transitive_reduction) on synthetic stratigraphic DAGs.
+
+Not collected by pytest; run from web_app/:
+
+    python tests/bench_stratigraphy_graph.py [nodes ...]
+"""
+import os
+import random
+import sys
+import time
+
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.stratigraphy_graph import hasse_edges  # noqa: E402
+
+
+def synthetic_sequence(count, seed=1):
+    """Units mostly cut/cover a few of the previous 60, like a deep urban sequence."""
+    rng = random.Random(seed)
+    edges = set()
+    for node in range(1, count):
+        for _ in range(rng.choice((1, 1, 1, 2, 3))):
+            edges.add((max(0, node - rng.randint(1, 60)), node))
+    return edges
+
+
+def _timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def _networkx_reduction(count, edges):
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(count))
+    graph.add_edges_from(edges)
+    if not nx.is_directed_acyclic_graph(graph):
+        raise ValueError("cycle")
+    return sorted(nx.algorithms.dag.transitive_reduction(graph).edges)
+
+
+def main(sizes):
+    print(f"{'nodes':>7} {'edges':>7} {'kept':>7} {'networkx s':>11} {'bitset s':>9} {'speedup':>8}")
+    for count in sizes:
+        edges = synthetic_sequence(count)
+        expected, nx_seconds = _timed(lambda: _networkx_reduction(count, edges))
+        kept, bitset_seconds = _timed(lambda: hasse_edges(range(count), edges))
+        assert kept == expected
+        print(
+            f"{count:>7} {len(edges):>7} {len(kept):>7} {nx_seconds:>11.3f} "
+            f"{bitset_seconds:>9.3f} {nx_seconds / bitset_seconds:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 5000, 10000])
@@ -3,6 +3,9 @@ import pytest
 import app as app_package
 from app import create_app
 from app.utils.tokens import create_session_token
+from app.utils.map_cache import invalidate_map_cache
+from app.utils.srid_cache import invalidate_project_srid
+from app.utils.user_state import invalidate_user_state
 
 
 class _AuthConnection:
@@ -12,6 +15,9 @@ class _AuthConnection:
 
 @pytest.fixture
 def app():
+    invalidate_user_state()
+    invalidate_map_cache()
+    invalidate_project_srid()
     flask_app = create_app()
     flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
     return flask_app
@@ -19,7 +25,7 @@ def app():
 
 @pytest.fixture
 def client(app, monkeypatch):
-    monkeypatch.setattr(app_package, "get_auth_connection", lambda: _AuthConnection())
+    monkeypatch.setattr(app_package, "get_request_auth_connection", lambda: _AuthConnection())
     monkeypatch.setattr(
         app_package,
         "get_user_access_state",
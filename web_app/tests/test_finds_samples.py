@@ -99,7 +99,7 @@ class _RecordingConnection:
 
 
 def test_finds_samples_page_uses_neutral_work_surface(client, monkeypatch):
-    monkeypatch.setattr(finds_samples_routes, "get_terrain_connection", lambda _dbname: _Connection())
+    monkeypatch.setattr(finds_samples_routes, "get_request_terrain_connection", lambda _dbname: _Connection())
     monkeypatch.setattr(finds_samples_routes, "list_find_types_sql", lambda: "find-types")
     monkeypatch.setattr(finds_samples_routes, "list_sample_types_sql", lambda: "sample-types")
     monkeypatch.setattr(finds_samples_routes, "list_polygons_names_sql", lambda: "polygons")
@@ -143,7 +143,7 @@ def test_finds_samples_page_uses_neutral_work_surface(client, monkeypatch):
 
 
 def test_finds_samples_list_endpoints_return_page_metadata(client, monkeypatch):
-    monkeypatch.setattr(finds_samples_routes, "get_terrain_connection", lambda _dbname: _Connection())
+    monkeypatch.setattr(finds_samples_routes, "get_request_terrain_connection", lambda _dbname: _Connection())
     monkeypatch.setattr(finds_samples_routes, "count_finds_sql", lambda: "find-count")
     monkeypatch.setattr(finds_samples_routes, "count_samples_sql", lambda: "sample-count")
     monkeypatch.setattr(finds_samples_routes, "list_finds_sql", lambda: "finds")
@@ -173,7 +173,7 @@ def test_finds_samples_list_endpoints_return_page_metadata(client, monkeypatch):
 
 def test_add_find_accepts_empty_count(client, monkeypatch):
     conn = _RecordingConnection()
-    monkeypatch.setattr(finds_samples_routes, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(finds_samples_routes, "get_request_terrain_connection", lambda _dbname: conn)
     monkeypatch.setattr(finds_samples_routes, "find_exists_sql", lambda: "find-exists")
     monkeypatch.setattr(finds_samples_routes, "insert_find_sql", lambda: "insert-find")
 
@@ -204,7 +204,7 @@ def test_add_find_accepts_empty_count(client, monkeypatch):
 
 def test_update_find_accepts_empty_count(client, monkeypatch):
     conn = _RecordingConnection()
-    monkeypatch.setattr(finds_samples_routes, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(finds_samples_routes, "get_request_terrain_connection", lambda _dbname: conn)
     monkeypatch.setattr(finds_samples_routes, "update_find_sql", lambda: "update-find")
 
     with client.session_transaction() as session:
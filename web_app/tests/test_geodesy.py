@@ -1,9 +1,16 @@
+import io
+import sqlite3
+import struct
 from io import BytesIO
 from pathlib import Path
 import re
 
+import pytest
+
 from app import queries
 from app.routes import geodesy as geodesy_routes
+from app.utils import geom_utils, geopts_parser, srid_cache
+from app.utils.map_cache import snap_bbox
 
 
 class _Cursor:
@@ -29,6 +36,12 @@ class _Cursor:
     def fetchall(self):
         return self.connection.fetchall_rows
 
+    def __iter__(self):
+        return iter(self.connection.fetchall_rows)
+
+    def copy_expert(self, query, file):
+        self.connection.copied.append((query, file.read()))
+
 
 class _Connection:
     def __init__(self, fetchone_row=(5514,), fetchone_rows=None, fetchall_rows=None, rowcount=1):
@@ -37,10 +50,11 @@ class _Connection:
         self.fetchall_rows = fetchall_rows or []
         self.rowcount = rowcount
         self.executed = []
+        self.copied = []
         self.committed = False
         self.rolled_back = False
 
-    def cursor(self):
+    def cursor(self, name=None):
         return _Cursor(self)
 
     def commit(self):
@@ -53,6 +67,17 @@ class _Connection:
         return None
 
 
+@pytest.fixture(autouse=True)
+def _srid_lookup_reads_only_find_srid(monkeypatch):
+    # route tests feed just the Find_SRID row; srtext/area of use are tested separately
+    def load(cur):
+        cur.execute(srid_cache.find_project_srid_sql())
+        row = cur.fetchone()
+        return srid_cache.ProjectSrid(int(row[0]) if row and row[0] else 0)
+
+    monkeypatch.setattr(srid_cache, "_load", load)
+
+
 def _select_test_db(client):
     with client.session_transaction() as session:
         session["selected_db"] = "02_test"
@@ -60,7 +85,7 @@ def _select_test_db(client):
 
 def test_geodesy_page_uses_base_leaflet_only(client, monkeypatch):
     conn = _Connection(fetchone_rows=[(5514,), (42, 99)])
-    monkeypatch.setattr(geodesy_routes, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
 
     _select_test_db(client)
 
@@ -86,10 +111,9 @@ def test_geodesy_page_uses_base_leaflet_only(client, monkeypatch):
     assert "/static/js/geodesy_map.js" in html
 
 
-def test_geodesy_upload_passes_notes_to_upsert(client, monkeypatch):
-    conn = _Connection()
-    monkeypatch.setattr(geodesy_routes, "get_terrain_connection", lambda _dbname: conn)
-    monkeypatch.setattr(geodesy_routes, "upsert_geopt_sql", lambda: "upsert-geopt")
+def test_geodesy_upload_copies_points_into_staging_and_upserts_once(client, monkeypatch):
+    conn = _Connection(fetchone_rows=[(5514,), (1, 1)])
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
 
     _select_test_db(client)
 
@@ -97,7 +121,7 @@ def test_geodesy_upload_passes_notes_to_upsert(client, monkeypatch):
         "/geodesy/upload",
         data={
             "file": (
-                BytesIO(b"id_pts,x,y,h,code,notes\n1,10.5,20.25,30,SU,alpha <b>\n"),
+                BytesIO(b"id_pts,x,y,h,code,notes\n1,10.5,20.25,30,SU,alpha <b>\n2,11,21,31\nbroken,line\n"),
                 "points.csv",
             )
         },
@@ -107,18 +131,17 @@ def test_geodesy_upload_passes_notes_to_upsert(client, monkeypatch):
     assert response.status_code == 302
     assert conn.committed is True
     assert conn.rolled_back is False
-    upsert_calls = [call for call in conn.executed if call[0] == "upsert-geopt"]
-    assert upsert_calls == [
-        (
-            "upsert-geopt",
-            (10.5, 20.25, 30.0, 5514, 5514, 1, 30.0, "SU", "SU", "SU", "alpha <b>"),
-        )
-    ]
+    assert len(conn.copied) == 1
+    assert conn.copied[0][1] == "2,1,10.5,20.25,30.0,SU,alpha <b>\n3,2,11.0,21.0,31.0,,\n"
+    upsert_calls = [call for call in conn.executed if call[0] == queries.upsert_geopts_from_stage_sql()]
+    assert upsert_calls == [(queries.upsert_geopts_from_stage_sql(), (5514, 5514))]
+    with client.session_transaction() as session:
+        assert "1 inserted, 1 updated, 1 rejected" in session["_flashes"][-1][1]
 
 
 def test_geodesy_list_ignores_invalid_numeric_filters(client, monkeypatch):
     conn = _Connection(fetchone_row=(1,), fetchall_rows=[(1, 10.0, 20.0, 30.0, "SU", "note")])
-    monkeypatch.setattr(geodesy_routes, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
     monkeypatch.setattr(geodesy_routes, "count_geopts_sql", lambda: "count-geopts")
     monkeypatch.setattr(geodesy_routes, "list_geopts_sql", lambda: "list-geopts")
 
@@ -140,7 +163,7 @@ def test_geodesy_list_ignores_invalid_numeric_filters(client, monkeypatch):
 
 def test_geodesy_list_uses_server_side_pagination(client, monkeypatch):
     conn = _Connection(fetchone_row=(60,), fetchall_rows=[(26, 1.0, 2.0, 3.0, "FO", None)])
-    monkeypatch.setattr(geodesy_routes, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
     monkeypatch.setattr(geodesy_routes, "count_geopts_sql", lambda: "count-geopts")
     monkeypatch.setattr(geodesy_routes, "list_geopts_sql", lambda: "list-geopts")
 
@@ -167,7 +190,7 @@ def test_geodesy_download_exports_all_filtered_points_as_txt(client, monkeypatch
             (11, 4.0, 5.0, 6.0, "PR", None),
         ]
     )
-    monkeypatch.setattr(geodesy_routes, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
     monkeypatch.setattr(geodesy_routes, "export_geopts_sql", lambda: "export-geopts")
 
     _select_test_db(client)
@@ -189,9 +212,66 @@ def test_geodesy_download_exports_all_filtered_points_as_txt(client, monkeypatch
     ]
 
 
+def test_geodesy_download_streams_points_into_geopackage(client, monkeypatch, tmp_path):
+    point_wkb = struct.pack("<BI3d", 1, 1001, -740000.5, -1040000.25, 250.5)
+    conn = _Connection(
+        fetchone_rows=[(5514,)],
+        fetchall_rows=[(10, "FI", "precise find", 250.5, point_wkb)],
+    )
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+
+    _select_test_db(client)
+
+    response = client.get("/geodesy/download?format=gpkg&q=find")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/geopackage+sqlite3"
+    assert "02_test_geodesy_points.gpkg" in response.headers["Content-Disposition"]
+    assert conn.executed[-1] == (queries.gis_export_geopts_sql(), ("find", "%find%", "%find%", None, None, None, None))
+
+    gpkg_path = tmp_path / "points.gpkg"
+    gpkg_path.write_bytes(response.get_data())
+    db = sqlite3.connect(gpkg_path)
+    try:
+        assert db.execute("PRAGMA application_id").fetchone() == (0x47504B47,)
+        assert db.execute("SELECT geometry_type_name, srs_id, z FROM gpkg_geometry_columns").fetchone() == ("POINT", 5514, 1)
+        geom, id_pts, code = db.execute('SELECT geom, id_pts, code FROM "02_test_geodesy_points"').fetchone()
+    finally:
+        db.close()
+    assert (id_pts, code) == (10, "FI")
+    assert geom[:2] == b"GP"
+    assert struct.unpack_from("<3d", geom, 8 + 32 + 5) == (-740000.5, -1040000.25, 250.5)
+
+
+def test_geodesy_geopackage_download_works_without_project_srid(client, monkeypatch, tmp_path):
+    point_wkb = struct.pack("<BI3d", 1, 1001, 12.5, 7.25, 1.0)
+    conn = _Connection(
+        fetchone_rows=[(0,)],
+        fetchall_rows=[(10, "FI", "precise find", 1.0, point_wkb)],
+    )
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+
+    _select_test_db(client)
+
+    response = client.get("/geodesy/download?format=gpkg")
+
+    assert response.status_code == 200
+    gpkg_path = tmp_path / "points.gpkg"
+    gpkg_path.write_bytes(response.get_data())
+    db = sqlite3.connect(gpkg_path)
+    try:
+        assert db.execute("SELECT srs_id FROM gpkg_geometry_columns").fetchone() == (-1,)
+        assert db.execute("SELECT srs_id FROM gpkg_contents").fetchone() == (-1,)
+        assert db.execute("SELECT srs_id FROM gpkg_spatial_ref_sys ORDER BY srs_id").fetchall() == [(-1,), (0,), (4326,)]
+        geom = db.execute('SELECT geom FROM "02_test_geodesy_points"').fetchone()[0]
+    finally:
+        db.close()
+    assert struct.unpack_from("<i", geom, 4) == (-1,)
+
+
 def test_geodesy_ajax_delete_accepts_csrf_header(client, monkeypatch):
     conn = _Connection()
-    monkeypatch.setattr(geodesy_routes, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
     monkeypatch.setattr(geodesy_routes, "delete_geopt_sql", lambda: "delete-geopt")
     client.application.config["WTF_CSRF_ENABLED"] = True
 
@@ -220,7 +300,7 @@ def test_geodesy_ajax_delete_accepts_csrf_header(client, monkeypatch):
 
 def test_geodesy_update_returns_not_found_when_no_row_changes(client, monkeypatch):
     conn = _Connection(rowcount=0)
-    monkeypatch.setattr(geodesy_routes, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
     monkeypatch.setattr(geodesy_routes, "update_geopt_sql", lambda: "update-geopt")
 
     _select_test_db(client)
@@ -237,7 +317,56 @@ def test_geodesy_update_returns_not_found_when_no_row_changes(client, monkeypatc
     assert conn.rolled_back is True
 
 
+def test_geodesy_update_rebuilds_polygons_marked_dirty_before_commit(client, monkeypatch):
+    conn = _Connection(fetchone_rows=[(True,), (2,)])
+    monkeypatch.setattr(geom_utils, "_DIRTY_TRACKING_DBS", {})
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(geodesy_routes, "update_geopt_sql", lambda: "update-geopt")
+
+    _select_test_db(client)
+
+    response = client.post("/geodesy/update/7", json={"x": 10, "y": 20, "h": 30, "code": "SU", "notes": ""})
+
+    assert response.status_code == 200
+    assert conn.committed is True
+    queries_run = [query for query, _params in conn.executed]
+    assert queries_run == [
+        "update-geopt",
+        queries.dirty_polygon_tracking_exists_sql(),
+        queries.rebuild_dirty_polygon_geoms_sql(),
+    ]
+
+
+def test_geodesy_usage_groups_bindings_containing_the_point(client, monkeypatch):
+    conn = _Connection(fetchall_rows=[
+        ("photogram", "FG-3", 10, 40),
+        ("polygon_top", "P1", 1, 20),
+        ("section", "4", 15, 15),
+    ])
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+
+    _select_test_db(client)
+
+    response = client.get("/geodesy/usage/15")
+
+    assert response.status_code == 200
+    assert response.get_json()["usage"] == {
+        "polygon_top": [{"ref": "P1", "from": 1, "to": 20}],
+        "polygon_bottom": [],
+        "section": [{"ref": "4", "from": 15, "to": 15}],
+        "photogram": [{"ref": "FG-3", "from": 10, "to": 40}],
+    }
+    assert conn.executed == [(queries.geopt_usage_sql(), (15, 15, 15, 15))]
+    assert "int4range(b.pts_from, b.pts_to, '[]') @>" in queries.geopt_usage_sql()
+
+
 def test_upsert_geopt_sql_persists_notes_without_clearing_blank_uploads():
+    stage_sql = queries.upsert_geopts_from_stage_sql()
+    assert "DISTINCT ON (s.id_pts)" in stage_sql
+    assert "ORDER BY s.id_pts, s.line_no DESC" in stage_sql
+    assert "notes = COALESCE(EXCLUDED.notes, tab_geopts.notes)" in stage_sql
+    assert "RETURNING (xmax = 0) AS inserted" in stage_sql
+
     sql = queries.upsert_geopt_sql()
 
     assert "INSERT INTO tab_geopts (id_pts, x, y, h, code, notes)" in sql
@@ -259,6 +388,128 @@ def test_upsert_geopt_sql_persists_notes_without_clearing_blank_uploads():
     assert "LIMIT" not in export_sql
 
 
+def test_geodesy_tile_returns_mvt_filtered_in_project_srid(client, monkeypatch):
+    conn = _Connection(fetchone_rows=[(5514,), (memoryview(b"\x1a\x02tile"),)])
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+
+    _select_test_db(client)
+
+    response = client.get("/geodesy/tiles/geopts/18/143000/88000.mvt?code=su&id_from=abc&id_to=10")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/vnd.mapbox-vector-tile"
+    assert response.data == b"\x1a\x02tile"
+    query, params = conn.executed[-1]
+    assert query == queries.mvt_geopts_tile_sql()
+    assert params == (18, 143000, 88000, 5514, "SU", "SU", None, None, None, None, None, 10, 10, 20000)
+    assert "g.pts_geom && a.g" in query
+
+
+def test_geodesy_tile_rejects_unknown_layers_and_out_of_range_tiles(client, monkeypatch):
+    conn = _Connection()
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+
+    _select_test_db(client)
+
+    assert client.get("/geodesy/tiles/finds/3/1/1.mvt").status_code == 404
+    assert client.get("/geodesy/tiles/polygons/3/8/1.mvt").status_code == 404
+    assert conn.executed == []
+
+    # no tab_section.geom_line in this DB: lines are built on the fly
+    conn.fetchone_rows = [(5514,), (False,), (None,)]
+    response = client.get("/geodesy/tiles/sections/3/1/1.mvt")
+    assert response.status_code == 200
+    assert response.data == b""
+    assert conn.executed[-2][0] == queries.section_lines_exist_sql()
+    assert conn.executed[-1][0] == queries.mvt_sections_tile_sql(False)
+
+
+def test_geodesy_geojson_is_cached_per_snapped_bbox_and_data_version(client, monkeypatch):
+    fc = {"type": "FeatureCollection", "features": [{"type": "Feature", "properties": {"id_pts": 1}}]}
+    conn = _Connection(fetchone_rows=[(True,), (16384, 7), (5514,), (fc,)])
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+
+    _select_test_db(client)
+
+    first = client.get("/geodesy/geojson?bbox=14.41,50.07,14.42,50.08")
+    assert first.status_code == 200
+    assert first.get_json() == fc
+    geojson_calls = [call for call in conn.executed if call[0] == queries.geojson_geopts_bbox_sql()]
+    assert len(geojson_calls) == 1
+    minx, miny, maxx, maxy = geojson_calls[0][1][:4]
+    assert minx <= 14.41 and miny <= 50.07 and maxx >= 14.42 and maxy >= 50.08
+
+    # slightly panned map, same data version: served from the cache
+    conn.fetchone_rows = [(16384, 7)]
+    second = client.get("/geodesy/geojson?bbox=14.4095,50.0695,14.4195,50.0795")
+    assert second.get_json() == fc
+    assert len([call for call in conn.executed if call[0] == queries.geojson_geopts_bbox_sql()]) == 1
+
+    # a change bumped the version: recomputed
+    conn.fetchone_rows = [(16384, 8), ({"type": "FeatureCollection", "features": []},)]
+    third = client.get("/geodesy/geojson?bbox=14.41,50.07,14.42,50.08")
+    assert third.get_json()["features"] == []
+    assert len([call for call in conn.executed if call[0] == queries.geojson_geopts_bbox_sql()]) == 2
+
+
+def test_snap_bbox_stays_within_lon_lat_and_is_skipped_without_caching(client, monkeypatch):
+    assert snap_bbox((-10, 30, 40, 85)) == (-16.0, 16.0, 48.0, 90.0)
+    assert snap_bbox((-179, -80, 179, 80)) == (-180.0, -90.0, 180.0, 90.0)
+
+    fc = {"type": "FeatureCollection", "features": []}
+    conn = _Connection(fetchone_rows=[(False,), (5514,), (fc,)])
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+
+    _select_test_db(client)
+
+    assert client.get("/geodesy/polygons-geojson?bbox=14.41,50.07,14.42,50.08").status_code == 200
+    query, params = conn.executed[-1]
+    assert query == queries.geojson_polygons_bbox_sql()
+    assert params[:4] == (14.41, 50.07, 14.42, 50.08)
+
+
+def test_geodesy_geojson_cluster_mode_uses_zoom_dependent_grid(client, monkeypatch):
+    fc = {
+        "type": "FeatureCollection",
+        "features": [{"type": "Feature", "properties": {"count": 3, "codes": {"SU": 2, "": 1}}}],
+    }
+    conn = _Connection(fetchone_rows=[(False,), (5514,), (fc,)])
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+
+    _select_test_db(client)
+
+    response = client.get("/geodesy/geojson?bbox=14,50,15,51&cluster=1&zoom=15&code=su")
+
+    assert response.get_json() == fc
+    query, params = conn.executed[-1]
+    assert query == queries.geojson_geopts_clusters_bbox_sql()
+    cell_size = 40075016.686 / 2 ** (15 + 8) * geodesy_routes.GEOPT_CLUSTER_CELL_PX
+    assert params[5:7] == ("SU", "SU")
+    assert params[-3:] == (pytest.approx(cell_size), pytest.approx(cell_size), 5000)
+    assert geodesy_routes._cluster_cell_size(16) == pytest.approx(cell_size / 2)
+
+
+def test_geodesy_photos_use_indexed_centroids_and_cluster_at_low_zoom(client, monkeypatch):
+    fc = {"type": "FeatureCollection", "features": []}
+    conn = _Connection(fetchone_rows=[(5514,), (fc,), (5514,), (fc,)])
+    monkeypatch.setattr(geodesy_routes, "get_request_terrain_connection", lambda _dbname: conn)
+
+    _select_test_db(client)
+
+    assert client.get("/geodesy/photos-geojson?bbox=14,50,15,51&zoom=12&limit=300").status_code == 200
+    assert conn.executed[-1] == (
+        queries.geojson_photo_clusters_bbox_sql(),
+        (14.0, 50.0, 15.0, 51.0, 5514, geodesy_routes.PHOTO_CLUSTER_GRID_CELLS, 300),
+    )
+
+    assert client.get("/geodesy/photos-geojson?bbox=14,50,15,51&zoom=19").status_code == 200
+    query, params = conn.executed[-1]
+    assert query == queries.geojson_photos_bbox_sql()
+    assert params == (14.0, 50.0, 15.0, 51.0, 5514, 5000)
+    assert "gps_lon" not in query
+    assert query.index("ST_Intersects(p.photo_centroid, b.g)") < query.index("LIMIT")
+
+
 def test_geodesy_map_script_has_single_init_and_safe_table_rendering():
     js_path = Path(__file__).resolve().parents[1] / "app" / "static" / "js" / "geodesy_map.js"
     script = js_path.read_text(encoding="utf-8")
@@ -276,3 +527,144 @@ def test_geodesy_map_script_has_single_init_and_safe_table_rendering():
     assert 'PR: "#' in script
     assert "limit: 1000" not in script
     assert "tr.innerHTML" not in script
+
+
+def test_project_srid_is_loaded_once_per_db_and_invalidated(monkeypatch):
+    monkeypatch.undo()
+    srid_cache.invalidate_project_srid()
+    conn = _Connection(fetchone_rows=[(5514,), ("PROJCS[\"S-JTSK\"]", False)])
+
+    with conn.cursor() as cur:
+        first = srid_cache.get_project_srid(cur, "02_test")
+        second = srid_cache.get_project_srid(cur, "02_test")
+
+    assert first == srid_cache.ProjectSrid(5514, 'PROJCS["S-JTSK"]', None)
+    assert second is first
+    assert [query for query, _params in conn.executed] == [
+        srid_cache.find_project_srid_sql(),
+        srid_cache.project_srs_sql(),
+    ]
+
+    srid_cache.invalidate_project_srid("02_test")
+    conn.fetchone_rows = [(0,)]
+    with conn.cursor() as cur:
+        assert srid_cache.get_project_srid(cur, "02_test").srid == 0
+        conn.fetchone_rows = [(0,)]
+        srid_cache.get_project_srid(cur, "02_test")
+    # DBs without a project SRID are looked up again every time
+    assert len(conn.executed) == 4
+
+
+def test_point_parser_handles_semicolons_comma_decimals_and_rejects():
+    data = (
+        "id_pts;x;y;h;code;notes\n"
+        "# exported by total station\n"
+        "1;10,5;20,25;30;SU;alpha\n"
+        "\n"
+        "2;1;2\n"
+        "x;1;2;3\n"
+        "3; 1 ;2;3\n"
+    )
+    stats = geopts_parser.ParseStats()
+    batches = list(geopts_parser.iter_point_batches(BytesIO(data.encode("utf-8")), stats=stats))
+
+    assert stats.delimiter == ";"
+    assert stats.header is True
+    assert stats.rows == 2
+    assert stats.rejected == 2
+    assert [list(batch.rows()) for batch in batches] == [
+        [(3, 1, 10.5, 20.25, 30.0, "SU", "alpha"), (7, 3, 1.0, 2.0, 3.0, None, None)],
+    ]
+
+
+def test_bulk_upsert_keeps_the_last_non_empty_notes_of_a_repeated_point():
+    class _StageCursor:
+        def __init__(self):
+            self.executed = []
+            self.staged = ""
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, _exc_type, _exc, _tb):
+            return False
+
+        def execute(self, query, params=None):
+            self.executed.append((query, params))
+
+        def copy_expert(self, _query, buf):
+            self.staged += buf.read()
+
+        def fetchone(self):
+            return (0, 1)
+
+    class _StageConnection:
+        def __init__(self):
+            self.cur = _StageCursor()
+
+        def cursor(self):
+            return self.cur
+
+    data = "7,1,2,3,SU,first note\n7,4,5,6,SU,\n"
+    batches = geopts_parser.iter_point_batches(BytesIO(data.encode("ascii")))
+    conn = _StageConnection()
+
+    assert geom_utils.bulk_upsert_geopts(conn, (list(batch.rows()) for batch in batches), 5514, 5514) == (2, 0, 1)
+
+    # both lines are staged; the merge takes x/y/h from line 2, notes from line 1
+    assert conn.cur.staged.splitlines() == ["1,7,1.0,2.0,3.0,SU,first note", "2,7,4.0,5.0,6.0,SU,"]
+    merge_sql, params = conn.cur.executed[-1]
+    assert params == (5514, 5514)
+    assert "WHERE NULLIF(BTRIM(notes), '') IS NOT NULL" in merge_sql
+    assert "(ARRAY_AGG(notes ORDER BY line_no DESC))[1] AS notes" in merge_sql
+    assert "LEFT JOIN last_notes n ON n.id_pts = s.id_pts" in merge_sql
+    assert "notes = COALESCE(EXCLUDED.notes, tab_geopts.notes)" in merge_sql
+
+
+def test_point_parser_streams_fixed_size_batches():
+    data = "".join(f"{i} {i}.5 {i}.25 1\n" for i in range(1, 11)).encode("ascii")
+
+    batches = list(geopts_parser.iter_point_batches(BytesIO(data), batch_size=4))
+
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert batches[0].x.typecode == "d"
+    assert list(batches[2].id_pts) == [9, 10]
+    assert list(batches[2].line_no) == [9, 10]
+
+
+def test_point_parser_decodes_cp1250_and_enforces_size_limit():
+    data = "1,10,20,30,SU,Sonda č. 1\n".encode("cp1250")
+
+    points, rejected = geopts_parser.parse_points(data)
+    assert rejected == 0
+    assert points[0]["notes"] == "Sonda č. 1"
+
+    with pytest.raises(ValueError, match="too large"):
+        geopts_parser.parse_points(data * 10000, max_bytes=1024)
+
+
+def test_point_parser_checks_the_encoding_of_the_whole_file():
+    padding = "".join(f"{i},10,20,30,SU,plain\n" for i in range(1, 5000))
+    data = (padding + "9999,10,20,30,SU,Sonda č. 1\n").encode("cp1250")
+    assert len(data) > geopts_parser.SNIFF_BYTES
+
+    points, rejected = geopts_parser.parse_points(data)
+    assert rejected == 0
+    assert points[-1]["notes"] == "Sonda č. 1"
+
+    class _Pipe(io.RawIOBase):
+        """Non-seekable stream: only the first SNIFF_BYTES decide the encoding."""
+
+        def __init__(self, payload):
+            self._data = BytesIO(payload)
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            chunk = self._data.read(len(buffer))
+            buffer[: len(chunk)] = chunk
+            return len(chunk)
+
+    with pytest.raises(ValueError, match="not valid utf-8 text"):
+        list(geopts_parser.iter_point_batches(_Pipe(data)))
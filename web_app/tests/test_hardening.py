@@ -5,8 +5,9 @@ from types import SimpleNamespace
 import pytest
 
 import app as app_package
-from app import database
+from app import database, db_pool, queries
 from app.queries import (
+    insert_bindings_set_sql,
     list_photos_sql,
     rebuild_geom_sql,
     report_finds_list_all_sql,
@@ -16,7 +17,10 @@ from app.routes import admin as admin_routes
 from app.routes import auth as auth_routes
 from app.routes import drawings as drawing_routes
 from app.routes import main as main_routes
+from app.routes import polygons as polygon_routes
 from app.utils import admin as admin_utils
+from app.utils import analyze_checks
+from app.utils import geom_utils
 from config import Config
 
 
@@ -80,7 +84,7 @@ def test_drawing_replacement_restores_original_files_on_rollback(
         file_handle.write(b"old thumbnail")
 
     connection = _DrawingConnection()
-    monkeypatch.setattr(drawing_routes, "get_terrain_connection", lambda _dbname: connection)
+    monkeypatch.setattr(drawing_routes, "get_request_terrain_connection", lambda _dbname: connection)
 
     with client.session_transaction() as session:
         session["selected_db"] = "01_SecurityTest"
@@ -120,6 +124,86 @@ def test_database_connections_use_closing_context_manager(monkeypatch):
     assert result["connection_factory"] is database.ClosingConnection
 
 
+class _PooledConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.rolled_back = False
+
+    def get_transaction_status(self):
+        return 0
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def test_pooled_connections_are_reused_and_bounded(monkeypatch):
+    opened = []
+
+    def fake_connect(**kwargs):
+        opened.append(_PooledConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(db_pool.psycopg2, "connect", fake_connect)
+    pools = db_pool.PoolManager(max_size=2, checkout_timeout=0)
+    kwargs = {"dbname": "01_Project", "user": "terrain"}
+
+    first = pools.getconn(kwargs)
+    second = pools.getconn(kwargs)
+    with pytest.raises(db_pool.PoolError):
+        pools.getconn(kwargs)
+
+    first.autocommit = True
+    assert pools.release(first) is True
+    assert pools.release(first) is True
+    assert first.autocommit is False
+    assert pools.getconn(kwargs) is first
+    assert len(opened) == 2
+    assert pools.release(_PooledConnection()) is False
+    assert pools.release(second) is True
+
+
+def test_least_recently_used_idle_pool_is_evicted(monkeypatch):
+    closed = []
+    monkeypatch.setattr(db_pool.psycopg2, "connect", lambda **_kwargs: _PooledConnection())
+    monkeypatch.setattr(db_pool, "_close_socket", closed.append)
+    pools = db_pool.PoolManager(max_size=1, max_databases=2)
+
+    for dbname in ("01_A", "02_B", "03_C"):
+        pools.release(pools.getconn({"dbname": dbname}))
+
+    assert [pool["dbname"] for pool in pools.stats()] == ["02_B", "03_C"]
+    assert len(closed) == 1
+
+
+def test_request_connection_is_shared_and_released_on_teardown(app, monkeypatch):
+    opened = []
+
+    class RequestConnection(_PooledConnection):
+        def close(self):
+            self.closed += 1
+
+    def fake_terrain_connection(dbname):
+        opened.append(RequestConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(database, "get_terrain_connection", fake_terrain_connection)
+
+    with app.test_request_context("/"):
+        first = database.get_request_terrain_connection("01_Project")
+        second = database.get_request_terrain_connection("01_Project")
+        other = database.get_request_terrain_connection("02_Other")
+        assert first is second
+        assert other is not first
+        assert first.closed == 0
+
+        database.release_request_connections()
+
+    assert len(opened) == 2
+    assert [conn.closed for conn in opened] == [1, 1]
+    assert database._request_refs == {}
+
+
 def test_database_backup_uses_terrain_credentials(tmp_path, monkeypatch):
     backup_dir = tmp_path / "backups"
     data_dir = tmp_path / "data"
@@ -237,7 +321,7 @@ def test_home_renders_database_selection_flash_once(client, monkeypatch):
         def close(self):
             return None
 
-    monkeypatch.setattr(main_routes, "get_auth_connection", IndexConnection)
+    monkeypatch.setattr(main_routes, "get_request_auth_connection", IndexConnection)
     monkeypatch.setattr(main_routes, "get_terrain_db_list", lambda _conn: ["01_Project"])
     monkeypatch.setattr(
         main_routes,
@@ -277,9 +361,308 @@ def test_polygon_rebuild_sql_falls_back_to_outer_hull():
     assert "ST_Collect" in query
 
 
+class _RebuildConnection:
+    def __init__(self):
+        self.executed = []
+        self.committed = False
+        self.rowcount = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, _query, params=None):
+        self.executed.append(params)
+        self.rowcount = len(params[0])
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        return None
+
+    def close(self):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc, _traceback):
+        return False
+
+
+def test_polygon_rebuild_runs_one_statement_or_one_per_worker(monkeypatch):
+    names = [f"P{i}" for i in range(10)]
+    monkeypatch.setattr(Config, "POLYGON_REBUILD_WORKERS", 3, raising=False)
+    monkeypatch.setattr(Config, "POLYGON_REBUILD_PARALLEL_MIN", 100, raising=False)
+
+    conn = _RebuildConnection()
+    assert geom_utils.rebuild_polygon_geoms(conn, "01_Test", names) == 10
+    assert conn.executed == [(names, names)]
+    assert conn.committed is False  # the caller commits
+
+    worker_connections = []
+
+    def worker_connection(_dbname):
+        worker_connections.append(_RebuildConnection())
+        return worker_connections[-1]
+
+    monkeypatch.setattr(Config, "POLYGON_REBUILD_PARALLEL_MIN", 5, raising=False)
+    monkeypatch.setattr(geom_utils, "get_terrain_connection", worker_connection)
+
+    assert geom_utils.rebuild_polygon_geoms(_RebuildConnection(), "01_Test", names) == 10
+    assert len(worker_connections) == 3
+    assert all(worker.committed for worker in worker_connections)
+    chunks = [worker.executed[0][0] for worker in worker_connections]
+    assert sorted(name for chunk in chunks for name in chunk) == sorted(names)
+
+
+class _AnalyzeConnection:
+    def __init__(self):
+        self.queries = []
+        self.last_query = ""
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, _params=None):
+        self.last_query = query
+        self.queries.append(query)
+        if "ST_Relate" in query and "tab_polygon_closure" in query and not self.closure:
+            raise RuntimeError('relation "tab_polygon_closure" does not exist')
+
+    closure = True
+
+    def fetchone(self):
+        if "tab_data_version" in self.last_query and "to_regclass" in self.last_query:
+            return (True,)
+        if "tab_polygon_closure" in self.last_query and "to_regclass" in self.last_query:
+            return (self.closure,)
+        if "pg_database" in self.last_query:
+            return (16384, 7)
+        return (False,)
+
+    def fetchall(self):
+        if "ST_Relate" in self.last_query:
+            return [("top", "P1", "P2")]
+        return []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc, _traceback):
+        return False
+
+
+def test_polygon_overlap_rule_uses_index_join_and_is_cached_per_data_version(app, monkeypatch):
+    overlap_sql = analyze_checks.rule_polygons_overlap_same_row_sql()
+    assert "a.geom_top && b.geom_top" in overlap_sql
+    assert "ST_Intersection" not in overlap_sql
+
+    connections = []
+
+    def connection(_dbname):
+        connections.append(_AnalyzeConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(analyze_checks, "get_request_terrain_connection", connection)
+
+    with app.test_request_context():
+        first = analyze_checks.count_bad_checks("01_Test")
+        second = analyze_checks.count_bad_checks("01_Test")
+
+    assert first == second == 1
+    assert overlap_sql in connections[0].queries
+    assert overlap_sql not in connections[1].queries
+
+
+def test_analyze_rules_fall_back_without_polygon_closure_and_run_in_savepoints(app, monkeypatch):
+    connection = _AnalyzeConnection()
+    connection.closure = False
+    monkeypatch.setattr(analyze_checks, "get_request_terrain_connection", lambda _dbname: connection)
+    monkeypatch.setattr(analyze_checks, "data_version", lambda _conn, _dbname: None)
+    monkeypatch.setattr(geom_utils, "_POLYGON_CLOSURE_DBS", {})
+
+    with app.test_request_context():
+        results = analyze_checks.run_analyze_checks("02_Test")
+
+    overlap = next(r for r in results["flat_results"] if r["code"] == "POLY_OVERLAP")
+    assert overlap["error"] is None and overlap["count"] == 1
+    overlap_sql = analyze_checks.rule_polygons_overlap_same_row_sql(False)
+    assert "WITH RECURSIVE polygon_closure" in overlap_sql
+    assert overlap_sql in connection.queries
+    assert connection.queries.count("SAVEPOINT analyze_rule;") == len(analyze_checks.RULES)
+    assert "tab_polygon_closure" in queries.stats_polygons_by_row_sql(True)
+    assert "parent_name = c.descendant" in queries.stats_polygons_by_row_sql(False)
+
+    # a failing rule is rolled back to its savepoint; the later rules still run
+    monkeypatch.setattr(analyze_checks, "has_polygon_closure", lambda _cur, _dbname: True)
+    connection.queries.clear()
+    with app.test_request_context():
+        results = analyze_checks.run_analyze_checks("02_Test")
+    overlap = next(r for r in results["flat_results"] if r["code"] == "POLY_OVERLAP")
+    assert "tab_polygon_closure" in overlap["error"]
+    assert connection.queries.count("ROLLBACK TO SAVEPOINT analyze_rule;") == 1
+    assert all(r["error"] is None for r in results["flat_results"] if r["code"] != "POLY_OVERLAP")
+
+
+class _PolygonsGeojsonConnection:
+    body = '{"top":{"type":"FeatureCollection","features":[]},"bottom":{"type":"FeatureCollection","features":[]}}'
+
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchone(self):
+        return (self.body,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc, _traceback):
+        return False
+
+
+def test_all_polygons_geojson_is_built_in_sql_and_simplified_per_zoom(client, monkeypatch):
+    connection = _PolygonsGeojsonConnection()
+    monkeypatch.setattr(polygon_routes, "get_request_terrain_connection", lambda _dbname: connection)
+    monkeypatch.setattr(polygon_routes, "data_version", lambda _conn, _dbname: None)
+    monkeypatch.setattr(polygon_routes, "polygons_geojson_all_sql", lambda: "polygons-all")
+    with client.session_transaction() as session:
+        session["selected_db"] = "01_Test"
+
+    full = client.get("/polygons/geojson?mode=all")
+    coarse = client.get("/polygons/geojson?mode=all&zoom=10")
+    fine = client.get("/polygons/geojson?mode=all&zoom=22")
+
+    assert full.get_data(as_text=True) == _PolygonsGeojsonConnection.body
+    assert full.get_json()["top"]["type"] == "FeatureCollection"
+    assert fine.status_code == coarse.status_code == 200
+    (_q1, full_params), (_q2, coarse_params), (_q3, fine_params) = connection.executed
+    assert full_params == (0.0, polygon_routes.POLYGON_GEOJSON_MAX_DIGITS)
+    assert coarse_params[0] > fine_params[0] > 0
+    assert coarse_params[1] < fine_params[1] <= polygon_routes.POLYGON_GEOJSON_MAX_DIGITS
+
+
+class _HierarchyConnection(_PolygonsGeojsonConnection):
+    def fetchall(self):
+        query, _params = self.executed[-1]
+        if query == "hierarchy":
+            return [("A", None, 1, 2, 5, 12.5), ("B", "A", 2, 1, 3, None), ("C", "B", 3, 0, 1, 2.0)]
+        if query == "subtree":
+            return [("B", "A", 1), ("C", "B", 2)]
+        return []
+
+
+def test_polygon_hierarchy_reports_depth_and_subtree_from_closure(client, monkeypatch):
+    connection = _HierarchyConnection()
+    monkeypatch.setattr(polygon_routes, "get_request_terrain_connection", lambda _dbname: connection)
+    monkeypatch.setattr(polygon_routes, "polygons_hierarchy_sql", lambda closure: "hierarchy")
+    monkeypatch.setattr(polygon_routes, "polygon_subtree_sql", lambda closure: "subtree")
+    with client.session_transaction() as session:
+        session["selected_db"] = "01_Test"
+
+    hierarchy = client.get("/polygons/geojson?mode=hierarchy").get_json()
+    subtree = client.get("/polygons/geojson?mode=subtree&name=A").get_json()
+
+    assert hierarchy["nodes"][0] == {
+        "name": "A", "parent": None, "depth": 1, "descendants": 2, "su_count": 5, "area": 12.5,
+    }
+    assert [node["depth"] for node in hierarchy["nodes"]] == [1, 2, 3]
+    assert subtree == {"name": "A", "nodes": [
+        {"name": "B", "parent": "A", "depth": 1},
+        {"name": "C", "parent": "B", "depth": 2},
+    ]}
+    assert connection.executed[-1] == ("subtree", ("A",))
+    assert "tab_polygon_closure" in analyze_checks.rule_polygons_overlap_same_row_sql()
+
+
+class _PolygonUploadConnection:
+    autocommit = True
+
+    def __init__(self):
+        self.executed = []
+        self.copied = []
+        self.committed = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def copy_expert(self, _query, buffer):
+        self.copied.append(buffer.read())
+
+    def fetchone(self):
+        return (3, 0)
+
+    def fetchall(self):
+        return [("S1", True, False), ("S2", False, False)]
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        return None
+
+    def close(self):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _exc_type, _exc, _traceback):
+        return False
+
+
+def test_polygon_upload_stages_points_and_ranges_in_bulk(client, monkeypatch):
+    from app.utils.srid_cache import ProjectSrid
+
+    connection = _PolygonUploadConnection()
+    dirty_calls = []
+    monkeypatch.setattr(polygon_routes, "get_request_terrain_connection", lambda _dbname: connection)
+    monkeypatch.setattr(polygon_routes, "get_project_srid", lambda _cur, _dbname: ProjectSrid(5514))
+    monkeypatch.setattr(
+        polygon_routes,
+        "rebuild_dirty_polygons",
+        lambda _conn, _dbname, rebuilt_names=None: dirty_calls.append(rebuilt_names),
+    )
+    with client.session_transaction() as session:
+        session["selected_db"] = "01_Test"
+
+    upload = b"1,10,20,1,EP,S1\n2,11,20,1,EP,S1\n3,11,21,1,EP,S1\n7,30,40,1,EP,S2\n"
+    response = client.post(
+        "/upload-polygons",
+        data={
+            "file": (io.BytesIO(upload), "polygons.csv"),
+            "epsg": "5514",
+            "side": "top",
+            "allocation_reason": "other",
+        },
+        content_type="multipart/form-data",
+    )
+
+    assert response.status_code == 302
+    assert connection.committed is True
+    queries = [query for query, _params in connection.executed]
+    assert len(queries) == 7  # independent of the number of polygons, points and ranges
+    bindings = [params for query, params in connection.executed if query == insert_bindings_set_sql("top")]
+    assert bindings == [(["S1", "S2"], [1, 7], [3, 7])]
+    assert connection.copied == ["1,1,10.0,20.0,1.0,EP,\n2,2,11.0,20.0,1.0,EP,\n3,3,11.0,21.0,1.0,EP,\n4,7,30.0,40.0,1.0,EP,\n"]
+    assert dirty_calls == [["S1", "S2"]]
+    with client.session_transaction() as session:
+        flashes = session["_flashes"]
+    assert flashes[-1] == ("warning", "No valid TOP geometry for 1 polygon(s): S2")
+
+
 def test_password_reset_response_does_not_enumerate_accounts(app, monkeypatch):
     auth_routes._RATE_LIMIT_BUCKETS.clear()
-    monkeypatch.setattr(auth_routes, "get_auth_connection", lambda: _AuthConnection())
+    monkeypatch.setattr(auth_routes, "get_request_auth_connection", lambda: _AuthConnection())
     monkeypatch.setattr(auth_routes, "get_enabled_user_name_by_email", lambda _conn, _email: None)
 
     response = app.test_client().post(
@@ -303,7 +686,7 @@ def test_public_auth_posts_require_csrf(app, path):
 def test_password_reset_url_uses_configured_base_url(app, monkeypatch):
     auth_routes._RATE_LIMIT_BUCKETS.clear()
     app.config["BASE_URL"] = "https://trusted.example"
-    monkeypatch.setattr(auth_routes, "get_auth_connection", lambda: _AuthConnection())
+    monkeypatch.setattr(auth_routes, "get_request_auth_connection", lambda: _AuthConnection())
     monkeypatch.setattr(auth_routes, "get_enabled_user_name_by_email", lambda _conn, _email: "User")
     monkeypatch.setattr(auth_routes, "get_user_password_hash", lambda _conn, _email: "hash")
     sent = {}
@@ -2,8 +2,13 @@ from PIL import Image
 import pytest
 from datetime import date
 import json
+import random
+
+import networkx as nx
 
 from app.routes import su as su_routes
+from app.utils.harris_layout import layered_layout
+from app.utils.stratigraphy_graph import StratigraphyCycleError, StratigraphyIndex, hasse_edges
 
 
 SAMPLE_02_TEST_RELS = [
@@ -54,17 +59,18 @@ def test_harris_matrix_builds_top_down_hasse_graph_from_02_test_sample():
     }
     assert (6, 4) not in graph.edges()
 
-    levels = su_routes._harris_levels(graph)
-    assert levels[6] < levels[3] < levels[2] < levels[12] < levels[5]
-    assert levels[5] < levels[1] < levels[7] < levels[8] < levels[9] < levels[11]
-    assert levels[5] < levels[4] < levels[10] < levels[11]
+    # every edge goes down at least one rank
+    y = {node: position[1] for node, position in layered_layout(graph.nodes, graph.edges).items()}
+    assert y[6] > y[3] > y[2] > y[12] > y[5]
+    assert y[5] > y[1] > y[7] > y[8] > y[9] > y[11]
+    assert y[5] > y[4] > y[10] > y[11]
     assert set(node_type_map.values()) == {"deposit"}
 
 
-def test_harris_matrix_fallback_layout_preserves_sample_branches():
-    graph, label_map, _node_type_map = _sample_harris_graph()
+def test_layered_layout_preserves_sample_branches():
+    graph, _label_map, _node_type_map = _sample_harris_graph()
 
-    positions = su_routes._fallback_harris_layout(graph, label_map)
+    positions = layered_layout(graph.nodes, graph.edges)
 
     assert positions[6][1] > positions[3][1] > positions[2][1] > positions[12][1]
     assert positions[12][1] > positions[5][1]
@@ -75,6 +81,61 @@ def test_harris_matrix_fallback_layout_preserves_sample_branches():
     assert positions[10][0] == pytest.approx(positions[4][0])
 
 
+def test_harris_matrix_layered_layout_is_deterministic_and_keeps_chains_straight():
+    graph, label_map, _node_type_map = _sample_harris_graph()
+
+    positions = su_routes._harris_matrix_layout(graph, label_map)
+
+    assert positions == su_routes._harris_matrix_layout(graph, label_map)
+    assert positions[6][1] > positions[3][1] > positions[2][1] > positions[12][1] > positions[5][1]
+    assert positions[5][1] > positions[1][1] > positions[7][1] > positions[8][1] > positions[9][1]
+    assert positions[1][1] == positions[4][1]
+    assert positions[1][0] < positions[4][0]
+    assert abs(positions[4][0] - positions[1][0]) >= 1.7 - 1e-9
+    for node in (7, 8, 9):
+        assert positions[node][0] == pytest.approx(positions[1][0])
+    assert positions[10][0] == pytest.approx(positions[4][0])
+
+
+def test_layered_layout_reorders_ranks_to_remove_crossings():
+    # sorted by id the lower rank would be [3, 4] and the two edges would cross
+    positions = layered_layout([1, 2, 3, 4], [(1, 4), (2, 3)])
+
+    assert positions[1][0] < positions[2][0]
+    assert positions[4][0] < positions[3][0]
+
+
+def test_layered_layout_orders_every_edge_on_large_sites():
+    # timings live in tests/bench_harris_layout.py
+    rng = random.Random(7)
+    count = 10000
+    edges = [
+        (max(0, node - rng.randint(1, 60)), node)
+        for node in range(1, count)
+        for _ in range(rng.choice((1, 1, 1, 2)))
+    ]
+
+    positions = layered_layout(range(count), edges)
+
+    assert len(positions) == count
+    assert all(positions[u][1] > positions[v][1] for u, v in edges)
+
+
+def test_layered_layout_keeps_room_next_to_the_ends_of_long_edges():
+    # a 40 rank chain with a shortcut from its top to its bottom unit
+    edges = [(node, node + 1) for node in range(40)] + [(0, 40)]
+
+    positions = layered_layout(range(41), edges)
+
+    assert all(positions[u][1] > positions[v][1] for u, v in edges)
+    # the stubs of the shortcut take room beside the chain at both ends, so
+    # the shortcut is not drawn over units 1 and 39
+    gap = 1.7 * (1 + 0.3) / 2
+    assert abs(positions[1][0] - positions[0][0]) == pytest.approx(gap / 2)
+    assert abs(positions[39][0] - positions[40][0]) == pytest.approx(gap / 2)
+    assert len({round(positions[node][0], 9) for node in range(1, 40)}) == 1
+
+
 def test_harris_matrix_rejects_cycles():
     with pytest.raises(ValueError, match="cycle"):
         su_routes._build_harris_matrix_data(
@@ -83,13 +144,178 @@ def test_harris_matrix_rejects_cycles():
         )
 
 
-def test_generate_harrismatrix_saves_non_blank_image(client, tmp_path, monkeypatch):
+def test_harris_matrix_cycle_message_lists_the_cycle():
+    with pytest.raises(ValueError, match=r"Cycle: 1=4 -> 2 -> 3 -> 1=4$"):
+        su_routes._build_harris_matrix_data(
+            [(0, ">", 1), (1, ">", 2), (2, ">", 3), (3, ">", 4), (1, "=", 4), (3, ">", 5)],
+            [(sj_id, "deposit") for sj_id in range(6)],
+        )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_hasse_edges_match_networkx_transitive_reduction(seed):
+    rng = random.Random(seed)
+    count = 200
+    edges = {
+        (min(a, b), max(a, b))
+        for a, b in ((rng.randrange(count), rng.randrange(count)) for _ in range(600))
+        if a != b
+    }
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(count))
+    graph.add_edges_from(edges)
+
+    assert hasse_edges(range(count), edges) == sorted(nx.transitive_reduction(graph).edges)
+
+
+def test_hasse_edges_reports_cycle_nodes():
+    with pytest.raises(StratigraphyCycleError) as excinfo:
+        hasse_edges([], [(0, 1), (1, 2), (2, 3), (3, 1), (3, 4)])
+
+    assert excinfo.value.cycle == [1, 2, 3, 1]
+
+
+def test_stratigraphy_index_rejects_relations_closing_a_cycle():
+    index = StratigraphyIndex(SAMPLE_02_TEST_RELS)
+
+    with pytest.raises(StratigraphyCycleError) as excinfo:
+        index.add(11, ">", 12)
+    cycle = excinfo.value.cycle
+    assert cycle[:3] == [(11,), (12,), (5,)] and cycle[-1] == (11,)
+
+    with pytest.raises(StratigraphyCycleError) as excinfo:
+        index.add(3, "=", 4)
+    assert excinfo.value.cycle == [(3, 4), (2,), (12,), (5,), (3, 4)]
+
+    index.add(11, ">", 13)
+    index.add(14, "=", 2)
+    with pytest.raises(StratigraphyCycleError) as excinfo:
+        index.add(13, ">", 14)
+    assert excinfo.value.cycle[:3] == [(13,), (2, 14), (12,)]
+
+
+def test_stratigraphy_index_replaces_relations_of_one_unit():
+    index = StratigraphyIndex([(1, ">", 2), (2, "=", 3), (3, ">", 4)])
+    with pytest.raises(StratigraphyCycleError):
+        index.add(4, ">", 1)
+
+    # without the relations of 2 nothing links 1 to 4 any more
+    index.remove_unit(2)
+    index.add(4, ">", 1)
+    index.add(2, "<", 1)
+    with pytest.raises(StratigraphyCycleError) as excinfo:
+        index.add(2, "=", 4)
+    assert excinfo.value.cycle == [(2, 4), (1,), (2, 4)]
+
+
+class _EditSuCursor:
+    def __init__(self, rels, executed):
+        self.rels = rels
+        self.executed = executed
+        self.sql = ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.sql = sql
+        self.executed.append((" ".join(sql.split()), params))
+
+    def fetchone(self):
+        if "count(*)" in self.sql:
+            return (len(self.rels), len(self.rels), 1)
+        return (1,)
+
+    def fetchall(self):
+        return list(self.rels)
+
+
+class _EditSuConnection:
+    def __init__(self, rels):
+        self.rels = rels
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.autocommit = True
+
+    def cursor(self):
+        return _EditSuCursor(self.rels, self.executed)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        return None
+
+
+def test_edit_su_rejects_relations_closing_a_cycle(client, monkeypatch):
+    conn = _EditSuConnection([(1, ">", 2), (2, ">", 3), (3, "=", 5)])
+    messages = []
+    monkeypatch.setattr(su_routes, "get_request_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(su_routes, "flash", lambda message, category: messages.append((category, message)))
+    monkeypatch.setattr(su_routes, "_STRATIGRAPHY_INDEXES", {})
+
+    with client.session_transaction() as session:
+        session["selected_db"] = "02_test"
+
+    form = {"id_sj": "5", "sj_typ": "deposit", "above_ids": "1", "below_ids": "", "equal_ids": "3"}
+    response = client.post("/su/edit", data=form)
+
+    assert response.status_code == 302
+    assert conn.rollbacks == 1 and conn.commits == 0
+    assert messages[-1][0] == "danger"
+    assert messages[-1][1].endswith("Cycle: 3=5 -> 1 -> 2 -> 3=5")
+    assert not any(sql.startswith("INSERT INTO tab_sj_stratigraphy") for sql, _params in conn.executed)
+
+    conn.executed.clear()
+    form["above_ids"] = ""
+    form["below_ids"] = "1"
+    client.post("/su/edit", data=form)
+    assert conn.commits == 1
+    inserted = [params for sql, params in conn.executed if sql.startswith("INSERT INTO tab_sj_stratigraphy")]
+    assert inserted == [(5, "<", 1), (5, "=", 3)]
+
+    # the table stamp did not move, so the next save checks against the kept index
+    conn.executed.clear()
+    form["below_ids"] = "2"
+    client.post("/su/edit", data=form)
+    assert conn.commits == 2
+    assert not any(sql.startswith("SELECT ref_sj1, relation, ref_sj2") for sql, _params in conn.executed)
+
+
+def test_edit_su_relation_check_ignores_incomplete_stored_relations(client, monkeypatch):
+    conn = _EditSuConnection([(1, ">", 2), (None, ">", 2), (2, None, 3), (3, " ", None)])
+    monkeypatch.setattr(su_routes, "get_request_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(su_routes, "flash", lambda message, category: None)
+    monkeypatch.setattr(su_routes, "_STRATIGRAPHY_INDEXES", {})
+
+    with client.session_transaction() as session:
+        session["selected_db"] = "02_test"
+
+    form = {"id_sj": "5", "sj_typ": "deposit", "above_ids": "", "below_ids": "2", "equal_ids": ""}
+    client.post("/su/edit", data=form)
+    assert conn.commits == 1 and conn.rollbacks == 0
+
+    # the complete rows are still checked: 5=7 -> 1 -> 2 -> 5=7
+    form.update(above_ids="1", below_ids="", equal_ids="7")
+    conn.rels.append((2, ">", 7))
+    client.post("/su/edit", data=form)
+    assert conn.rollbacks == 1 and conn.commits == 1
+
+
+def test_generate_harrismatrix_saves_svg_with_clickable_units(client, tmp_path, monkeypatch):
     class _Connection:
         def close(self):
             return None
 
     matrix_dir = tmp_path / "harrismatrix"
-    monkeypatch.setattr(su_routes, "get_terrain_connection", lambda _dbname: _Connection())
+    monkeypatch.setattr(su_routes, "get_request_terrain_connection", lambda _dbname: _Connection())
     monkeypatch.setattr(
         su_routes,
         "fetch_stratigraphy_relations",
@@ -105,7 +331,6 @@ def test_generate_harrismatrix_saves_non_blank_image(client, tmp_path, monkeypat
         "get_hmatrix_dirs",
         lambda _dbname: (str(matrix_dir), None),
     )
-    monkeypatch.setattr(su_routes, "_harris_matrix_layout", su_routes._fallback_harris_layout)
 
     with client.session_transaction() as session:
         session["selected_db"] = "02_test"
@@ -113,17 +338,77 @@ def test_generate_harrismatrix_saves_non_blank_image(client, tmp_path, monkeypat
     response = client.post("/generate-harrismatrix")
 
     assert response.status_code == 302
-    generated_files = list(matrix_dir.glob("*.png"))
+    generated_files = list(matrix_dir.glob("*.svg"))
     assert len(generated_files) == 1
     links_file = matrix_dir / f"{generated_files[0].name}.links.json"
     assert links_file.exists()
-    assert json.loads(links_file.read_text(encoding="utf-8"))["areas"]
+    view = json.loads(links_file.read_text(encoding="utf-8"))
+    assert view["areas"] and view["tiles"] is None
+    assert view["width"] > 100 and view["height"] > 100
+    assert not list(matrix_dir.glob("*.tiles"))
 
-    image = Image.open(generated_files[0]).convert("RGB")
-    pixels = image.getdata()
-    assert image.size[0] > 100
-    assert image.size[1] > 100
-    assert any(pixel != (255, 255, 255) for pixel in pixels)
+    svg = generated_files[0].read_text(encoding="utf-8")
+    assert svg.startswith("<svg ")
+    assert f'viewBox="0 0 {view["width"]} {view["height"]}"' in svg
+    assert '<g id="hmatrix-su-1" class="hmatrix-su" data-hmatrix-kind="su" data-hmatrix-id="1"' in svg
+    assert "matplotlib" not in svg
+
+
+def test_generate_harrismatrix_reuses_image_until_data_changes(client, tmp_path, monkeypatch):
+    class _Connection:
+        def close(self):
+            return None
+
+    rels = list(SAMPLE_02_TEST_RELS)
+    matrix_dir = tmp_path / "harrismatrix"
+    matrix_dir.mkdir()
+    (matrix_dir / "02_test_20240101_120000.png").write_bytes(b"old")
+    (matrix_dir / "02_test_20240101_120000.png.links.json").write_text("{}", encoding="utf-8")
+    layouts = []
+    renders = []
+    real_save = su_routes._save_harris_matrix_image
+    real_layout = su_routes._harris_matrix_layout
+
+    def counting_layout(graph, label_map):
+        layouts.append(graph.number_of_nodes())
+        return real_layout(graph, label_map)
+
+    def counting_save(*args, **kwargs):
+        renders.append(args[4]["deposit"])
+        return real_save(*args, **kwargs)
+
+    monkeypatch.setattr(su_routes, "_HARRIS_GRAPH_CACHE", su_routes.OrderedDict())
+    monkeypatch.setattr(su_routes.Config, "HARRIS_IMAGES_KEEP", 1, raising=False)
+    monkeypatch.setattr(su_routes, "get_request_terrain_connection", lambda _dbname: _Connection())
+    monkeypatch.setattr(su_routes, "fetch_stratigraphy_relations", lambda _conn: list(rels))
+    monkeypatch.setattr(su_routes, "get_all_sj_with_types", lambda _conn: SAMPLE_02_TEST_ROWS)
+    monkeypatch.setattr(su_routes, "get_hmatrix_dirs", lambda _dbname: (str(matrix_dir), None))
+    monkeypatch.setattr(su_routes, "_harris_matrix_layout", counting_layout)
+    monkeypatch.setattr(su_routes, "_save_harris_matrix_image", counting_save)
+
+    with client.session_transaction() as session:
+        session["selected_db"] = "02_test"
+
+    client.post("/generate-harrismatrix")
+    first = sorted(path.name for path in matrix_dir.iterdir())
+    client.post("/generate-harrismatrix")
+
+    # the timestamped image is cleaned up; an unchanged regenerate renders nothing
+    assert len(first) == 2 and "02_test_20240101_120000.png" not in first
+    assert sorted(path.name for path in matrix_dir.iterdir()) == first
+    assert (len(layouts), len(renders)) == (1, 1)
+
+    # another color re-renders but reuses the cached graph layout
+    client.post("/generate-harrismatrix", data={"deposit_color": "#112233"})
+    assert (len(layouts), renders[-1]) == (1, "#112233")
+
+    rels.append((1, ">", 11))
+    client.post("/generate-harrismatrix")
+    assert len(layouts) == 2
+    assert len(list(matrix_dir.glob("*.svg"))) == 1
+    assert not list(matrix_dir.glob("*.png"))
+    with client.session_transaction() as session:
+        assert session["harrismatrix_image"] == next(matrix_dir.glob("*.svg")).name
 
 
 def test_harris_matrix_image_returns_clickable_su_and_object_areas(tmp_path):
@@ -131,10 +416,10 @@ def test_harris_matrix_image_returns_clickable_su_and_object_areas(tmp_path):
         SAMPLE_02_TEST_RELS,
         SAMPLE_02_TEST_ROWS,
     )
-    positions = su_routes._fallback_harris_layout(graph, label_map)
-    filepath = tmp_path / "matrix.png"
+    positions = su_routes._harris_matrix_layout(graph, label_map)
+    filepath = tmp_path / "matrix.svg"
 
-    areas = su_routes._save_harris_matrix_image(
+    view = su_routes._save_harris_matrix_image(
         graph,
         positions,
         label_map,
@@ -147,14 +432,46 @@ def test_harris_matrix_image_returns_clickable_su_and_object_areas(tmp_path):
         dsu=dsu,
     )
 
-    assert filepath.exists()
+    areas = view["areas"]
+    svg = filepath.read_text(encoding="utf-8")
+    assert 'id="hmatrix-object-42"' in svg
+    assert 'data-hmatrix-label="Obj 42 (wall)"' in svg
     assert any(area["kind"] == "su" and area["id"] == 1 for area in areas)
     assert any(area["kind"] == "object" and area["id"] == 42 for area in areas)
-    assert all(0 <= area["left"] <= 100 for area in areas)
-    assert all(0 <= area["top"] <= 100 for area in areas)
+    assert all(0 <= area["x"] and area["x"] + area["width"] <= view["width"] for area in areas)
+    assert all(0 <= area["y"] and area["y"] + area["height"] <= view["height"] for area in areas)
     assert all(area["width"] > 0 and area["height"] > 0 for area in areas)
 
 
+def test_harris_matrix_tile_pyramid_halves_down_to_one_tile(tmp_path):
+    graph, label_map, node_type_map, dsu = su_routes._build_harris_matrix_data(
+        SAMPLE_02_TEST_RELS,
+        SAMPLE_02_TEST_ROWS,
+    )
+    positions = su_routes._harris_matrix_layout(graph, label_map)
+    tiles_dir = tmp_path / "matrix.svg.tiles"
+
+    view = su_routes._save_harris_matrix_image(
+        graph,
+        positions,
+        label_map,
+        node_type_map,
+        {"deposit": "#ADD8E6"},
+        str(tmp_path / "matrix.svg"),
+        dsu=dsu,
+        tiles_dir=str(tiles_dir),
+    )
+
+    max_zoom = view["tiles"]["max_zoom"]
+    assert max_zoom >= 1
+    assert 2 ** max_zoom * 256 >= max(view["width"], view["height"]) > 2 ** (max_zoom - 1) * 256
+    assert {path.name for path in tiles_dir.iterdir()} <= {str(zoom) for zoom in range(max_zoom + 1)}
+    top = Image.open(tiles_dir / "0" / "0" / "0.png").convert("RGB")
+    assert top.size == (256, 256)
+    assert any(pixel != (255, 255, 255) for pixel in top.getdata())
+    assert list((tiles_dir / str(max_zoom)).rglob("*.png"))
+
+
 class _HarrisPageCursor:
     def __init__(self):
         self.query = ""
@@ -184,39 +501,59 @@ class _HarrisPageConnection:
         return None
 
 
-def test_harrismatrix_page_renders_clickable_overlay(client, monkeypatch):
-    monkeypatch.setattr(su_routes, "get_terrain_connection", lambda _dbname: _HarrisPageConnection())
+def test_harrismatrix_page_renders_clickable_svg(client, tmp_path, monkeypatch):
+    (tmp_path / "matrix.svg").write_text(
+        '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 10 10">'
+        '<g id="hmatrix-su-1" class="hmatrix-su" data-hmatrix-kind="su" data-hmatrix-id="1"'
+        ' data-hmatrix-ids="1" data-hmatrix-label="1"><rect width="5" height="4"/></g></svg>',
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(su_routes, "get_request_terrain_connection", lambda _dbname: _HarrisPageConnection())
+    monkeypatch.setattr(su_routes, "get_hmatrix_dirs", lambda _dbname: (str(tmp_path), None))
     monkeypatch.setattr(
         su_routes,
         "_load_harris_links",
-        lambda _dbname, _image: [
-            {
-                "kind": "su",
-                "id": 1,
-                "ids": [1],
-                "label": "1",
-                "left": 10,
-                "top": 20,
-                "width": 5,
-                "height": 4,
-            }
-        ],
+        lambda _dbname, _image: {"width": 10, "height": 10, "tiles": None, "areas": []},
     )
 
     with client.session_transaction() as session:
         session["selected_db"] = "02_test"
-        session["harrismatrix_image"] = "matrix.png"
+        session["harrismatrix_image"] = "matrix.svg"
 
     response = client.get("/harrismatrix")
     html = response.get_data(as_text=True)
 
     assert response.status_code == 200
-    assert "hmatrix-image-wrap" in html
-    assert "hmatrix-hotspot hmatrix-hotspot-su" in html
-    assert 'data-hmatrix-id="1"' in html
+    assert 'id="hmatrixSvgWrap"' in html
+    assert 'class="hmatrix-su" data-hmatrix-kind="su" data-hmatrix-id="1"' in html
+    assert 'id="hmatrixTiles"' not in html
     assert 'id="hmatrixEntityModal"' in html
 
 
+def test_harrismatrix_page_uses_tile_viewer_for_tiled_matrices(client, monkeypatch):
+    monkeypatch.setattr(su_routes, "get_request_terrain_connection", lambda _dbname: _HarrisPageConnection())
+    monkeypatch.setattr(
+        su_routes,
+        "_load_harris_links",
+        lambda _dbname, _image: {
+            "width": 900,
+            "height": 700,
+            "tiles": {"max_zoom": 2, "tile_size": 256},
+            "areas": [{"kind": "su", "id": 1, "ids": [1], "label": "1", "x": 1, "y": 1, "width": 5, "height": 4}],
+        },
+    )
+
+    with client.session_transaction() as session:
+        session["selected_db"] = "02_test"
+        session["harrismatrix_image"] = "matrix.svg"
+
+    html = client.get("/harrismatrix").get_data(as_text=True)
+
+    assert 'id="hmatrixTiles"' in html
+    assert "/harrismatrix/img/matrix.svg.tiles" in html
+    assert 'id="hmatrixSvgWrap"' not in html
+
+
 class _DetailCursor:
     def __init__(self, row):
         self.row = row
@@ -281,7 +618,7 @@ def test_harrismatrix_su_detail_api_returns_entity_payload(client, monkeypatch):
         [8],
         [],
     )
-    monkeypatch.setattr(su_routes, "get_terrain_connection", lambda _dbname: _DetailConnection(row))
+    monkeypatch.setattr(su_routes, "get_request_terrain_connection", lambda _dbname: _DetailConnection(row))
 
     with client.session_transaction() as session:
         session["selected_db"] = "02_test"
@@ -303,7 +640,7 @@ def test_harrismatrix_object_detail_api_returns_object_payload(client, monkeypat
         def close(self):
             return None
 
-    monkeypatch.setattr(su_routes, "get_terrain_connection", lambda _dbname: _Connection())
+    monkeypatch.setattr(su_routes, "get_request_terrain_connection", lambda _dbname: _Connection())
     monkeypatch.setattr(
         su_routes,
         "q_get_object_with_sjs",
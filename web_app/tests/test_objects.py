@@ -12,7 +12,7 @@ def test_objects_page_renders_pagination_markup_for_existing_objects(client, mon
         for idx in range(1, 13)
     ]
 
-    monkeypatch.setattr(object_routes, "get_terrain_connection", lambda _dbname: _Connection())
+    monkeypatch.setattr(object_routes, "get_request_terrain_connection", lambda _dbname: _Connection())
     monkeypatch.setattr(object_routes, "_get_next_object_id", lambda _conn: 13)
     monkeypatch.setattr(object_routes, "_get_object_types", lambda _conn: ["wall"])
     monkeypatch.setattr(object_routes, "q_list_objects_with_sjs", lambda _conn: objects)
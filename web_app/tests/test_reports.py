@@ -77,7 +77,7 @@ def test_geopts_sql_export_excludes_derived_geometry(monkeypatch):
         ["id_pts", "x", "y", "h", "code", "notes"],
         [(1, 10.0, 20.0, 30.0, "SU", "O'Reilly")],
     )
-    monkeypatch.setattr(geopts_table, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(geopts_table, "get_request_terrain_connection", lambda _dbname: conn)
 
     sql_text = geopts_table.GeoptsTableExporter().to_sql(_ctx())
 
@@ -105,7 +105,7 @@ def test_photos_sql_export_excludes_centroid_and_keeps_json(monkeypatch):
             {"camera": "UnitCam", "ok": True},
         )],
     )
-    monkeypatch.setattr(photos_table, "get_terrain_connection", lambda _dbname: conn)
+    monkeypatch.setattr(photos_table, "get_request_terrain_connection", lambda _dbname: conn)
 
     sql_text = photos_table.PhotosTableExporter().to_sql(_ctx())
 
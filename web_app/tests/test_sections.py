@@ -1,6 +1,10 @@
+from app import queries
 from app.routes import sections as section_routes
 
 
+executed = []
+
+
 class _Cursor:
     def __init__(self):
         self.query = None
@@ -13,6 +17,14 @@ class _Cursor:
 
     def execute(self, query, _params=None):
         self.query = query
+        executed.append(query)
+
+    def fetchone(self):
+        if self.query == "rebuild-lines":
+            return (3,)
+        if self.query == "line-counts":
+            return (4, 1)
+        return None
 
     def fetchall(self):
         if self.query == "sections-list":
@@ -44,16 +56,25 @@ class _Cursor:
 
 
 class _Connection:
+    committed = False
+
     def cursor(self):
         return _Cursor()
 
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        return None
+
     def close(self):
         return None
 
 
 def test_sections_page_renders_edit_controls_and_prefill_payload(client, monkeypatch):
-    monkeypatch.setattr(section_routes, "get_terrain_connection", lambda _dbname: _Connection())
-    monkeypatch.setattr(section_routes, "get_sections_list_sql", lambda: "sections-list")
+    monkeypatch.setattr(section_routes, "get_request_terrain_connection", lambda _dbname: _Connection())
+    monkeypatch.setattr(section_routes, "has_section_lines", lambda _cur, _dbname: True)
+    monkeypatch.setattr(section_routes, "get_sections_list_sql", lambda stored=True: "sections-list")
     monkeypatch.setattr(section_routes, "list_authors_sql", lambda: "authors-list")
     monkeypatch.setattr(section_routes, "list_sj_ids_sql", lambda: "sj-list")
 
@@ -82,8 +103,9 @@ def test_sections_page_renders_edit_controls_and_prefill_payload(client, monkeyp
 
 
 def test_sections_geojson_returns_leaflet_ready_lines(client, monkeypatch):
-    monkeypatch.setattr(section_routes, "get_terrain_connection", lambda _dbname: _Connection())
-    monkeypatch.setattr(section_routes, "sections_lines_geojson_4326_sql", lambda: "sections-geojson")
+    monkeypatch.setattr(section_routes, "get_request_terrain_connection", lambda _dbname: _Connection())
+    monkeypatch.setattr(section_routes, "has_section_lines", lambda _cur, _dbname: True)
+    monkeypatch.setattr(section_routes, "sections_lines_geojson_4326_sql", lambda stored=True: "sections-geojson")
 
     with client.session_transaction() as session:
         session["selected_db"] = "02_test"
@@ -102,3 +124,61 @@ def test_sections_geojson_returns_leaflet_ready_lines(client, monkeypatch):
             }
         ]
     }
+
+
+def test_rebuild_all_sections_recomputes_stored_lines(client, monkeypatch):
+    connection = _Connection()
+    monkeypatch.setattr(section_routes, "get_request_terrain_connection", lambda _dbname: connection)
+    monkeypatch.setattr(section_routes, "has_section_lines", lambda _cur, _dbname: True)
+    monkeypatch.setattr(section_routes, "rebuild_section_lines_sql", lambda: "rebuild-lines")
+    monkeypatch.setattr(section_routes, "section_line_counts_sql", lambda stored=True: "line-counts")
+
+    with client.session_transaction() as session:
+        session["selected_db"] = "02_test"
+
+    response = client.post("/sections/rebuild-all")
+
+    assert response.status_code == 302
+    assert connection.committed is True
+    with client.session_transaction() as session:
+        messages = session["_flashes"]
+    assert messages == [("success", "Geometry rebuilt for 4 section(s) (3 changed). Skipped 1 (not enough points).")]
+
+
+def test_rebuild_all_sections_only_validates_without_stored_lines(client, monkeypatch):
+    connection = _Connection()
+    executed.clear()
+    monkeypatch.setattr(section_routes, "get_request_terrain_connection", lambda _dbname: connection)
+    monkeypatch.setattr(section_routes, "has_section_lines", lambda _cur, _dbname: False)
+    monkeypatch.setattr(section_routes, "rebuild_section_lines_sql", lambda: "rebuild-lines")
+    monkeypatch.setattr(
+        section_routes, "section_line_counts_sql", lambda stored=True: "line-counts" if not stored else "stored-counts"
+    )
+
+    with client.session_transaction() as session:
+        session["selected_db"] = "02_test"
+
+    response = client.post("/sections/rebuild-all")
+
+    assert response.status_code == 302
+    assert executed == ["line-counts"]
+    with client.session_transaction() as session:
+        messages = session["_flashes"]
+    assert messages == [("success", "Geometry validated for 4 section(s). Skipped 1 (not enough points).")]
+
+
+def test_section_line_queries_build_lines_without_the_stored_column():
+    for build in (
+        queries.get_sections_list_sql,
+        queries.sections_lines_geojson_4326_sql,
+        queries.gis_export_sections_sql,
+        queries.section_line_counts_sql,
+        queries.mvt_sections_tile_sql,
+        queries.report_sections_cards_detail_sql,
+    ):
+        stored = build()
+        fallback = build(False)
+        assert "section_lines" not in stored
+        assert "FROM section_lines" in fallback
+        assert "ST_MakeLine(d.pts_geom ORDER BY d.id_pts)" in fallback
+        assert fallback.count("%s") == stored.count("%s")
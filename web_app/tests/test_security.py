@@ -7,6 +7,7 @@ import pytest
 from werkzeug.datastructures import FileStorage
 
 import app as app_package
+from app.routes import admin as admin_routes
 from app.routes import auth as auth_routes
 from app.routes import finds_samples as finds_samples_routes
 from app.routes import main as main_routes
@@ -95,7 +96,7 @@ def test_selected_database_guard_discards_invalid_session_value(client):
 
 def test_select_database_requires_available_database(client, monkeypatch):
     connection = _FakeConnection()
-    monkeypatch.setattr(main_routes, "get_auth_connection", lambda: connection)
+    monkeypatch.setattr(main_routes, "get_request_auth_connection", lambda: connection)
     monkeypatch.setattr(main_routes, "get_terrain_db_list", lambda _conn: ["01_Allowed"])
 
     response = client.post("/select-db", data={"selected_db": "01_NotAvailable"})
@@ -108,7 +109,7 @@ def test_select_database_requires_available_database(client, monkeypatch):
 
 def test_select_database_accepts_available_database(client, monkeypatch):
     connection = _FakeConnection()
-    monkeypatch.setattr(main_routes, "get_auth_connection", lambda: connection)
+    monkeypatch.setattr(main_routes, "get_request_auth_connection", lambda: connection)
     monkeypatch.setattr(main_routes, "get_terrain_db_list", lambda _conn: ["01_Allowed"])
 
     response = client.post("/select-db", data={"selected_db": "01_Allowed"})
@@ -136,7 +137,7 @@ def test_find_and_sample_details_escape_database_values(client, monkeypatch, pat
     _select_database(client)
     monkeypatch.setattr(
         finds_samples_routes,
-        "get_terrain_connection",
+        "get_request_terrain_connection",
         lambda _dbname: _FakeConnection(row),
     )
 
@@ -200,7 +201,7 @@ def test_mobile_login_code_is_hashed_before_storage(monkeypatch):
     captured = {}
     login_code = "B" * 43
     monkeypatch.setattr(main_routes.secrets, "token_urlsafe", lambda _size: login_code)
-    monkeypatch.setattr(main_routes, "get_auth_connection", lambda: connection)
+    monkeypatch.setattr(main_routes, "get_request_auth_connection", lambda: connection)
 
     def capture_grant(_conn, email, token_hash, expires_at):
         captured.update(email=email, token_hash=token_hash, expires_at=expires_at)
@@ -230,6 +231,40 @@ def test_disabled_user_is_rejected_on_each_request(client, monkeypatch):
     assert "token=;" in response.headers.get("Set-Cookie", "")
 
 
+def test_user_state_is_cached_until_admin_disables_the_user(client, monkeypatch):
+    states = {"security-test@example.invalid": ("Security Test", "archeolog", True)}
+    lookups = []
+
+    def fake_user_access_state(_conn, email):
+        lookups.append(email)
+        return states[email]
+
+    class AdminConnection(_FakeConnection):
+        def execute(self, _query, params=None):
+            states[params[0]] = ("Security Test", "archeolog", False)
+
+        def commit(self):
+            return None
+
+    monkeypatch.setattr(app_package, "get_user_access_state", fake_user_access_state)
+    monkeypatch.setattr(admin_routes, "get_request_auth_connection", lambda: AdminConnection())
+    monkeypatch.setattr(main_routes, "_create_mobile_login_code", lambda _email: "A" * 43)
+    monkeypatch.setattr(main_routes, "_mobile_api_qr_svg", lambda _payload: "<svg/>")
+
+    assert client.get("/mobile-api-qr.svg").status_code == 200
+    assert client.get("/mobile-api-qr.svg").status_code == 200
+    assert len(lookups) == 1
+
+    response = client.post("/disable-user", data={"mail": "security-test@example.invalid"})
+    assert response.status_code == 302
+    assert len(lookups) == 1
+
+    response = client.get("/mobile-api-qr.svg")
+    assert response.status_code == 302
+    assert response.headers["Location"].startswith("/login")
+    assert len(lookups) == 2
+
+
 def test_password_reset_token_is_bound_to_current_password_hash():
     token = create_password_reset_token("user@example.invalid", "old-hash", lifetime_minutes=5)
     payload = decode_password_reset_token(token)